@@ -3,3 +3,4 @@ from django.apps import AppConfig
 
 class ApiconnectorsConfig(AppConfig):
     name = 'apiconnectors'
+    default_auto_field = 'django.db.models.BigAutoField'
@@ -1,17 +1,27 @@
 
+import logging
+
 from dal import autocomplete
+from django.conf import settings
 from django.http import JsonResponse
 import requests
 
+from apiconnectors import client
+
+logger = logging.getLogger(__name__)
+
 cerl_search_url = 'https://data.cerl.org/thesaurus/_search'
 cerl_record_url = 'http://thesaurus.cerl.org/record/'
 cerl_record_url_api =   'https://data.cerl.org/thesaurus/'
 
 
 def cerl_suggest(query, cerl_search_field="name"):
-    response = requests.get(cerl_search_url,
-                            params={'query': cerl_search_field+':'+query+'*'},
-                            headers={'accept': 'application/json'})
+    try:
+        response = client.get(cerl_search_url, params={'query': cerl_search_field+':'+query+'*'},
+                              ttl=settings.API_CONNECTOR_SUGGEST_CACHE_SECONDS)
+    except requests.RequestException:
+        logger.warning("CERL suggest for %s failed", query, exc_info=True)
+        return []
     if response.status_code == requests.codes.ok:
         return response.json().get('rows', None) or []
     else:
@@ -22,15 +32,36 @@ def get_names(item, cerl_search_field):
         return ", ".join([str(name) for name in item[cerl_search_field] if name])
     return ""
 
-def get_record(id):
-    response = requests.get(cerl_record_url_api+id, headers={'accept': 'application/json'})
+def get_record_json(id):
+    """
+    Gets the JSON of a CERL Thesaurus record, or None if it cannot be retrieved
+    """
+    try:
+        response = client.get(cerl_record_url_api+id)
+    except requests.RequestException:
+        logger.warning("CERL record %s could not be retrieved", id, exc_info=True)
+        return None
     if response.status_code == requests.codes.ok:
-        parts = response.json().get('data').get('heading')[0].get('part')
+        return response.json()
+    return None
+
+def get_record(id):
+    record = get_record_json(id)
+    if record is not None:
+        parts = record.get('data').get('heading')[0].get('part')
         names = [list(part.values())[0] for part in parts]
         return "{}, {}".format("".join(names[:1]), " ".join(names[1:]))
     else:
         return "- no data -"
 
+def get_lat_long(record):
+    """
+    Gets the latitude and longitude of a CERL Thesaurus place record
+    :return: a tuple (latitude, longitude), with None for unknown values
+    """
+    point = ((record or {}).get('data') or {}).get('location', {}).get('point', {})
+    return point.get('lat'), point.get('long')
+
 class CerlSuggest(autocomplete.Select2ListView):
     cerl_search_field = "placeName"
 
@@ -0,0 +1,216 @@
+"""
+The shared HTTP client of the external authority APIs (CERL Thesaurus, VIAF).
+
+Requests have a timeout (API_CONNECTOR_TIMEOUT) and go through one requests.Session per thread, which keeps the
+connections to each host open. Responses are stored in the database (ApiResponse) and reused until they expire,
+after API_CONNECTOR_CACHE_SECONDS by default, so repeated suggestions and record lookups do not hit the network.
+If a request fails, an expired stored response is used if there is one. Expired responses are kept for that
+until the purge_api_responses command deletes them.
+
+In offline mode (API_CONNECTOR_OFFLINE), nothing is sent to the external APIs: stored responses are used even if
+they expired, and other requests go to the stub server at API_CONNECTOR_STUB_URL (see apiconnectors.stub), with
+the host of the original URL as the first part of the path, e.g. <stub url>/data.cerl.org/thesaurus/cnl00016323.
+Without a stub server, they raise OfflineError.
+"""
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# The status codes of the responses that are stored; others, e.g. server errors, are not
+STORED_STATUS_CODES = [200, 404, 410]
+
+_local = threading.local()
+
+
+class OfflineError(requests.ConnectionError):
+    """
+    Raised for a request without a stored response in offline mode without a stub server
+    """
+    pass
+
+
+class ApiResult:
+    """
+    A response of an external API, either fetched or stored
+    """
+    def __init__(self, url, status_code, text, content_type='', expires=None):
+        """
+        :param expires: the expiry date of a stored response
+        """
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.content_type = content_type
+        self.expires = expires
+
+    @property
+    def stored(self):
+        return self.expires is not None
+
+    @property
+    def is_expired(self):
+        return self.expires is not None and self.expires <= timezone.now()
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError("{} error for url: {}".format(self.status_code, self.url))
+
+
+def get_session():
+    """
+    Gets the requests session of the current thread
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.API_CONNECTOR_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def get_url(url, params=None):
+    """
+    Adds query parameters to a URL, in a fixed order so that the URL can be used as a key
+    """
+    if not params:
+        return url
+    return url + ('&' if '?' in url else '?') + urlencode(sorted(params.items()))
+
+
+def get_key(url, accept):
+    return hashlib.md5("{} {}".format(accept, url).encode()).hexdigest()
+
+
+def get_request_url(url):
+    """
+    Gets the URL to send a request to, which is on the stub server in offline mode
+    :raises OfflineError: in offline mode without a stub server
+    """
+    if not settings.API_CONNECTOR_OFFLINE:
+        return url
+    if not settings.API_CONNECTOR_STUB_URL:
+        raise OfflineError("No stored response for {} in offline mode".format(url))
+    parts = urlsplit(url)
+    return "{}/{}{}{}".format(settings.API_CONNECTOR_STUB_URL.rstrip('/'), parts.netloc, parts.path,
+                              '?' + parts.query if parts.query else '')
+
+
+def fetch(url, accept='application/json', timeout=None):
+    """
+    Sends a request to an external API (or the stub server in offline mode), without using the stored responses.
+    This does not use the database, so it can run in any thread.
+    :return: an ApiResult
+    :raises requests.RequestException: if the request failed
+    """
+    response = get_session().get(get_request_url(url), headers={'accept': accept},
+                                 timeout=timeout or settings.API_CONNECTOR_TIMEOUT)
+    logger.debug('%s: %s %s, %0.2f', url, response.status_code, response.reason,
+                 response.elapsed.total_seconds())
+    return ApiResult(url, response.status_code, response.text, response.headers.get('content-type', ''))
+
+
+def get_stored(urls, accept='application/json', expired=False):
+    """
+    Gets the stored responses of URLs that did not expire, or all stored responses in offline mode
+    :param urls: the URLs, including their query strings
+    :param accept: the media type the responses were requested with
+    :param expired: include expired responses
+    :return: a dict of ApiResults by URL
+    """
+    from .models import ApiResponse
+    keys = {get_key(url, accept): url for url in urls}
+    stored = ApiResponse.objects.filter(key__in=keys)
+    if not expired and not settings.API_CONNECTOR_OFFLINE:
+        stored = stored.filter(expires__gt=timezone.now())
+    return {keys[response.key]: ApiResult(keys[response.key], response.status_code, response.content,
+                                          response.content_type, response.expires) for response in stored}
+
+
+def store(results, accept='application/json', ttl=None):
+    """
+    Stores the responses with STORED_STATUS_CODES, replacing stored responses of the same URLs
+    :param results: the ApiResults
+    :param accept: the media type the responses were requested with
+    :param ttl: the number of seconds to store the responses, by default API_CONNECTOR_CACHE_SECONDS
+    """
+    from .models import ApiResponse
+    now = timezone.now()
+    expires = now + timedelta(seconds=ttl or settings.API_CONNECTOR_CACHE_SECONDS)
+    responses = {}
+    for result in results:
+        if result.status_code in STORED_STATUS_CODES:
+            key = get_key(result.url, accept)
+            responses[key] = ApiResponse(key=key, url=result.url, status_code=result.status_code,
+                                         content_type=result.content_type, content=result.text, fetched=now,
+                                         expires=expires)
+    if responses:
+        # MySQL updates on any unique key and does not take the fields of the conflict
+        target = {'unique_fields': ['key']} if connection.features.supports_update_conflicts_with_target else {}
+        ApiResponse.objects.bulk_create(responses.values(), update_conflicts=True,
+                                        update_fields=['url', 'status_code', 'content_type', 'content', 'fetched',
+                                                       'expires'], **target)
+
+
+def get(url, params=None, accept='application/json', ttl=None, timeout=None):
+    """
+    Gets a URL of an external API, from the stored responses if it was fetched before and did not expire
+    :param url: the URL
+    :param params: a dict of query parameters
+    :param accept: the media type to accept
+    :param ttl: the number of seconds to store the response, by default API_CONNECTOR_CACHE_SECONDS
+    :param timeout: the number of seconds to wait for the server, by default API_CONNECTOR_TIMEOUT
+    :return: an ApiResult
+    :raises requests.RequestException: if the request failed and there is no stored response
+    """
+    url = get_url(url, params)
+    stored = get_stored([url], accept, expired=True).get(url)
+    if stored is not None and (settings.API_CONNECTOR_OFFLINE or not stored.is_expired):
+        return stored
+
+    try:
+        result = fetch(url, accept, timeout)
+    except requests.RequestException:
+        if stored is None:
+            raise
+        logger.warning("Request for %s failed, using the expired response", url, exc_info=True)
+        return stored
+    if result.status_code not in STORED_STATUS_CODES and stored is not None:
+        return stored
+    store([result], accept, ttl)
+    return result
+
+
+def purge(expired_before, batch_size=10000):
+    """
+    Deletes the stored responses that expired before a date, in batches
+    :param expired_before: a datetime
+    :return: the number of deleted responses
+    """
+    from .models import ApiResponse
+    expired = ApiResponse.objects.filter(expires__lt=expired_before)
+    deleted = 0
+    while True:
+        pks = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += ApiResponse.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,285 @@
+"""
+Bulk enrichment of places and persons from their authority records.
+
+An Enrichment fills in the missing values of the objects of a model from the records of an external API: the
+coordinates of places from their CERL records, the years of birth and death of persons from their VIAF records.
+An Enricher runs an enrichment in batches of objects, ordered by primary key:
+- the stored responses of the batch are looked up with one query (see apiconnectors.client);
+- the other records are fetched concurrently by a bounded thread pool, at most rate requests per second in total,
+  retrying failed requests and server errors with exponential backoff; these threads do not use the database;
+- the changed objects are written with bulk_update, with their history (see mediate.history), and the cache tags
+  of the objects are invalidated;
+- the primary key of the last object of the batch is written to a checkpoint file, if any, so that an interrupted
+  run continues after it. The checkpoint of a model is removed when its run completes.
+
+See the enrich_authorities command.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+
+from apiconnectors import client
+from apiconnectors.cerlapi import cerl_record_url_api
+from apiconnectors.viafapi import RDF_MEDIA_TYPE, ViafEntity, parse_rdf
+from mediate.cache import invalidate_instances
+from mediate.history import HistoryWriter
+
+logger = logging.getLogger(__name__)
+
+# The status codes of responses that are retried
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class Enrichment:
+    """
+    Fills in missing values of the objects of a model from their records in an external API
+    """
+    model_label = None
+    # The fields that are filled in
+    fields = []
+    # The media type of the records
+    accept = 'application/json'
+    # The change reason of the history of the changed objects
+    change_reason = ""
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_queryset(self):
+        """
+        Gets the objects with missing values and a record to get them from
+        """
+        raise NotImplementedError
+
+    def get_url(self, obj):
+        """
+        Gets the URL of the record of an object
+        """
+        raise NotImplementedError
+
+    def apply(self, obj, result):
+        """
+        Fills in the missing values of an object from its record
+        :param result: the ApiResult of the record
+        :return: True if a value changed
+        """
+        raise NotImplementedError
+
+    def save(self, objs, batch_size=1000):
+        with transaction.atomic(), HistoryWriter(change_reason=self.change_reason, batch_size=batch_size) as history:
+            self.model.objects.bulk_update(objs, self.fields, batch_size=batch_size)
+            history.add(objs)
+            invalidate_instances(objs)
+
+
+class PlaceEnrichment(Enrichment):
+    model_label = 'persons.Place'
+    fields = ['latitude', 'longitude']
+    change_reason = "Coordinates from CERL"
+
+    def get_queryset(self):
+        return self.model.objects.exclude(cerl_id__isnull=True).exclude(cerl_id='')\
+            .filter(Q(latitude__isnull=True) | Q(latitude=0) | Q(longitude__isnull=True) | Q(longitude=0))
+
+    def get_url(self, place):
+        return cerl_record_url_api + place.cerl_id
+
+    def apply(self, place, result):
+        return result.status_code == requests.codes.ok and place.set_lat_long(result.json())
+
+
+class PersonEnrichment(Enrichment):
+    model_label = 'persons.Person'
+    fields = ['date_of_birth', 'date_of_death', 'normalised_date_of_birth', 'normalised_date_of_death']
+    accept = RDF_MEDIA_TYPE
+    change_reason = "Years of birth and death from VIAF"
+
+    def get_queryset(self):
+        return self.model.objects.exclude(viaf_id__isnull=True).exclude(viaf_id='')\
+            .filter(Q(date_of_birth__isnull=True) | Q(date_of_birth='') |
+                    Q(date_of_death__isnull=True) | Q(date_of_death=''))
+
+    def get_url(self, person):
+        return ViafEntity(person.viaf_id).uri
+
+    def apply(self, person, result):
+        if result.status_code != requests.codes.ok:
+            return False
+        entity = ViafEntity(person.viaf_id)
+        entity.rdf = parse_rdf(result.text, entity.uri)
+        changed = False
+        # The normalised dates are computed fields, which bulk_update does not update
+        if not person.date_of_birth and entity.birthdate:
+            person.date_of_birth = str(entity.birthyear)
+            person.normalised_date_of_birth = entity.birthyear
+            changed = True
+        if not person.date_of_death and entity.deathdate:
+            person.date_of_death = str(entity.deathyear)
+            person.normalised_date_of_death = entity.deathyear
+            changed = True
+        return changed
+
+
+PLACE_ENRICHMENT = PlaceEnrichment()
+PERSON_ENRICHMENT = PersonEnrichment()
+
+ENRICHMENTS = {
+    'places': PLACE_ENRICHMENT,
+    'persons': PERSON_ENRICHMENT,
+}
+
+
+class RateLimiter:
+    """
+    Spaces the calls of wait() of all threads, so that there are at most rate calls per second
+    """
+    def __init__(self, rate):
+        """
+        :param rate: the number of calls per second, or 0 for no limit
+        """
+        self.interval = 1 / rate if rate else 0
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next)
+            self.next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Checkpoint:
+    """
+    The primary key of the last object that was enriched per model, in a JSON file
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def get(self, model_label):
+        return self.load().get(model_label)
+
+    def set(self, model_label, pk):
+        values = self.load()
+        if pk is None:
+            values.pop(model_label, None)
+        else:
+            values[model_label] = str(pk)
+        # Replace the file at once, so that it is never incomplete
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump(values, file)
+        os.replace(self.path + '.tmp', self.path)
+
+
+class Enricher:
+    """
+    Runs an enrichment in batches, fetching the records of each batch concurrently
+    """
+    def __init__(self, enrichment, workers=8, rate=10, retries=3, backoff=1, batch_size=200, checkpoint=None):
+        """
+        :param enrichment: the Enrichment
+        :param workers: the number of threads that fetch records
+        :param rate: the maximum number of requests per second of all threads, or 0 for no limit
+        :param retries: the number of times a failed request is retried
+        :param backoff: the number of seconds before the first retry, doubled for each next retry
+        :param batch_size: the number of objects per batch
+        :param checkpoint: the path of the checkpoint file, or None
+        """
+        self.enrichment = enrichment
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+
+    def fetch(self, url):
+        """
+        Fetches a record, retrying failed requests
+        :return: an ApiResult, or None if the record could not be fetched
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self.limiter.wait()
+            try:
+                result = client.fetch(url, self.enrichment.accept)
+            except requests.RequestException as e:
+                logger.warning("Request %d for %s failed: %s", attempt + 1, url, e)
+                continue
+            if result.status_code not in RETRY_STATUS_CODES:
+                return result
+            logger.warning("Request %d for %s failed with status %s", attempt + 1, url, result.status_code)
+        return None
+
+    def get_results(self, objs, executor):
+        """
+        Gets the records of objects, stored or fetched
+        :return: a dict of ApiResults (or None if a record could not be fetched) by primary key
+        """
+        urls = {obj.pk: self.enrichment.get_url(obj) for obj in objs}
+        results = client.get_stored(set(urls.values()), self.enrichment.accept)
+        missing = sorted(set(urls.values()) - set(results))
+        fetched = [result for result in executor.map(self.fetch, missing) if result is not None]
+        client.store(fetched, self.enrichment.accept)
+        results.update((result.url, result) for result in fetched)
+        return {pk: results.get(url) for pk, url in urls.items()}
+
+    def run(self):
+        """
+        Runs the enrichment, continuing after the checkpoint if there is one
+        :return: a generator of the progress after each batch, as a dict with the numbers of objects done, in total,
+        updated and failed (without a record), and the number of objects per second
+        """
+        model_label = self.enrichment.model_label
+        queryset = self.enrichment.get_queryset().order_by('pk')
+        last = self.checkpoint.get(model_label) if self.checkpoint else None
+        progress = {'done': 0, 'total': (queryset.filter(pk__gt=last) if last else queryset).count(),
+                    'updated': 0, 'failed': 0, 'rate': 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                # Keyset pagination, as objects that are not updated stay in the queryset
+                objs = list((queryset.filter(pk__gt=last) if last else queryset)[:self.batch_size])
+                if not objs:
+                    break
+                results = self.get_results(objs, executor)
+                changed = []
+                for obj in objs:
+                    result = results[obj.pk]
+                    if result is None:
+                        progress['failed'] += 1
+                        continue
+                    try:
+                        if self.enrichment.apply(obj, result):
+                            changed.append(obj)
+                    except Exception:
+                        logger.warning("Could not read the record of %s %s", model_label, obj.pk, exc_info=True)
+                        progress['failed'] += 1
+                self.enrichment.save(changed, self.batch_size)
+
+                last = objs[-1].pk
+                if self.checkpoint:
+                    self.checkpoint.set(model_label, last)
+                progress['done'] += len(objs)
+                progress['updated'] += len(changed)
+                progress['rate'] = progress['done'] / max(time.perf_counter() - start, 0.001)
+                yield dict(progress)
+        if self.checkpoint:
+            self.checkpoint.set(model_label, None)
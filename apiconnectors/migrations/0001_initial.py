@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True, verbose_name='Key')),
+                ('url', models.TextField(verbose_name='URL')),
+                ('status_code', models.IntegerField(verbose_name='Status code')),
+                ('content_type', models.CharField(blank=True, max_length=128, verbose_name='Content type')),
+                ('content', models.TextField(blank=True, verbose_name='Content')),
+                ('fetched', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fetched')),
+                ('expires', models.DateTimeField(verbose_name='Expires')),
+            ],
+        ),
+    ]
@@ -1,3 +1,22 @@
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class ApiResponse(models.Model):
+    """
+    A stored response of an external API, reused until it expires (see apiconnectors.client)
+    """
+    key = models.CharField(_("Key"), max_length=32, unique=True)
+    url = models.TextField(_("URL"))
+    status_code = models.IntegerField(_("Status code"))
+    content_type = models.CharField(_("Content type"), max_length=128, blank=True)
+    content = models.TextField(_("Content"), blank=True)
+    fetched = models.DateTimeField(_("Fetched"), default=timezone.now)
+    expires = models.DateTimeField(_("Expires"))
+
+    def __str__(self):
+        return "{} ({})".format(self.url, self.status_code)
+
+    def is_expired(self):
+        return self.expires <= timezone.now()
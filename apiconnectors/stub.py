@@ -0,0 +1,76 @@
+"""
+A local HTTP server that stands in for the external APIs in offline mode (see apiconnectors.client), e.g. in tests:
+
+    with StubServer({'/data.cerl.org/thesaurus/cnl00016323': {'data': {...}}}) as server:
+        with override_settings(API_CONNECTOR_OFFLINE=True, API_CONNECTOR_STUB_URL=server.url):
+            ...
+
+The responses are given per path, with or without the query string: a dict or list is served as JSON, a string as
+text, and a tuple as (status code, content, content type). Other paths get a 404 response.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        stub.requests.append(self.path)
+        response = stub.responses.get(self.path, stub.responses.get(self.path.split('?')[0]))
+        if response is None:
+            status_code, content, content_type = 404, '', 'text/plain'
+        elif isinstance(response, tuple):
+            status_code, content, content_type = response
+        elif isinstance(response, (dict, list)):
+            status_code, content, content_type = 200, json.dumps(response), 'application/json'
+        else:
+            status_code, content, content_type = 200, response, 'text/plain'
+        body = content.encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """
+    Serves fixed responses on a free local port, in a thread
+    """
+    def __init__(self, responses=None):
+        """
+        :param responses: the responses by path
+        """
+        self.responses = responses or {}
+        # The paths that were requested
+        self.requests = []
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubRequestHandler)
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
@@ -1,3 +1,156 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apiconnectors import client
+from apiconnectors.cerlapi import cerl_suggest, get_record, cerl_record_url_api
+from apiconnectors.enrich import Enricher, PLACE_ENRICHMENT
+from apiconnectors.models import ApiResponse
+from apiconnectors.stub import StubServer
+from apiconnectors.viafapi import ViafEntity
+from persons.models import Person, Place
+
+CERL_RECORD = {
+    'data': {
+        'heading': [{'part': [{'name': 'Nijmegen'}]}],
+        'location': {'point': {'lat': 51.84, 'long': 5.86}},
+    }
+}
+
+VIAF_RDF = """<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:schema="http://schema.org/">
+  <rdf:Description rdf:about="http://viaf.org/viaf/123">
+    <schema:birthDate>1632-11-24</schema:birthDate>
+    <schema:deathDate>1677-02-21</schema:deathDate>
+  </rdf:Description>
+</rdf:RDF>
+"""
+
+
+class ClientTests(TestCase):
+    def setUp(self):
+        self.stub = StubServer({
+            '/data.cerl.org/thesaurus/cnl00016323': CERL_RECORD,
+            '/data.cerl.org/thesaurus/_search': {'rows': [{'id': 'cnl00016323', 'name_display_line': 'Nijmegen'}]},
+            '/viaf.org/viaf/123': (200, VIAF_RDF, 'application/rdf+xml'),
+        })
+        self.stub.start()
+        self.settings = override_settings(API_CONNECTOR_OFFLINE=True, API_CONNECTOR_STUB_URL=self.stub.url)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.stub.stop()
+
+    def test_stored_response(self):
+        self.assertEqual(get_record('cnl00016323'), "Nijmegen, ")
+        self.assertEqual(get_record('cnl00016323'), "Nijmegen, ")
+        self.assertEqual(self.stub.requests, ['/data.cerl.org/thesaurus/cnl00016323'])
+        self.assertEqual(ApiResponse.objects.get(url=cerl_record_url_api + 'cnl00016323').status_code, 200)
+
+        # Not found is stored too
+        self.assertEqual(get_record('cnl00000000'), "- no data -")
+        self.assertEqual(get_record('cnl00000000'), "- no data -")
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_suggest(self):
+        rows = cerl_suggest('Nijm', 'placeName')
+        self.assertEqual([row['id'] for row in rows], ['cnl00016323'])
+        self.assertTrue(self.stub.requests[0].startswith('/data.cerl.org/thesaurus/_search?query=placeName'))
+
+    def test_expired_response(self):
+        with override_settings(API_CONNECTOR_OFFLINE=False):
+            ApiResponse.objects.create(key=client.get_key(cerl_record_url_api + 'cnl00016323', 'application/json'),
+                                       url=cerl_record_url_api + 'cnl00016323', status_code=200, content='{}',
+                                       expires=timezone.now() - timedelta(seconds=1))
+        # Offline, an expired response is used rather than the stub server
+        self.assertEqual(client.get(cerl_record_url_api + 'cnl00016323').json(), {})
+        self.assertEqual(self.stub.requests, [])
+
+    def test_purge_api_responses(self):
+        for days in [40, 1]:
+            url = cerl_record_url_api + 'cnl{}'.format(days)
+            ApiResponse.objects.create(key=client.get_key(url, 'application/json'), url=url, status_code=200,
+                                       content='{}', expires=timezone.now() - timedelta(days=days))
+        with redirect_stdout(StringIO()) as output:
+            call_command('purge_api_responses', days=30, batch_size=1)
+        self.assertIn("Deleted 1 responses", output.getvalue())
+        # Recently expired responses are kept, to be used when a request fails
+        self.assertEqual(list(ApiResponse.objects.values_list('url', flat=True)), [cerl_record_url_api + 'cnl1'])
+
+    def test_offline_without_stub(self):
+        with override_settings(API_CONNECTOR_STUB_URL=''):
+            with self.assertRaises(client.OfflineError):
+                client.get(cerl_record_url_api + 'cnl00016323')
+            self.assertEqual(get_record('cnl00016323'), "- no data -")
+
+    def test_viaf_rdf(self):
+        entity = ViafEntity(123)
+        self.assertEqual(entity.birthyear, 1632)
+        self.assertEqual(entity.deathyear, 1677)
+
+
+class EnrichTests(TestCase):
+    def setUp(self):
+        self.stub = StubServer({
+            '/data.cerl.org/thesaurus/cnl00016323': CERL_RECORD,
+            '/data.cerl.org/thesaurus/cnl00000503': (503, '', 'text/plain'),
+            '/viaf.org/viaf/123': (200, VIAF_RDF, 'application/rdf+xml'),
+        })
+        self.stub.start()
+        self.settings = override_settings(API_CONNECTOR_OFFLINE=True, API_CONNECTOR_STUB_URL=self.stub.url)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.stub.stop()
+
+    def test_enrich_authorities(self):
+        place = Place.objects.create(name='Nijmegen', cerl_id='cnl00016323')
+        Place.objects.create(name='Unknown', cerl_id='cnl00000000')
+        Place.objects.create(name='Unavailable', cerl_id='cnl00000503')
+        person = Person.objects.create(short_name='Spinoza', surname='Spinoza', first_names='Baruch',
+                                       viaf_id='http://viaf.org/viaf/123', date_of_death='1677', sex='MALE')
+
+        with redirect_stdout(StringIO()) as output:
+            call_command('enrich_authorities', workers=2, rate=0, retries=1)
+        self.assertIn("Enriched 1 of 3 places (1 failed)", output.getvalue())
+        self.assertIn("Enriched 1 of 1 persons (0 failed)", output.getvalue())
+
+        place.refresh_from_db()
+        self.assertEqual((place.latitude, place.longitude), (51.84, 5.86))
+        self.assertEqual(place.history.first().history_change_reason, "Coordinates from CERL")
+        person.refresh_from_db()
+        self.assertEqual((person.date_of_birth, person.date_of_death), ('1632', '1677'))
+        self.assertEqual(person.normalised_date_of_birth, 1632)
+        # The server error is retried once and not stored
+        self.assertEqual(self.stub.requests.count('/data.cerl.org/thesaurus/cnl00000503'), 2)
+        self.assertFalse(ApiResponse.objects.filter(url=cerl_record_url_api + 'cnl00000503').exists())
+
+        # The stored records are not fetched again
+        with redirect_stdout(StringIO()):
+            call_command('enrich_authorities', 'places', rate=0, retries=0)
+        self.assertEqual(self.stub.requests.count('/data.cerl.org/thesaurus/cnl00016323'), 1)
+        self.assertEqual(self.stub.requests.count('/data.cerl.org/thesaurus/cnl00000000'), 1)
+
+    def test_checkpoint(self):
+        places = sorted([Place.objects.create(name='Place {}'.format(number), cerl_id='cnl00016323')
+                         for number in range(3)], key=lambda place: place.pk)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            with open(path, 'w') as file:
+                json.dump({'persons.Place': str(places[0].pk)}, file)
+            progress = list(Enricher(PLACE_ENRICHMENT, rate=0, batch_size=1, checkpoint=path).run())
+            self.assertEqual([step['done'] for step in progress], [1, 2])
+            self.assertEqual(progress[-1]['updated'], 2)
+            # The checkpoint of a completed run is removed
+            with open(path) as file:
+                self.assertEqual(json.load(file), {})
+        self.assertEqual([place.pk for place in Place.objects.filter(latitude__isnull=True)], [places[0].pk])
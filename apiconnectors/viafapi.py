@@ -8,16 +8,29 @@ import time
 
 from attrdict import AttrMap
 from cached_property import cached_property
+from django.conf import settings
 import requests
 import rdflib
 from rdflib.namespace import Namespace
 
+from apiconnectors import client
+
 
 logger = logging.getLogger(__name__)
 
 
 SCHEMA_NS = Namespace('http://schema.org/')
 
+RDF_MEDIA_TYPE = 'application/rdf+xml'
+
+
+def parse_rdf(data, uri):
+    '''Parse VIAF RDF/XML, e.g. to set :attr:`ViafEntity.rdf` of RDF that was
+    retrieved beforehand'''
+    graph = rdflib.Graph()
+    graph.parse(data=data, format='xml', publicID=uri)
+    return graph
+
 
 class ViafAPI(object):
     """Wrapper for VIAF API.
@@ -43,12 +56,9 @@ class ViafAPI(object):
 
         #  'viaf/AutoSuggest?query=[searchTerms]&callback[optionalCallbackName]
         autosuggest_url = '%s/AutoSuggest' % self.api_base
-        response = requests.get(autosuggest_url,
-                                params={'query': term},
-                                headers={'accept': 'application/json'})
-        logger.debug('autosuggest \'%s\': %s %s, %0.2f',
-                     term, response.status_code, response.reason,
-                     response.elapsed.total_seconds())
+        response = client.get(autosuggest_url, params={'query': term},
+                              ttl=settings.API_CONNECTOR_SUGGEST_CACHE_SECONDS)
+        logger.debug('autosuggest \'%s\': %s', term, response.status_code)
 
         if response.status_code == requests.codes.ok:
             return response.json().get('result', None) or []
@@ -72,10 +82,9 @@ class ViafAPI(object):
             'sortKeys': 'holdingscount'
         }
 
-        response = requests.get(search_url, params=params)
-        logger.debug('search \'%s\': %s %s, %0.2f',
-                     params['query'], response.status_code, response.reason,
-                     response.elapsed.total_seconds())
+        response = client.get(search_url, params=params,
+                              ttl=settings.API_CONNECTOR_SUGGEST_CACHE_SECONDS)
+        logger.debug('search \'%s\': %s', params['query'], response.status_code)
         if response.status_code == requests.codes.ok:
             data = SRUResult(response.json())
             if data.total_results:
@@ -123,8 +132,9 @@ class ViafEntity(object):
     def rdf(self):
         '''VIAF data for this entity as :class:`rdflib.Graph`'''
         start = time.time()
-        graph = rdflib.Graph()
-        graph.parse(self.uri)
+        response = client.get(self.uri, accept=RDF_MEDIA_TYPE)
+        response.raise_for_status()
+        graph = parse_rdf(response.text, self.uri)
         logger.debug('Loaded VIAF RDF %s: %0.2f sec',
                      self.uri, time.time() - start)
         return graph
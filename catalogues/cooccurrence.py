@@ -0,0 +1,123 @@
+"""
+Co-occurrence of persons in collections.
+
+The person x collection incidence is retrieved with one query and stored as a sparse matrix in CSR form:
+the collection indices of each person's row are sorted and stored consecutively. Comparing a person with
+all other persons is then a single vectorized pass over the matrix. Matrices are cached per dataset scope and
+set of roles.
+"""
+import hashlib
+
+import numpy as np
+
+from mediate.cache import get_or_set_tagged, dataset_tag, SHARED_TAG
+
+
+class PersonCollectionMatrix:
+    """
+    A sparse person x collection incidence matrix in CSR form
+    """
+    def __init__(self, person_ids, collection_ids, indptr, indices, item_counts):
+        """
+        :param person_ids: an array with the person ID of each row
+        :param collection_ids: an array with the collection ID of each column
+        :param indptr: the rows of the matrix: row i has the columns indices[indptr[i]:indptr[i + 1]]
+        :param indices: the column indices of the incidences
+        :param item_counts: an array with the number of person-item relations of each person
+        """
+        self.person_ids = person_ids
+        self.collection_ids = collection_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.item_counts = item_counts
+        self.rows = {person_id: row for row, person_id in enumerate(person_ids)}
+
+    @classmethod
+    def from_relations(cls, relations):
+        """
+        Builds the matrix from person-item relations
+        :param relations: a PersonItemRelation queryset
+        """
+        pairs = list(relations.order_by().values_list('person_id', 'item__lot__collection_id'))
+        person_column = np.array([person_id for person_id, collection_id in pairs], dtype=object)
+        collection_column = np.array([collection_id for person_id, collection_id in pairs], dtype=object)
+        person_ids, person_rows = np.unique(person_column, return_inverse=True)
+        collection_ids, collection_columns = np.unique(collection_column, return_inverse=True)
+        item_counts = np.bincount(person_rows, minlength=len(person_ids))
+
+        # The distinct incidences, sorted by row and column
+        incidences = np.unique(person_rows.astype(np.int64) * max(len(collection_ids), 1) + collection_columns)
+        rows, indices = np.divmod(incidences, max(len(collection_ids), 1))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(person_ids)))])
+        return cls(person_ids, collection_ids, indptr, indices, item_counts)
+
+    def get_row(self, person_id):
+        """
+        Gets the column indices of the collections of a person
+        """
+        row = self.rows.get(person_id)
+        if row is None:
+            return np.array([], dtype=np.int64)
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def get_shared_collection_counts(self, person_id):
+        """
+        Gets the number of collections each person shares with a person
+        :return: an array with a count per row
+        """
+        selected = np.zeros(len(self.collection_ids), dtype=bool)
+        selected[self.get_row(person_id)] = True
+        rows = np.repeat(np.arange(len(self.person_ids)), np.diff(self.indptr))
+        return np.bincount(rows, weights=selected[self.indices], minlength=len(self.person_ids)).astype(np.int64)
+
+    def get_correlations(self, person_id, minimal_item_count=0):
+        """
+        Gets the correlation of the other persons with a person: the number of collections with both persons
+        divided by the number of collections with the other person but without the selected person
+        :param person_id: the ID of the selected person
+        :param minimal_item_count: the minimal number of person-item relations of the other persons
+        :return: a list of tuples of a person ID, the number of collections with both persons,
+        the number of collections without the selected person and the ratio, in descending order of ratio
+        """
+        both = self.get_shared_collection_counts(person_id)
+        without_selected = np.diff(self.indptr) - both
+        ratio = np.zeros(len(self.person_ids))
+        np.divide(both, without_selected, out=ratio, where=without_selected > 0)
+
+        rows = np.flatnonzero(self.item_counts >= minimal_item_count)
+        rows = rows[self.person_ids[rows] != person_id]
+        rows = rows[np.argsort(-ratio[rows], kind='stable')]
+        return [(self.person_ids[row], int(both[row]), int(without_selected[row]), float(ratio[row]))
+                for row in rows]
+
+    def get_top_cooccurring(self, person_id, k=10):
+        """
+        Gets the k persons that share the most collections with a person
+        :return: a list of tuples of a person ID and the number of shared collections
+        """
+        both = self.get_shared_collection_counts(person_id)
+        row = self.rows.get(person_id)
+        if row is not None:
+            both[row] = 0
+        candidates = np.flatnonzero(both)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-both[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-both[candidates], kind='stable')]
+        return [(self.person_ids[row], int(both[row])) for row in candidates]
+
+
+def get_person_collection_matrix(datasets, collections, roles):
+    """
+    Gets the person x collection matrix of the relations with the given roles in the given collections,
+    cached per datasets and roles
+    :param datasets: the datasets of the collections
+    :param collections: a Collection queryset
+    :param roles: names of person-item relation roles
+    """
+    from items.models import PersonItemRelation  # Avoid a circular import
+    signature = repr((sorted(str(dataset.pk) for dataset in datasets), sorted(roles)))
+    key = 'person_collection_matrix_{}'.format(hashlib.sha1(signature.encode()).hexdigest())
+    tags = [SHARED_TAG] + [dataset_tag(dataset.pk) for dataset in datasets]
+    return get_or_set_tagged(key, lambda: PersonCollectionMatrix.from_relations(
+        PersonItemRelation.objects.filter(role__name__in=roles, item__lot__collection__in=collections)
+    ), tags)
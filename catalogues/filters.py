@@ -119,20 +119,18 @@ class CollectionFilter(django_filters.FilterSet):
 
     def number_of_items_filter(self, queryset, name, value):
         if any(value):
-            queryset = queryset.annotate(num_items=Count('lot__item'))
             if value[0]:
-                queryset = queryset.filter(num_items__gte=value[0])
+                queryset = queryset.filter(number_of_items__gte=value[0])
             if value[1]:
-                queryset = queryset.filter(num_items__lte=value[1])
+                queryset = queryset.filter(number_of_items__lte=value[1])
         return queryset
 
     def number_of_lots_filter(self, queryset, name, value):
         if any(value):
-            queryset = queryset.annotate(num_items=Count('lot'))
             if value[0]:
-                queryset = queryset.filter(num_items__gte=value[0])
+                queryset = queryset.filter(number_of_lots__gte=value[0])
             if value[1]:
-                queryset = queryset.filter(num_items__lte=value[1])
+                queryset = queryset.filter(number_of_lots__lte=value[1])
         return queryset
 
     def owner_gender_filter(self, queryset, name, value):
@@ -1,5 +1,6 @@
 from django import forms
 from django_select2.forms import Select2Widget, ModelSelect2Widget, ModelSelect2MultipleWidget
+from search.widgets import CollectionSelect2Widget, PersonSelect2Widget, PlaceSelect2MultipleWidget, PlaceSelect2Widget
 from django.contrib.contenttypes.models import ContentType
 from .models import *
 from catalogues.tools import get_datasets_for_session
@@ -57,9 +58,8 @@ class CollectionModelForm(forms.ModelForm):
         for type in CollectionPlaceRelationType.objects.all():
             places = forms.ModelMultipleChoiceField(
                 label="{} places".format(type.name).capitalize(),
-                widget=ModelSelect2MultipleWidget(
+                widget=PlaceSelect2MultipleWidget(
                     model=Place,
-                    search_fields=['name__icontains'],
                 ),
                 queryset=Place.objects.all(),
                 required=False,
@@ -69,9 +69,8 @@ class CollectionModelForm(forms.ModelForm):
 
     def add_publicationplaces_field(self):
         publication_places = forms.ModelMultipleChoiceField(
-            widget=ModelSelect2MultipleWidget(
+            widget=PlaceSelect2MultipleWidget(
                 model=Place,
-                search_fields=['name__icontains'],
             ),
             queryset=Place.objects.all(),
             required=False,
@@ -201,9 +200,8 @@ class CollectionCollectionTypeRelationModelForm(forms.ModelForm):
         if self.collections:
             self.fields['collection'] = forms.ModelChoiceField(
                 queryset=self.collections,
-                widget=ModelSelect2Widget(
+                widget=CollectionSelect2Widget(
                     queryset=self.collections,
-                    search_fields=['short_title__icontains'],
                 ),
             )
 
@@ -258,9 +256,8 @@ class LotModelForm(forms.ModelForm):
         if self.collections:
             self.fields['collection'] = forms.ModelChoiceField(
                 queryset=self.collections,
-                widget=ModelSelect2Widget(
+                widget=CollectionSelect2Widget(
                     queryset=self.collections,
-                    search_fields=['short_title__icontains'],
                     dependent_fields={'category': 'category'}
                 ),
             )
@@ -271,9 +268,8 @@ class PersonCollectionRelationModelForm(forms.ModelForm):
         model = PersonCollectionRelation
         fields = "__all__"
         widgets = {
-            'person': ModelSelect2Widget(
+            'person': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
             ),
             'role': ModelSelect2Widget(
                 model=PersonCollectionRelationRole,
@@ -288,9 +284,8 @@ class PersonCollectionRelationModelForm(forms.ModelForm):
         if self.collections:
             self.fields['collection'] = forms.ModelChoiceField(
                 queryset=self.collections,
-                widget=ModelSelect2Widget(
+                widget=CollectionSelect2Widget(
                     queryset=self.collections,
-                    search_fields=['short_title__icontains'],
                 ),
             )
 
@@ -306,9 +301,8 @@ class PersonCatalogueRelationModelForm(forms.ModelForm):
         model = PersonCatalogueRelation
         fields = "__all__"
         widgets = {
-            'person': ModelSelect2Widget(
+            'person': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
             ),
         }
 
@@ -331,9 +325,8 @@ class CollectionPlaceRelationModelForm(forms.ModelForm):
         model = CollectionPlaceRelation
         fields = "__all__"
         widgets = {
-            'place': ModelSelect2Widget(
+            'place': PlaceSelect2Widget(
                 model=Place,
-                search_fields=['name__icontains']
             ),
             'type': ModelSelect2Widget(
                 model=CollectionPlaceRelationType,
@@ -348,9 +341,8 @@ class CollectionPlaceRelationModelForm(forms.ModelForm):
         if self.collections:
             self.fields['collection'] = forms.ModelChoiceField(
                 queryset=self.collections,
-                widget=ModelSelect2Widget(
+                widget=CollectionSelect2Widget(
                     queryset=self.collections,
-                    search_fields=['short_title__icontains'],
                 ),
             )
 
@@ -377,9 +369,8 @@ class CategoryModelForm(forms.ModelForm):
         if self.collections:
             self.fields['collection'] = forms.ModelChoiceField(
                 queryset=self.collections,
-                widget=ModelSelect2Widget(
+                widget=CollectionSelect2Widget(
                     queryset=self.collections,
-                    search_fields=['short_title__icontains'],
                     dependent_fields={'parent': 'category'}
                 ),
             )
@@ -443,9 +434,8 @@ class AddLotAtEndForm(LotModelForm):
 class PersonWorkCorrelationForm(forms.Form):
     person = forms.ModelChoiceField(
         queryset=Person.objects.all(),
-        widget=ModelSelect2Widget(
+        widget=PersonSelect2Widget(
             attrs={'data-placeholder': "First select a collection"},
             queryset=Person.objects.all(),
-            search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
         )
     )
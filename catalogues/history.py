@@ -1,16 +1,17 @@
 from simple_history import register
 from .models import *
+from .tools import COUNTERS
 
 
 register(Dataset)
-register(Catalogue)
+register(Catalogue, excluded_fields=COUNTERS)
 register(CatalogueYear)
 register(CollectionType)
 register(Library)
-register(Collection)
+register(Collection, excluded_fields=COUNTERS)
 register(CollectionCollectionTypeRelation)
 register(CollectionHeldBy)
-register(Lot)
+register(Lot, excluded_fields=['sort_key'])
 register(PersonCatalogueRelation)
 register(PersonCollectionRelationRole)
 register(PersonCollectionRelation)
@@ -11,6 +11,8 @@ from django.db.models import Max, F
 from django.db import transaction
 
 from catalogues.models import CatalogueCollectionRelation, Collection, Lot, Category
+from catalogues.ordering import rebalance_lots
+from catalogues.tools import reconcile_counters
 
 
 def get_collections(collection__uuids):
@@ -38,6 +40,10 @@ class Command(BaseCommand):
         # Get the command line arguments
         first_collection, second_collection = get_collections(kwargs.get('collection_uuids', []))
 
+        # Make the indices of both collections contiguous
+        rebalance_lots(first_collection.pk)
+        rebalance_lots(second_collection.pk)
+
         # Get last index from first collection
         last_index = Lot.objects.filter(collection=first_collection)\
             .aggregate(Max("index_in_collection"))['index_in_collection__max']
@@ -55,6 +61,10 @@ class Command(BaseCommand):
 
             categories_to_move.update(collection=first_collection)
 
+            # The lots were moved without signals, so recompute the sort keys and the counters
+            rebalance_lots(first_collection.pk, order_by=('index_in_collection', 'sort_key'))
+            reconcile_counters([first_collection.pk, second_collection.pk])
+
             # Make sure the first collection is connected to the same catalogues as the second
             for catalogue in second_collection.catalogue.all():
                 CatalogueCollectionRelation.objects.get_or_create(collection=first_collection, catalogue=catalogue)
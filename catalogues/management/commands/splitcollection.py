@@ -8,6 +8,8 @@ from django.db.models import F
 from django.db import transaction
 
 from catalogues.models import Catalogue, Collection, Lot, Category
+from catalogues.ordering import rebalance_lots
+from catalogues.tools import reconcile_counters
 
 
 def range_string_to_list(range_string):
@@ -49,6 +51,8 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         # Get the command line arguments
         collection = Collection.objects.get(uuid=kwargs.get('collection_id'))
+        # Make the indices contiguous, as they are given by position
+        rebalance_lots(collection.pk)
         lot = Lot.objects.get(collection=collection, index_in_collection=kwargs.get('index_in_collection'))
         new_collection_name = kwargs.get('new_collection_name')
         exclude_indexes = ranges_string_to_list(kwargs.get('exclude_index_in_collection') or '')
@@ -84,3 +88,8 @@ class Command(BaseCommand):
 
             diff = lot.index_in_collection - 1
             lots_to_move.update(collection=new_collection, index_in_collection=F('index_in_collection') - diff)
+
+            # The lots were moved without signals, so recompute the sort keys and the counters
+            rebalance_lots(collection.pk)
+            rebalance_lots(new_collection.pk)
+            reconcile_counters([collection.pk, new_collection.pk])
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:41
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+COUNTERS = ['number_of_lots', 'number_of_items', 'number_of_non_book_items', 'number_of_uncountable_book_items']
+
+
+def compute_counters(apps, schema_editor):
+    """
+    Computes the counters of the existing collections and catalogues
+    """
+    Catalogue = apps.get_model('catalogues', 'Catalogue')
+    Collection = apps.get_model('catalogues', 'Collection')
+    Lot = apps.get_model('catalogues', 'Lot')
+    Item = apps.get_model('items', 'Item')
+
+    counts = {collection_id: {'number_of_lots': number_of_lots} for collection_id, number_of_lots in
+              Lot.objects.order_by().values_list('collection').annotate(Count('uuid'))}
+    for values in Item.objects.order_by().values('lot__collection').annotate(
+            number_of_items=Count('uuid'),
+            number_of_non_book_items=Count('uuid', filter=Q(non_book=True)),
+            number_of_uncountable_book_items=Count('uuid', filter=Q(uncountable_book_items=True))):
+        counts.setdefault(values.pop('lot__collection'), {}).update(values)
+    collections = list(Collection.objects.filter(pk__in=[pk for pk in counts if pk]))
+    for collection in collections:
+        for counter in COUNTERS:
+            setattr(collection, counter, counts[collection.pk].get(counter, 0))
+    Collection.objects.bulk_update(collections, COUNTERS, batch_size=1000)
+
+    catalogues = list(Catalogue.objects.annotate(**{'sum_' + counter: Coalesce(Sum('collection__' + counter), 0)
+                                                    for counter in COUNTERS}))
+    for catalogue in catalogues:
+        for counter in COUNTERS:
+            setattr(catalogue, counter, getattr(catalogue, 'sum_' + counter))
+    Catalogue.objects.bulk_update(catalogues, COUNTERS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogues', '0041_auto_20260225_1354'),
+        ('items', '0040_alter_edition_place'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogue',
+            name='number_of_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of items'),
+        ),
+        migrations.AddField(
+            model_name='catalogue',
+            name='number_of_lots',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of lots'),
+        ),
+        migrations.AddField(
+            model_name='catalogue',
+            name='number_of_non_book_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of non-book items'),
+        ),
+        migrations.AddField(
+            model_name='catalogue',
+            name='number_of_uncountable_book_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of items with uncountable book items'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='number_of_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of items'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='number_of_lots',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of lots'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='number_of_non_book_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of non-book items'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='number_of_uncountable_book_items',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Number of items with uncountable book items'),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+LOT_SORT_KEY_GAP = 1024
+
+
+def set_sort_keys(apps, schema_editor):
+    """
+    Gives the existing lots evenly spaced sort keys in the order of the collection
+    """
+    Lot = apps.get_model('catalogues', 'Lot')
+    batch = []
+    collection_id = None
+    position = 0
+    for lot in Lot.objects.order_by('collection', 'index_in_collection', 'number_in_collection', 'uuid')\
+            .only('uuid', 'collection', 'sort_key').iterator(chunk_size=1000):
+        if lot.collection_id != collection_id:
+            collection_id = lot.collection_id
+            position = 0
+        position += 1
+        lot.sort_key = position * LOT_SORT_KEY_GAP
+        batch.append(lot)
+        if len(batch) >= 1000:
+            Lot.objects.bulk_update(batch, ['sort_key'])
+            batch = []
+    Lot.objects.bulk_update(batch, ['sort_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogues', '0042_collection_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='sort_key',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='Sort key'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(fields=['collection', 'sort_key'], name='catalogues__collect_bd27fa_idx'),
+        ),
+        migrations.RunPython(set_sort_keys, migrations.RunPython.noop),
+    ]
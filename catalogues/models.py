@@ -1,5 +1,5 @@
 from django.db import models, transaction
-from django.db.models import ProtectedError, F
+from django.db.models import ProtectedError
 from django.db.models.deletion import CASCADE, SET_NULL
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse_lazy
@@ -38,6 +38,13 @@ class Catalogue(models.Model):
     # full_title = models.TextField(_("Full title"), null=True)
     shelf_mark = models.ForeignKey(ShelfMark, on_delete=SET_NULL, null=True, blank=True)
 
+    # Counters, kept up to date by the receivers of lots and items (see catalogues.tools)
+    number_of_lots = models.IntegerField(_("Number of lots"), default=0, editable=False)
+    number_of_items = models.IntegerField(_("Number of items"), default=0, editable=False)
+    number_of_non_book_items = models.IntegerField(_("Number of non-book items"), default=0, editable=False)
+    number_of_uncountable_book_items = models.IntegerField(_("Number of items with uncountable book items"),
+                                                           default=0, editable=False)
+
     def __str__(self):
         return self.name
 
@@ -45,10 +52,7 @@ class Catalogue(models.Model):
         return reverse_lazy('catalogue_detail', args=[str(self.uuid)])
 
     def item_count(self):
-        from items.models import Item
-        item_count = Item.objects.filter(lot__collection__catalogue=self).count()
-        uncountable_book_items = Item.objects.filter(lot__collection__catalogue=self, uncountable_book_items=True).count()
-        return item_count + uncountable_book_items
+        return self.number_of_items + self.number_of_uncountable_book_items
 
 
 class CatalogueYear(models.Model):
@@ -110,6 +114,13 @@ class Collection(models.Model):
 
     tags = GenericRelation(TaggedEntity, related_query_name='collections')
 
+    # Counters, kept up to date by the receivers of lots and items (see catalogues.tools)
+    number_of_lots = models.IntegerField(_("Number of lots"), default=0, editable=False)
+    number_of_items = models.IntegerField(_("Number of items"), default=0, editable=False)
+    number_of_non_book_items = models.IntegerField(_("Number of non-book items"), default=0, editable=False)
+    number_of_uncountable_book_items = models.IntegerField(_("Number of items with uncountable book items"),
+                                                           default=0, editable=False)
+
     class Meta:
         ordering = ['year_of_publication', 'short_title']
 
@@ -137,18 +148,14 @@ class Collection(models.Model):
                 pass
 
     def item_count(self):
-        from items.models import Item
-        item_count = Item.objects.filter(lot__collection=self).count()
-        uncountable_book_items = Item.objects.filter(lot__collection=self, uncountable_book_items=True).count()
-        return item_count + uncountable_book_items
+        return self.number_of_items + self.number_of_uncountable_book_items
 
     def has_uncountable_book_items(self):
-        from items.models import Item
-        return Item.objects.filter(lot__collection=self, uncountable_book_items=True).exists()
+        return self.number_of_uncountable_book_items > 0
 
     @property
     def sorted_lot_set(self):
-        return self.lot_set.order_by('index_in_collection', 'number_in_collection')
+        return self.lot_set.order_by('sort_key', 'number_in_collection')
 
 
 class CatalogueCollectionRelation(models.Model):
@@ -224,31 +231,103 @@ class Lot(models.Model):
     lot_as_listed_in_collection = models.TextField(_("Full lot description, exactly as in the collection"))
     index_in_collection = models.IntegerField(_("Index in collection"), null=True)
     category = models.ForeignKey('Category', on_delete=SET_NULL, null=True, blank=True)
+    # The order of the lots in the collection, see catalogues.ordering
+    sort_key = models.BigIntegerField(_("Sort key"), null=True, editable=False)
+
+    # The collection and index_in_collection as loaded from the database
+    _loaded_position = None
+    # Whether the sort key was set by place_before
+    _placed_before = False
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['collection', 'sort_key'])
+        ]
 
     def __str__(self):
         return self.lot_as_listed_in_collection
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_position = (instance.__dict__.get('collection_id'),
+                                     instance.__dict__.get('index_in_collection'))
+        return instance
+
     def save(self, *args, **kwargs):
+        from .ordering import shift_indices
         # Check whether the collection of the category is the same collection
         if not self.category or self.collection == self.category.collection:
             with transaction.atomic():
-                # Add 1 to index_in_collection for all lots with index_in_collection greater than or equal to this index
-                Lot.objects.filter(collection=self.collection, index_in_collection__gte=self.index_in_collection)\
-                    .update(index_in_collection=F('index_in_collection') + 1)
+                # Only the lot itself gets a new sort key if it is added or moved, the sort keys of the other lots
+                # are not changed. The indices of the later lots are shifted to keep them contiguous.
+                position = (self.collection_id, self.index_in_collection)
+                loaded_position = None if self._state.adding else self._loaded_position
+                if loaded_position is not None and loaded_position != position:
+                    # The indices may have been shifted since the lot was loaded
+                    loaded_position = Lot.objects.filter(pk=self.pk)\
+                        .values_list('collection_id', 'index_in_collection').first()
+                if self.sort_key is None or loaded_position != position:
+                    if loaded_position != position:
+                        exclude = None if self._state.adding else self.pk
+                        if loaded_position is not None and loaded_position[1] is not None:
+                            shift_indices(loaded_position[0], loaded_position[1] + 1, -1, exclude=exclude)
+                        shift_indices(self.collection_id, self.index_in_collection, 1, exclude=exclude)
+                    if not self._placed_before:
+                        self.place_in_collection()
+                    if kwargs.get('update_fields') is not None:
+                        kwargs['update_fields'] = set(kwargs['update_fields']) | {'sort_key'}
                 super(Lot, self).save(*args, **kwargs)
+                self._loaded_position = position
+                self._placed_before = False
         else:
             raise Exception(_("Lot {}: the collection is not the same as the category's collection").format(self))
 
+    def place_in_collection(self):
+        """
+        Sets the sort key for index_in_collection (or the end of the collection if there is no index)
+        """
+        from .ordering import get_free_sort_key, rebalance_lots
+        exclude = None if self._state.adding else self.pk
+        self.sort_key = get_free_sort_key(self.collection_id, self.index_in_collection, exclude)
+        if self.sort_key is None:
+            # There is no room between the neighbours
+            rebalance_lots(self.collection_id)
+            self.sort_key = get_free_sort_key(self.collection_id, self.index_in_collection, exclude)
+
+    def place_before(self, lot):
+        """
+        Sets the sort key to place the lot right before another lot of the same collection, before it is saved
+        """
+        from .ordering import get_sort_key_before, rebalance_lots
+        self.sort_key = get_sort_key_before(lot)
+        if self.sort_key is None:
+            # There is no room before the lot
+            rebalance_lots(lot.collection_id)
+            lot.refresh_from_db(fields=['sort_key', 'index_in_collection'])
+            self.sort_key = get_sort_key_before(lot)
+        # Saving keeps this sort key instead of placing the lot by its index
+        self._placed_before = True
 
     def get_absolute_url(self):
         return reverse_lazy('lot_detail', args=[str(self.uuid)])
 
+    def get_position(self):
+        """
+        Gets the position of the lot in its collection, i.e. the contiguous index in the collection
+        """
+        return Lot.objects.filter(collection=self.collection_id, sort_key__lt=self.sort_key).count() + 1
+
     def get_previous_lots(self, number=4):
-        index_incollection = self.index_in_collection
-        index_start = index_incollection - number
-        index_end = index_incollection - 1
-        return Lot.objects.filter(collection=self.collection, index_in_collection__gte=index_start,
-                                  index_in_collection__lte=index_end)
+        """
+        Gets the lots before this lot in the collection, in order and with their position
+        """
+        lots = list(Lot.objects.filter(collection=self.collection_id, sort_key__lt=self.sort_key)
+                    .order_by('-sort_key')[:number])[::-1]
+        first_position = self.get_position() - len(lots)
+        for offset, lot in enumerate(lots):
+            lot.position = first_position + offset
+        return lots
 
 
 class PersonCatalogueRelation(models.Model):
@@ -380,10 +459,10 @@ class Category(models.Model):
 from .history import *
 
 
-# Clear cache when a model object is saved
+# Invalidate the cache tags of a model object when it is saved or deleted
 from django.db.models.signals import post_save, post_delete
 from mediate.tools import receiver_with_multiple_senders
-from django.core.cache import cache
+from mediate.cache import invalidate_instance
 
 
 @receiver_with_multiple_senders([post_save, post_delete],[
@@ -391,5 +470,136 @@ from django.core.cache import cache
     CollectionCollectionTypeRelation, CollectionHeldBy, Lot, PersonCatalogueRelation, PersonCollectionRelationRole,
     PersonCollectionRelation, CollectionPlaceRelationType, CollectionPlaceRelation, ParisianCategory, Category
 ])
-def clear_cache(sender, instance, **kwargs):
-    cache.clear()
\ No newline at end of file
+def invalidate_cache(sender, instance, using=None, **kwargs):
+    invalidate_instance(instance, using=using)
+
+
+# Invalidate the cached session scopes when datasets, their collections or permissions change
+from django.contrib.auth.models import User, Group
+from guardian.models import UserObjectPermission, GroupObjectPermission
+
+
+@receiver_with_multiple_senders([post_save, post_delete], [
+    Dataset, Catalogue, CatalogueCollectionRelation, UserObjectPermission, GroupObjectPermission
+])
+def invalidate_session_scopes_on_change(sender, instance, using=None, **kwargs):
+    from catalogues.tools import invalidate_session_scopes
+    invalidate_session_scopes(using=using)
+
+
+# The fields of users that the permissions in their scopes depend on
+USER_SCOPE_FIELDS = ['is_superuser', 'is_active']
+
+
+@receiver(models.signals.pre_save, sender=User)
+def remember_user_scope_fields(sender, instance, using=None, update_fields=None, **kwargs):
+    # New users have no scopes yet, and saving other fields (e.g. last_login on each login) does not change them
+    instance._old_scope_fields = None
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & set(USER_SCOPE_FIELDS)):
+        return
+    instance._old_scope_fields = User.objects.using(using).filter(pk=instance.pk)\
+        .values_list(*USER_SCOPE_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_session_scopes_on_user_change(sender, instance, using=None, **kwargs):
+    old_scope_fields = getattr(instance, '_old_scope_fields', None)
+    if old_scope_fields is not None \
+            and old_scope_fields != tuple(getattr(instance, field) for field in USER_SCOPE_FIELDS):
+        from catalogues.tools import invalidate_session_scopes
+        invalidate_session_scopes(using=using)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_session_scopes_on_user_delete(sender, instance, using=None, **kwargs):
+    from catalogues.tools import invalidate_session_scopes
+    invalidate_session_scopes(using=using)
+
+
+@receiver(post_delete, sender=Collection)
+def invalidate_session_scopes_on_collection_delete(sender, instance, using=None, **kwargs):
+    from catalogues.tools import invalidate_session_scopes
+    invalidate_session_scopes(using=using)
+
+
+@receiver(models.signals.m2m_changed, sender=Collection.catalogue.through)
+@receiver(models.signals.m2m_changed, sender=User.groups.through)
+@receiver(models.signals.m2m_changed, sender=User.user_permissions.through)
+@receiver(models.signals.m2m_changed, sender=Group.permissions.through)
+def invalidate_session_scopes_on_m2m_change(sender, action, using=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        from catalogues.tools import invalidate_session_scopes
+        invalidate_session_scopes(using=using)
+
+
+# Keep the counters of collections and catalogues up to date when lots are saved or deleted
+from django.db.models.signals import pre_save, pre_delete
+
+
+@receiver(pre_save, sender=Lot)
+def remember_lot_collection(sender, instance, using=None, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._counted_collection_id = None
+        return
+    instance._counted_collection_id = Lot.objects.using(using).filter(pk=instance.pk)\
+        .values_list('collection_id', flat=True).first()
+
+
+@receiver(post_save, sender=Lot)
+def update_counters_on_lot_save(sender, instance, created, using=None, raw=False, **kwargs):
+    from catalogues.tools import update_counters, get_item_counters
+    if raw:
+        return
+    old_collection_id = getattr(instance, '_counted_collection_id', None)
+    if created:
+        update_counters(instance.collection_id, {'number_of_lots': 1}, using=using)
+    elif old_collection_id != instance.collection_id:
+        from items.models import Item
+        counters = {'number_of_lots': 1, **get_item_counters(Item.objects.using(using).filter(lot=instance))}
+        update_counters(old_collection_id, counters, sign=-1, using=using)
+        update_counters(instance.collection_id, counters, using=using)
+
+
+@receiver(pre_delete, sender=Lot)
+def count_lot_items(sender, instance, using=None, **kwargs):
+    from catalogues.tools import get_item_counters
+    from items.models import Item
+    # The items of the lot are not deleted, but they are no longer in the collection
+    instance._counters = {'number_of_lots': 1, **get_item_counters(Item.objects.using(using).filter(lot=instance))}
+
+
+@receiver(post_delete, sender=Lot)
+def update_counters_on_lot_delete(sender, instance, using=None, **kwargs):
+    from catalogues.tools import update_counters
+    update_counters(instance.collection_id, getattr(instance, '_counters', {'number_of_lots': 1}), sign=-1,
+                    using=using)
+
+
+@receiver(pre_delete, sender=Lot)
+def remember_lot_position(sender, instance, using=None, **kwargs):
+    # The indices may have been shifted since the lot was loaded
+    instance._deleted_position = Lot.objects.using(using).filter(pk=instance.pk)\
+        .values_list('collection_id', 'index_in_collection').first()
+
+
+@receiver(post_delete, sender=Lot)
+def close_index_gap_on_lot_delete(sender, instance, **kwargs):
+    from catalogues.ordering import shift_indices
+    collection_id, index = getattr(instance, '_deleted_position', None) or (None, None)
+    if index is not None:
+        shift_indices(collection_id, index + 1, -1, exclude=instance.pk)
+
+
+@receiver_with_multiple_senders([post_save, post_delete], [CatalogueCollectionRelation])
+def reconcile_counters_on_relation_change(sender, instance, using=None, **kwargs):
+    from catalogues.tools import reconcile_catalogue_counters
+    reconcile_catalogue_counters([instance.catalogue_id], using=using)
+
+
+@receiver(models.signals.m2m_changed, sender=Collection.catalogue.through)
+def reconcile_counters_on_m2m_change(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    from catalogues.tools import reconcile_catalogue_counters
+    if action in ('post_add', 'post_remove'):
+        reconcile_catalogue_counters([instance.pk] if reverse else pk_set, using=using)
+    elif action == 'post_clear':
+        reconcile_catalogue_counters([instance.pk] if reverse else None, using=using)
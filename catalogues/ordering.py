@@ -0,0 +1,131 @@
+"""
+The order of the lots in a collection.
+
+Lots are ordered by a sparse sort key: consecutive lots get keys that are LOT_SORT_KEY_GAP apart, so a lot can be
+inserted between two lots by giving it a key halfway, without changing the keys of the other lots. Only when two
+neighbouring keys have no room left, the keys of the collection are rebalanced.
+
+The index_in_collection of the lots stays contiguous: adding, moving or deleting a lot shifts the indices of the
+later lots with one UPDATE statement per collection (see shift_indices), and the computed index of their items is
+recomputed in bulk. A lot with index_in_collection n is placed before the lot that had index n. A lot that is added
+before a given lot (Lot.place_before) is placed by the sort keys, so that repeated insertions before the same lot
+keep their order.
+"""
+from django.apps import apps
+from django.db.models import F, Max, Min
+
+LOT_SORT_KEY_GAP = 1024
+
+
+def get_lot_model():
+    return apps.get_model('catalogues', 'Lot')
+
+
+def get_free_sort_key(collection_id, index=None, exclude=None):
+    """
+    Gets a sort key for a lot with an index in a collection
+    :param collection_id: the ID of the collection
+    :param index: the index_in_collection of the lot, or None to add the lot at the end
+    :param exclude: the ID of the lot itself, if it is already in the collection
+    :return: a sort key, or None if there is no room between the neighbouring keys
+    """
+    lots = get_lot_model().objects.filter(collection_id=collection_id, sort_key__isnull=False).exclude(pk=exclude)
+    upper = None
+    if index is not None:
+        upper = lots.filter(index_in_collection__gte=index).aggregate(Min('sort_key'))['sort_key__min']
+    if upper is not None:
+        lots = lots.filter(sort_key__lt=upper)
+    lower = lots.aggregate(Max('sort_key'))['sort_key__max']
+
+    if lower is None and upper is None:
+        return LOT_SORT_KEY_GAP
+    if lower is None:
+        return upper - LOT_SORT_KEY_GAP
+    if upper is None:
+        return lower + LOT_SORT_KEY_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+
+def get_sort_key_before(lot):
+    """
+    Gets a sort key for a lot right before another lot
+    :param lot: the lot to place the new lot before
+    :return: a sort key, or None if there is no room before the lot
+    """
+    lower = get_lot_model().objects.filter(collection_id=lot.collection_id, sort_key__lt=lot.sort_key)\
+        .aggregate(Max('sort_key'))['sort_key__max']
+    if lower is None:
+        return lot.sort_key - LOT_SORT_KEY_GAP
+    if lot.sort_key - lower < 2:
+        return None
+    return (lower + lot.sort_key) // 2
+
+
+def shift_indices(collection_id, index, delta, exclude=None):
+    """
+    Shifts the index_in_collection of the lots from an index on in a collection with one UPDATE statement,
+    and recomputes the computed fields of their items
+    :param collection_id: the ID of the collection
+    :param index: the first index to shift
+    :param delta: 1 to make room for a lot, -1 to close the gap of a lot
+    :param exclude: the ID of the lot that is added, moved or deleted
+    :return: the number of shifted lots
+    """
+    from mediate.computed import recompute
+    if collection_id is None or index is None:
+        return 0
+    Lot = get_lot_model()
+    lots = Lot.objects.filter(collection_id=collection_id, index_in_collection__gte=index).exclude(pk=exclude)
+    pks = list(lots.values_list('pk', flat=True))
+    if pks:
+        Lot.objects.filter(pk__in=pks).update(index_in_collection=F('index_in_collection') + delta)
+        recompute(Lot, pks, ['index_in_collection'])
+    return len(pks)
+
+
+def rebalance_lots(collection_id, order_by=('sort_key',)):
+    """
+    Gives the lots of a collection evenly spaced sort keys and sets their index_in_collection to their position
+    :param collection_id: the ID of the collection
+    :param order_by: the order of the lots, e.g. ('index_in_collection', 'sort_key') after moving lots
+    with their index_in_collection
+    :return: the number of changed lots
+    """
+    from mediate.computed import recompute
+    Lot = get_lot_model()
+    lots = Lot.objects.filter(collection_id=collection_id).order_by(*order_by, 'uuid')\
+        .only('uuid', 'sort_key', 'index_in_collection')
+    changed = []
+    changed_indices = []
+    for position, lot in enumerate(lots, start=1):
+        if lot.index_in_collection != position:
+            changed_indices.append(lot.pk)
+        if lot.index_in_collection != position or lot.sort_key != position * LOT_SORT_KEY_GAP:
+            lot.index_in_collection = position
+            lot.sort_key = position * LOT_SORT_KEY_GAP
+            changed.append(lot)
+    Lot.objects.bulk_update(changed, ['sort_key', 'index_in_collection'], batch_size=1000)
+    if changed_indices:
+        # Update the computed fields that depend on the index (bulk_update does not)
+        recompute(Lot, changed_indices, ['index_in_collection'])
+    return len(changed)
+
+
+def get_unbalanced_collections():
+    """
+    Gets the IDs of the collections with lots whose index_in_collection is not their position
+    """
+    unbalanced = set()
+    current_collection_id = None
+    position = 0
+    for collection_id, index_in_collection in get_lot_model().objects.order_by('collection', 'sort_key', 'uuid')\
+            .values_list('collection', 'index_in_collection').iterator(chunk_size=10000):
+        if collection_id != current_collection_id:
+            current_collection_id = collection_id
+            position = 0
+        position += 1
+        if collection_id not in unbalanced and index_in_collection != position:
+            unbalanced.add(collection_id)
+    return unbalanced
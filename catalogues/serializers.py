@@ -1,86 +1,91 @@
 from .models import *
-from rest_framework import serializers
+from mediate.api import ApiSerializer, Expansion
 
 
-class DatasetSerializer(serializers.HyperlinkedModelSerializer):
+class DatasetSerializer(ApiSerializer):
     class Meta:
         model = Dataset
         fields = "__all__"
 
 
-class CollectionSerializer(serializers.HyperlinkedModelSerializer):
+class CollectionSerializer(ApiSerializer):
     class Meta:
         model = Collection
         fields = "__all__"
 
 
-class CollectionTypeSerializer(serializers.HyperlinkedModelSerializer):
+class CollectionTypeSerializer(ApiSerializer):
     class Meta:
         model = CollectionType
         fields = "__all__"
 
 
-class CatalogueSerializer(serializers.HyperlinkedModelSerializer):
+class CatalogueSerializer(ApiSerializer):
     class Meta:
         model = Catalogue
         fields = "__all__"
 
 
-class LotSerializer(serializers.HyperlinkedModelSerializer):
+class LotSerializer(ApiSerializer):
+    expansions = {
+        'collection': Expansion(CollectionSerializer, select_related=['collection'],
+                                prefetch_related=['collection__catalogue']),
+    }
+
     class Meta:
         model = Lot
         fields = "__all__"
 
 
-class PersonCollectionRelationSerializer(serializers.HyperlinkedModelSerializer):
+class PersonCollectionRelationSerializer(ApiSerializer):
     class Meta:
         model = PersonCollectionRelation
         fields = "__all__"
 
 
-class PersonCollectionRelationRoleSerializer(serializers.HyperlinkedModelSerializer):
+class PersonCollectionRelationRoleSerializer(ApiSerializer):
     class Meta:
         model = PersonCollectionRelationRole
         fields = "__all__"
 
 
-class PersonCatalogueRelationSerializer(serializers.HyperlinkedModelSerializer):
+class PersonCatalogueRelationSerializer(ApiSerializer):
     class Meta:
         model = PersonCatalogueRelation
         fields = "__all__"
 
 
-class CatalogueYearSerializer(serializers.HyperlinkedModelSerializer):
+class CatalogueYearSerializer(ApiSerializer):
     class Meta:
         model = CatalogueYear
         fields = "__all__"
 
 
-class LibrarySerializer(serializers.HyperlinkedModelSerializer):
+class LibrarySerializer(ApiSerializer):
     class Meta:
         model = Library
         fields = "__all__"
 
 
-class CollectionCollectionTypeRelationSerializer(serializers.HyperlinkedModelSerializer):
+class CollectionCollectionTypeRelationSerializer(ApiSerializer):
     class Meta:
         model = CollectionCollectionTypeRelation
         fields = "__all__"
 
 
-class CollectionHeldBySerializer(serializers.HyperlinkedModelSerializer):
+class CollectionHeldBySerializer(ApiSerializer):
     class Meta:
         model = CollectionHeldBy
         fields = "__all__"
 
 
-class ParisianCategorySerializer(serializers.HyperlinkedModelSerializer):
+class ParisianCategorySerializer(ApiSerializer):
     class Meta:
         model = ParisianCategory
         fields = "__all__"
 
 
-class CategorySerializer(serializers.HyperlinkedModelSerializer):
+class CategorySerializer(ApiSerializer):
     class Meta:
         model = Category
         fields = "__all__"
@@ -9,7 +9,6 @@ from collections import defaultdict
 from mediate.tools import UUIDRenderMixin
 
 from catalogues.models import PersonCollectionRelation
-from items.models import Item
 from persons.models import Country
 from mediate.columns import render_action_column
 
@@ -86,7 +85,7 @@ class CollectionTable(tables.Table):
         ))
 
     def render_number_of_lots(self, record):
-        return record.lot_set.count()
+        return record.number_of_lots
 
     def render_number_of_items(self, record):
         item_count = record.item_count()
@@ -104,7 +103,7 @@ class CollectionTable(tables.Table):
     def render_percentage_non_books(self, record):
         item_count = record.item_count()
         percentage = 0.00 if not item_count else \
-            round(100 * Item.objects.filter(lot__collection=record, non_book=True).count() / record.item_count(), 2)
+            round(100 * record.number_of_non_book_items / item_count, 2)
         return "{}%".format(percentage)
 
     def render_related_places(self, record):
@@ -236,7 +235,7 @@ class CatalogueTable(tables.Table):
         )
 
     def render_lots(self, record):
-        lot_count = Lot.objects.filter(collection__catalogue=record).count()
+        lot_count = record.number_of_lots
 
         return format_html(
             '<a href="{}?{}">'
@@ -450,3 +450,345 @@ class LotModelTests(TestCase):
         self.assertEqual(exception.args, ("Lot {}: the collection is not the same as the category's collection"
                                          .format(dummy_lot),))
 
+
+
+class SessionScopeTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+        self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        self.collection.catalogue.add(catalogue)
+        self.user = User.objects.create_user('test-user', 'example@example.com', 'test-user')
+
+    def get_request(self):
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = {'datasets': [{'uuid': str(self.dataset.uuid)}]}
+        return request
+
+    def test_get_session_scope(self):
+        from cachalot.api import cachalot_disabled
+        from guardian.shortcuts import assign_perm
+        from catalogues.tools import get_session_scope, get_datasets_for_session
+        from catalogues.views.views import get_collections_for_session
+
+        # Without permission, the (non-existing) default dataset is used
+        self.assertEqual(get_datasets_for_session(self.get_request()), [])
+
+        assign_perm('catalogues.change_dataset', self.user, self.dataset)
+        request = self.get_request()
+        self.assertEqual(get_datasets_for_session(request), [self.dataset])
+        self.assertEqual(list(get_collections_for_session(request)), [self.collection])
+
+        # The scope is cached on the request and for later requests in the same session
+        with cachalot_disabled(), self.assertNumQueries(0):
+            get_session_scope(request)
+            get_session_scope(self.get_request())
+
+        other_collection = Collection.objects.create(short_title='short_title other', year_of_publication=1666)
+        other_collection.catalogue.add(Catalogue.objects.create(name='name_other', dataset=self.dataset))
+        self.assertEqual(set(get_session_scope(self.get_request()).collection_uuids),
+                         {self.collection.uuid, other_collection.uuid})
+
+    def test_session_scope_user_change(self):
+        from django.contrib.auth.models import update_last_login
+        from mediate.cache import get_tag_versions
+        from catalogues.tools import SCOPE_TAG
+
+        # Logging in does not change the scopes
+        version = get_tag_versions([SCOPE_TAG])
+        update_last_login(None, self.user)
+        self.user.first_name = 'changed'
+        self.user.save()
+        self.assertEqual(get_tag_versions([SCOPE_TAG]), version)
+
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertNotEqual(get_tag_versions([SCOPE_TAG]), version)
+
+    def test_session_scope_permission_change(self):
+        from django.contrib.auth.models import Group, Permission
+        from mediate.cache import get_tag_versions
+        from catalogues.tools import SCOPE_TAG
+
+        permission = Permission.objects.get(content_type__app_label='catalogues', codename='change_dataset')
+        self.user.user_permissions.add(permission)
+        version = get_tag_versions([SCOPE_TAG])
+        self.user.user_permissions.remove(permission)
+        self.assertNotEqual(get_tag_versions([SCOPE_TAG]), version)
+
+        group = Group.objects.create(name='editors')
+        self.user.groups.add(group)
+        version = get_tag_versions([SCOPE_TAG])
+        group.permissions.add(permission)
+        self.assertNotEqual(get_tag_versions([SCOPE_TAG]), version)
+
+
+class PersonCollectionMatrixTests(TestCase):
+    def setUp(self):
+        from django.conf import settings
+        from items.models import Item, Edition, PersonItemRelation, PersonItemRelationRole
+
+        role = PersonItemRelationRole.objects.create(name=settings.PERSON_ITEM_ROLES[0])
+        other_role = PersonItemRelationRole.objects.create(name='other role')
+        dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=dataset)
+        edition = Edition.objects.create(year_start=1600)
+        self.persons = [Person.objects.create(short_name='person {}'.format(index), surname='surname',
+                                              first_names='first names') for index in range(4)]
+        # The persons with items per collection; person 3 only has items with another role
+        collection_persons = [[0, 1], [0, 1, 2], [0, 2], [1, 2], [2]]
+        for index, person_indices in enumerate(collection_persons):
+            collection = Collection.objects.create(short_title='collection {}'.format(index),
+                                                   year_of_publication=1666)
+            collection.catalogue.add(catalogue)
+            lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1,
+                                     lot_as_listed_in_collection='lot 1')
+            for person_index in person_indices + [3]:
+                item = Item.objects.create(short_title='item', lot=lot, catalogue=catalogue, edition=edition,
+                                           index_in_lot=person_index + 1)
+                PersonItemRelation.objects.create(person=self.persons[person_index], item=item,
+                                                  role=other_role if person_index == 3 else role)
+        self.dataset = dataset
+
+    def test_PersonCollectionMatrix(self):
+        from django.conf import settings
+        from catalogues.cooccurrence import get_person_collection_matrix
+
+        matrix = get_person_collection_matrix([self.dataset], Collection.objects.all(), settings.PERSON_ITEM_ROLES)
+        # Person 1 shares 2 of its 3 collections with person 0, person 2 2 of its 4
+        self.assertEqual(matrix.get_correlations(self.persons[0].pk), [
+            (self.persons[1].pk, 2, 1, 2.0),
+            (self.persons[2].pk, 2, 2, 1.0),
+        ])
+        self.assertEqual(matrix.get_correlations(self.persons[0].pk, minimal_item_count=4),
+                         [(self.persons[2].pk, 2, 2, 1.0)])
+        self.assertEqual(set(matrix.get_top_cooccurring(self.persons[0].pk)),
+                         {(self.persons[1].pk, 2), (self.persons[2].pk, 2)})
+        self.assertEqual(len(matrix.get_top_cooccurring(self.persons[0].pk, k=1)), 1)
+        self.assertEqual(matrix.get_top_cooccurring(self.persons[3].pk), [])
+
+    def test_person_cooccurrence_json(self):
+        import json
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from catalogues.views.views import person_cooccurrence_json
+
+        request = RequestFactory().get('/', {'person': str(self.persons[3].pk), 'k': 1})
+        request.user = User.objects.create_superuser('test-user', 'example@example.com', 'test-user')
+        request.session = {'datasets': [{'uuid': str(self.dataset.uuid)}]}
+        self.assertEqual(json.loads(person_cooccurrence_json(request).content)['persons'], [])
+
+
+class CollectionCountersTests(TestCase):
+    def setUp(self):
+        dataset = Dataset.objects.create(name='name_test')
+        self.catalogue = Catalogue.objects.create(name='name_test', dataset=dataset)
+        self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        self.collection.catalogue.add(self.catalogue)
+        self.other_collection = Collection.objects.create(short_title='short_title other', year_of_publication=1666)
+
+    def create_item(self, lot, index, **kwargs):
+        from items.models import Item, Edition
+        return Item.objects.create(short_title='item', lot=lot, edition=Edition.objects.create(year_start=1600),
+                                   index_in_lot=index, **kwargs)
+
+    def assertCounters(self, obj, *counters):
+        from catalogues.tools import COUNTERS
+        obj.refresh_from_db()
+        self.assertEqual(tuple(getattr(obj, counter) for counter in COUNTERS), counters)
+
+    def test_counters(self):
+        from items.models import ItemType, ItemItemTypeRelation
+
+        lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1,
+                                 lot_as_listed_in_collection='lot 1')
+        item = self.create_item(lot, 1)
+        self.create_item(lot, 2, uncountable_book_items=True)
+        ItemItemTypeRelation.objects.create(item=item, type=ItemType.objects.create(name='map'))
+        self.assertCounters(self.collection, 1, 2, 1, 1)
+        self.assertCounters(self.catalogue, 1, 2, 1, 1)
+        self.assertEqual(self.collection.item_count(), 3)
+
+        # Moving the lot to another collection moves its items
+        lot.collection = self.other_collection
+        lot.save()
+        self.assertCounters(self.collection, 0, 0, 0, 0)
+        self.assertCounters(self.other_collection, 1, 2, 1, 1)
+        self.assertCounters(self.catalogue, 0, 0, 0, 0)
+
+        item.delete()
+        self.assertCounters(self.other_collection, 1, 1, 0, 1)
+        lot.delete()
+        self.assertCounters(self.other_collection, 0, 0, 0, 0)
+
+        # Adding a collection to a catalogue adds its counters
+        other_lot = Lot.objects.create(collection=self.other_collection, number_in_collection=1,
+                                       index_in_collection=1, lot_as_listed_in_collection='lot 1')
+        self.create_item(other_lot, 1)
+        self.other_collection.catalogue.add(self.catalogue)
+        self.assertCounters(self.catalogue, 1, 1, 0, 0)
+
+    def test_reconcile_counters(self):
+        from catalogues.tools import reconcile_counters
+
+        lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1,
+                                 lot_as_listed_in_collection='lot 1')
+        self.create_item(lot, 1)
+        Collection.objects.filter(pk=self.collection.pk).update(number_of_lots=5, number_of_items=0)
+        Catalogue.objects.filter(pk=self.catalogue.pk).update(number_of_non_book_items=2)
+        self.assertEqual(reconcile_counters(), (1, 1))
+        self.assertCounters(self.collection, 1, 1, 0, 0)
+        self.assertCounters(self.catalogue, 1, 1, 0, 0)
+        self.assertEqual(reconcile_counters(), (0, 0))
+
+
+class LotOrderingTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        self.lots = [self.create_lot(index) for index in range(1, 4)]
+
+    def create_lot(self, index):
+        return Lot.objects.create(collection=self.collection, number_in_collection=index, index_in_collection=index,
+                                  lot_as_listed_in_collection='lot {}'.format(index))
+
+    def assertOrder(self, lots):
+        self.assertEqual(list(self.collection.sorted_lot_set), lots)
+
+    def test_insert_lot(self):
+        from catalogues.ordering import get_unbalanced_collections, rebalance_lots
+
+        keys = list(Lot.objects.order_by('sort_key').values_list('sort_key', flat=True))
+        new_lot = self.create_lot(2)
+        self.assertOrder([self.lots[0], new_lot, self.lots[1], self.lots[2]])
+        # The sort keys of the other lots are not changed, their indices stay contiguous
+        self.assertEqual(list(Lot.objects.exclude(pk=new_lot.pk).order_by('sort_key')
+                              .values_list('sort_key', flat=True)), keys)
+        self.assertEqual(list(self.collection.sorted_lot_set.values_list('index_in_collection', flat=True)),
+                         [1, 2, 3, 4])
+        self.assertEqual(self.lots[2].get_position(), 4)
+        self.assertEqual([(lot, lot.position) for lot in self.lots[2].get_previous_lots(2)],
+                         [(new_lot, 2), (self.lots[1], 3)])
+
+        # Editing a lot does not move it
+        self.lots[0].lot_as_listed_in_collection = 'lot 1 edited'
+        self.lots[0].save()
+        self.assertOrder([self.lots[0], new_lot, self.lots[1], self.lots[2]])
+
+        self.assertEqual(get_unbalanced_collections(), set())
+        Lot.objects.filter(pk=new_lot.pk).update(index_in_collection=5)
+        self.assertEqual(get_unbalanced_collections(), {self.collection.pk})
+        rebalance_lots(self.collection.pk)
+        self.assertEqual(list(self.collection.sorted_lot_set.values_list('index_in_collection', flat=True)),
+                         [1, 2, 3, 4])
+        self.assertEqual(get_unbalanced_collections(), set())
+
+    def test_insert_move_and_delete_lots(self):
+        from items.models import Item, Edition
+
+        for lot in self.lots:
+            Item.objects.create(short_title='item {}'.format(lot.index_in_collection), lot=lot, index_in_lot=1,
+                                edition=Edition.objects.create())
+        lot_x = self.create_lot(2)
+        lot_y = self.create_lot(3)
+        self.assertOrder([self.lots[0], lot_x, lot_y, self.lots[1], self.lots[2]])
+        for lot in [lot_x, lot_y]:
+            Item.objects.create(short_title='item {}'.format(lot.pk), lot=lot, index_in_lot=1,
+                                edition=Edition.objects.create())
+        # The items are ordered by the indices of their lots
+        self.assertEqual([item.lot for item in Item.objects.order_by('lot_index_in_collection')],
+                         [self.lots[0], lot_x, lot_y, self.lots[1], self.lots[2]])
+
+        # Moving a lot
+        lot_x.index_in_collection = 4
+        lot_x.save()
+        self.assertOrder([self.lots[0], lot_y, self.lots[1], lot_x, self.lots[2]])
+        self.assertEqual([item.lot for item in Item.objects.order_by('lot_index_in_collection')],
+                         [self.lots[0], lot_y, self.lots[1], lot_x, self.lots[2]])
+
+        lot_y.delete()
+        self.assertEqual(list(self.collection.sorted_lot_set.values_list('index_in_collection', flat=True)),
+                         [1, 2, 3, 4])
+        self.assertEqual(list(Item.objects.filter(lot__isnull=False).order_by('lot_index_in_collection')
+                              .values_list('lot_index_in_collection', flat=True)), [1, 2, 3, 4])
+
+    def test_insert_lot_without_room(self):
+        # Repeatedly inserting at the same position exhausts the gap and rebalances the collection
+        inserted = [self.create_lot(2) for index in range(12)]
+        self.assertOrder([self.lots[0]] + inserted[::-1] + self.lots[1:])
+
+    def test_add_lot_before(self):
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        # Repeated insertions before the same lot keep their order
+        self.collection.catalogue.add(Catalogue.objects.create(name='name_test',
+                                                               dataset=Dataset.objects.create(name='name_test')))
+        user = User.objects.create_superuser(username='test', password='test')
+        self.client.force_login(user)
+        for title in ['lot A', 'lot B']:
+            response = self.client.post(reverse('add_lot_before', args=[self.lots[1].pk]), {
+                'collection': self.collection.pk, 'number_in_collection': title, 'index_in_collection': 2,
+                'lot_as_listed_in_collection': title,
+            }, HTTP_HOST=settings.HOST_NAME)
+            self.assertEqual(response.status_code, 302)
+        new_lots = [Lot.objects.get(lot_as_listed_in_collection=title) for title in ['lot A', 'lot B']]
+        self.assertOrder([self.lots[0]] + new_lots + self.lots[1:])
+
+    def test_place_before_without_room(self):
+        inserted = []
+        for index in range(12):
+            lot = Lot(collection=self.collection, number_in_collection='new', index_in_collection=2,
+                      lot_as_listed_in_collection='new lot {}'.format(index))
+            lot.place_before(self.lots[1])
+            lot.save()
+            inserted.append(lot)
+        self.assertOrder([self.lots[0]] + inserted + self.lots[1:])
+
+
+class BulkIngestTests(TestCase):
+    def test_import_transcription(self):
+        import io
+        import os
+        import tempfile
+        from contextlib import redirect_stdout
+        from django.core.management import call_command
+        from items.models import Item, BookFormat
+        from persons.models import Place
+        from search.index import ITEM_INDEX
+
+        Dataset.objects.create(name='name_test')
+        transcription = "TIT@Catalogue of books\n<%%>CAT@Folio\n<%%>N@1\nTT@A book. Lond. 1700\nF@2\n" \
+                        "<%%>N@2\nTT@Another book\nC@Leiden\nF@2\n<%%>N@3\nTT@A third book\nC@Leiden\n"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test_catalogue.txt')
+            with open(path, 'w', encoding='utf-8') as transcription_file:
+                transcription_file.write(transcription)
+            with redirect_stdout(io.StringIO()) as output:
+                call_command('import_transcription', path, 'name_test')
+        self.assertIn("rows/sec", output.getvalue())
+
+        collection = Collection.objects.get(short_title='test_catalogue')
+        self.assertEqual(collection.full_title, 'Catalogue of books')
+        self.assertEqual(list(collection.catalogue.values_list('name', flat=True)), ['test_catalogue'])
+        self.assertEqual([(lot.index_in_collection, lot.category.bookseller_category)
+                          for lot in collection.sorted_lot_set.select_related('category')],
+                         [(1, 'Folio'), (2, 'Folio'), (3, 'Folio')])
+
+        # Lookup objects are created once
+        self.assertEqual(BookFormat.objects.filter(name='2').count(), 1)
+        self.assertEqual(Place.objects.filter(name='Leiden [non-CERL]').count(), 1)
+
+        # The work of the signals is done at the end
+        items = Item.objects.filter(lot__collection=collection).order_by('lot_index_in_collection')
+        self.assertEqual([item.lot_index_in_collection for item in items], [1, 2, 3])
+        self.assertTrue(all(item.dataset_uuid for item in items))
+        self.assertEqual(Item.history.filter(uuid__in=items.values('uuid')).count(), 3)
+        collection.refresh_from_db()
+        self.assertEqual((collection.number_of_lots, collection.number_of_items), (3, 3))
+        self.assertEqual(set(ITEM_INDEX.filter(Item.objects.all(), 'short_title', 'third')), {items[2]})
@@ -1,21 +1,76 @@
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
+import hashlib
 import json
 
-from catalogues.models import Dataset
+from catalogues.models import Dataset, Collection
+from mediate.cache import get_or_set_tagged, invalidate_tags
+
+# The cache tag of all session scopes, invalidated when datasets, collections or permissions change
+SCOPE_TAG = 'scope'
+
+
+class SessionScope:
+    """
+    The datasets and collections of a session, resolved once and cached per user and dataset selection
+    """
+    def __init__(self, permitted_datasets, datasets, collection_uuids):
+        """
+        :param permitted_datasets: the selected datasets the user has permission to change
+        :param datasets: the permitted datasets or, if there are none, the default dataset
+        :param collection_uuids: the UUIDs of the collections in the datasets
+        """
+        self.permitted_datasets = permitted_datasets
+        self.datasets = datasets
+        self.collection_uuids = collection_uuids
+
+    @property
+    def dataset_uuids(self):
+        return [dataset.uuid for dataset in self.datasets]
+
+    @classmethod
+    def resolve(cls, request):
+        datasets_session = request.session.get('datasets', [])
+        if datasets_session:
+            datasets_retrieved = Dataset.objects.filter(uuid__in=[dataset['uuid'] for dataset in datasets_session])
+        else:
+            datasets_retrieved = get_dataset_for_anonymoususer()
+        permitted_datasets = [dataset for dataset in datasets_retrieved
+                              if request.user.has_perm('catalogues.change_dataset', dataset)]
+        datasets = permitted_datasets or list(get_dataset_for_anonymoususer())
+        collection_uuids = list(Collection.objects.filter(catalogue__dataset__in=datasets).distinct()
+                                .values_list('uuid', flat=True))
+        return cls(permitted_datasets, datasets, collection_uuids)
+
+
+def get_session_scope(request):
+    """
+    Gets the scope of the session of a request.
+    The scope is kept on the request and cached per user and dataset selection.
+    :param request: the current request object
+    :return: a SessionScope
+    """
+    dataset_uuids = sorted(dataset['uuid'] for dataset in request.session.get('datasets', []))
+    user_id = request.user.pk if request.user.is_authenticated else 'anonymous'
+    key = 'session_scope_{}_{}'.format(user_id, hashlib.sha1(",".join(dataset_uuids).encode()).hexdigest())
+
+    # The dataset selection may change during a request
+    request_scope = getattr(request, '_session_scope', None)
+    if request_scope and request_scope[0] == key:
+        return request_scope[1]
+
+    scope = get_or_set_tagged(key, lambda: SessionScope.resolve(request), [SCOPE_TAG])
+    request._session_scope = (key, scope)
+    return scope
+
+
+def invalidate_session_scopes(using=None):
+    invalidate_tags([SCOPE_TAG], using=using)
 
 
 def get_permitted_datasets_for_session(request):
-    datasets_session = request.session.get('datasets', [])
-    if datasets_session:
-        datasets_retrieved = Dataset.objects.filter(uuid__in=[dataset['uuid']
-                                                            for dataset in datasets_session])
-    else:
-        datasets_retrieved = get_dataset_for_anonymoususer()
-    datasets_permitted = [dataset for dataset in datasets_retrieved
-                          if request.user.has_perm('catalogues.change_dataset', dataset)]
-    return datasets_permitted
+    return list(get_session_scope(request).permitted_datasets)
 
 
 def get_datasets_for_session(request, extra_dataset=None):
@@ -26,11 +81,11 @@ def get_datasets_for_session(request, extra_dataset=None):
     :param request: the current request object
     :return: dataset
     """
-    datasets_permitted = get_permitted_datasets_for_session(request)
-    if datasets_permitted:
-        return datasets_permitted + [extra_dataset] if extra_dataset else datasets_permitted
+    scope = get_session_scope(request)
+    if scope.permitted_datasets:
+        return scope.permitted_datasets + [extra_dataset] if extra_dataset else list(scope.permitted_datasets)
 
-    return list(get_dataset_for_anonymoususer())
+    return list(scope.datasets)
 
 
 def get_dataset_for_anonymoususer():
@@ -38,3 +93,103 @@ def get_dataset_for_anonymoususer():
         return Dataset.objects.filter(name=settings.DATASET_NAME_FOR_ANONYMOUSUSER)
     except KeyError:
         return Dataset.objects.none()
+
+
+# The counters of collections and catalogues, kept up to date by the receivers of lots and items
+COUNTERS = ['number_of_lots', 'number_of_items', 'number_of_non_book_items', 'number_of_uncountable_book_items']
+ITEM_COUNTERS = COUNTERS[1:]
+
+
+def get_item_counters(items):
+    """
+    Gets the item counters for a queryset of items with a single aggregate query
+    """
+    from django.db.models import Count, Q
+    return items.aggregate(
+        number_of_items=Count('uuid'),
+        number_of_non_book_items=Count('uuid', filter=Q(non_book=True)),
+        number_of_uncountable_book_items=Count('uuid', filter=Q(uncountable_book_items=True))
+    )
+
+
+def get_single_item_counters(non_book, uncountable_book_items):
+    return {'number_of_items': 1, 'number_of_non_book_items': int(bool(non_book)),
+            'number_of_uncountable_book_items': int(bool(uncountable_book_items))}
+
+
+def update_counters(collection_id, counters, sign=1, using=None):
+    """
+    Adds (or subtracts) counters to the counters of a collection and its catalogues
+    :param collection_id: the ID of a collection or None
+    :param counters: a dict with the difference per counter
+    :param sign: 1 to add the counters, -1 to subtract them
+    """
+    from django.db.models import F
+    from catalogues.models import Catalogue
+    updates = {counter: F(counter) + sign * value for counter, value in counters.items() if value}
+    if not collection_id or not updates:
+        return
+    Collection.objects.using(using).filter(pk=collection_id).update(**updates)
+    Catalogue.objects.using(using).filter(collection=collection_id).update(**updates)
+
+
+def reconcile_catalogue_counters(catalogue_ids=None, using=None):
+    """
+    Recomputes the counters of catalogues from the counters of their collections
+    :param catalogue_ids: the IDs of the catalogues or None for all catalogues
+    :return: the number of catalogues with changed counters
+    """
+    from django.db.models import Sum
+    from django.db.models.functions import Coalesce
+    from catalogues.models import Catalogue
+    catalogues = Catalogue.objects.using(using).all()
+    if catalogue_ids is not None:
+        catalogues = catalogues.filter(pk__in=catalogue_ids)
+    changed = []
+    for catalogue in catalogues.annotate(**{'sum_' + counter: Coalesce(Sum('collection__' + counter), 0)
+                                            for counter in COUNTERS}):
+        if any(getattr(catalogue, counter) != getattr(catalogue, 'sum_' + counter) for counter in COUNTERS):
+            for counter in COUNTERS:
+                setattr(catalogue, counter, getattr(catalogue, 'sum_' + counter))
+            changed.append(catalogue)
+    Catalogue.objects.using(using).bulk_update(changed, COUNTERS, batch_size=1000)
+    return len(changed)
+
+
+def reconcile_counters(collection_ids=None, using=None):
+    """
+    Recomputes the counters of collections and their catalogues with grouped aggregate queries
+    :param collection_ids: the IDs of the collections or None for all collections
+    :return: a tuple of the numbers of collections and catalogues with changed counters
+    """
+    from django.db.models import Count, Q
+    from catalogues.models import Catalogue, Lot
+    from items.models import Item
+    collections = Collection.objects.using(using).all()
+    lots = Lot.objects.using(using).order_by()
+    items = Item.objects.using(using).order_by()
+    catalogue_ids = None
+    if collection_ids is not None:
+        collections = collections.filter(pk__in=collection_ids)
+        lots = lots.filter(collection__in=collection_ids)
+        items = items.filter(lot__collection__in=collection_ids)
+        catalogue_ids = list(Catalogue.objects.using(using).filter(collection__in=collection_ids)
+                             .values_list('pk', flat=True).distinct())
+
+    counts = {collection_id: {'number_of_lots': number_of_lots} for collection_id, number_of_lots in
+              lots.values_list('collection').annotate(Count('uuid'))}
+    for values in items.values('lot__collection').annotate(
+            number_of_items=Count('uuid'),
+            number_of_non_book_items=Count('uuid', filter=Q(non_book=True)),
+            number_of_uncountable_book_items=Count('uuid', filter=Q(uncountable_book_items=True))):
+        counts.setdefault(values.pop('lot__collection'), {}).update(values)
+
+    changed = []
+    for collection in collections.only('uuid', *COUNTERS):
+        collection_counts = counts.get(collection.pk, {})
+        if any(getattr(collection, counter) != collection_counts.get(counter, 0) for counter in COUNTERS):
+            for counter in COUNTERS:
+                setattr(collection, counter, collection_counts.get(counter, 0))
+            changed.append(collection)
+    Collection.objects.using(using).bulk_update(changed, COUNTERS, batch_size=1000)
+    return len(changed), reconcile_catalogue_counters(catalogue_ids, using=using)
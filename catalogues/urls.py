@@ -248,5 +248,6 @@ urlpatterns = [
     # Person-Work correlation
     path('personworkcorrelation/', person_work_correlation, name="personworkcorrelation"),
     path('personworkcorrelationlist/', person_work_correlation_list, name="personworkcorrelationlist"),
+    path('personcooccurrence/json/', person_cooccurrence_json, name="personcooccurrence_json"),
 
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
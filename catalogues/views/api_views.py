@@ -1,22 +1,25 @@
 from django.http import Http404
-from rest_framework import viewsets, filters
+from rest_framework import filters
+from mediate.api import API_PARAMS, ApiViewSet
 from ..serializers import *
 
 
-class DatasetViewSet(viewsets.ModelViewSet):
+class DatasetViewSet(ApiViewSet):
     queryset = Dataset.objects.all()
     serializer_class = DatasetSerializer
     http_method_names = ['get']
+    dataset_field = 'pk'
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
 
-class CollectionViewSet(viewsets.ModelViewSet):
-    queryset = Collection.objects.all()
+class CollectionViewSet(ApiViewSet):
+    queryset = Collection.objects.prefetch_related('catalogue')
     serializer_class = CollectionSerializer
     http_method_names = ['get']
     filter_backends = [filters.SearchFilter]
     search_fields = ['short_title']
+    dataset_field = 'catalogue__dataset'
 
     filter_fields = ['short_title', 'year_of_publication']
 
@@ -25,8 +28,10 @@ class CollectionViewSet(viewsets.ModelViewSet):
         Optionally restricts the returned purchases to a given user,
         by filtering against a `username` query parameter in the URL.
         """
-        queryset = Collection.objects.all()
+        queryset = super().get_queryset()
         for param, value in self.request.query_params.items():
+            if param in API_PARAMS:
+                continue
             if param.split('__')[0] in self.filter_fields:
                 queryset = queryset.filter(**{param: value})
             else:
@@ -34,75 +39,77 @@ class CollectionViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class CollectionTypeViewSet(viewsets.ModelViewSet):
+class CollectionTypeViewSet(ApiViewSet):
     queryset = CollectionType.objects.all()
     serializer_class = CollectionTypeSerializer
     http_method_names = ['get']
 
 
-class CatalogueViewSet(viewsets.ModelViewSet):
+class CatalogueViewSet(ApiViewSet):
     queryset = Catalogue.objects.all()
     serializer_class = CatalogueSerializer
     http_method_names = ['get']
+    dataset_field = 'dataset'
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
 
-class LotViewSet(viewsets.ModelViewSet):
+class LotViewSet(ApiViewSet):
     queryset = Lot.objects.all()
     serializer_class = LotSerializer
     http_method_names = ['get']
+    dataset_field = 'collection__catalogue__dataset'
 
 
-class PersonCollectionRelationViewSet(viewsets.ModelViewSet):
+class PersonCollectionRelationViewSet(ApiViewSet):
     queryset = PersonCollectionRelation.objects.all()
     serializer_class = PersonCollectionRelationSerializer
     http_method_names = ['get']
 
 
-class PersonCollectionRelationRoleViewSet(viewsets.ModelViewSet):
+class PersonCollectionRelationRoleViewSet(ApiViewSet):
     queryset = PersonCollectionRelationRole.objects.all()
     serializer_class = PersonCollectionRelationRoleSerializer
     http_method_names = ['get']
 
 
-class PersonCatalogueRelationViewSet(viewsets.ModelViewSet):
+class PersonCatalogueRelationViewSet(ApiViewSet):
     queryset = PersonCatalogueRelation.objects.all()
     serializer_class = PersonCatalogueRelationSerializer
     http_method_names = ['get']
 
 
-class CatalogueYearViewSet(viewsets.ModelViewSet):
+class CatalogueYearViewSet(ApiViewSet):
     queryset = CatalogueYear.objects.all()
     serializer_class = CatalogueYearSerializer
     http_method_names = ['get']
 
 
-class LibraryViewSet(viewsets.ModelViewSet):
+class LibraryViewSet(ApiViewSet):
     queryset = Library.objects.all()
     serializer_class = LibrarySerializer
     http_method_names = ['get']
 
 
-class CollectionCollectionTypeRelationViewSet(viewsets.ModelViewSet):
+class CollectionCollectionTypeRelationViewSet(ApiViewSet):
     queryset = CollectionCollectionTypeRelation.objects.all()
     serializer_class = CollectionCollectionTypeRelationSerializer
     http_method_names = ['get']
 
 
-class CollectionHeldByViewSet(viewsets.ModelViewSet):
+class CollectionHeldByViewSet(ApiViewSet):
     queryset = CollectionHeldBy.objects.all()
     serializer_class = CollectionHeldBySerializer
     http_method_names = ['get']
 
 
-class ParisianCategoryViewSet(viewsets.ModelViewSet):
+class ParisianCategoryViewSet(ApiViewSet):
     queryset = ParisianCategory.objects.all()
     serializer_class = ParisianCategorySerializer
     http_method_names = ['get']
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ApiViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     http_method_names = ['get']
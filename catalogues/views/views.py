@@ -7,7 +7,7 @@ from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic.list import ListView
 from django.db.models import Count, Min, Max, Q, Func, F, Value, Avg, FloatField, IntegerField, Sum
-from django.db.models.functions import Substr, Length
+from django.db.models.functions import Substr, Length, Cast, NullIf
 from django.http import JsonResponse, HttpResponseRedirect, HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
@@ -17,14 +17,16 @@ from guardian.shortcuts import get_objects_for_user
 
 from mediate.tools import put_layout_in_context, put_get_variable_in_context
 from mediate.views import GenericDetailView
-from simplemoderation.tools import moderate
+from simplemoderation.tools import moderate, set_under_moderation
 
 from ..forms import *
 from ..tables import *
 from ..filters import *
 
 from ..models import *
-from catalogues.tools import get_datasets_for_session, get_dataset_for_anonymoususer, get_permitted_datasets_for_session
+from catalogues.tools import get_datasets_for_session, get_dataset_for_anonymoususer, get_permitted_datasets_for_session, \
+    get_session_scope
+from catalogues.cooccurrence import get_person_collection_matrix
 
 from items.models import Item, Edition, Language, BookFormat
 import json
@@ -34,7 +36,7 @@ import django_tables2
 
 
 def get_collections_for_session(request, extra_collection=None):
-    filter = Q(catalogue__dataset__in=get_datasets_for_session(request))
+    filter = Q(pk__in=get_session_scope(request).collection_uuids)
     if extra_collection:
         filter = filter & Q(pk=extra_collection.pk)
     return Collection.objects.filter(filter)
@@ -129,21 +131,13 @@ class CollectionStatisticsView(TemplateView):
             ]
         ]
 
-        # Averages
-        # Average number of lots and items
+        # Averages, from the counters of the collections
+        # Average number of lots and items, and average percentage of non-books (relative to the books)
         averages = filter.qs \
-            .annotate(lot_cnt=Count('lot', distinct=True), item_cnt=Count('lot__item', distinct=True)) \
-            .aggregate(avg_lot_cnt=Avg(F('lot_cnt')), avg_item_cnt=Avg(F('item_cnt')))
-
-        # Average percentage of non-books
-        averages.update(
-            filter.qs \
-                .annotate(pct_non_book=100
-                                * Count('lot__item', filter=Q(lot__item__non_book=True), output_field=FloatField())
-                                / Count('lot__item', filter=Q(lot__item__non_book=False))
-            )
-                .aggregate(avg_pct_non_books=Avg(F('pct_non_book')))
-        )
+            .annotate(pct_non_book=100 * Cast('number_of_non_book_items', FloatField())
+                                   / NullIf(F('number_of_items') - F('number_of_non_book_items'), 0)) \
+            .aggregate(avg_lot_cnt=Avg('number_of_lots'), avg_item_cnt=Avg('number_of_items'),
+                       avg_pct_non_books=Avg('pct_non_book'))
 
         # Replace keys with human-readable keys
         labels = {
@@ -375,23 +369,23 @@ class CollectionDetailView(PermissionRequiredMixin, DetailView):
         self.object = self.get_object()
         context = super().get_context_data(**kwargs)
 
-        # Find the first lot for each page
+        # Find the first lot (by sort key) for each page
         context['first_lot_on_page_dict'] = dict([
             (lot['first_lot_on_page'], lot['page_in_collection']) for lot in
             self.object.lot_set.filter(page_in_collection__isnull=False).values('page_in_collection')
-                .annotate(first_lot_on_page=Min('index_in_collection')).order_by()
+                .annotate(first_lot_on_page=Min('sort_key')).order_by()
         ])
 
-        # Find the first lot for each category
+        # Find the first lot (by sort key) for each category
         # by looping over the ordered lots in the collection
         lots = self.object.lot_set.filter(category__isnull=False).values(
-            'index_in_collection', 'category__bookseller_category', 'number_in_collection').order_by('index_in_collection')
+            'sort_key', 'category__bookseller_category', 'number_in_collection').order_by('sort_key')
         first_lot_in_category_dict = {}
         last_category = ""
         for lot in lots:
             if lot['category__bookseller_category'] != last_category or lot['number_in_collection'] == 1:
                 last_category = lot['category__bookseller_category']
-                first_lot_in_category_dict[lot['index_in_collection']] = lot['category__bookseller_category']
+                first_lot_in_category_dict[lot['sort_key']] = lot['category__bookseller_category']
         context['first_lot_in_category_dict'] = first_lot_in_category_dict
 
         context['change_dataset_perm'] = self.request.user.has_perm('catalogues.change_dataset',
@@ -403,6 +397,12 @@ class CollectionDetailView(PermissionRequiredMixin, DetailView):
 class CollectionDetailBareView(CollectionDetailView):
     template_name = 'catalogues/collection_detail_bare.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Whether the lots are under moderation, with one query
+        context['lots'] = set_under_moderation(list(self.object.sorted_lot_set))
+        return context
+
 
 @moderate()
 class CollectionCreateView(CreateView):
@@ -943,7 +943,7 @@ class LotTableView(ListView):
 
     def get_queryset(self):
         return Lot.objects.filter(collection__catalogue__dataset__in=get_datasets_for_session(self.request))\
-            .order_by('collection__year_of_publication', 'collection__short_title', 'index_in_collection',
+            .order_by('collection__year_of_publication', 'collection__short_title', 'sort_key',
                                     'lot_as_listed_in_collection')
 
     def get_context_data(self, **kwargs):
@@ -1049,16 +1049,21 @@ class LotDeleteView(PermissionRequiredMixin, DeleteView):
 
 
 def previous_lot_view(request, pk, index):
+    """
+    Gets the lot at a position (the contiguous index in the collection) in a collection
+    """
     try:
-        lot = Lot.objects.get(collection__uuid=pk, index_in_collection=index)
+        if index < 1:
+            raise IndexError()
+        lot = Lot.objects.filter(collection__uuid=pk).order_by('sort_key')[index - 1]
         if not request.user.has_perm('catalogues.view_dataset', lot.collection.catalogue.first().dataset):
             raise PermissionDenied()
         return JsonResponse({
             'success': True,
             'lot_as_listed_in_collection': lot.lot_as_listed_in_collection,
-            'index_in_collection': lot.index_in_collection
+            'index_in_collection': index
         })
-    except ObjectDoesNotExist:
+    except (ObjectDoesNotExist, IndexError):
         return JsonResponse({
             'success': False
         })
@@ -1114,11 +1119,8 @@ def add_lot_before(request, pk):
         raise PermissionDenied()
 
     # Determine whether there is a lot before the selected position
-    try:
-        lot_before = Lot.objects.filter(collection=lot_after.collection, index_in_collection__lt=lot_after.index_in_collection)\
-            .order_by('-index_in_collection').first()
-    except:
-        lot_before = None
+    lot_before = Lot.objects.filter(collection=lot_after.collection, sort_key__lt=lot_after.sort_key)\
+        .order_by('-sort_key').first()
 
     next_url = reverse_lazy('collection_detail_bare', args=[str(lot_after.collection.uuid)])
     next_url = '{}#lot__{}'.format(next_url, lot_after.uuid)
@@ -1126,7 +1128,13 @@ def add_lot_before(request, pk):
     if request.method == 'POST':
         form = AddLotBeforeForm(request.POST)
         if form.is_valid():
-            new_lot = form.save()
+            # Place the lot right before the selected lot, at its index
+            new_lot = form.save(commit=False)
+            new_lot.collection = lot_after.collection
+            new_lot.index_in_collection = lot_after.get_position()
+            new_lot.place_before(lot_after)
+            new_lot.save()
+            form.save_m2m()
 
             # Create Item for this new Lot
             empty_edition = Edition.objects.create()
@@ -1157,7 +1165,7 @@ def add_lot_before(request, pk):
         else:
             page = lot_after.page_in_collection
 
-        index = lot_after.index_in_collection
+        index = lot_after.get_position()
 
         form = AddLotBeforeForm(category=category, page=page, index=index, collection=lot_after.collection)
     else:
@@ -1183,7 +1191,7 @@ def add_lot_at_end(request, pk):
     collection = get_object_or_404(Collection, pk=pk)
     if not request.user.has_perm('catalogues.change_dataset', collection.catalogue.first().dataset):
         raise PermissionDenied()
-    last_lot = Lot.objects.filter(collection=collection).order_by('-index_in_collection').first()
+    last_lot = Lot.objects.filter(collection=collection).order_by('-sort_key').first()
 
     next_url = reverse_lazy('collection_detail_bare', args=[str(collection.uuid)])
     next_url = '{}#lot__{}'.format(next_url, last_lot.uuid)
@@ -1827,47 +1835,44 @@ from django.views.decorators.http import require_POST
 @require_POST
 def person_work_correlation_list(request):
     person_id = request.POST.get('person', None)
-    if person_id:
-        selected_person = Person.objects.get(pk=person_id)
-
-    persons = Person.objects\
-        .annotate(item_cnt=Count("personitemrelation__item",
-                                 filter=Q(personitemrelation__role__name__in=settings.PERSON_ITEM_ROLES)))\
-        .filter(item_cnt__gte=settings.MINIMAL_ITEMS_PER_PERSON)\
-        .exclude(pk=person_id).distinct()
-
-    selected_person_collections_set = set(list(
-        get_collections_for_session(request)
-        .filter(lot__item__personitemrelation__person=selected_person,
-                lot__item__personitemrelation__role__name__in=settings.PERSON_ITEM_ROLES)
-        .values_list('uuid', flat=True)
-    ))
-
-    data = {}
-    for person in persons:
-        person_collections_set = set(list(
-            Collection.objects.filter(lot__item__personitemrelation__person=person,
-                                      lot__item__personitemrelation__role__name__in=settings.PERSON_ITEM_ROLES)
-            .values_list('uuid', flat=True)
-        ))
-
-        collection_cnt_both = len(set.intersection(selected_person_collections_set, person_collections_set))
-        collection_cnt_without_selected = len(person_collections_set - selected_person_collections_set)
-
-        try:
-            ratio = collection_cnt_both / collection_cnt_without_selected
-        except ZeroDivisionError as zde:
-            ratio = 0
-
-        data[person] = (collection_cnt_both, collection_cnt_without_selected, ratio, round(ratio, 2))
-
-    correlation_list = sorted(data.items(), key=lambda item: item[1][2], reverse=True)
-    correlations = OrderedDict(correlation_list)
+    selected_person = get_object_or_404(Person, pk=person_id)
+
+    matrix = get_person_collection_matrix(get_datasets_for_session(request), get_collections_for_session(request),
+                                          settings.PERSON_ITEM_ROLES)
+    correlation_list = matrix.get_correlations(selected_person.pk, settings.MINIMAL_ITEMS_PER_PERSON)
+    persons = Person.objects.in_bulk([correlation[0] for correlation in correlation_list])
+    correlations = OrderedDict(
+        (persons[person_id], (collection_cnt_both, collection_cnt_without_selected, ratio, round(ratio, 2)))
+        for person_id, collection_cnt_both, collection_cnt_without_selected, ratio in correlation_list
+        if person_id in persons
+    )
 
     # Chart
-    chart_data = ['correlation'] + [correlation[1][3] for correlation in correlation_list[:50]]
+    chart_data = ['correlation'] + [values[3] for values in list(correlations.values())[:50]]
 
     context = {'selected_person': selected_person, 'correlations': correlations, 'chart_data': json.dumps(chart_data)}
 
     return render(request, 'catalogues/person_work_correlation_list.html', context=context)
 
+
+def person_cooccurrence_json(request):
+    """
+    Gets the persons that share the most collections with a person, e.g. ?person=<UUID>&k=10
+    """
+    selected_person = get_object_or_404(Person, pk=request.GET.get('person'))
+    try:
+        k = max(int(request.GET.get('k', 10)), 1)
+    except ValueError:
+        k = 10
+
+    matrix = get_person_collection_matrix(get_datasets_for_session(request), get_collections_for_session(request),
+                                          settings.PERSON_ITEM_ROLES)
+    top_cooccurring = matrix.get_top_cooccurring(selected_person.pk, k)
+    persons = Person.objects.in_bulk([person_id for person_id, collection_count in top_cooccurring])
+    return JsonResponse({
+        'person': str(selected_person.pk),
+        'persons': [{'uuid': str(person_id), 'short_name': persons[person_id].short_name,
+                     'collection_count': collection_count}
+                    for person_id, collection_count in top_cooccurring if person_id in persons]
+    })
+
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('catalogues', '0041_auto_20260225_1354'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Totals',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='Key')),
+                ('stale', models.BooleanField(default=False, verbose_name='Stale')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+                ('collections', models.IntegerField(default=0, verbose_name='Collections')),
+                ('book_items', models.IntegerField(default=0, verbose_name='Book items')),
+                ('uncountable_book_items_count', models.IntegerField(default=0, verbose_name='Items with uncountable book items')),
+                ('non_book_items', models.IntegerField(default=0, verbose_name='Non book items')),
+                ('works', models.IntegerField(default=0, verbose_name='Works')),
+                ('persons', models.IntegerField(default=0, verbose_name='Persons')),
+                ('female_persons', models.IntegerField(default=0, verbose_name='Female persons')),
+                ('countries', models.IntegerField(default=0, verbose_name='Countries')),
+                ('cities', models.IntegerField(default=0, verbose_name='Cities')),
+                ('languages', models.IntegerField(default=0, verbose_name='Languages')),
+                ('item_person_relations', models.IntegerField(default=0, verbose_name='Items with persons')),
+                ('item_work_relations', models.IntegerField(default=0, verbose_name='Item-work relations')),
+                ('items_with_date', models.IntegerField(default=0, verbose_name='Items with date')),
+                ('items_with_place_of_publication', models.IntegerField(default=0, verbose_name='Items with place of publication')),
+                ('items_with_publisher', models.IntegerField(default=0, verbose_name='Items with publisher')),
+                ('persons_with_place_of_birth', models.IntegerField(default=0, verbose_name='Persons with place of birth')),
+                ('persons_with_place_of_death', models.IntegerField(default=0, verbose_name='Persons with place of death')),
+                ('books_with_language', models.IntegerField(default=0, verbose_name='Books with language')),
+                ('books_with_parisian_category', models.IntegerField(default=0, verbose_name='Books with Parisian category')),
+                ('collection', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalogues.collection')),
+                ('datasets', models.ManyToManyField(related_name='+', to='catalogues.dataset')),
+            ],
+        ),
+    ]
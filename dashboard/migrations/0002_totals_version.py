@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='totals',
+            name='version',
+            field=models.IntegerField(default=0, verbose_name='Version'),
+        ),
+    ]
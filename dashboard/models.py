@@ -1,3 +1,237 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.deletion import CASCADE
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+import hashlib
+
+from catalogues.models import Dataset, Collection
+
+
+class Totals(models.Model):
+    """
+    Precomputed counters for the totals page, for a set of datasets and optionally a single collection
+    """
+    key = models.CharField(_("Key"), max_length=40, primary_key=True)
+    datasets = models.ManyToManyField(Dataset, related_name='+')
+    collection = models.ForeignKey(Collection, on_delete=CASCADE, null=True, related_name='+')
+    stale = models.BooleanField(_("Stale"), default=False)
+    # Incremented whenever the totals are marked stale, so that a refresh that overlaps a change keeps them stale
+    version = models.IntegerField(_("Version"), default=0)
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+    collections = models.IntegerField(_("Collections"), default=0)
+    book_items = models.IntegerField(_("Book items"), default=0)
+    uncountable_book_items_count = models.IntegerField(_("Items with uncountable book items"), default=0)
+    non_book_items = models.IntegerField(_("Non book items"), default=0)
+    works = models.IntegerField(_("Works"), default=0)
+    persons = models.IntegerField(_("Persons"), default=0)
+    female_persons = models.IntegerField(_("Female persons"), default=0)
+    countries = models.IntegerField(_("Countries"), default=0)
+    cities = models.IntegerField(_("Cities"), default=0)
+    languages = models.IntegerField(_("Languages"), default=0)
+    item_person_relations = models.IntegerField(_("Items with persons"), default=0)
+    item_work_relations = models.IntegerField(_("Item-work relations"), default=0)
+    items_with_date = models.IntegerField(_("Items with date"), default=0)
+    items_with_place_of_publication = models.IntegerField(_("Items with place of publication"), default=0)
+    items_with_publisher = models.IntegerField(_("Items with publisher"), default=0)
+    persons_with_place_of_birth = models.IntegerField(_("Persons with place of birth"), default=0)
+    persons_with_place_of_death = models.IntegerField(_("Persons with place of death"), default=0)
+    books_with_language = models.IntegerField(_("Books with language"), default=0)
+    books_with_parisian_category = models.IntegerField(_("Books with Parisian category"), default=0)
+
+    COUNTERS = ['collections', 'book_items', 'uncountable_book_items_count', 'non_book_items', 'works', 'persons',
+                'female_persons', 'countries', 'cities', 'languages', 'item_person_relations', 'item_work_relations',
+                'items_with_date', 'items_with_place_of_publication', 'items_with_publisher',
+                'persons_with_place_of_birth', 'persons_with_place_of_death', 'books_with_language',
+                'books_with_parisian_category']
+
+    # Counters shown as a percentage of the book items
+    BOOK_ITEM_PERCENTAGES = ['item_person_relations', 'item_work_relations', 'items_with_date',
+                             'items_with_place_of_publication', 'items_with_publisher', 'books_with_language',
+                             'books_with_parisian_category']
+
+    # Counters shown as a percentage of the persons
+    PERSON_PERCENTAGES = ['persons_with_place_of_birth', 'persons_with_place_of_death']
+
+    def __str__(self):
+        return self.key
+
+    @staticmethod
+    def get_key(dataset_uuids, collection_uuid=None):
+        """
+        Gets the primary key for a set of datasets and optionally a collection
+        :param dataset_uuids: an iterable of dataset UUIDs
+        :param collection_uuid: a collection UUID or None
+        :return: a hex digest
+        """
+        scope = ",".join(sorted(str(dataset_uuid) for dataset_uuid in dataset_uuids))
+        if collection_uuid:
+            scope += "|{}".format(collection_uuid)
+        return hashlib.sha1(scope.encode()).hexdigest()
+
+    @classmethod
+    def mark_stale(cls, dataset_uuids=None):
+        """
+        Marks the totals that include any of the given datasets as stale and increments their versions
+        :param dataset_uuids: an iterable of dataset UUIDs or None for all totals
+        """
+        totals = cls.objects.all()
+        if dataset_uuids is not None:
+            totals = totals.filter(pk__in=cls.objects.filter(datasets__in=dataset_uuids).values('pk'))
+        totals.update(stale=True, version=F('version') + 1)
+
+    @staticmethod
+    def percentage(part, total, digits=None):
+        return round(100 * part / total, digits) if total else 0
+
+    def get_context(self):
+        """
+        Gets the counters and percentages as used by the totals template
+        """
+        context = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        context['stale'] = self.stale
+        context['updated'] = self.updated
+        context['percentage_non_book_items'] = self.percentage(self.non_book_items, self.book_items, 1)
+        for counter in self.BOOK_ITEM_PERCENTAGES:
+            context['percentage_' + counter] = self.percentage(getattr(self, counter), self.book_items)
+        for counter in self.PERSON_PERCENTAGES:
+            context['percentage_' + counter] = self.percentage(getattr(self, counter), self.persons)
+        return context
+
+
+# Mark totals as stale when a model object they are based on is saved or deleted
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from mediate.tools import receiver_with_multiple_senders
+from catalogues.models import Catalogue, CatalogueCollectionRelation, Lot
+from items.models import Item, Edition, Work, Language, ItemLanguageRelation, ItemWorkRelation, PersonItemRelation, \
+    Publisher, PublicationPlace
+from persons.models import Person, Place, Country
+
+
+class PendingStaleTotals:
+    """
+    Collects the datasets of the model objects changed during a transaction and marks their totals stale once
+    on commit. Items and collections are resolved to datasets with one query each.
+    """
+    def __init__(self):
+        self.done = False
+        self.all_datasets = False
+        self.dataset_uuids = set()
+        self.collection_ids = set()
+        self.item_ids = set()
+        # The datasets of changed items, which may have been deleted by the time of the commit
+        self.item_dataset_uuids = {}
+
+    def add(self, instance):
+        """
+        Adds the datasets a model object belongs to
+        """
+        if isinstance(instance, Item):
+            self.item_dataset_uuids[instance.pk] = instance.dataset_uuid
+            if instance.dataset_uuid:
+                self.dataset_uuids.add(instance.dataset_uuid)
+            else:
+                self.all_datasets = True
+        elif getattr(instance, 'item_id', None):
+            self.item_ids.add(instance.item_id)
+        elif isinstance(instance, Collection) or getattr(instance, 'collection_id', None):
+            self.collection_ids.add(instance.pk if isinstance(instance, Collection) else instance.collection_id)
+        else:
+            self.all_datasets = True
+
+    def add_datasets(self, dataset_uuids):
+        """
+        :param dataset_uuids: an iterable of dataset UUIDs or None for all datasets
+        """
+        if dataset_uuids is None:
+            self.all_datasets = True
+        else:
+            self.dataset_uuids.update(dataset_uuids)
+
+    def resolve_dataset_uuids(self):
+        """
+        :return: a set of dataset UUIDs or None if the changes (possibly) concern all datasets
+        """
+        dataset_uuids = set(self.dataset_uuids)
+        item_ids = self.item_ids - set(self.item_dataset_uuids)
+        dataset_uuids.update(uuid for uuid in (self.item_dataset_uuids.get(item_id) for item_id in self.item_ids)
+                             if uuid)
+        if item_ids:
+            items = dict(Item.objects.filter(uuid__in=item_ids).values_list('uuid', 'dataset_uuid'))
+            if len(items) < len(item_ids) or None in items.values():
+                return None
+            dataset_uuids.update(items.values())
+        if self.collection_ids:
+            relations = CatalogueCollectionRelation.objects.filter(collection_id__in=self.collection_ids)\
+                .values_list('collection_id', 'catalogue__dataset_id').distinct()
+            if len({collection_id for collection_id, dataset_uuid in relations}) < len(self.collection_ids):
+                return None
+            dataset_uuids.update(dataset_uuid for collection_id, dataset_uuid in relations)
+        return dataset_uuids
+
+    def __call__(self):
+        self.done = True
+        if self.all_datasets:
+            Totals.mark_stale()
+        else:
+            dataset_uuids = self.resolve_dataset_uuids()
+            if dataset_uuids is None or dataset_uuids:
+                Totals.mark_stale(dataset_uuids)
+
+
+def mark_stale_on_commit(instance=None, dataset_uuids=()):
+    """
+    Marks the totals of a model object or of some datasets stale when the current transaction is committed,
+    or immediately if not in a transaction (see PendingStaleTotals)
+    :param instance: a model object or None
+    :param dataset_uuids: an iterable of dataset UUIDs or None for all datasets
+    """
+    connection = transaction.get_connection()
+    pending = None
+    if connection.in_atomic_block:
+        for sids, func, *rest in connection.run_on_commit:
+            if isinstance(func, PendingStaleTotals) and not func.done:
+                pending = func
+                break
+    if pending is None:
+        pending = PendingStaleTotals()
+        if connection.in_atomic_block:
+            transaction.on_commit(pending)
+    if instance is not None:
+        pending.add(instance)
+    pending.add_datasets(dataset_uuids)
+    if not connection.in_atomic_block:
+        pending()
+
+
+@receiver_with_multiple_senders([post_save, post_delete], [
+    Collection, CatalogueCollectionRelation, Lot, Item, Edition, Work, Language, ItemLanguageRelation,
+    ItemWorkRelation, PersonItemRelation, Publisher, PublicationPlace, Person, Place, Country
+])
+def mark_totals_stale(sender, instance, **kwargs):
+    mark_stale_on_commit(instance)
+
+
+@receiver(pre_save, sender=Catalogue)
+def remember_dataset_of_catalogue(sender, instance, **kwargs):
+    instance._old_dataset_id = sender.objects.filter(pk=instance.pk).values_list('dataset_id', flat=True).first() \
+        if not instance._state.adding else None
+
+
+@receiver_with_multiple_senders([post_save, post_delete], [Catalogue])
+def mark_totals_of_catalogue_stale(sender, instance, **kwargs):
+    # The collections of a catalogue that moves to another dataset move with it
+    old_dataset_id = getattr(instance, '_old_dataset_id', None)
+    if old_dataset_id != instance.dataset_id:
+        mark_stale_on_commit(dataset_uuids={old_dataset_id, instance.dataset_id} - {None})
+
+
+@receiver(m2m_changed, sender=Collection.catalogue.through)
+def mark_totals_stale_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        mark_stale_on_commit(dataset_uuids=[instance.dataset_id] if reverse else
+                             Catalogue.objects.filter(pk__in=pk_set).values_list('dataset_id', flat=True))
+    elif action == 'post_clear':
+        mark_stale_on_commit(dataset_uuids=[instance.dataset_id] if reverse else None)
@@ -0,0 +1,32 @@
+"""
+Jobs of the dashboard app (see jobs.tasks)
+"""
+from jobs.tasks import register_task
+
+REFRESH_TOTALS_TASK = 'refresh_totals'
+
+
+def enqueue_refresh_totals(datasets, collection=None):
+    """
+    Queues a job that refreshes the totals for a list of datasets and optionally a single collection,
+    unless one is queued already
+    :return: the queued job
+    """
+    from jobs.models import Job
+    arguments = {'datasets': sorted(str(dataset.pk) for dataset in datasets),
+                 'collection': str(collection.pk) if collection else None}
+    job = Job.objects.filter(task=REFRESH_TOTALS_TASK, state=Job.QUEUED, arguments=arguments)\
+        .order_by('created').first()
+    return job or Job.enqueue(REFRESH_TOTALS_TASK, arguments, description="Refresh the totals")
+
+
+@register_task(REFRESH_TOTALS_TASK)
+def run_refresh_totals(job, datasets, collection=None):
+    """
+    Refreshes the totals for a list of datasets and optionally a single collection (see dashboard.tools)
+    """
+    from catalogues.models import Dataset, Collection
+    from dashboard.tools import refresh_totals
+    totals = refresh_totals(list(Dataset.objects.filter(pk__in=datasets)),
+                            Collection.objects.get(pk=collection) if collection else None)
+    return {'stale': totals.stale}
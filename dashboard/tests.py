@@ -1,3 +1,191 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, RequestFactory
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
 
-# Create your tests here.
+from catalogues.models import Dataset, Catalogue, Collection, Lot
+from items.models import Item, Edition
+from dashboard import tools
+from dashboard.models import Totals, PendingStaleTotals
+from dashboard.tasks import REFRESH_TOTALS_TASK
+from dashboard.tools import get_totals, compute_dashboard_stats
+from jobs.models import Job
+from jobs.worker import Worker
+from dashboard.views import get_dashboard_stats
+
+from datetime import timedelta
+from unittest import mock
+
+
+class TotalsTests(TestCase):
+    def setUp(self):
+        # Totals are marked stale on commit, so run the pending marking before the tests
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dataset = Dataset.objects.create(name='name_test')
+            self.other_dataset = Dataset.objects.create(name='name_test_other')
+            catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+            self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+            self.collection.catalogue.add(catalogue)
+            self.lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1,
+                                          lot_as_listed_in_collection='lot 1')
+            self.edition = Edition.objects.create(year_start=1600)
+            Item.objects.create(short_title='item 1', lot=self.lot, catalogue=catalogue, edition=self.edition,
+                                index_in_lot=1)
+
+    def test_Totals_refresh(self):
+        totals = get_totals([self.dataset])
+        self.assertEqual(totals.book_items, 1)
+        self.assertEqual(totals.collections, 1)
+        other_totals = get_totals([self.other_dataset])
+        self.assertEqual(other_totals.book_items, 0)
+
+        # Adding an item marks only the totals of its dataset as stale
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(short_title='item 2', lot=self.lot, edition=self.edition, index_in_lot=2)
+        self.assertTrue(Totals.objects.get(key=totals.key).stale)
+        self.assertFalse(Totals.objects.get(key=other_totals.key).stale)
+
+        # Stale totals are shown until a job has refreshed them
+        self.assertEqual(get_totals([self.dataset]).book_items, 1)
+        get_totals([self.dataset])
+        self.assertEqual(Job.objects.filter(task=REFRESH_TOTALS_TASK).count(), 1)
+        Worker(name='test worker').run_next()
+        totals = get_totals([self.dataset])
+        self.assertEqual(totals.book_items, 2)
+        self.assertFalse(totals.stale)
+
+    def test_Totals_refresh_during_change(self):
+        totals = get_totals([self.dataset])
+        compute_totals = tools.compute_totals
+
+        def compute_totals_during_change(collections):
+            counters = compute_totals(collections)
+            with self.captureOnCommitCallbacks(execute=True):
+                Item.objects.create(short_title='item 2', lot=self.lot, edition=self.edition, index_in_lot=2)
+            return counters
+
+        with mock.patch('dashboard.tools.compute_totals', side_effect=compute_totals_during_change):
+            Totals.mark_stale()
+            totals = tools.refresh_totals([self.dataset])
+        # The counters do not include the change, so the totals stay stale
+        self.assertEqual(totals.book_items, 1)
+        self.assertTrue(totals.stale)
+        self.assertEqual(tools.refresh_totals([self.dataset]).book_items, 2)
+        self.assertFalse(Totals.objects.get(key=totals.key).stale)
+
+    def test_Totals_catalogue_change(self):
+        totals = get_totals([self.dataset])
+        other_totals = get_totals([self.other_dataset])
+        with self.captureOnCommitCallbacks(execute=True):
+            catalogue = Catalogue.objects.create(name='other', dataset=self.other_dataset)
+        Totals.objects.update(stale=False)
+
+        # Moving a collection to a catalogue of another dataset changes the totals of both datasets
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collection.catalogue.clear()
+            self.collection.catalogue.add(catalogue)
+        self.assertTrue(Totals.objects.get(key=totals.key).stale)
+        self.assertTrue(Totals.objects.get(key=other_totals.key).stale)
+
+        Totals.objects.update(stale=False)
+        catalogue.dataset = self.dataset
+        with self.captureOnCommitCallbacks(execute=True):
+            catalogue.save()
+        self.assertTrue(Totals.objects.get(key=totals.key).stale)
+        self.assertTrue(Totals.objects.get(key=other_totals.key).stale)
+
+    def test_Totals_stale_once_per_transaction(self):
+        totals = get_totals([self.dataset])
+        other_totals = get_totals([self.other_dataset])
+        with self.captureOnCommitCallbacks() as callbacks:
+            for index in range(2, 5):
+                Item.objects.create(short_title='item', lot=self.lot, edition=self.edition, index_in_lot=index)
+            self.lot.save()
+        self.assertFalse(Totals.objects.get(key=totals.key).stale)
+        pending = [callback for callback in callbacks if isinstance(callback, PendingStaleTotals)]
+        self.assertEqual(len(pending), 1)
+        with self.assertNumQueries(2):
+            pending[0]()
+        self.assertEqual(Totals.objects.get(key=totals.key).version, totals.version + 1)
+        self.assertFalse(Totals.objects.get(key=other_totals.key).stale)
+
+    def test_Totals_refresh_without_worker(self):
+        totals = get_totals([self.dataset])
+        Totals.mark_stale()
+        self.assertEqual(get_totals([self.dataset]).book_items, 1)
+        job = Job.objects.get(task=REFRESH_TOTALS_TASK)
+
+        # The totals are refreshed on request if no worker claimed the job in time
+        Item.objects.create(short_title='item 2', lot=self.lot, edition=self.edition, index_in_lot=2)
+        created = job.created - timedelta(seconds=settings.TOTALS_REFRESH_TIMEOUT + 1)
+        Job.objects.filter(pk=job.pk).update(created=created)
+        totals = get_totals([self.dataset])
+        self.assertEqual(totals.book_items, 2)
+        self.assertFalse(totals.stale)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.CANCELLED)
+
+    def test_Totals_rebuild(self):
+        call_command('rebuild_dashboard_totals', collections=True)
+        self.assertEqual(Totals.objects.count(), 3)
+        totals = Totals.objects.get(key=Totals.get_key([self.dataset.pk], self.collection.pk))
+        self.assertEqual(totals.book_items, 1)
+        self.assertEqual(totals.get_context()['percentage_item_person_relations'], 0)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+        collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        collection.catalogue.add(catalogue)
+        lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1,
+                                 lot_as_listed_in_collection='lot 1')
+        Lot.objects.create(collection=collection, number_in_collection=2, index_in_collection=2,
+                           lot_as_listed_in_collection='lot 2')
+        edition = Edition.objects.create(year_start=1600)
+        Edition.objects.create(year_start=1601)
+        for index in range(2):
+            Item.objects.create(short_title='item {}'.format(index), lot=lot, catalogue=catalogue, edition=edition,
+                                index_in_lot=index + 1)
+
+    def test_compute_dashboard_stats(self):
+        with self.assertNumQueries(4):
+            stats, timings = compute_dashboard_stats([self.dataset])
+        self.assertEqual(stats, {
+            'number_of_editions_without_items': 0,
+            'number_of_editions_gt_1_item': 1,
+            'number_of_items_without_editions': 0,
+            'number_of_items_without_lot': 0,
+            'number_of_lots_without_items': 1
+        })
+        self.assertEqual(set(timings), set(stats))
+
+    def test_compute_dashboard_stats_other_dataset(self):
+        # An edition with items in the collections of another dataset only counts for that dataset
+        other_dataset = Dataset.objects.create(name='other')
+        catalogue = Catalogue.objects.create(name='other', dataset=other_dataset)
+        collection = Collection.objects.create(short_title='other', year_of_publication=1666)
+        collection.catalogue.add(catalogue)
+        lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1)
+        edition = Edition.objects.create(year_start=1602)
+        for index in range(3):
+            Item.objects.create(short_title='other {}'.format(index), lot=lot, catalogue=catalogue, edition=edition,
+                                index_in_lot=index + 1)
+        stats, timings = compute_dashboard_stats([self.dataset])
+        self.assertEqual(stats['number_of_editions_gt_1_item'], 1)
+        stats, timings = compute_dashboard_stats([other_dataset])
+        self.assertEqual(stats['number_of_editions_gt_1_item'], 1)
+
+        # Editions without items are not counted for any dataset
+        self.assertEqual(stats['number_of_editions_without_items'], 0)
+
+    def test_get_dashboard_stats(self):
+        user = User.objects.create_superuser('test-user', 'example@example.com', 'test-user')
+        request = RequestFactory().get(reverse('get_dashboard_stats'))
+        request.user = user
+        request.session = {'datasets': [{'uuid': str(self.dataset.uuid)}]}
+        response = get_dashboard_stats(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.content.decode(), r"Lots without items: </span>\s*<span>1</span>")
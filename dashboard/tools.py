@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+import time
+from datetime import timedelta
+from django.db.models import Count, Q
+
+from items.models import Item, Edition, Work, Language, PersonItemRelation, ItemWorkRelation
+from catalogues.models import Collection, Lot
+from persons.models import Place, Person, Country
+from dashboard.models import Totals
+from dashboard.tasks import enqueue_refresh_totals
+
+
+def compute_totals(collections):
+    """
+    Computes the counters of the totals page for a list of collections
+    :param collections: a list of collections
+    :return: a dict with the counters
+    """
+    collections = list(collections)
+    uncountable_book_items_count = Item.objects.filter(lot__collection__in=collections,
+                                                       uncountable_book_items=True).count()
+    book_items = Item.objects.filter(lot__collection__in=collections, non_book=False).count() \
+                 + uncountable_book_items_count
+    non_book_items = Item.objects.filter(lot__collection__in=collections, non_book=True).count()
+    works = Work.objects.filter(items__item__lot__collection__in=collections).distinct().count()
+    persons = Person.objects.filter(personitemrelation__item__lot__collection__in=collections).distinct().count()
+    female_persons = Person.objects.filter(sex=Person.FEMALE,
+                                           personitemrelation__item__lot__collection__in=collections)\
+                                    .distinct().count()
+
+    cities_of_publication = list(Place.objects
+                                 .filter(publicationplace__edition__items__lot__collection__in=collections)
+                                 .distinct().values_list('uuid', flat=True))
+    cities_of_birth = list(Place.objects.filter(persons_born__personitemrelation__item__lot__collection__in=collections)
+                           .distinct().values_list('uuid', flat=True))
+    cities_of_death = list(Place.objects.filter(persons_died__personitemrelation__item__lot__collection__in=collections)
+                           .distinct().values_list('uuid', flat=True))
+    cities_list = list(set(cities_of_publication+cities_of_birth+cities_of_death))
+    countries = Country.objects.filter(place__in=cities_list).distinct().count()
+
+    languages = Language.objects\
+        .annotate(item_cnt=Count('items', filter=Q(items__item__lot__collection__in=collections,
+                                                   items__item__non_book=False)))\
+        .filter(item_cnt__gt=0).distinct().count()
+
+    return {
+        'collections': len({collection.pk for collection in collections}),
+        'book_items': book_items,
+        'uncountable_book_items_count': uncountable_book_items_count,
+        'non_book_items': non_book_items,
+        'works': works,
+        'persons': persons,
+        'female_persons': female_persons,
+        'countries': countries,
+        'cities': len(cities_list),
+        'languages': languages,
+        'item_person_relations': PersonItemRelation.objects.filter(item__lot__collection__in=collections,
+                                                                   item__non_book=False)
+                                                           .values('item').distinct().count(),
+        'item_work_relations': ItemWorkRelation.objects.filter(item__lot__collection__in=collections,
+                                                               item__non_book=False).distinct().count(),
+        'items_with_date': Item.objects.filter(lot__collection__in=collections, edition__year_start__isnull=False,
+                                               non_book=False).distinct().count(),
+        'items_with_place_of_publication': Item.objects.filter(lot__collection__in=collections,
+                                                               edition__publicationplace__place__isnull=False,
+                                                               non_book=False).distinct().count(),
+        'items_with_publisher': Item.objects.filter(edition__publisher__isnull=False).distinct().count(),
+        'persons_with_place_of_birth': Person.objects.filter(city_of_birth__isnull=False).distinct().count(),
+        'persons_with_place_of_death': Person.objects.filter(city_of_death__isnull=False).distinct().count(),
+        'books_with_language': Item.objects.filter(lot__collection__in=collections, languages__isnull=False,
+                                                   non_book=False).distinct().count(),
+        'books_with_parisian_category': Item.objects.filter(lot__collection__in=collections, non_book=False,
+                                                            parisian_category__isnull=False).distinct().count(),
+    }
+
+
+def refresh_totals(datasets, collection=None):
+    """
+    (Re)computes and stores the totals for a list of datasets and optionally a single collection.
+    The totals stay stale if they were marked stale again while they were computed, as the counters may not
+    include that change.
+    :param datasets: a list of datasets
+    :param collection: a collection or None
+    :return: the Totals object
+    """
+    collections = Collection.objects.filter(catalogue__dataset__in=datasets)
+    if collection:
+        collections = collections.filter(pk=collection.pk)
+    key = Totals.get_key([dataset.pk for dataset in datasets], collection.pk if collection else None)
+    # Store the totals before computing them, so that changes in the meantime mark them stale
+    with transaction.atomic():
+        totals, created = Totals.objects.get_or_create(key=key, defaults=dict(collection=collection, stale=True))
+        if created:
+            totals.datasets.set(datasets)
+    counters = compute_totals(collections)
+    if not Totals.objects.filter(key=key, version=totals.version)\
+            .update(stale=False, updated=timezone.now(), **counters):
+        Totals.objects.filter(key=key).update(updated=timezone.now(), **counters)
+    totals.refresh_from_db()
+    return totals
+
+
+def get_totals(datasets, collection=None):
+    """
+    Gets the stored totals for a list of datasets and optionally a single collection. Totals that do not exist
+    yet are computed, and stale totals are refreshed by a job (see dashboard.tasks). If no worker claimed that
+    job within settings.TOTALS_REFRESH_TIMEOUT seconds, e.g. because no run_jobs worker is running, the totals
+    are refreshed here instead.
+    :param datasets: a list of datasets
+    :param collection: a collection or None
+    :return: the Totals object
+    """
+    key = Totals.get_key([dataset.pk for dataset in datasets], collection.pk if collection else None)
+    totals = Totals.objects.filter(key=key).first()
+    if totals is None:
+        return refresh_totals(datasets, collection)
+    if totals.stale:
+        job = enqueue_refresh_totals(datasets, collection)
+        if job.created < timezone.now() - timedelta(seconds=settings.TOTALS_REFRESH_TIMEOUT) and job.cancel():
+            return refresh_totals(datasets, collection)
+    return totals
+
+
+def get_item_stats(datasets, collection_ids):
+    """
+    Counts the items without edition and the items without lot with one aggregate query
+    """
+    return Item.objects.filter(Q(lot__collection__in=collection_ids)
+                               | Q(lot__isnull=True, catalogue__dataset__in=datasets))\
+        .aggregate(number_of_items_without_editions=Count('pk', filter=Q(lot__isnull=False, edition__isnull=True)),
+                   number_of_items_without_lot=Count('pk', filter=Q(lot__isnull=True)))
+
+
+def get_edition_stats(datasets, collection_ids):
+    """
+    Counts the editions without any items and the editions with more than one item in the collections
+    with one grouped aggregate query.
+    Editions are scoped by the datasets through the items in their collections, so editions without items
+    in the collections are not counted.
+    """
+    return Edition.objects.filter(items__lot__collection__in=collection_ids)\
+        .annotate(number_of_items=Count('items', distinct=True))\
+        .aggregate(number_of_editions_without_items=Count('pk', filter=Q(number_of_items=0)),
+                   number_of_editions_gt_1_item=Count('pk', filter=Q(number_of_items__gt=1)))
+
+
+def get_lot_stats(datasets, collection_ids):
+    """
+    Counts the lots without items in the collections with one grouped aggregate query
+    """
+    return Lot.objects.filter(collection__in=collection_ids)\
+        .annotate(number_of_items=Count('item'))\
+        .aggregate(number_of_lots_without_items=Count('pk', filter=Q(number_of_items=0)))
+
+
+DASHBOARD_STATS = [get_item_stats, get_edition_stats, get_lot_stats]
+
+
+def compute_dashboard_stats(datasets):
+    """
+    Computes the data quality counters of the dashboard for a list of datasets
+    :param datasets: a list of datasets
+    :return: a dict with the counters and a dict with the time (in ms) it took to compute each counter;
+    counters that are computed by the same query share their timing
+    """
+    collection_ids = list(Collection.objects.filter(catalogue__dataset__in=datasets)
+                          .distinct().values_list('pk', flat=True))
+    stats = {}
+    timings = {}
+    for get_stats in DASHBOARD_STATS:
+        start = time.perf_counter()
+        counters = get_stats(datasets, collection_ids)
+        duration = round(1000 * (time.perf_counter() - start), 1)
+        for counter, value in counters.items():
+            stats[counter] = value or 0
+            timings[counter] = duration
+    return stats, timings
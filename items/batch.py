@@ -0,0 +1,271 @@
+"""
+Batch edits of the items selected in the item table.
+
+A batch edit loads the selected items with their datasets in one query and checks the permission to change each
+dataset once. Changes are written in chunks with bulk queries, so the number of queries depends on the number of
+chunks rather than on the number of items. Bulk queries do not send signals, so the batch edit does what the
+receivers would have done: it creates history records, updates the computed fields and the search index,
+invalidates the tagged cache, marks the dashboard totals as stale and reconciles the collection counters.
+
+The result per item is kept in a report: an ordered dict with the requested item IDs as keys.
+"""
+from collections import Counter, OrderedDict
+import uuid
+
+from django.contrib import messages
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import gettext as _
+
+from guardian.shortcuts import get_perms
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from catalogues.models import Dataset
+from mediate.cache import invalidate_instances
+from mediate.computed import recompute
+from search.index import reindex
+
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+DENIED = 'denied'
+NOT_FOUND = 'not found'
+
+# The item fields that the collection counters depend on
+COUNTED_FIELDS = {'non_book', 'uncountable_book_items'}
+
+
+def chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def bulk_create(model, objects, batch_size):
+    """
+    Creates objects with ignore_conflicts, with history records if the model has a history
+    """
+    if hasattr(model, 'history'):
+        bulk_create_with_history(objects, model, batch_size=batch_size, ignore_conflicts=True)
+    else:
+        model.objects.bulk_create(objects, batch_size=batch_size, ignore_conflicts=True)
+
+
+class ItemBatchEdit:
+    """
+    An edit of a batch of items on behalf of a user
+    """
+    def __init__(self, user, item_ids, batch_size=1000):
+        """
+        :param user: the user, who needs the change_dataset permission for the datasets of the items
+        :param item_ids: the IDs of the selected items
+        :param batch_size: the number of objects per query
+        """
+        from items.models import Item
+        self.batch_size = batch_size
+        self.report = OrderedDict((str(item_id), NOT_FOUND) for item_id in item_ids)
+        self.changed_fields = set()
+
+        valid_ids = []
+        for item_id in self.report:
+            try:
+                valid_ids.append(uuid.UUID(item_id))
+            except ValueError:
+                pass
+        rows = []
+        for ids in chunks(valid_ids, batch_size):
+            rows.extend(Item.objects.filter(uuid__in=ids)
+                        .values_list('uuid', 'short_title', 'edition_id', 'lot__collection_id', 'dataset_uuid'))
+
+        # Check the permission once per dataset
+        datasets = Dataset.objects.in_bulk({dataset_id for *values, dataset_id in rows if dataset_id})
+        permitted_dataset_ids = {dataset_id for dataset_id, dataset in datasets.items()
+                                 if 'change_dataset' in get_perms(user, dataset)}
+
+        self.titles = {}
+        self.edition_ids = {}
+        self.collection_ids = set()
+        self.dataset_ids = set()
+        for item_id, short_title, edition_id, collection_id, dataset_id in rows:
+            self.titles[item_id] = short_title
+            if dataset_id in permitted_dataset_ids:
+                self.report[str(item_id)] = UNCHANGED
+                self.edition_ids[item_id] = edition_id
+                self.collection_ids.add(collection_id)
+                self.dataset_ids.add(dataset_id)
+            else:
+                self.report[str(item_id)] = DENIED
+
+    @property
+    def item_ids(self):
+        """
+        The IDs of the items that the user is allowed to change
+        """
+        return list(self.edition_ids)
+
+    def set_changed(self, item_ids):
+        for item_id in item_ids:
+            self.report[str(item_id)] = CHANGED
+
+    def add_relations(self, model, **values):
+        """
+        Relates the items to objects, e.g. add_relations(ItemLanguageRelation, language=language)
+        :param model: a model with a foreign key named item
+        :param values: the other fields of the relations
+        :return: the created relations
+        """
+        return self._add_relations(model, 'item_id', {item_id: item_id for item_id in self.item_ids}, values)
+
+    def add_edition_relations(self, model, **values):
+        """
+        Relates the editions of the items to objects, e.g. add_edition_relations(Publisher, publisher=person)
+        :param model: a model with a foreign key named edition
+        :param values: the other fields of the relations
+        :return: the created relations
+        """
+        return self._add_relations(model, 'edition_id', self.edition_ids, values)
+
+    def add_tag(self, tag):
+        """
+        Tags the items
+        :return: the created tagged entities
+        """
+        from items.models import Item
+        from tagme.models import TaggedEntity
+        content_type = ContentType.objects.get_for_model(Item)
+        return self._add_relations(TaggedEntity, 'object_id', {item_id: item_id for item_id in self.item_ids},
+                                   {'tag': tag, 'content_type': content_type})
+
+    def _add_relations(self, model, field_name, targets, values):
+        """
+        Creates the missing relations of the targets of the items
+        :param field_name: the name of the field of the model that refers to the target
+        :param targets: a dict with the target ID per item ID
+        """
+        created = []
+        for item_ids in chunks(targets, self.batch_size):
+            target_ids = {targets[item_id] for item_id in item_ids}
+            existing = set(model.objects.filter(**{field_name + '__in': target_ids}, **values)
+                           .values_list(field_name, flat=True))
+            new_target_ids = target_ids - existing
+            relations = [model(**{field_name: target_id}, **values) for target_id in new_target_ids]
+            bulk_create(model, relations, self.batch_size)
+            self.set_changed(item_id for item_id in item_ids if targets[item_id] in new_target_ids)
+            created.extend(relations)
+        if created:
+            # Recompute the fields depending on the relations (e.g. Person.weight)
+            recompute(model, [relation.pk for relation in created], batch_size=self.batch_size)
+            invalidate_instances(created)
+        return created
+
+    def remove_edition_relations(self, model, keep=None):
+        """
+        Deletes the relations of the editions of the items
+        :param model: a model with a foreign key named edition
+        :param keep: a Q object for the relations to keep
+        :return: the number of deleted relations
+        """
+        deleted = 0
+        for item_ids in chunks(self.item_ids, self.batch_size):
+            relations = model.objects.filter(edition_id__in={self.edition_ids[item_id] for item_id in item_ids})
+            if keep is not None:
+                relations = relations.exclude(keep)
+            removed = dict(relations.values_list('pk', 'edition_id'))
+            if removed:
+                model.objects.filter(pk__in=list(removed)).delete()
+                edition_ids = set(removed.values())
+                self.set_changed(item_id for item_id in item_ids if self.edition_ids[item_id] in edition_ids)
+                deleted += len(removed)
+        return deleted
+
+    def add_item_type(self, item_type):
+        """
+        Adds a type to the items; items with a non-book type are non-book items without languages
+        :return: the created relations
+        """
+        from items.models import ItemItemTypeRelation, ItemLanguageRelation
+        relations = self.add_relations(ItemItemTypeRelation, type=item_type)
+        if item_type.non_book and relations:
+            item_ids = [relation.item_id for relation in relations]
+            self.set_item_fields(item_ids=item_ids, non_book=True)
+            for ids in chunks(item_ids, self.batch_size):
+                ItemLanguageRelation.objects.filter(item_id__in=ids).delete()
+        return relations
+
+    def update_items(self, fields, update, item_ids=None):
+        """
+        Changes fields of the items
+        :param fields: the names of the fields that may be changed
+        :param update: a function that changes an item in place
+        :param item_ids: the IDs of the items to change, if not all items
+        :return: the changed items
+        """
+        from items.models import Item
+        attnames = [Item._meta.get_field(field).attname for field in fields]
+        permitted_ids = self.item_ids if item_ids is None else [item_id for item_id in item_ids
+                                                                if item_id in self.edition_ids]
+        changed = []
+        for item_ids in chunks(permitted_ids, self.batch_size):
+            changed_items = []
+            # All fields are loaded, as the history records include them
+            for item in Item.objects.filter(uuid__in=item_ids):
+                original = [getattr(item, attname) for attname in attnames]
+                update(item)
+                if [getattr(item, attname) for attname in attnames] != original:
+                    changed_items.append(item)
+            if changed_items:
+                bulk_update_with_history(changed_items, Item, fields, batch_size=self.batch_size)
+                recompute(Item, [item.pk for item in changed_items], fields, batch_size=self.batch_size)
+                reindex(Item, [item.pk for item in changed_items], fields, batch_size=self.batch_size)
+                self.set_changed(item.pk for item in changed_items)
+                changed.extend(changed_items)
+        if changed:
+            self.changed_fields.update(fields)
+            invalidate_instances(changed)
+        return changed
+
+    def set_item_fields(self, item_ids=None, **values):
+        """
+        Sets fields of the items to the same values, e.g. set_item_fields(book_format=book_format)
+        :param item_ids: the IDs of the items to change, if not all items
+        :return: the changed items
+        """
+        def update(item):
+            for field, value in values.items():
+                setattr(item, field, value)
+        return self.update_items(list(values), update, item_ids)
+
+    def finish(self):
+        """
+        Updates what depends on the changes of the batch edit as a whole
+        """
+        from catalogues.tools import reconcile_counters
+        from dashboard.models import Totals
+        if CHANGED not in self.report.values():
+            return
+        if self.changed_fields & COUNTED_FIELDS:
+            reconcile_counters(self.collection_ids)
+        Totals.mark_stale(self.dataset_ids)
+
+    def get_summary(self):
+        """
+        Gets the number of items per result
+        """
+        return Counter(self.report.values())
+
+    def add_messages(self, request, description):
+        """
+        Reports the results as messages
+        :param description: a description of the edit, e.g. "adding a language"
+        """
+        summary = self.get_summary()
+        if summary[CHANGED] or summary[UNCHANGED]:
+            messages.add_message(request, messages.SUCCESS,
+                                 _("{} items changed, {} items were already up to date.")
+                                 .format(summary[CHANGED], summary[UNCHANGED]))
+        denied = [self.titles[uuid.UUID(item_id)] for item_id, result in self.report.items() if result == DENIED]
+        if denied:
+            messages.add_message(request, messages.ERROR,
+                                 _("Items {} could not be used for {} because you are not allowed to change the "
+                                   "dataset.").format(", ".join(str(title) for title in denied), description))
+        if summary[NOT_FOUND]:
+            messages.add_message(request, messages.WARNING,
+                                 _("{} selected items were not found.").format(summary[NOT_FOUND]))
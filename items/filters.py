@@ -9,6 +9,7 @@ from persons.models import Country, Profession, Religion
 from catalogues.models import Collection, ParisianCategory, PersonCollectionRelation
 from catalogues.views.views import get_collections_for_session
 from mediate.tools import filter_multiple_words
+from search.index import ITEM_INDEX, LOT_INDEX
 from mediate.filters import QBasedFilterset, RangeFilterQ, MultipleChoiceFilterQWithExtraLookups, \
     ModelMultipleChoiceFilterQ
 
@@ -124,7 +125,8 @@ class ItemTagRankingFilter(QBasedFilterset):
 # Item filter
 class ItemFilter(django_filters.FilterSet):
     short_title = django_filters.Filter(lookup_expr='icontains', method='multiple_words_filter')
-    lot = django_filters.Filter(field_name='lot__lot_as_listed_in_collection', lookup_expr='icontains')
+    lot = django_filters.Filter(field_name='lot__lot_as_listed_in_collection', lookup_expr='icontains',
+                                method='lot_filter')
     number_of_volumes = django_filters.Filter(lookup_expr='icontains')
     book_format = django_filters.ModelMultipleChoiceFilter(
         queryset=BookFormat.objects.all(),
@@ -450,7 +452,11 @@ class ItemFilter(django_filters.FilterSet):
         return queryset
 
     def multiple_words_filter(self, queryset, name, value):
-        return filter_multiple_words(self.filters[name].lookup_expr, queryset, name, value, wildcards=True)
+        return ITEM_INDEX.filter(queryset, name, value, self.filters[name].lookup_expr, multiple_words=True,
+                                 wildcards=True)
+
+    def lot_filter(self, queryset, name, value):
+        return LOT_INDEX.filter(queryset, name, value, self.filters['lot'].lookup_expr)
 
     def material_details_filter(self, queryset, name, value):
         if value:
@@ -3,6 +3,9 @@ from django import forms
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext_lazy as _
 from django_select2.forms import Select2Widget, ModelSelect2Widget, ModelSelect2MultipleWidget
+from search.widgets import PersonSelect2Widget, PersonSelect2MultipleWidget, PlaceSelect2Widget, \
+    PlaceSelect2MultipleWidget, WorkSelect2Widget, WorkSelect2MultipleWidget
+from search.autocomplete import ITEM_AUTOCOMPLETE
 from .models import *
 from catalogues.models import Category, ParisianCategory
 from catalogues.views.views import get_collections_for_session
@@ -77,9 +80,8 @@ class ItemModelForm(forms.ModelForm):
 
     def add_publishers_field(self):
         publishers = forms.ModelMultipleChoiceField(
-            widget=ModelSelect2MultipleWidget(
+            widget=PersonSelect2MultipleWidget(
                 model=Person,
-                search_fields=['short_name__icontains', 'first_names__icontains', 'surname__icontains'],
             ),
             queryset=Person.objects.all(),
             required=False,
@@ -222,7 +224,9 @@ class ItemSuggest(autocomplete.Select2QuerySetView):
         qs = Item.objects.filter(lot__collection__in=get_collections_for_session(self.request))
 
         if self.q:
-            qs = qs.filter(short_title__icontains=self.q)
+            # Already scoped to the collections of the session
+            filtered = ITEM_AUTOCOMPLETE.filter(qs, self.q)
+            qs = filtered if filtered is not None else qs.filter(short_title__icontains=self.q)
 
         return qs
 
@@ -232,9 +236,8 @@ class ItemAuthorModelForm(forms.ModelForm):
         model = ItemAuthor
         fields = "__all__"
         widgets = {
-            'author': ModelSelect2Widget(
+            'author': PersonSelect2Widget(
                 queryset=Person.objects.all(),
-                search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
             )
         }
 
@@ -332,9 +335,8 @@ class ItemWorkRelationModelForm(forms.ModelForm):
         model = ItemWorkRelation
         fields = "__all__"
         widgets = {
-            'work': ModelSelect2Widget(
+            'work': WorkSelect2Widget(
                 model=Work,
-                search_fields=['title__icontains']
             )
         }
 
@@ -380,9 +382,8 @@ class PersonItemRelationModelForm(forms.ModelForm):
         model = PersonItemRelation
         fields = ['item', 'person', 'role', 'notes']
         widgets = {
-            'person': ModelSelect2Widget(
+            'person': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains']
             ),
             'role': ModelSelect2Widget(
                 model=PersonItemRelationRole,
@@ -441,9 +442,8 @@ class EditionPlaceForm(forms.ModelForm):
         model = Edition
         fields = ['place']
         widgets = {
-            'place': ModelSelect2Widget(
+            'place': PlaceSelect2Widget(
                 model=Place,
-                search_fields=['name__icontains']
             )
         }
 
@@ -501,9 +501,8 @@ class ItemWorksForm(forms.ModelForm):
         model = ItemWorkRelation
         fields = ['work']
         widgets = {
-            'work': ModelSelect2MultipleWidget(
-                model=Work,
-                search_fields=['title__icontains']
+            'work': WorkSelect2MultipleWidget(
+                model=Work
             )
         }
 
@@ -537,9 +536,8 @@ class PublisherForm(forms.ModelForm):
         model = Publisher
         fields = ['publisher']
         widgets = {
-            'publisher': ModelSelect2Widget(
+            'publisher': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
             )
         }
 
@@ -558,9 +556,8 @@ class EditionPlacesForm(forms.Form):
     def add_publicationplaces_field(self):
         publication_places = forms.ModelMultipleChoiceField(
             label=_("Real places of publication"),
-            widget=ModelSelect2MultipleWidget(
+            widget=PlaceSelect2MultipleWidget(
                 model=Place,
-                search_fields=['name__icontains']
             ),
             queryset=Place.objects.all(),
             required=False,
@@ -573,9 +570,8 @@ class EditionModelForm(forms.ModelForm):
         model = Edition
         fields = "__all__"
         widgets = {
-            'place': ModelSelect2Widget(
+            'place': PlaceSelect2Widget(
                 model=Place,
-                search_fields=['name__icontains']
             ),
         }
         labels = {'place': _("Stated place of publication")}
@@ -587,9 +583,8 @@ class EditionModelForm(forms.ModelForm):
     def add_publicationplaces_field(self):
         publication_places = forms.ModelMultipleChoiceField(
             label=_("Real places of publication"),
-            widget=ModelSelect2MultipleWidget(
+            widget=PlaceSelect2MultipleWidget(
                 model=Place,
-                search_fields=['name__icontains']
             ),
             queryset=Place.objects.all(),
             required=False,
@@ -624,9 +619,8 @@ class PublisherModelForm(forms.ModelForm):
         model = Publisher
         fields = "__all__"
         widgets = {
-            'publisher': ModelSelect2Widget(
+            'publisher': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains']
             ),
             'edition': ModelSelect2Widget(
                 model=Edition,
@@ -654,13 +648,11 @@ class WorkAuthorModelForm(forms.ModelForm):
         model = WorkAuthor
         fields = "__all__"
         widgets = {
-            'author': ModelSelect2Widget(
+            'author': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains']
             ),
-            'work': ModelSelect2Widget(
+            'work': WorkSelect2Widget(
                 model=Work,
-                search_fields=['title__icontains']
             ),
         }
 
@@ -14,6 +14,7 @@ import uuid
 from persons.models import Place, Person
 from catalogues.models import Catalogue, Lot, ParisianCategory
 from tagme.models import TaggedEntity
+from mediate.computed import defer_update
 
 from simplemoderation.tools import moderated
 
@@ -193,23 +194,16 @@ class Item(ComputedFieldsModel):
                     _("The catalogue of this item and the catalogue of the collection of this item, are not the same.")
                                    })
 
-    def determine_non_book(self):
-        original_non_book = self.non_book
-        if ItemItemTypeRelation.objects.filter(item=self):
-            if ItemItemTypeRelation.objects.filter(item=self).exclude(type__non_book=False):
-                self.non_book = True
-            else:
-                self.non_book = False
-        else:
-            self.non_book = False
-
-        # Return whether non_book is changed
-        return not original_non_book == self.non_book
-
     @precomputed
     def save(self, *args, **kwargs):
-        self.determine_non_book()
+        adding = self._state.adding
+        if adding:
+            # A new item has no types yet
+            self.non_book = False
         super().save(*args, **kwargs)
+        if not adding:
+            # Correct non_book in case this instance is outdated, see update_non_book
+            defer_update(update_non_book_for_items, [self.pk])
 
         # A non-book item cannot have a language
         if self.non_book:
@@ -254,29 +248,93 @@ class ItemItemTypeRelation(models.Model):
         unique_together = (('item', 'type'),)
 
 
+def update_non_book(items):
+    """
+    Derives non_book from the types of items: an item is a non-book item if it has a non-book type.
+    The changed items are found with one query and updated with one UPDATE statement; then their counters,
+    languages, history and cache are updated.
+    :param items: an Item queryset
+    :return: the number of changed items
+    """
+    from django.db.models import Exists, OuterRef, Q
+    from catalogues.tools import update_counters
+    from dashboard.models import Totals
+    from mediate.cache import invalidate_instances
+    from mediate.history import HistoryWriter
+
+    non_book = Exists(ItemItemTypeRelation.objects.filter(item=OuterRef('pk'), type__non_book=True))
+    changed = list(items.order_by().filter((Q(non_book=True) & ~non_book) | (Q(non_book=False) & non_book))
+                   .values_list('pk', 'lot__collection_id', 'non_book').distinct())
+    if not changed:
+        return 0
+    changed_ids = [item_id for item_id, collection_id, was_non_book in changed]
+    Item.objects.filter(pk__in=changed_ids).update(non_book=non_book)
+
+    deltas = {}
+    for item_id, collection_id, was_non_book in changed:
+        deltas[collection_id] = deltas.get(collection_id, 0) + (-1 if was_non_book else 1)
+    for collection_id, delta in deltas.items():
+        update_counters(collection_id, {'number_of_non_book_items': delta})
+
+    # A non-book item cannot have a language
+    ItemLanguageRelation.objects.filter(
+        item_id__in=[item_id for item_id, collection_id, was_non_book in changed if not was_non_book]).delete()
+
+    objs = list(Item.objects.filter(pk__in=changed_ids))
+    with HistoryWriter() as history:
+        history.add(objs)
+    invalidate_instances(objs)
+    # The update does not send signals
+    Totals.mark_stale({obj.dataset_uuid for obj in objs if obj.dataset_uuid})
+    return len(changed)
+
+
+def update_non_book_for_items(item_ids):
+    """
+    Derives non_book for items by their IDs, see update_non_book
+    """
+    from mediate.ingest import chunks
+    return sum(update_non_book(Item.objects.filter(pk__in=ids)) for ids in chunks(item_ids, 1000))
+
+
+def update_non_book_for_types(type_ids):
+    """
+    Derives non_book for the items of item types, see update_non_book
+    """
+    return update_non_book(Item.objects.filter(itemitemtyperelation__type__in=type_ids))
+
+
 @receiver(models.signals.post_save, sender=ItemItemTypeRelation)
 @receiver(models.signals.post_delete, sender=ItemItemTypeRelation)
-def set_item_non_book(sender, instance, **kwargs):
+def set_item_non_book(sender, instance, raw=False, **kwargs):
     """
-    Triggers and propagates the non-book check. 
-    :param sender: 
-    :param instance: 
-    :param kwargs: 
-    :return: 
+    Updates non_book of the item of a relation, once per transaction if deferred (see mediate.computed)
     """
-    item = instance.item
-    changed = item.determine_non_book()
-    if changed:
-        item.save()
+    origin = kwargs.get('origin')
+    if raw or isinstance(origin, ItemType) or (isinstance(origin, Item) and origin.pk == instance.item_id):
+        # The relation is deleted because the type or the item is deleted
+        return
+    defer_update(update_non_book_for_items, [instance.item_id])
 
 
 @receiver(models.signals.post_save, sender=ItemType)
+def set_item_non_book_for_type(sender, instance, created, raw=False, **kwargs):
+    """
+    Updates non_book of the items of a type, once per transaction if deferred (see mediate.computed)
+    """
+    if not created and not raw:
+        defer_update(update_non_book_for_types, [instance.pk])
+
+
+@receiver(models.signals.pre_delete, sender=ItemType)
+def remember_items_of_type(sender, instance, **kwargs):
+    instance._item_ids = list(Item.objects.filter(itemitemtyperelation__type=instance).values_list('pk', flat=True))
+
+
 @receiver(models.signals.post_delete, sender=ItemType)
-def set_item_non_book_for_type(sender, instance, **kwargs):
-    for item in Item.objects.filter(itemitemtyperelation__type=instance):
-        changed = item.determine_non_book()
-        if changed:
-            item.save()
+def set_item_non_book_for_deleted_type(sender, instance, **kwargs):
+    if getattr(instance, '_item_ids', None):
+        defer_update(update_non_book_for_items, instance._item_ids)
 
 
 class ItemAuthor(models.Model):
@@ -355,7 +413,7 @@ class Edition(models.Model):
         str_elements = []
         if self.place:
             str_elements.append("{}".format(self.place.name))
-        publishers = [publisher.publisher.short_name for publisher in Publisher.objects.filter(edition=self)
+        publishers = [publisher.publisher.short_name for publisher in self.publisher_set.all()
                       if publisher.publisher.short_name]
         if publishers:
             str_elements += publishers
@@ -449,10 +507,10 @@ class PersonItemRelation(models.Model):
 from .history import *
 
 
-# Clear cache when a model object is saved
+# Invalidate the cache tags of a model object when it is saved or deleted
 from django.db.models.signals import post_save, post_delete
 from mediate.tools import receiver_with_multiple_senders
-from django.core.cache import cache
+from mediate.cache import invalidate_instance
 
 
 @receiver_with_multiple_senders([post_save, post_delete],[
@@ -460,5 +518,48 @@ from django.core.cache import cache
     ItemAuthor, ItemLanguageRelation, ItemWorkRelation, ItemMaterialDetailsRelation, Edition, Publisher,
     PersonItemRelationRole, PersonItemRelation
 ])
-def clear_cache(sender, instance, **kwargs):
-    cache.clear()
\ No newline at end of file
+def invalidate_cache(sender, instance, using=None, **kwargs):
+    invalidate_instance(instance, using=using)
+
+# Keep the counters of collections and catalogues up to date when items are saved or deleted
+from django.db.models.signals import pre_save, pre_delete
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_counters(sender, instance, using=None, raw=False, **kwargs):
+    instance._counted = None
+    if raw or instance._state.adding:
+        return
+    instance._counted = Item.objects.using(using).filter(pk=instance.pk)\
+        .values_list('lot__collection_id', 'non_book', 'uncountable_book_items').first()
+
+
+@receiver(post_save, sender=Item)
+def update_counters_on_item_save(sender, instance, created, using=None, raw=False, **kwargs):
+    from catalogues.tools import update_counters, get_single_item_counters
+    if raw:
+        return
+    old = getattr(instance, '_counted', None)
+    collection_id = instance.lot.collection_id if instance.lot_id else None
+    new = (collection_id, instance.non_book, instance.uncountable_book_items)
+    if old == new:
+        return
+    if old:
+        update_counters(old[0], get_single_item_counters(*old[1:]), sign=-1, using=using)
+    update_counters(new[0], get_single_item_counters(*new[1:]), using=using)
+    instance._counted = new
+
+
+@receiver(pre_delete, sender=Item)
+def count_deleted_item(sender, instance, using=None, **kwargs):
+    # The stored values, as the instance may be outdated
+    instance._counted = Item.objects.using(using).filter(pk=instance.pk)\
+        .values_list('lot__collection_id', 'non_book', 'uncountable_book_items').first()
+
+
+@receiver(post_delete, sender=Item)
+def update_counters_on_item_delete(sender, instance, using=None, **kwargs):
+    from catalogues.tools import update_counters, get_single_item_counters
+    counted = getattr(instance, '_counted', None)
+    if counted:
+        update_counters(counted[0], get_single_item_counters(*counted[1:]), sign=-1, using=using)
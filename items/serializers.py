@@ -1,110 +1,132 @@
 from .models import *
-from rest_framework import serializers
+from mediate.api import ApiSerializer, Expansion
 
 
-class BookFormatSerializer(serializers.HyperlinkedModelSerializer):
+class BookFormatSerializer(ApiSerializer):
     class Meta:
         model = BookFormat
         fields = "__all__"
 
 
-class ItemSerializer(serializers.HyperlinkedModelSerializer):
+class ItemSerializer(ApiSerializer):
+    expansions = {
+        'lot': Expansion('catalogues.serializers.LotSerializer', select_related=['lot']),
+        'collection': Expansion('catalogues.serializers.CollectionSerializer', source='lot.collection',
+                                select_related=['lot__collection'], prefetch_related=['lot__collection__catalogue']),
+        'edition': Expansion('items.serializers.EditionSerializer', select_related=['edition']),
+        'persons': Expansion('items.serializers.PersonItemRelationSerializer', source='personitemrelation_set',
+                             many=True, expand=['person', 'role'],
+                             prefetch_related=['personitemrelation_set__person', 'personitemrelation_set__role']),
+        'works': Expansion('items.serializers.ItemWorkRelationSerializer', many=True, expand=['work'],
+                           prefetch_related=['works__work']),
+    }
+
     class Meta:
         model = Item
         fields = "__all__"
 
 
-class ItemAuthorSerializer(serializers.HyperlinkedModelSerializer):
+class ItemAuthorSerializer(ApiSerializer):
     class Meta:
         model = ItemAuthor
         fields = "__all__"
 
 
-class ItemItemTypeRelationSerializer(serializers.HyperlinkedModelSerializer):
+class ItemItemTypeRelationSerializer(ApiSerializer):
     class Meta:
         model = ItemItemTypeRelation
         fields = "__all__"
 
 
-class ItemLanguageRelationSerializer(serializers.HyperlinkedModelSerializer):
+class ItemLanguageRelationSerializer(ApiSerializer):
     class Meta:
         model = ItemLanguageRelation
         fields = "__all__"
 
 
-class ItemMaterialDetailsRelationSerializer(serializers.HyperlinkedModelSerializer):
+class ItemMaterialDetailsRelationSerializer(ApiSerializer):
     class Meta:
         model = ItemMaterialDetailsRelation
         fields = "__all__"
 
 
-class ItemTypeSerializer(serializers.HyperlinkedModelSerializer):
+class ItemTypeSerializer(ApiSerializer):
     class Meta:
         model = ItemType
         fields = "__all__"
 
 
-class ItemWorkRelationSerializer(serializers.HyperlinkedModelSerializer):
+class ItemWorkRelationSerializer(ApiSerializer):
+    expansions = {
+        'work': Expansion('items.serializers.WorkSerializer', select_related=['work']),
+    }
+
     class Meta:
         model = ItemWorkRelation
         fields = "__all__"
 
 
-class LanguageSerializer(serializers.HyperlinkedModelSerializer):
+class LanguageSerializer(ApiSerializer):
     class Meta:
         model = Language
         fields = "__all__"
 
 
-class MaterialDetailsSerializer(serializers.HyperlinkedModelSerializer):
+class MaterialDetailsSerializer(ApiSerializer):
     class Meta:
         model = MaterialDetails
         fields = "__all__"
 
 
-class PersonItemRelationSerializer(serializers.HyperlinkedModelSerializer):
+class PersonItemRelationSerializer(ApiSerializer):
+    expansions = {
+        'person': Expansion('persons.serializers.PersonSerializer', select_related=['person']),
+        'role': Expansion('items.serializers.PersonItemRelationRoleSerializer', select_related=['role']),
+        'item': Expansion('items.serializers.ItemSerializer', select_related=['item']),
+    }
+
     class Meta:
         model = PersonItemRelation
         fields = "__all__"
 
 
-class PersonItemRelationRoleSerializer(serializers.HyperlinkedModelSerializer):
+class PersonItemRelationRoleSerializer(ApiSerializer):
     class Meta:
         model = PersonItemRelationRole
         fields = "__all__"
 
 
-class EditionSerializer(serializers.HyperlinkedModelSerializer):
+class EditionSerializer(ApiSerializer):
     class Meta:
         model = Edition
         fields = "__all__"
 
 
-class PublisherSerializer(serializers.HyperlinkedModelSerializer):
+class PublisherSerializer(ApiSerializer):
     class Meta:
         model = Publisher
         fields = "__all__"
 
 
-class SubjectSerializer(serializers.HyperlinkedModelSerializer):
+class SubjectSerializer(ApiSerializer):
     class Meta:
         model = Subject
         fields = "__all__"
 
 
-class WorkSerializer(serializers.HyperlinkedModelSerializer):
+class WorkSerializer(ApiSerializer):
     class Meta:
         model = Work
         fields = "__all__"
 
 
-class WorkAuthorSerializer(serializers.HyperlinkedModelSerializer):
+class WorkAuthorSerializer(ApiSerializer):
     class Meta:
         model = WorkAuthor
         fields = "__all__"
 
 
-class WorkSubjectSerializer(serializers.HyperlinkedModelSerializer):
+class WorkSubjectSerializer(ApiSerializer):
     class Meta:
         model = WorkSubject
         fields = "__all__"
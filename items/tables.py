@@ -1,4 +1,4 @@
-from django.db.models import Count
+from django.db.models import Count, Prefetch
 import django_tables2 as tables
 from django_tables2.utils import A  # alias for Accessor
 from django.utils.html import format_html
@@ -7,7 +7,9 @@ from django.utils.safestring import mark_safe
 import itertools
 
 from .models import *
-from tagme.models import Tag
+from tagme.models import Tag, TaggedEntity
+from catalogues.models import Dataset
+from guardian.shortcuts import get_objects_for_user
 
 from mediate.columns import ActionColumn, render_action_column, AddInfoLinkMixin
 from mediate.tools import UUIDRenderMixin
@@ -26,8 +28,79 @@ class BookFormatTable(UUIDRenderMixin, tables.Table):
         ]
 
 
+class ItemRelationsMixin:
+    """
+    Mixin for Item tables that loads all related objects needed by the render_XX and value_XX methods in bulk.
+    The related objects are fetched with select_related and prefetch_related. Because django-tables2 slices the
+    queryset per page, the prefetch queries only cover the records on the current page, and the number of queries
+    per page does not depend on the number of rows.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.data.data = self.data.data.select_related(
+            'lot',
+            'lot__collection',
+            'catalogue',
+            'book_format',
+            'edition',
+            'edition__place',
+            'parisian_category',
+        ).prefetch_related(
+            Prefetch('personitemrelation_set',
+                     queryset=PersonItemRelation.objects.select_related('person', 'role')),
+            Prefetch('works', queryset=ItemWorkRelation.objects.select_related('work')),
+            Prefetch('languages', queryset=ItemLanguageRelation.objects.select_related('language')),
+            Prefetch('itemmaterialdetailsrelation_set',
+                     queryset=ItemMaterialDetailsRelation.objects.select_related('material_details')),
+            Prefetch('itemitemtyperelation_set', queryset=ItemItemTypeRelation.objects.select_related('type')),
+            Prefetch('edition__publisher_set', queryset=Publisher.objects.select_related('publisher')),
+            Prefetch('edition__publicationplace_set', queryset=PublicationPlace.objects.select_related('place')),
+            Prefetch('tags', queryset=TaggedEntity.objects.select_related('tag')),
+        )
+
+    @staticmethod
+    def get_person_item_relations_per_role(record):
+        """
+        Groups the (prefetched) person-item relations of an item by role
+        :param record: an Item
+        :return: a dict with roles as keys and lists of relations as values
+        """
+        relations_per_role = {}
+        for relation in record.personitemrelation_set.all():
+            relations_per_role.setdefault(relation.role, []).append(relation)
+        return relations_per_role
+
+    def has_change_dataset_perm(self, dataset_uuid):
+        """
+        Checks whether the user may change the given dataset, either globally or per object.
+        The permitted datasets are retrieved once per table instead of once per row.
+        """
+        if not hasattr(self, 'changeable_dataset_uuids'):
+            self.changeable_dataset_uuids = set(
+                get_objects_for_user(self.request.user, 'catalogues.change_dataset', klass=Dataset,
+                                     accept_global_perms=True).values_list('uuid', flat=True)
+            )
+        return dataset_uuid in self.changeable_dataset_uuids
+
+    def render_material_details(self, record):
+        return ", ".join([relation.material_details.description
+                          for relation in record.itemmaterialdetailsrelation_set.all()])
+
+    def value_people(self, record):
+        relation_groups = []
+        for role, role_relations in self.get_person_item_relations_per_role(record).items():
+            persons = [relation.person.short_name for relation in role_relations]
+            relation_groups.append(
+                role.name.capitalize() + ": " + ", ".join(persons)
+            )
+        return "\n".join(relation_groups)
+
+    def value_works(self, record):
+        return " | ".join([relation.work.title for relation in record.works.all()])
+
+
 # Item table
-class ItemTable(AddInfoLinkMixin, tables.Table):
+class ItemTable(ItemRelationsMixin, AddInfoLinkMixin, tables.Table):
     uuid = tables.Column(empty_values=(), verbose_name="", orderable=False)
     checkbox = tables.CheckBoxColumn(empty_values=(), orderable=False,
                                      attrs={'th__input': {'id': 'checkbox_column', 'title': 'Select/deselect all'}})
@@ -77,22 +150,9 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.add_info_link("parisian_category", 'parisiancategories')
-        self.data.data = self.data.data.prefetch_related(
-            'lot',
-            'lot__collection',
-            'lot__collection__catalogue__dataset',
-            'personitemrelation_set__role',
-            'book_format',
-            'works',
-            'works__work',
-            'edition',
-            'parisian_category',
-            'tags',
-        )
 
     def render_uuid(self, record, value):
-        change_dataset_perm = self.request.user.has_perm('catalogues.change_dataset',
-                                                         record.lot.collection.catalogue.first().dataset)
+        change_dataset_perm = self.has_change_dataset_perm(record.dataset_uuid)
 
         url_name_change = 'change_item' if change_dataset_perm else None
         url_name_delete = 'delete_item' if change_dataset_perm else None
@@ -115,10 +175,8 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
         )
 
     def render_people(self, record):
-        person_item_relations = record.personitemrelation_set.all() #
         relation_groups = []
-        for role in set([relation.role for relation in person_item_relations]):
-            role_relations = person_item_relations.filter(role=role)
+        for role, role_relations in self.get_person_item_relations_per_role(record).items():
             persons = []
             for relation in role_relations:
                 person = relation.person
@@ -162,22 +220,19 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
     def render_number_of_volumes(self, record):
         return record.number_of_volumes or format_html("&mdash;")
 
-    def render_material_details(self, record):
-        return ", ".join(MaterialDetails.objects.filter(items__item=record).values_list('description', flat=True))
-
     def render_edition(self, record):
         year = record.edition.get_year_range_str()
         year_str = year if year else ""
         publishers_str = ", ".join(
-            Person.objects.filter(publisher__edition=record.edition_id).values_list('short_name', flat=True)
+            [publisher.publisher.short_name for publisher in record.edition.publisher_set.all()]
         )
         places_str = ", ".join(
-            Place.objects.filter(publicationplace__edition=record.edition_id).values_list('name', flat=True)
+            [publication_place.place.name for publication_place in record.edition.publicationplace_set.all()]
         )
         return f'{places_str}{": " if places_str else ""}{publishers_str}{", " if publishers_str and year_str else ""}{year_str}'
 
     def render_languages(self, record):
-        language_names = [format_html(language.name) for language in Language.objects.filter(items__item=record)]
+        language_names = [format_html(relation.language.name) for relation in record.languages.all()]
         return format_html(
             '<div class="col-xs-11 expandable-cell collapsed-cell">{}</div>'
             '<div class="col-xs-1">'
@@ -194,7 +249,7 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
             return ""
 
     def render_item_type(self, record):
-        return ", ".join(ItemType.objects.filter(itemitemtyperelation__item=record).values_list('name', flat=True))
+        return ", ".join([relation.type.name for relation in record.itemitemtyperelation_set.all()])
 
     def render_tags(self, record):
         return ", ".join([str(taggedentity.tag) for taggedentity in record.tags.all()])
@@ -203,32 +258,6 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
     def value_lot(self, record):
         return record.lot.lot_as_listed_in_collection
 
-    def value_people(self, record):
-        person_item_relations = PersonItemRelation.objects.filter(item=record)
-        relation_groups = []
-        for role in set([relation.role for relation in person_item_relations]):
-            role_relations = person_item_relations.filter(role=role)
-            persons = []
-            for relation in role_relations:
-                person = relation.person
-                name = person.short_name
-                person_entry = name
-                persons.append(person_entry)
-
-            relation_groups.append(
-                role.name.capitalize() + ": " + ", ".join(persons)
-            )
-        return "\n".join(relation_groups)
-
-    def value_works(self, record):
-        item_work_relations = ItemWorkRelation.objects.filter(item=record)
-        work_entries = []
-        for relation in item_work_relations:
-            work = relation.work
-            work_entry = work.title
-            work_entries.append(work_entry)
-        return " | ".join(work_entries)
-
     def value_collection(self, record):
         return str(record.lot.collection) or ""
 
@@ -240,7 +269,7 @@ class ItemTable(AddInfoLinkMixin, tables.Table):
 
 
 # Item table
-class TaggedItemTable(tables.Table):
+class TaggedItemTable(ItemRelationsMixin, tables.Table):
     people = tables.Column(empty_values=())
     works = tables.Column(empty_values=(), verbose_name=_("Works"))
     lot = tables.Column(order_by='lot__lot_as_listed_in_collection', )
@@ -268,10 +297,8 @@ class TaggedItemTable(tables.Table):
         ]
 
     def render_people(self, record):
-        person_item_relations = PersonItemRelation.objects.filter(item=record)
         relation_groups = []
-        for role in set([relation.role for relation in person_item_relations]):
-            role_relations = person_item_relations.filter(role=role)
+        for role, role_relations in self.get_person_item_relations_per_role(record).items():
             persons = []
             for relation in role_relations:
                 person = relation.person
@@ -288,7 +315,7 @@ class TaggedItemTable(tables.Table):
         return format_html("<br/> ".join(relation_groups))
 
     def render_works(self, record):
-        item_work_relations = ItemWorkRelation.objects.filter(item=record)
+        item_work_relations = record.works.all()
         work_entries = []
         for relation in item_work_relations:
             work = relation.work
@@ -308,39 +335,10 @@ class TaggedItemTable(tables.Table):
     def render_number_of_volumes(self, record):
         return record.number_of_volumes or format_html("&mdash;")
 
-    def render_material_details(self, record):
-        return ", ".join(MaterialDetails.objects.filter(items__item=record).values_list('description', flat=True))
-
     # All value_XX methods are for the table export
     def value_lot(self, record):
         return record.lot.lot_as_listed_in_collection
 
-    def value_people(self, record):
-        person_item_relations = PersonItemRelation.objects.filter(item=record)
-        relation_groups = []
-        for role in set([relation.role for relation in person_item_relations]):
-            role_relations = person_item_relations.filter(role=role)
-            persons = []
-            for relation in role_relations:
-                person = relation.person
-                name = person.short_name
-                person_entry = name
-                persons.append(person_entry)
-
-            relation_groups.append(
-                role.name.capitalize() + ": " + ", ".join(persons)
-            )
-        return "\n".join(relation_groups)
-
-    def value_works(self, record):
-        item_work_relations = ItemWorkRelation.objects.filter(item=record)
-        work_entries = []
-        for relation in item_work_relations:
-            work = relation.work
-            work_entry = work.title
-            work_entries.append(work_entry)
-        return " | ".join(work_entries)
-
     def value_collection(self, record):
         return str(record.lot.collection) or ""
 
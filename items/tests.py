@@ -1,10 +1,28 @@
 from django.test import TestCase
-from django.test import Client
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django_tables2.config import RequestConfig
+from guardian.shortcuts import assign_perm
+from cachalot.api import cachalot_disabled
 from mediate.tools_testing import GenericCRUDTestMixin
+from mediate.export import StreamingTableExport
 from catalogues.tests import LotTests
 from persons.tests import PersonTests
 
 from .models import *
+from .tables import ItemTable, TaggedItemTable
+from catalogues.models import Dataset, Catalogue, Collection
+from tagme.models import Tag, TaggedEntity
+from openpyxl import load_workbook
+
+import csv
+import io
+import json
+import os
+import tempfile
 
 
 class LanguageTests(GenericCRUDTestMixin, TestCase):
@@ -411,3 +429,296 @@ class PersonItemRelationTests(GenericCRUDTestMixin, TestCase):
         """TODO: add detail template"""
         pass
 
+
+class ItemTableQueryCountTests(TestCase):
+    """
+    The number of queries needed to render a page of the item table should not depend on the number of rows
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('test-user', 'example@example.com', 'test-user')
+        dataset, created = Dataset.objects.get_or_create(name='name_test')
+        assign_perm('catalogues.change_dataset', self.user, dataset)
+        catalogue = Catalogue.objects.create(name='name_test', dataset=dataset)
+        collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        collection.catalogue.add(catalogue)
+
+        place = Place.objects.create(name='name test')
+        person = Person.objects.create(short_name='short_name test', surname='surname test',
+                                       first_names='first_names test', sex='FEMALE')
+        role = PersonItemRelationRole.objects.create(name='author')
+        work = Work.objects.create(title='title test')
+        language = Language.objects.create(name='name test')
+        material_details = MaterialDetails.objects.create(description='description test')
+        item_type = ItemType.objects.create(name='name test', non_book=False)
+        tag = Tag.objects.create(namespace='item', name='name test')
+
+        for index in range(10):
+            lot = Lot.objects.create(collection=collection, number_in_collection=index, index_in_collection=index,
+                                     lot_as_listed_in_collection='lot {}'.format(index))
+            edition = Edition.objects.create(year_start=1600 + index)
+            Publisher.objects.create(publisher=person, edition=edition)
+            PublicationPlace.objects.create(edition=edition, place=place)
+            item = Item.objects.create(short_title='item {}'.format(index), lot=lot, catalogue=catalogue,
+                                       edition=edition, index_in_lot=1)
+            PersonItemRelation.objects.create(person=person, item=item, role=role)
+            ItemWorkRelation.objects.create(item=item, work=work)
+            ItemLanguageRelation.objects.create(item=item, language=language)
+            ItemMaterialDetailsRelation.objects.create(item=item, material_details=material_details)
+            ItemItemTypeRelation.objects.create(item=item, type=item_type)
+            TaggedEntity.objects.create(tag=tag, content_object=item)
+
+    def count_queries_for_page(self, table_class, per_page):
+        request = RequestFactory().get('/', {'per_page': per_page})
+        # A fresh user, as the permissions are cached on the user object
+        request.user = User.objects.get(pk=self.user.pk)
+        table = table_class(Item.objects.all())
+        RequestConfig(request).configure(table)
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            table.as_html(request)
+        return len(context.captured_queries)
+
+    def count_queries_for_export(self, table_class, number_of_items):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        table = table_class(Item.objects.filter(pk__in=Item.objects.order_by('pk')
+                                                .values_list('pk', flat=True)[:number_of_items]))
+        RequestConfig(request).configure(table)
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            rows = list(table.as_values())
+        self.assertEqual(len(rows), number_of_items + 1)
+        return len(context.captured_queries)
+
+    def test_ItemTable_query_count(self):
+        self.assertEqual(self.count_queries_for_page(ItemTable, 2), self.count_queries_for_page(ItemTable, 10))
+        self.assertEqual(self.count_queries_for_export(ItemTable, 2), self.count_queries_for_export(ItemTable, 10))
+
+    def test_TaggedItemTable_query_count(self):
+        self.assertEqual(self.count_queries_for_page(TaggedItemTable, 2),
+                         self.count_queries_for_page(TaggedItemTable, 10))
+        self.assertEqual(self.count_queries_for_export(TaggedItemTable, 2),
+                         self.count_queries_for_export(TaggedItemTable, 10))
+
+    def test_ItemTable_global_change_permission(self):
+        user = User.objects.create_user('global-user', 'global@example.com', 'global-user')
+        assign_perm('catalogues.change_dataset', user)
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=user.pk)
+        table = ItemTable(Item.objects.all())
+        RequestConfig(request).configure(table)
+        item = Item.objects.first()
+        self.assertTrue(table.has_change_dataset_perm(item.dataset_uuid))
+
+    def test_ItemTable_streaming_export(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        exclude_columns = ('uuid', 'manage_works', 'manage_persons', 'checkbox')
+        table = ItemTable(Item.objects.order_by('short_title'))
+        RequestConfig(request).configure(table)
+        expected_rows = list(table.as_values(exclude_columns=exclude_columns))
+
+        exporter = StreamingTableExport('csv', table, exclude_columns=exclude_columns, chunk_size=3)
+        self.assertEqual(list(exporter.get_rows()), expected_rows)
+        response = exporter.response('table.csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(list(csv.reader(io.StringIO(content))), [['' if value is None else str(value) for value in row]
+                                                                   for row in expected_rows])
+
+        response = StreamingTableExport('xlsx', table, exclude_columns=exclude_columns).response('table.xlsx')
+        worksheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(worksheet.max_row, len(expected_rows))
+
+    def test_export_collection_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'items.jsonl')
+            with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+                call_command('export_collection_data', 'items', all_collections=True, format='jsonl', output=path,
+                             stderr=io.StringIO())
+            with open(path) as file:
+                rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]['People VIAF'], "Author: short_name test")
+        self.assertEqual(rows[0]['Edition'], "name test: short_name test, 1600")
+        # One query for the collections, one for the items and one per prefetched relation
+        self.assertEqual(len(context.captured_queries), 10)
+
+
+class ItemBatchEditTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('test-user', 'example@example.com', 'test-user')
+        self.items = []
+        for name in ['permitted', 'other']:
+            dataset = Dataset.objects.create(name=name)
+            catalogue = Catalogue.objects.create(name=name, dataset=dataset)
+            self.collection = Collection.objects.create(short_title=name, year_of_publication=1666)
+            self.collection.catalogue.add(catalogue)
+            lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1,
+                                     lot_as_listed_in_collection='lot 1')
+            for index in range(12):
+                self.items.append(Item.objects.create(short_title='{} {}'.format(name, index), lot=lot,
+                                                      edition=Edition.objects.create(year_start=1600),
+                                                      index_in_lot=index + 1))
+            if name == 'permitted':
+                assign_perm('catalogues.change_dataset', self.user, dataset)
+                self.permitted_collection = self.collection
+        self.language = Language.objects.create(name='name test')
+
+    def add_language(self, items):
+        from items.batch import ItemBatchEdit
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            batch_edit = ItemBatchEdit(self.user, [item if isinstance(item, str) else str(item.pk) for item in items])
+            batch_edit.add_relations(ItemLanguageRelation, language=self.language)
+            batch_edit.finish()
+        return batch_edit, len(context.captured_queries)
+
+    def test_report(self):
+        from items.batch import CHANGED, UNCHANGED, DENIED, NOT_FOUND
+
+        ItemLanguageRelation.objects.create(item=self.items[0], language=self.language)
+        batch_edit, query_count = self.add_language([self.items[0], self.items[1], self.items[12]])
+        self.assertEqual(list(batch_edit.report.values()), [UNCHANGED, CHANGED, DENIED])
+        self.assertEqual(ItemLanguageRelation.objects.count(), 2)
+        self.assertEqual(ItemLanguageRelation.history.count(), 2)
+
+        batch_edit = self.add_language(['not an ID', self.items[1]])[0]
+        self.assertEqual(list(batch_edit.report.values()), [NOT_FOUND, UNCHANGED])
+
+    def test_query_count(self):
+        # The number of queries does not depend on the number of items
+        self.assertEqual(self.add_language(self.items[:2])[1], self.add_language(self.items[2:12])[1])
+
+    def test_add_type_to_items(self):
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from items.views.views import add_type_to_items
+
+        item_type = ItemType.objects.create(name='map', non_book=True)
+        ItemLanguageRelation.objects.create(item=self.items[0], language=self.language)
+        request = RequestFactory().post('/', {'entries': [str(item.pk) for item in self.items[:3]],
+                                              'type': [str(item_type.pk)]}, HTTP_REFERER='/')
+        request.user = self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        add_type_to_items(request)
+
+        self.assertEqual(ItemItemTypeRelation.objects.filter(type=item_type).count(), 3)
+        self.assertEqual(Item.objects.filter(non_book=True).count(), 3)
+        self.assertFalse(ItemLanguageRelation.objects.exists())
+        self.permitted_collection.refresh_from_db()
+        self.assertEqual(self.permitted_collection.number_of_non_book_items, 3)
+
+
+class ComputedFieldsTests(TestCase):
+    def setUp(self):
+        self.dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+        self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        self.collection.catalogue.add(catalogue)
+        self.lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1,
+                                      lot_as_listed_in_collection='lot ' + 'x' * 200)
+        self.person = Person.objects.create(short_name='short_name test', surname='surname test',
+                                            first_names='first_names test', date_of_birth='ca. 1620')
+        role = PersonItemRelationRole.objects.create(name='author')
+        for index in range(3):
+            item = Item.objects.create(short_title='item {}'.format(index), lot=self.lot, index_in_lot=index + 1,
+                                       edition=Edition.objects.create(year_start=1640 + index))
+            PersonItemRelation.objects.create(person=self.person, item=item, role=role)
+
+    def get_values(self):
+        from mediate.computed import ITEM_FIELDS, PERSON_FIELDS
+        return (list(Item.objects.order_by('index_in_lot').values_list(*ITEM_FIELDS)),
+                list(Person.objects.values_list(*PERSON_FIELDS)))
+
+    def test_deferred_computed_fields(self):
+        from mediate.computed import deferred_computed_fields
+        with deferred_computed_fields():
+            self.collection.year_of_publication = 1700
+            self.collection.save()
+            self.lot.index_in_collection = 2
+            self.lot.save()
+            self.assertEqual(Item.objects.filter(collection_year_of_publication=1666).count(), 3)
+        self.assertEqual(Item.objects.filter(collection_year_of_publication=1700, lot_index_in_collection=2).count(),
+                         3)
+
+        with deferred_computed_fields():
+            PersonItemRelation.objects.filter(item__edition__year_start=1640).delete()
+        self.assertEqual(Person.objects.get().earliest_edition_year, 1641)
+
+    def test_recompute_computed_fields(self):
+        expected = self.get_values()
+        self.assertEqual(expected[0][0][:4], (1666, 'short_title test', self.dataset.pk, 1))
+        self.assertEqual(len(expected[0][0][4]), 128)
+        self.assertEqual(expected[1][0][:3], (1620, None, 1640))
+
+        Item.objects.update(collection_year_of_publication=None, collection_short_title=None, dataset_uuid=None,
+                            lot_index_in_collection=None, lot_lot_as_listed_in_collection=None)
+        Person.objects.update(normalised_date_of_birth=None, earliest_edition_year=None, weight=12)
+        call_command('recompute_computed_fields', dataset='name_test', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(self.get_values(), expected)
+
+
+class NonBookTests(TestCase):
+    def setUp(self):
+        self.dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+        self.collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        self.collection.catalogue.add(catalogue)
+        lot = Lot.objects.create(collection=self.collection, number_in_collection=1, index_in_collection=1)
+        self.item_type = ItemType.objects.create(name='map', non_book=False)
+        self.language = Language.objects.create(name='name test')
+        self.items = []
+        for index in range(3):
+            item = Item.objects.create(short_title='item {}'.format(index), lot=lot, index_in_lot=index + 1,
+                                       edition=Edition.objects.create())
+            ItemItemTypeRelation.objects.create(item=item, type=self.item_type)
+            ItemLanguageRelation.objects.create(item=item, language=self.language)
+            self.items.append(item)
+
+    def test_non_book_for_type(self):
+        self.assertFalse(Item.objects.filter(non_book=True).exists())
+        self.item_type.non_book = True
+        with CaptureQueriesContext(connection) as context:
+            self.item_type.save()
+        updates = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE "items_item"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Item.objects.filter(non_book=True).count(), 3)
+        self.assertFalse(ItemLanguageRelation.objects.exists())
+        self.collection.refresh_from_db()
+        self.assertEqual(self.collection.number_of_non_book_items, 3)
+
+        self.item_type.delete()
+        self.assertFalse(Item.objects.filter(non_book=True).exists())
+        self.collection.refresh_from_db()
+        self.assertEqual(self.collection.number_of_non_book_items, 0)
+
+    def test_non_book_totals(self):
+        from dashboard.models import Totals
+        from dashboard.tools import get_totals, refresh_totals
+        ItemLanguageRelation.objects.all().delete()
+        totals = get_totals([self.dataset])
+        self.assertEqual((totals.book_items, totals.non_book_items), (3, 0))
+
+        self.item_type.non_book = True
+        self.item_type.save()
+        self.assertTrue(Totals.objects.get(key=totals.key).stale)
+        totals = refresh_totals([self.dataset])
+        self.assertEqual((totals.book_items, totals.non_book_items), (0, 3))
+
+    def test_non_book_for_relations(self):
+        from mediate.computed import deferred_computed_fields
+        non_book_type = ItemType.objects.create(name='print', non_book=True)
+        with deferred_computed_fields():
+            for item in self.items[:2]:
+                ItemItemTypeRelation.objects.create(item=item, type=non_book_type)
+            self.assertFalse(Item.objects.filter(non_book=True).exists())
+        self.assertEqual(Item.objects.filter(non_book=True).count(), 2)
+        self.assertEqual(ItemLanguageRelation.objects.count(), 1)
+
+        # Saving an outdated instance does not undo the change
+        self.items[0].save()
+        self.assertTrue(Item.objects.get(pk=self.items[0].pk).non_book)
+
+        ItemItemTypeRelation.objects.filter(type=non_book_type).first().delete()
+        self.assertEqual(Item.objects.filter(non_book=True).count(), 1)
+        self.collection.refresh_from_db()
+        self.assertEqual(self.collection.number_of_non_book_items, 1)
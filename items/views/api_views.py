@@ -1,110 +1,116 @@
-from rest_framework import viewsets
+from catalogues.models import Catalogue, Collection, Lot
+from mediate.api import ApiViewSet
 from ..serializers import *
 
 
-class BookFormatViewSet(viewsets.ModelViewSet):
+class BookFormatViewSet(ApiViewSet):
     queryset = BookFormat.objects.all()
     serializer_class = BookFormatSerializer
     http_method_names = ['get']
 
 
-class ItemViewSet(viewsets.ModelViewSet):
+class ItemViewSet(ApiViewSet):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     http_method_names = ['get']
+    dataset_field = 'dataset_uuid'
+    # The computed fields of items
+    etag_models = [Lot, Collection, Catalogue]
 
 
-class ItemAuthorViewSet(viewsets.ModelViewSet):
+class ItemAuthorViewSet(ApiViewSet):
     queryset = ItemAuthor.objects.all()
     serializer_class = ItemAuthorSerializer
     http_method_names = ['get']
 
 
-class ItemItemTypeRelationViewSet(viewsets.ModelViewSet):
+class ItemItemTypeRelationViewSet(ApiViewSet):
     queryset = ItemItemTypeRelation.objects.all()
     serializer_class = ItemItemTypeRelationSerializer
     http_method_names = ['get']
 
 
-class ItemLanguageRelationViewSet(viewsets.ModelViewSet):
+class ItemLanguageRelationViewSet(ApiViewSet):
     queryset = ItemLanguageRelation.objects.all()
     serializer_class = ItemLanguageRelationSerializer
     http_method_names = ['get']
 
 
-class ItemMaterialDetailsRelationViewSet(viewsets.ModelViewSet):
+class ItemMaterialDetailsRelationViewSet(ApiViewSet):
     queryset = ItemMaterialDetailsRelation.objects.all()
     serializer_class = ItemMaterialDetailsRelationSerializer
     http_method_names = ['get']
 
 
-class ItemTypeViewSet(viewsets.ModelViewSet):
+class ItemTypeViewSet(ApiViewSet):
     queryset = ItemType.objects.all()
     serializer_class = ItemTypeSerializer
     http_method_names = ['get']
 
 
-class ItemWorkRelationViewSet(viewsets.ModelViewSet):
+class ItemWorkRelationViewSet(ApiViewSet):
     queryset = ItemWorkRelation.objects.all()
     serializer_class = ItemWorkRelationSerializer
     http_method_names = ['get']
+    dataset_field = 'item__dataset_uuid'
 
 
-class LanguageViewSet(viewsets.ModelViewSet):
+class LanguageViewSet(ApiViewSet):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
     http_method_names = ['get']
 
 
-class MaterialDetailsViewSet(viewsets.ModelViewSet):
+class MaterialDetailsViewSet(ApiViewSet):
     queryset = MaterialDetails.objects.all()
     serializer_class = MaterialDetailsSerializer
     http_method_names = ['get']
 
 
-class PersonItemRelationViewSet(viewsets.ModelViewSet):
+class PersonItemRelationViewSet(ApiViewSet):
     queryset = PersonItemRelation.objects.all()
     serializer_class = PersonItemRelationSerializer
     http_method_names = ['get']
+    dataset_field = 'item__dataset_uuid'
 
 
-class PersonItemRelationRoleViewSet(viewsets.ModelViewSet):
+class PersonItemRelationRoleViewSet(ApiViewSet):
     queryset = PersonItemRelationRole.objects.all()
     serializer_class = PersonItemRelationRoleSerializer
     http_method_names = ['get']
 
 
-class EditionViewSet(viewsets.ModelViewSet):
+class EditionViewSet(ApiViewSet):
     queryset = Edition.objects.all()
     serializer_class = EditionSerializer
     http_method_names = ['get']
 
 
-class PublisherViewSet(viewsets.ModelViewSet):
+class PublisherViewSet(ApiViewSet):
     queryset = Publisher.objects.all()
     serializer_class = PublisherSerializer
     http_method_names = ['get']
 
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(ApiViewSet):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
     http_method_names = ['get']
 
 
-class WorkViewSet(viewsets.ModelViewSet):
+class WorkViewSet(ApiViewSet):
     queryset = Work.objects.all()
     serializer_class = WorkSerializer
     http_method_names = ['get']
 
 
-class WorkAuthorViewSet(viewsets.ModelViewSet):
+class WorkAuthorViewSet(ApiViewSet):
     queryset = WorkAuthor.objects.all()
     serializer_class = WorkAuthorSerializer
     http_method_names = ['get']
 
 
-class WorkSubjectViewSet(viewsets.ModelViewSet):
+class WorkSubjectViewSet(ApiViewSet):
     queryset = WorkSubject.objects.all()
     serializer_class = WorkSubjectSerializer
     http_method_names = ['get']
@@ -9,16 +9,15 @@ from django.db import IntegrityError
 from django.forms import formset_factory
 from django.core.paginator import Paginator
 from django_tables2.config import RequestConfig
-from django_tables2.export.export import TableExport
+from mediate.export import StreamingTableExport
 
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import escape
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Case, When
 
 import django_tables2
-from guardian.shortcuts import get_objects_for_user, get_perms
+from guardian.shortcuts import get_objects_for_user
 from guardian.mixins import PermissionRequiredMixin
 from django_select2.views import AutoResponseView
 
@@ -38,7 +37,9 @@ from catalogues.models import Dataset
 from persons.forms import PersonModelForm
 from mediate.views import GenericDetailView
 from catalogues.views.views import get_collections_for_session
+from search.autocomplete import PERSON_AUTOCOMPLETE
 from catalogues.tools import get_datasets_for_session, get_permitted_datasets_for_session
+from items.batch import ItemBatchEdit
 from simplemoderation.models import Moderation, ModerationAction
 
 from simplemoderation.tools import moderate
@@ -127,11 +128,11 @@ class ItemTableView(ListView):
     def get(self, request, *args, **kwargs):
         # Handle the _export query
         export_format = request.GET.get('_export', None)
-        if TableExport.is_valid_format(export_format):
+        if StreamingTableExport.is_valid_format(export_format):
             filter = ItemFilter(self.request.GET, queryset=self.get_queryset())
             table = ItemTable(filter.qs)
             RequestConfig(request).configure(table)
-            exporter = TableExport(export_format, table,
+            exporter = StreamingTableExport(export_format, table,
                                    exclude_columns=('uuid', 'manage_works', 'manage_persons', 'checkbox'))
             return exporter.response('table.{}'.format(export_format))
         else:
@@ -248,11 +249,13 @@ class PersonAndRoleAutocompleteView(AutoResponseView):
         page = int(request.GET.get('page', 1))
         begin = (page - 1) * self.page_size
         end = page * self.page_size
-        person_query = Q(person__short_name__icontains=term)
+        person_candidates = PERSON_AUTOCOMPLETE.get_candidates(term)
+        person_query = Q(person__in=person_candidates) if person_candidates is not None \
+            else Q(person__short_name__icontains=term)
         role_query = Q(role__name__icontains=term)
 
         person_item_relations = PersonItemRelation.objects\
-                .filter(item__lot__collection__catalogue__dataset__in=get_datasets_for_session(request)) \
+                .filter(item__lot__collection__in=get_collections_for_session(request)) \
                 .filter(person_query | role_query)\
                 .values('person', 'person__short_name', 'role', 'role__name')\
                 .distinct().order_by('person__short_name')[begin:end]
@@ -287,11 +290,11 @@ class TaggedItemTableView(ListView):
     def get(self, request, *args, **kwargs):
         # Handle the _export query
         export_format = request.GET.get('_export', None)
-        if TableExport.is_valid_format(export_format):
+        if StreamingTableExport.is_valid_format(export_format):
             filter = ItemFilter(self.request.GET, queryset=self.get_queryset())
             table = TaggedItemTable(filter.qs)
             RequestConfig(request).configure(table)
-            exporter = TableExport(export_format, table,
+            exporter = StreamingTableExport(export_format, table,
                                    exclude_columns=('uuid', 'manage_works', 'manage_persons', 'checkbox'))
             return exporter.response('table.{}'.format(export_format))
         else:
@@ -1308,26 +1311,18 @@ def add_person_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST:
-            items = request.POST.getlist('entries')
-            for item_id in items:
-                item = Item.objects.get(uuid=item_id)
-                form_set = PersonItemRelationAddFormSet(data=request.POST)
-                if form_set.is_valid() and 'change_dataset' in \
-                        get_perms(request.user, item.lot.collection.catalogue.first().dataset):
+            form_set = PersonItemRelationAddFormSet(data=request.POST)
+            if form_set.is_valid():
+                batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+                with transaction.atomic():
                     for form in form_set:
-                        if form.is_valid() and form.has_changed():
-                            try:
-                                personitemrelation = form.save(commit=False)
-                                personitemrelation.item = item
-                                personitemrelation.save()
-                            except IntegrityError as ie:
-                                # Probably a unique constraint error which means the relation already exists
-                                messages.add_message(request, messages.ERROR,
-                                                     _("{} is already {} of {}".format(form.cleaned_data['person'],
-                                                                                       form.cleaned_data['role'], item)))
-                else:
-                    messages.add_message(request, messages.ERROR,
-                                _("Item {} could not be used for adding a person.".format(item)))
+                        if form.has_changed():
+                            batch_edit.add_relations(PersonItemRelation, person=form.cleaned_data['person'],
+                                                     role=form.cleaned_data['role'])
+                    batch_edit.finish()
+                batch_edit.add_messages(request, _("adding a person"))
+            else:
+                messages.add_message(request, messages.WARNING, _("The person form was invalid."))
 
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
     else:
@@ -1352,30 +1347,16 @@ def set_publication_places_for_items(request):
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
 
     places = publicationplacesform.cleaned_data['publication_places']
-    for item_id in item_ids:
-        item = Item.objects.get(uuid=item_id)
-        if 'change_dataset' not in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-            messages.add_message(request, messages.ERROR,
-                                 _("Item {} could not be used for setting places of publication"
-                                   " because you are not allowed to change the dataset.".format(item)))
-            return HttpResponseRedirect(request.META['HTTP_REFERER'])
-
-        edition = item.edition
-        if not edition:
-            edition = Edition()
-            item.edition = edition
-            item.save()
-
+    batch_edit = ItemBatchEdit(request.user, item_ids)
+    with transaction.atomic():
         # Delete the publication places that are not linked to the given places
-        PublicationPlace.objects.filter(edition=edition).exclude(place__in=places).delete()
+        batch_edit.remove_edition_relations(PublicationPlace, keep=Q(place__in=places))
 
         # Add publication places
         for place in places:
-            try:
-                PublicationPlace.objects.get_or_create(edition=edition, place=place)
-            except IntegrityError as integrity_error:
-                # Probably a duplicate entry
-                pass
+            batch_edit.add_edition_relations(PublicationPlace, place=place)
+        batch_edit.finish()
+    batch_edit.add_messages(request, _("setting places of publication"))
 
     return HttpResponseRedirect(request.META['HTTP_REFERER'])
 
@@ -1388,18 +1369,13 @@ def set_bookformat_for_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST:
-            items = request.POST.getlist('entries')
             itemformatform = ItemFormatForm(data=request.POST)
             if itemformatform.is_valid():
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        item.book_format = itemformatform.cleaned_data['book_format']
-                        item.save()
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for setting a book format"
-                                               " because you are not allowed to change the dataset.".format(item)))
+                batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+                with transaction.atomic():
+                    batch_edit.set_item_fields(book_format=itemformatform.cleaned_data['book_format'])
+                    batch_edit.finish()
+                batch_edit.add_messages(request, _("setting a book format"))
             else:
                 messages.add_message(request, messages.WARNING, _("The Book Format form was invalid."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1415,25 +1391,13 @@ def set_publisher_for_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST:
-            items = request.POST.getlist('entries')
             publisherform = PublisherForm(data=request.POST)
             if publisherform.is_valid():
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        if not item.edition:
-                            item.edition = Edition()
-                            item.save()
-                        try:
-                            publisher = Publisher(edition=item.edition, publisher=publisherform.cleaned_data['publisher'])
-                            publisher.save()
-                        except IntegrityError:
-                            # Unique constraint failed; the Publisher already exists
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for setting a publisher"
-                                               " because you are not allowed to change the dataset.".format(item)))
+                batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+                with transaction.atomic():
+                    batch_edit.add_edition_relations(Publisher, publisher=publisherform.cleaned_data['publisher'])
+                    batch_edit.finish()
+                batch_edit.add_messages(request, _("setting a publisher"))
             else:
                 messages.add_message(request, messages.WARNING, _("The Publisher form was invalid."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1449,24 +1413,12 @@ def add_language_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'language' in request.POST:
-            items = request.POST.getlist('entries')
-            languages = request.POST.getlist('language')
-            for language_id in languages:
-                language = Language.objects.get(uuid=language_id)
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        try:
-                            itemlanguagerelation = ItemLanguageRelation(item=item,
-                                                                        language=language)
-                            itemlanguagerelation.save()
-                        except IntegrityError:
-                            # Unique constraint failed; the ItemLanguageRelation already exists
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for adding a language"
-                                               " because you are not allowed to change the dataset.".format(item)))
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                for language in Language.objects.filter(uuid__in=request.POST.getlist('language')):
+                    batch_edit.add_relations(ItemLanguageRelation, language=language)
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding a language"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no language selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1482,23 +1434,12 @@ def add_type_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'type' in request.POST:
-            items = request.POST.getlist('entries')
-            types = request.POST.getlist('type')
-            for type_id in types:
-                itemtype = ItemType.objects.get(uuid=type_id)
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        try:
-                            itemitemtyperelation = ItemItemTypeRelation(item=item, type=itemtype)
-                            itemitemtyperelation.save()
-                        except IntegrityError:
-                            # Unique constraint failed; the ItemItemTypeRelation already exists
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for adding a type"
-                                               " because you are not allowed to change the dataset.".format(item)))
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                for itemtype in ItemType.objects.filter(uuid__in=request.POST.getlist('type')):
+                    batch_edit.add_item_type(itemtype)
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding a type"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no types selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1514,24 +1455,12 @@ def add_tags_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'tag' in request.POST:
-            items = request.POST.getlist('entries')
-            tags = request.POST.getlist('tag')
-            for tag_id in tags:
-                tag = Tag.objects.get(id=tag_id)
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        try:
-                            if tag.id not in item.tags.values_list('tag', flat=True):
-                                item.tags.create(tag=tag)
-                        except IntegrityError as ie:
-                            # Unique constraint failed; the ItemItemTypeRelation already exists
-                            print(ie)
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for adding a tag"
-                                               " because you are not allowed to change the dataset.".format(item)))
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                for tag in Tag.objects.filter(id__in=request.POST.getlist('tag')):
+                    batch_edit.add_tag(tag)
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding a tag"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no tags selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1547,22 +1476,12 @@ def add_works_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'work' in request.POST:
-            items = request.POST.getlist('entries')
-            works = request.POST.getlist('work')
-            for work_id in works:
-                work = Work.objects.get(uuid=work_id)
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        try:
-                            ItemWorkRelation.objects.create(item=item, work=work)
-                        except IntegrityError:
-                            # Unique constraint failed; the ItemItemTypeRelation already exists
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for adding a work"
-                                               " because you are not allowed to change the dataset.".format(item)))
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                for work in Work.objects.filter(uuid__in=request.POST.getlist('work')):
+                    batch_edit.add_relations(ItemWorkRelation, work=work)
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding a work"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no works selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1578,22 +1497,13 @@ def add_materialdetails_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'material_details' in request.POST:
-            items = request.POST.getlist('entries')
-            material_details_objects = request.POST.getlist('material_details')
-            for material_details_id in material_details_objects:
-                material_details = MaterialDetails.objects.get(uuid=material_details_id)
-                for item_id in items:
-                    item = Item.objects.get(uuid=item_id)
-                    if 'change_dataset' in get_perms(request.user, item.lot.collection.catalogue.first().dataset):
-                        try:
-                            ItemMaterialDetailsRelation.objects.create(item=item, material_details=material_details)
-                        except IntegrityError:
-                            # Unique constraint failed; the ItemItemTypeRelation already exists
-                            pass
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             _("Item {} could not be used for adding material details"
-                                               " because you are not allowed to change the dataset.".format(item)))
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                for material_details in MaterialDetails.objects.filter(
+                        uuid__in=request.POST.getlist('material_details')):
+                    batch_edit.add_relations(ItemMaterialDetailsRelation, material_details=material_details)
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding material details"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no material details selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1609,14 +1519,12 @@ def add_parisian_category_to_items(request):
     """
     if request.method == 'POST':
         if 'entries' in request.POST and 'parisian_category' in request.POST:
-            item_ids = request.POST.getlist('entries')
-            items = Item.objects.filter(uuid__in=item_ids, lot__collection__in=get_collections_for_session(request))
-            if len(item_ids) != items.count():
-                messages.add_message(request, messages.ERROR,
-                                     _("Some items could not be used for adding a parisian category"
-                                       " because you are not allowed to change the dataset."))
-            parisian_category_id = request.POST.get('parisian_category')
-            items.update(parisian_category_id=parisian_category_id)
+            batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+            with transaction.atomic():
+                batch_edit.set_item_fields(
+                    parisian_category=get_object_or_404(ParisianCategory, pk=request.POST.get('parisian_category')))
+                batch_edit.finish()
+            batch_edit.add_messages(request, _("adding a parisian category"))
         else:
             messages.add_message(request, messages.WARNING, _("No items and/or no Parisian categories selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
@@ -1639,12 +1547,14 @@ def toggle_uncountable_book_items(request):
         messages.add_message(request, messages.WARNING, _("No items selected."))
         return HttpResponseRedirect(request.META['HTTP_REFERER'])
 
-    item_ids = request.POST.getlist('entries')
-    items = Item.objects.filter(uuid__in=item_ids, lot__collection__in=get_collections_for_session(request))
-    if len(item_ids) != items.count():
-        messages.add_message(request, messages.ERROR, _("Some items could not be used for toggling uncountable book"
-                                                        " items because you are not allowed to change the dataset."))
-    items.update(uncountable_book_items=Case(When(uncountable_book_items=True, then=False), default=True))
+    def toggle(item):
+        item.uncountable_book_items = not item.uncountable_book_items
+
+    batch_edit = ItemBatchEdit(request.user, request.POST.getlist('entries'))
+    with transaction.atomic():
+        batch_edit.update_items(['uncountable_book_items'], toggle)
+        batch_edit.finish()
+    batch_edit.add_messages(request, _("toggling uncountable book items"))
     return HttpResponseRedirect(request.META['HTTP_REFERER'])
 
 
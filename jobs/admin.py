@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('description', 'task', 'state', 'progress_current', 'progress_total', 'created', 'finished')
+    list_filter = ('state', 'task')
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('task', models.CharField(max_length=128, verbose_name='Task')),
+                ('arguments', models.JSONField(blank=True, default=dict, verbose_name='Arguments')),
+                ('description', models.CharField(blank=True, max_length=255, verbose_name='Description')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=16, verbose_name='State')),
+                ('progress_current', models.IntegerField(default=0, verbose_name='Progress')),
+                ('progress_total', models.IntegerField(blank=True, null=True, verbose_name='Total')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('output', models.TextField(blank=True, verbose_name='Output')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Result')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='Cancel requested')),
+                ('worker', models.CharField(blank=True, max_length=128, verbose_name='Worker')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Started')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Finished')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['state', 'created'], name='jobs_job_state_7cb95d_idx')],
+            },
+        ),
+    ]
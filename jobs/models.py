@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db import models
+from django.db.models.deletion import SET_NULL
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+import uuid
+from datetime import timedelta
+
+
+class Job(models.Model):
+    """
+    A long-running task that is queued in the database and run by a worker process (the run_jobs command)
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATES = (
+        (QUEUED, _("Queued")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+        (CANCELLED, _("Cancelled")),
+    )
+    FINISHED_STATES = [DONE, FAILED, CANCELLED]
+
+    uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.CharField(_("Task"), max_length=128)
+    arguments = models.JSONField(_("Arguments"), default=dict, blank=True)
+    description = models.CharField(_("Description"), max_length=255, blank=True)
+    state = models.CharField(_("State"), max_length=16, choices=STATES, default=QUEUED)
+    progress_current = models.IntegerField(_("Progress"), default=0)
+    progress_total = models.IntegerField(_("Total"), null=True, blank=True)
+    message = models.TextField(_("Message"), blank=True)
+    output = models.TextField(_("Output"), blank=True)
+    result = models.JSONField(_("Result"), null=True, blank=True)
+    error = models.TextField(_("Error"), blank=True)
+    cancel_requested = models.BooleanField(_("Cancel requested"), default=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=SET_NULL, null=True, blank=True,
+                                   related_name='+')
+    worker = models.CharField(_("Worker"), max_length=128, blank=True)
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+    started = models.DateTimeField(_("Started"), null=True, blank=True)
+    finished = models.DateTimeField(_("Finished"), null=True, blank=True)
+    heartbeat = models.DateTimeField(_("Heartbeat"), null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['state', 'created']),
+        ]
+
+    def __str__(self):
+        return "{} ({})".format(self.description or self.task, self.get_state_display())
+
+    @classmethod
+    def enqueue(cls, task, arguments=None, description='', user=None):
+        """
+        Queues a job for a worker
+        :param task: the name of a registered task, see jobs.tasks
+        :param arguments: the keyword arguments of the task, which must be JSON serializable
+        :param description: a description for the overview of jobs
+        :param user: the user that started the job
+        :return: the new job
+        """
+        from .tasks import get_task
+        get_task(task)  # Fail early for unknown tasks
+        return cls.objects.create(task=task, arguments=arguments or {}, description=description,
+                                  created_by=user if user and user.is_authenticated else None)
+
+    @classmethod
+    def claim_next(cls, worker):
+        """
+        Claims the oldest queued job for a worker. A job is claimed with a conditional update, so that
+        parallel workers never run the same job.
+        :param worker: the name of the worker
+        :return: the claimed job, or None if there are no queued jobs
+        """
+        while True:
+            pk = cls.objects.filter(state=cls.QUEUED).order_by('created').values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            now = timezone.now()
+            if cls.objects.filter(pk=pk, state=cls.QUEUED)\
+                    .update(state=cls.RUNNING, worker=worker, started=now, heartbeat=now):
+                return cls.objects.get(pk=pk)
+
+    @classmethod
+    def fail_stale(cls, seconds):
+        """
+        Marks running jobs without a heartbeat for some time as failed, e.g. when their worker was killed.
+        They are not requeued, as their task may have been partially done.
+        :param seconds: the number of seconds after which a job is stale
+        :return: the number of stale jobs
+        """
+        stale_before = timezone.now() - timedelta(seconds=seconds)
+        return cls.objects.filter(state=cls.RUNNING, heartbeat__lt=stale_before)\
+            .update(state=cls.FAILED, finished=timezone.now(), error="The worker stopped responding")
+
+    def cancel(self):
+        """
+        Cancels a queued job, or asks the worker of a running job to stop it
+        :return: True if the job was cancelled or will be stopped
+        """
+        if Job.objects.filter(pk=self.pk, state=Job.QUEUED).update(state=Job.CANCELLED, finished=timezone.now()):
+            self.refresh_from_db()
+            return True
+        if Job.objects.filter(pk=self.pk, state=Job.RUNNING).update(cancel_requested=True):
+            self.refresh_from_db()
+            return True
+        return False
+
+    def is_finished(self):
+        return self.state in self.FINISHED_STATES
+
+    def get_percentage(self):
+        if self.state == self.DONE:
+            return 100
+        if not self.progress_total:
+            return None
+        return min(100, round(100 * self.progress_current / self.progress_total))
+
+    def to_json(self):
+        """
+        The state and progress of the job, for the progress endpoint
+        """
+        return {
+            'uuid': str(self.uuid),
+            'task': self.task,
+            'description': self.description,
+            'state': self.state,
+            'progress': {
+                'current': self.progress_current,
+                'total': self.progress_total,
+                'percentage': self.get_percentage(),
+            },
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created.isoformat() if self.created else None,
+            'started': self.started.isoformat() if self.started else None,
+            'finished': self.finished.isoformat() if self.finished else None,
+        }
@@ -0,0 +1,83 @@
+"""
+Tasks that can be run as jobs.
+
+A task is a function registered under a name with register_task. A worker calls it with the job and the
+arguments of the job. Code that runs in a job, including management commands, reports its progress with
+report_progress, which does nothing outside of a job.
+"""
+import threading
+
+from django.conf import settings
+from django.core.management import call_command
+
+_tasks = {}
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """
+    Raised by report_progress when the job was cancelled, to stop the task
+    """
+    pass
+
+
+def register_task(name):
+    """
+    Registers a function as a task, e.g.
+
+        @register_task('rebuild_totals')
+        def rebuild_totals(job, collections=False):
+            ...
+
+    :param name: the name of the task, as stored in Job.task
+    """
+    def decorator(function):
+        _tasks[name] = function
+        return function
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise ValueError("Unknown task: {}".format(name))
+
+
+def get_reporter():
+    """
+    Gets the progress reporter of the job that is running in this thread, if any
+    """
+    return getattr(_local, 'reporter', None)
+
+
+def set_reporter(reporter):
+    _local.reporter = reporter
+
+
+def report_progress(current=None, total=None, message=None, increment=None):
+    """
+    Reports the progress of the job that is running in this thread. The progress is written to the database
+    periodically by the worker, outside of any transaction of the task.
+    :param current: the number of units done
+    :param total: the total number of units
+    :param message: a message describing the current step
+    :param increment: a number of units done since the previous report, instead of current
+    :raises JobCancelled: if the job was cancelled
+    """
+    reporter = get_reporter()
+    if reporter is not None:
+        reporter.update(current=current, total=total, message=message, increment=increment)
+
+
+@register_task('command')
+def run_command(job, command, arguments=None, options=None):
+    """
+    Runs a management command. Only the commands in settings.JOB_COMMANDS can be run as a job.
+    :param command: the name of the command
+    :param arguments: a list of command line arguments
+    :param options: a dict of options
+    """
+    if command not in getattr(settings, 'JOB_COMMANDS', []):
+        raise ValueError("The command {} cannot be run as a job".format(command))
+    call_command(command, *(arguments or []), **(options or {}))
@@ -0,0 +1,107 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.models import User
+
+from jobs.models import Job
+from jobs.tasks import register_task, report_progress
+from jobs.views import job_progress_json, job_list_json, get_jobs_panel
+from jobs.worker import Worker
+
+import json
+
+
+@register_task('test_count')
+def count_task(job, number):
+    for i in range(number):
+        report_progress(current=i + 1, total=number)
+    report_progress(message="Counted to {}".format(number))
+    return {'number': number}
+
+
+@register_task('test_fail')
+def fail_task(job):
+    raise RuntimeError("Failed on purpose")
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test', password='test')
+        self.other_user = User.objects.create_user(username='other', password='test')
+        self.worker = Worker(name='test worker')
+
+    def test_run_job(self):
+        job = Job.enqueue('test_count', {'number': 3}, user=self.user)
+        self.assertEqual(job.state, Job.QUEUED)
+        self.assertEqual(self.worker.run_next(), job)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.DONE)
+        self.assertEqual(job.worker, 'test worker')
+        self.assertEqual((job.progress_current, job.progress_total), (3, 3))
+        self.assertEqual(job.result, {'number': 3})
+        self.assertEqual(job.message, "Counted to 3")
+        self.assertIsNone(self.worker.run_next())
+
+    def test_failed_job(self):
+        Job.enqueue('test_fail')
+        job = self.worker.run_next()
+        self.assertEqual(job.state, Job.FAILED)
+        self.assertIn("Failed on purpose", job.error)
+
+    def test_claim(self):
+        first = Job.enqueue('test_count', {'number': 1})
+        second = Job.enqueue('test_count', {'number': 1})
+        self.assertEqual(Job.claim_next('worker 1'), first)
+        self.assertEqual(Job.claim_next('worker 2'), second)
+        self.assertIsNone(Job.claim_next('worker 3'))
+        self.assertEqual(Job.objects.get(pk=first.pk).worker, 'worker 1')
+
+        # A running job without heartbeat is marked as failed
+        self.assertEqual(Job.fail_stale(0), 2)
+        self.assertEqual(Job.objects.filter(state=Job.FAILED).count(), 2)
+
+    def test_cancel(self):
+        job = Job.enqueue('test_count', {'number': 1})
+        self.assertTrue(job.cancel())
+        self.assertEqual(job.state, Job.CANCELLED)
+        self.assertIsNone(self.worker.run_next())
+        self.assertFalse(job.cancel())
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            Job.enqueue('unknown')
+
+    @override_settings(JOB_COMMANDS=['reconcile_counters'])
+    def test_command(self):
+        Job.enqueue('command', {'command': 'reconcile_counters'})
+        job = self.worker.run_next()
+        self.assertEqual(job.state, Job.DONE)
+        self.assertTrue(job.output)
+
+        Job.enqueue('command', {'command': 'remove_collection_etc'})
+        job = self.worker.run_next()
+        self.assertEqual(job.state, Job.FAILED)
+        self.assertIn("cannot be run as a job", job.error)
+
+    def test_progress_json(self):
+        job = Job.enqueue('test_count', {'number': 2}, user=self.user)
+        self.worker.run_next()
+
+        request = RequestFactory().get('/jobs/{}/json/'.format(job.pk))
+        request.user = self.user
+        data = json.loads(job_progress_json(request, job.pk).content)
+        self.assertEqual(data['state'], Job.DONE)
+        self.assertEqual(data['progress'], {'current': 2, 'total': 2, 'percentage': 100})
+
+        # Other users do not see the job
+        request.user = self.other_user
+        self.assertEqual(job_progress_json(request, job.pk).status_code, 404)
+        request = RequestFactory().get('/jobs/json/')
+        request.user = self.other_user
+        self.assertEqual(json.loads(job_list_json(request).content)['jobs'], [])
+
+    def test_jobs_panel(self):
+        Job.enqueue('test_count', {'number': 2}, description='Count to two', user=self.user)
+        request = RequestFactory().get('/jobs/panel/')
+        request.user = self.user
+        response = get_jobs_panel(request)
+        self.assertContains(response, 'Count to two')
+        self.assertContains(response, 'every 3s')
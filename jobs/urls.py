@@ -0,0 +1,12 @@
+from django.urls import path
+from django.contrib.auth.decorators import login_required
+
+from .views import job_progress_json, job_list_json, get_jobs_panel, enqueue_command, cancel_job
+
+urlpatterns = [
+    path('json/', login_required(job_list_json), name='job_list_json'),
+    path('panel/', login_required(get_jobs_panel), name='get_jobs_panel'),
+    path('command/', login_required(enqueue_command), name='enqueue_command'),
+    path('<uuid:pk>/json/', login_required(job_progress_json), name='job_progress_json'),
+    path('<uuid:pk>/cancel/', login_required(cancel_job), name='cancel_job'),
+]
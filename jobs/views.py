@@ -0,0 +1,91 @@
+import shlex
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import require_POST
+
+from .models import Job
+
+
+def get_jobs_for_user(user):
+    """
+    Superusers see all jobs, other users the jobs they started
+    """
+    jobs = Job.objects.select_related('created_by')
+    if not user.is_superuser:
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+def job_progress_json(request, pk):
+    """
+    Returns the state and progress of a job as JSON
+    :param request:
+    :param pk: the UUID of the job
+    :return:
+    """
+    job = get_jobs_for_user(request.user).filter(pk=pk).first()
+    if job is None:
+        return JsonResponse({'error': "Job not found"}, status=404)
+    return JsonResponse(job.to_json())
+
+
+def job_list_json(request):
+    """
+    Returns the state and progress of the most recent jobs as JSON, optionally filtered by state
+    (e.g. ?state=running)
+    :param request:
+    :return:
+    """
+    jobs = get_jobs_for_user(request.user)
+    state = request.GET.get('state')
+    if state:
+        jobs = jobs.filter(state=state)
+    return JsonResponse({'jobs': [job.to_json() for job in jobs[:50]]})
+
+
+def get_jobs_panel(request):
+    """
+    Renders the overview of the most recent jobs for the dashboard, which polls it (more often while jobs are active)
+    """
+    jobs = list(get_jobs_for_user(request.user)[:10])
+    return render(request, 'jobs/jobs_panel.html', {
+        'jobs': jobs,
+        'active': any(not job.is_finished() for job in jobs),
+    })
+
+
+@require_POST
+def enqueue_command(request):
+    """
+    Queues a management command from settings.JOB_COMMANDS as a job
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'error': "Permission denied"}, status=403)
+    command = request.POST.get('command', '')
+    if command not in getattr(settings, 'JOB_COMMANDS', []):
+        messages.add_message(request, messages.ERROR, _("The command {} cannot be run as a job").format(command))
+        return redirect('dashboard')
+    try:
+        arguments = shlex.split(request.POST.get('arguments', ''))
+    except ValueError as error:
+        messages.add_message(request, messages.ERROR, _("Invalid arguments: {}").format(error))
+        return redirect('dashboard')
+    description = ' '.join([command] + arguments)[:255]
+    Job.enqueue('command', {'command': command, 'arguments': arguments}, description=description,
+                user=request.user)
+    messages.add_message(request, messages.SUCCESS, _("Queued {}").format(description))
+    return redirect('dashboard')
+
+
+@require_POST
+def cancel_job(request, pk):
+    """
+    Cancels a queued job or stops a running job, and renders the jobs panel
+    """
+    job = get_object_or_404(get_jobs_for_user(request.user), pk=pk)
+    job.cancel()
+    return get_jobs_panel(request)
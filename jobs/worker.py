@@ -0,0 +1,162 @@
+"""
+Running queued jobs.
+
+A worker claims one job at a time and runs its task in the main thread. The progress the task reports, and the
+output it prints, are kept in memory and written to the job by a separate thread every few seconds. That thread
+uses its own database connection, so the progress is visible while the task is still inside a transaction, and it
+keeps the heartbeat of the job up to date during long steps without progress reports.
+"""
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import redirect_stdout
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Job
+from .tasks import get_task, set_reporter, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of characters of output that is kept per job
+OUTPUT_LIMIT = 100000
+
+
+class JobOutput(io.TextIOBase):
+    """
+    A file-like object that passes what is written to it to a progress reporter
+    """
+    def __init__(self, reporter):
+        self.reporter = reporter
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.reporter.write(text)
+        return len(text)
+
+
+class ProgressReporter:
+    """
+    Keeps the progress and output of a running job and writes them to the database
+    """
+    def __init__(self, job):
+        self.job = job
+        self.lock = threading.Lock()
+        self.current = job.progress_current
+        self.total = job.progress_total
+        self.message = job.message
+        self.output = ''
+        self.cancelled = False
+
+    def update(self, current=None, total=None, message=None, increment=None):
+        with self.lock:
+            if current is not None:
+                self.current = current
+            if increment is not None:
+                self.current += increment
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message
+        if self.cancelled:
+            raise JobCancelled()
+
+    def write(self, text):
+        with self.lock:
+            self.output = (self.output + text)[-OUTPUT_LIMIT:]
+            lines = [line for line in text.splitlines() if line.strip()]
+            if lines:
+                self.message = lines[-1][:1000]
+
+    def get_values(self):
+        with self.lock:
+            return {
+                'progress_current': self.current,
+                'progress_total': self.total,
+                'message': self.message,
+                'output': self.output,
+            }
+
+    def flush(self):
+        """
+        Writes the progress to the job and checks whether it was cancelled
+        """
+        Job.objects.filter(pk=self.job.pk).update(heartbeat=timezone.now(), **self.get_values())
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            self.cancelled = True
+
+    def run(self, stop, interval):
+        """
+        Flushes the progress every interval seconds, until stop is set
+        """
+        try:
+            while not stop.wait(interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Could not write the progress of job %s", self.job.pk)
+        finally:
+            connection.close()
+
+
+class Worker:
+    """
+    Runs queued jobs, one at a time. Several workers can run in parallel, as jobs are claimed atomically.
+    """
+    def __init__(self, name=None, interval=2):
+        """
+        :param name: the name of the worker, by default its host name and process ID
+        :param interval: the number of seconds between the progress updates of a job
+        """
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.interval = interval
+
+    def run_next(self):
+        """
+        Claims and runs the oldest queued job
+        :return: the job, or None if there were no queued jobs
+        """
+        job = Job.claim_next(self.name)
+        if job is not None:
+            self.run_job(job)
+        return job
+
+    def run_job(self, job):
+        """
+        Runs the task of a claimed job and stores its final state
+        """
+        reporter = ProgressReporter(job)
+        stop = threading.Event()
+        thread = threading.Thread(target=reporter.run, args=(stop, self.interval), daemon=True)
+        thread.start()
+        set_reporter(reporter)
+
+        state, result, error = Job.DONE, None, ''
+        try:
+            with redirect_stdout(JobOutput(reporter)):
+                result = get_task(job.task)(job, **job.arguments)
+        except JobCancelled:
+            state = Job.CANCELLED
+        except Exception:
+            state, error = Job.FAILED, traceback.format_exc()
+            logger.exception("Job %s failed", job.pk)
+        finally:
+            set_reporter(None)
+            stop.set()
+            thread.join()
+
+        try:
+            json.dumps(result)
+        except TypeError:
+            result = str(result)
+        Job.objects.filter(pk=job.pk).update(state=state, result=result, error=error, finished=timezone.now(),
+                                             heartbeat=timezone.now(), **reporter.get_values())
+        job.refresh_from_db()
+        return job
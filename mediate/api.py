@@ -0,0 +1,263 @@
+"""
+Harvesting support for the REST API.
+
+All API viewsets derive from ApiViewSet and all serializers from ApiSerializer, which add:
+- page sizes up to API_MAX_PAGE_SIZE with ?page_size=, and keyset pagination on the primary key with
+  ?pagination=cursor, which stays fast on the last pages of large tables (see mediate.pagination);
+- sparse fieldsets with ?fields=, e.g. ?fields=api-url,short_title;
+- nested relations with ?expand=, e.g. ?expand=lot,edition,persons, loaded with select_related and
+  prefetch_related instead of one query per object;
+- dataset scoping with ?dataset=<uuid>, for datasets the user may view and the public dataset;
+- an ETag derived from the cache tag versions of the models in the response (see mediate.cache), so that
+  a request with If-None-Match gets a 304 response without querying the database when nothing changed.
+
+Example:
+
+    /api/item/?pagination=cursor&page_size=1000&expand=edition,persons&dataset=<uuid>
+
+For complete copies of a dataset, DumpView streams all rows of a model at once, e.g. /api/dump/items/.
+
+"""
+import hashlib
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+from rest_framework import exceptions, permissions, serializers, status, viewsets
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from mediate.cache import SHARED_TAG, get_tag_versions, model_tag
+from mediate.dump import DUMPS, gzip_stream, parse_since
+
+# The query parameters of the API that are not filters
+API_PARAMS = ['page', 'page_size', 'cursor', 'pagination', 'fields', 'expand', 'dataset', 'format', 'search']
+
+
+def get_list_param(request, name):
+    """
+    Gets the comma separated values of a query parameter
+    """
+    return [value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()]
+
+
+def get_requested_datasets(request):
+    """
+    Gets the datasets of ?dataset=, which the user needs to be allowed to view
+    :return: a list of primary keys, or None if no dataset is requested
+    """
+    values = get_list_param(request, 'dataset')
+    if not values:
+        return None
+    try:
+        uuids = {uuid.UUID(value) for value in values}
+    except ValueError:
+        raise exceptions.ValidationError({'dataset': "Not a valid UUID"})
+    datasets = list(apps.get_model('catalogues', 'Dataset').objects.filter(uuid__in=uuids))
+    if len(datasets) < len(uuids):
+        raise exceptions.NotFound("Dataset not found")
+    for dataset in datasets:
+        if dataset.name != settings.DATASET_NAME_FOR_ANONYMOUSUSER \
+                and not request.user.has_perm('catalogues.view_dataset', dataset):
+            raise exceptions.PermissionDenied("No permission to view dataset {}".format(dataset.name))
+    return [dataset.pk for dataset in datasets]
+
+
+class Expansion:
+    """
+    A relation that can be expanded into nested objects with ?expand=
+    """
+    def __init__(self, serializer, source=None, many=False, expand=None, select_related=None,
+                 prefetch_related=None):
+        """
+        :param serializer: the serializer class of the related objects, or its dotted path
+        :param source: the attribute of the related objects, by default the name of the expansion
+        :param many: whether there are many related objects
+        :param expand: the names of the expansions of the related objects to include
+        :param select_related: the select_related lookups needed for the expansion
+        :param prefetch_related: the prefetch_related lookups needed for the expansion
+        """
+        self._serializer = serializer
+        self.source = source
+        self.many = many
+        self.expand = expand or []
+        self.select_related = select_related or []
+        self.prefetch_related = prefetch_related or []
+
+    @property
+    def serializer(self):
+        # A dotted path allows serializers to refer to serializers that are defined later
+        if isinstance(self._serializer, str):
+            self._serializer = import_string(self._serializer)
+        return self._serializer
+
+    def get_field(self, name):
+        kwargs = {'source': self.source} if self.source and self.source != name else {}
+        return self.serializer(many=self.many, read_only=True, expand=self.expand, **kwargs)
+
+    def get_models(self):
+        """
+        Gets the models of the objects in the expansion
+        """
+        models = [self.serializer.Meta.model]
+        for name in self.expand:
+            models.extend(self.serializer.expansions[name].get_models())
+        return models
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+class ApiSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    A hyperlinked serializer with sparse fieldsets and expansions. The serializer of the view takes them
+    from the query parameters, nested serializers from their expansion.
+    """
+    expansions = {}
+
+    def __init__(self, *args, expand=None, fields=None, **kwargs):
+        """
+        :param expand: the names of the expansions to include
+        :param fields: the names of the fields to include, or None for all
+        """
+        self.requested_expand = expand
+        self.requested_fields = fields
+        super().__init__(*args, **kwargs)
+
+    def is_root(self):
+        view = self.context.get('view')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None and view is not None and type(self) is view.get_serializer_class()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand, only = self.requested_expand or [], self.requested_fields
+        request = self.context.get('request')
+        if request is not None and self.is_root():
+            expand, only = get_list_param(request, 'expand'), get_list_param(request, 'fields') or None
+        for name in expand:
+            if name in self.expansions:
+                fields[name] = self.expansions[name].get_field(name)
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only or name in expand}
+        return fields
+
+
+class ApiViewSet(viewsets.ModelViewSet):
+    """
+    A read-only viewset with expansions, dataset scoping and ETags
+    """
+    http_method_names = ['get']
+    # The lookup of the dataset of the objects, for ?dataset=
+    dataset_field = None
+    # The models other than the model of the viewset and of the expansions that the responses depend on
+    etag_models = []
+
+    def get_expansions(self):
+        """
+        Gets the requested expansions of the serializer of the viewset
+        """
+        expansions = getattr(self.get_serializer_class(), 'expansions', {})
+        names = get_list_param(self.request, 'expand')
+        unknown = [name for name in names if name not in expansions]
+        if unknown:
+            raise exceptions.ValidationError({'expand': "Unknown expansion(s): {}. Choose from: {}".format(
+                ", ".join(unknown), ", ".join(expansions))})
+        return [expansions[name] for name in names]
+
+    def get_datasets(self):
+        """
+        Gets the primary keys of the datasets of ?dataset=
+        :return: a list of primary keys, or None if the objects are not scoped
+        """
+        datasets = get_requested_datasets(self.request)
+        if datasets is not None and self.dataset_field is None:
+            raise exceptions.ValidationError({'dataset': "These objects do not belong to a dataset"})
+        return datasets
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for expansion in self.get_expansions():
+            queryset = expansion.apply(queryset)
+        datasets = self.get_datasets()
+        if datasets is not None:
+            # A subquery, as the objects may be linked to a dataset more than once
+            model = queryset.model
+            queryset = queryset.filter(pk__in=model._base_manager.filter(**{self.dataset_field + '__in': datasets})
+                                       .values('pk'))
+        return queryset
+
+    def get_etag(self, request):
+        """
+        Gets the ETag of a response, from the cache tag versions of its models and the request
+        """
+        models = [self.queryset.model] + list(self.etag_models)
+        for expansion in self.get_expansions():
+            models.extend(expansion.get_models())
+        versions = get_tag_versions([model_tag(model) for model in models] + [SHARED_TAG])
+        key = "|".join([request.get_full_path(), request.META.get('HTTP_ACCEPT', ''),
+                        str(request.user.pk if request.user.is_authenticated else 'anonymous')] +
+                       ["{}={}".format(tag, version) for tag, version in sorted(versions.items())])
+        return '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+class DumpView(APIView):
+    """
+    Streams a dump of all rows of a model as newline-delimited JSON (see mediate.dump), compressed with gzip
+    if the client accepts it. Supports ?dataset=<uuid> and ?updated_since=<ISO 8601 date>.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response is not rendered
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, name):
+        if name not in DUMPS:
+            raise exceptions.NotFound("Unknown dump {}. Choose from: {}".format(name, ", ".join(DUMPS)))
+        dump = DUMPS[name]
+        since = None
+        if request.query_params.get('updated_since'):
+            try:
+                since = parse_since(request.query_params['updated_since'])
+            except ValueError as e:
+                raise exceptions.ValidationError({'updated_since': str(e)})
+        try:
+            lines = dump.lines(get_requested_datasets(request), since, chunk_size=settings.API_DUMP_CHUNK_SIZE)
+        except ValueError as e:
+            raise exceptions.ValidationError({'updated_since': str(e)})
+
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = StreamingHttpResponse(gzip_stream(lines), content_type='application/x-ndjson')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['Content-Disposition'] = 'attachment; filename="{}.ndjson"'.format(name)
+        return response
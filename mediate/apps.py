@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MediateConfig(AppConfig):
+    name = 'mediate'
+
+    def ready(self):
+        from mediate.computed import install_handlers
+        install_handlers()
@@ -0,0 +1,215 @@
+"""
+Tag based cache invalidation.
+
+Cache entries are stored under keys that include the current version of one or more tags, e.g.
+'dataset:<uuid>', 'collection:<uuid>' or 'model:items.item'. Invalidating a tag increments its version,
+which makes all entries that were stored with the old version unreachable (they expire by their timeout).
+This replaces clearing the whole cache on every save.
+
+Invalidations that happen inside a transaction are collected and executed once, when the transaction
+is committed.
+"""
+import hashlib
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+SHARED_TAG = 'shared'
+TAG_VERSION_KEY_PREFIX = 'tag_version'
+
+
+def dataset_tag(dataset_uuid):
+    return "dataset:{}".format(dataset_uuid)
+
+
+def collection_tag(collection_uuid):
+    return "collection:{}".format(collection_uuid)
+
+
+def model_tag(model):
+    return "model:{}".format(model._meta.label_lower)
+
+
+def _tag_version_key(tag):
+    return "{}:{}".format(TAG_VERSION_KEY_PREFIX, tag)
+
+
+def _new_tag_version():
+    # A time based initial version prevents a reset to an old version when a version key is evicted
+    return int(time.time() * 1000)
+
+
+def get_tag_versions(tags):
+    """
+    Gets the current versions of the given tags; missing versions are initialized
+    :param tags: an iterable of tag strings
+    :return: a dict with tags as keys and versions as values
+    """
+    tags = sorted(set(tags))
+    keys = {_tag_version_key(tag): tag for tag in tags}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+    missing = {_tag_version_key(tag): _new_tag_version() for tag in tags if tag not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update({keys[key]: version for key, version in missing.items()})
+    return versions
+
+
+def get_tagged_key(key, tags):
+    """
+    Constructs a cache key that includes the given tags and their current versions. The tags are hashed, as
+    different tags may have the same version and the key length is limited.
+    """
+    versions = get_tag_versions(tags)
+    tagged = ",".join("{}={}".format(tag, versions[tag]) for tag in sorted(versions))
+    return "{}:{}".format(key, hashlib.sha1(tagged.encode()).hexdigest())
+
+
+def get_tagged(key, tags, default=None):
+    return cache.get(get_tagged_key(key, tags), default)
+
+
+def set_tagged(key, value, tags, timeout=None):
+    cache.set(get_tagged_key(key, tags), value, timeout=timeout if timeout is not None else cache.default_timeout)
+
+
+def get_or_set_tagged(key, default, tags, timeout=None):
+    """
+    Gets a tagged cache entry or sets it using default (a value or a callable)
+    """
+    tagged_key = get_tagged_key(key, tags)
+    return cache.get_or_set(tagged_key, default, timeout=timeout if timeout is not None else cache.default_timeout)
+
+
+def invalidate_tags_now(tags):
+    """
+    Increments the versions of the given tags immediately
+    """
+    for tag in set(tags):
+        try:
+            cache.incr(_tag_version_key(tag))
+        except ValueError:
+            # The version does not exist (anymore): any new version invalidates existing entries
+            cache.set(_tag_version_key(tag), _new_tag_version(), timeout=None)
+
+
+class PendingInvalidation:
+    """
+    Collects tags and scope information during a transaction and invalidates them once on commit
+    """
+    def __init__(self):
+        self.done = False
+        self.tags = set()
+        self.collection_ids = set()
+        self.item_ids = set()
+
+    def resolve_dataset_tags(self):
+        """
+        Determines the datasets of the collected collections and items with one query each.
+        If some of them cannot be resolved (e.g. because they were deleted), the shared tag is added.
+        """
+        tags = set()
+        resolved = True
+        if self.collection_ids:
+            CatalogueCollectionRelation = apps.get_model('catalogues', 'CatalogueCollectionRelation')
+            relations = CatalogueCollectionRelation.objects.filter(collection_id__in=self.collection_ids)\
+                .values_list('collection_id', 'catalogue__dataset_id').distinct()
+            tags.update(dataset_tag(dataset_uuid) for collection_id, dataset_uuid in relations)
+            resolved = resolved and len({collection_id for collection_id, dataset_uuid in relations}) \
+                == len(self.collection_ids)
+        if self.item_ids:
+            Item = apps.get_model('items', 'Item')
+            items = Item.objects.filter(uuid__in=self.item_ids, dataset_uuid__isnull=False)\
+                .values_list('uuid', 'dataset_uuid')
+            tags.update(dataset_tag(dataset_uuid) for item_id, dataset_uuid in items)
+            resolved = resolved and len(items) == len(self.item_ids)
+        if not resolved:
+            tags.add(SHARED_TAG)
+        return tags
+
+    def __call__(self):
+        self.done = True
+        tags = self.tags | self.resolve_dataset_tags()
+        invalidate_tags_now(tags)
+
+
+def get_pending_invalidation(using=None):
+    """
+    Gets the PendingInvalidation for the current transaction, or registers a new one with on_commit
+    :return: a PendingInvalidation or None if not in a transaction
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+    for sids, func, *rest in connection.run_on_commit:
+        if isinstance(func, PendingInvalidation) and not func.done:
+            return func
+    pending_invalidation = PendingInvalidation()
+    transaction.on_commit(pending_invalidation, using=using)
+    return pending_invalidation
+
+
+def get_cache_tags(instance):
+    """
+    Gets the tags and scope information for a model instance.
+    Instances that cannot be linked to a dataset or collection also invalidate the shared tag.
+    :return: a tuple of a set of tags, a set of collection IDs and a set of item IDs
+    """
+    tags = {model_tag(type(instance))}
+    collection_ids = set()
+    item_ids = set()
+
+    label = instance._meta.label_lower
+    if label == 'catalogues.dataset':
+        tags.add(dataset_tag(instance.pk))
+    elif label == 'catalogues.collection':
+        tags.add(collection_tag(instance.pk))
+        collection_ids.add(instance.pk)
+    elif getattr(instance, 'dataset_uuid', None):
+        tags.add(dataset_tag(instance.dataset_uuid))
+    elif getattr(instance, 'dataset_id', None):
+        tags.add(dataset_tag(instance.dataset_id))
+    elif getattr(instance, 'collection_id', None):
+        tags.add(collection_tag(instance.collection_id))
+        collection_ids.add(instance.collection_id)
+    elif getattr(instance, 'item_id', None):
+        item_ids.add(instance.item_id)
+    else:
+        tags.add(SHARED_TAG)
+    return tags, collection_ids, item_ids
+
+
+def invalidate_instances(instances, using=None):
+    """
+    Invalidates the cache tags of model instances, coalesced per transaction.
+    Use this for objects that are changed without sending signals, e.g. by bulk_create.
+    """
+    pending_invalidation = get_pending_invalidation(using) or PendingInvalidation()
+    for instance in instances:
+        tags, collection_ids, item_ids = get_cache_tags(instance)
+        pending_invalidation.tags.update(tags)
+        pending_invalidation.collection_ids.update(collection_ids)
+        pending_invalidation.item_ids.update(item_ids)
+    if not transaction.get_connection(using).in_atomic_block:
+        pending_invalidation()
+
+
+def invalidate_tags(tags, using=None):
+    """
+    Invalidates tags immediately and again when the current transaction is committed,
+    so that entries cached in between from data that was not committed yet are invalidated too
+    """
+    invalidate_tags_now(tags)
+    pending_invalidation = get_pending_invalidation(using)
+    if pending_invalidation:
+        pending_invalidation.tags.update(tags)
+
+
+def invalidate_instance(instance, using=None):
+    """
+    Invalidates the cache tags of a model instance, coalesced per transaction
+    """
+    invalidate_instances([instance], using=using)
+
@@ -0,0 +1,257 @@
+"""
+Set-based recomputation of computed fields.
+
+django-computedfields updates the computed fields that depend on an object when the object is saved or deleted,
+by loading the dependent objects and saving their new values in batches. Changing the year of a collection
+or the indices of lots therefore rewrites its items row by row.
+
+Here the computed fields of items are computed with one UPDATE statement per set of items, using subqueries on
+their lots, collections and catalogues. Those of persons are computed with an UPDATE statement for their
+earliest edition year and a vectorized pass for their weight (see persons.ranking).
+
+Inside deferred_computed_fields(), the save and delete signal handlers of django-computedfields only collect the keys
+of the saved objects and of the dependents of deleted objects. When the outermost context exits, the dependents are
+recomputed with recompute(). The DeferredComputedFieldsMiddleware does this for each request that changes data.
+Other derived values can be deferred in the same way with defer_update().
+"""
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Substr
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from mediate.cache import invalidate_tags, model_tag
+
+_local = threading.local()
+
+ITEM_FIELDS = ['collection_year_of_publication', 'collection_short_title', 'dataset_uuid', 'lot_index_in_collection',
+               'lot_lot_as_listed_in_collection']
+PERSON_FIELDS = ['normalised_date_of_birth', 'normalised_date_of_death', 'earliest_edition_year', 'weight']
+
+
+def get_item_field_expressions():
+    """
+    Gets the expressions for the computed fields of Item, see the computed methods of Item
+    """
+    Lot = apps.get_model('catalogues', 'Lot')
+    Catalogue = apps.get_model('catalogues', 'Catalogue')
+    lots = Lot.objects.filter(pk=OuterRef('lot_id')).order_by()
+    return {
+        'collection_year_of_publication': Subquery(lots.values('collection__year_of_publication')[:1]),
+        'collection_short_title': Subquery(lots.values('collection__short_title')[:1]),
+        # The dataset of the first catalogue of the collection
+        'dataset_uuid': Subquery(Catalogue.objects.filter(collection__lot=OuterRef('lot_id')).order_by('pk')
+                                 .values('dataset_id')[:1]),
+        'lot_index_in_collection': Subquery(lots.values('index_in_collection')[:1]),
+        'lot_lot_as_listed_in_collection': Subquery(
+            lots.annotate(text=Substr('lot_as_listed_in_collection', 1, 128)).values('text')[:1]),
+    }
+
+
+def recompute_items(items, fields=None):
+    """
+    Recomputes the computed fields of items with one UPDATE statement
+    :param items: an Item queryset
+    :param fields: the names of the fields to recompute, or None for all
+    :return: the number of updated items
+    """
+    expressions = get_item_field_expressions()
+    values = {name: expressions[name] for name in fields or ITEM_FIELDS if name in expressions}
+    if not values:
+        return 0
+    Item = apps.get_model('items', 'Item')
+    return Item.objects.filter(pk__in=items.values('pk')).update(**values)
+
+
+def recompute_persons(persons, fields=None, batch_size=1000):
+    """
+    Recomputes the computed fields of persons
+    :param persons: a Person queryset
+    :param fields: the names of the fields to recompute, or None for all
+    :return: the number of persons with a changed weight or normalised date of birth or death
+    """
+    from mediate.tools import date_of_x_text_to_int
+    from persons.ranking import compute_person_weights
+    Person = apps.get_model('persons', 'Person')
+    Edition = apps.get_model('items', 'Edition')
+    fields = set(fields or PERSON_FIELDS)
+    persons = Person.objects.filter(pk__in=persons.values('pk'))
+
+    if 'earliest_edition_year' in fields:
+        persons.update(earliest_edition_year=Subquery(
+            Edition.objects.filter(items__personitemrelation__person=OuterRef('pk'), year_start__isnull=False)
+            .order_by('year_start').values('year_start')[:1]
+        ))
+        # The updates do not send signals
+        invalidate_tags([model_tag(Person)])
+
+    updated_fields = [name for name in ['normalised_date_of_birth', 'normalised_date_of_death', 'weight']
+                      if name in fields]
+    if not updated_fields:
+        return 0
+    weights = compute_person_weights(persons) if 'weight' in fields else {}
+    changed = []
+    for person in persons.only('uuid', 'date_of_birth', 'date_of_death', *updated_fields):
+        values = {
+            'normalised_date_of_birth': date_of_x_text_to_int(person.date_of_birth),
+            'normalised_date_of_death': date_of_x_text_to_int(person.date_of_death),
+            'weight': weights.get(person.pk),
+        }
+        if any(getattr(person, name) != values[name] for name in updated_fields):
+            for name in updated_fields:
+                setattr(person, name, values[name])
+            changed.append(person)
+    Person.objects.bulk_update(changed, updated_fields, batch_size=batch_size)
+    if changed:
+        invalidate_tags([model_tag(Person)])
+    return len(changed)
+
+
+def recompute(model, pks, fields=None, local=True, batch_size=1000):
+    """
+    Recomputes the computed fields of objects and of the objects that depend on them
+    :param model: the model of the objects
+    :param pks: the primary keys of the objects
+    :param fields: the names of the changed fields, or None if all fields may have changed
+    :param local: whether to recompute the computed fields of the objects themselves (e.g. after bulk_create)
+    :param batch_size: the number of objects per UPDATE statement
+    """
+    from computedfields.models import active_resolver
+
+    def get_dependents(model, pks, fields):
+        return active_resolver._querysets_for_update(model, model._base_manager.filter(pk__in=pks), fields,
+                                                     pk_list=True)
+
+    pending = {}
+    if local and active_resolver.has_computedfields(model):
+        pending[model] = [set(pks), None]
+    else:
+        merge(pending, get_dependents(model, pks, fields))
+
+    # The dependency graph of computed fields is acyclic
+    while pending:
+        model, (pks, fields) = pending.popitem()
+        pks = list(pks)
+        for start in range(0, len(pks), batch_size):
+            chunk = pks[start:start + batch_size]
+            queryset = model._base_manager.filter(pk__in=chunk)
+            if model._meta.label == 'items.Item':
+                recompute_items(queryset, fields)
+            elif model._meta.label == 'persons.Person':
+                recompute_persons(queryset, fields, batch_size=batch_size)
+            else:
+                active_resolver.bulk_updater(queryset, fields, local_only=True)
+            merge(pending, get_dependents(model, chunk, fields))
+
+
+def merge(pending, updates):
+    """
+    Merges a map of dependent models to primary keys and fields into the pending updates
+    """
+    for model, (pks, fields) in updates.items():
+        pending_pks, pending_fields = pending.setdefault(model, [set(), set()])
+        pending_pks.update(pks)
+        if pending_fields is not None:
+            if fields is None:
+                pending[model][1] = None
+            else:
+                pending_fields.update(fields)
+
+
+def is_deferred():
+    return getattr(_local, 'deferred', None) is not None
+
+
+@contextmanager
+def deferred_computed_fields():
+    """
+    Collects the objects whose dependent computed fields need to be updated, and recomputes them in bulk
+    when the outermost context exits. If the context exits with an exception, nothing is recomputed.
+    """
+    if is_deferred():
+        yield
+        return
+    _local.deferred = {'saved': {}, 'pending': {}, 'updates': {}}
+    try:
+        yield
+        deferred = _local.deferred
+        _local.deferred = None
+        with transaction.atomic():
+            for func, pks in deferred['updates'].items():
+                func(pks)
+            for model, (pks, fields) in deferred['saved'].items():
+                recompute(model, pks, fields, local=False)
+            for model, (pks, fields) in deferred['pending'].items():
+                recompute(model, pks, fields)
+    finally:
+        _local.deferred = None
+
+
+def defer_update(func, pks):
+    """
+    Calls a function that updates derived values of objects, once per deferred_computed_fields() context
+    for all objects, or immediately if not deferred
+    :param func: a function that takes a set of primary keys
+    :param pks: the primary keys of the changed objects
+    """
+    if is_deferred():
+        _local.deferred['updates'].setdefault(func, set()).update(pks)
+    else:
+        func(set(pks))
+
+
+# Signal handlers that collect the changes while deferred, and otherwise call the handlers of django-computedfields
+HANDLERS = [
+    (pre_save, 'get_old_handler', 'COMP_FIELD_PRESAVE'),
+    (post_save, 'postsave_handler', 'COMP_FIELD'),
+    (pre_delete, 'predelete_handler', 'COMP_FIELD_PREDELETE'),
+    (post_delete, 'postdelete_handler', 'COMP_FIELD_POSTDELETE'),
+]
+
+
+def get_old_handler(sender, instance, **kwargs):
+    from computedfields import handlers
+    handlers.get_old_handler(sender, instance, **kwargs)
+    if is_deferred():
+        # The dependents of the old related objects of changed foreign keys
+        old = handlers.UPDATE_OLD.pop(instance, None)
+        if old:
+            merge(_local.deferred['pending'], old)
+
+
+def postsave_handler(sender, instance, **kwargs):
+    from computedfields import handlers
+    if not is_deferred():
+        handlers.postsave_handler(sender, instance, **kwargs)
+    elif not kwargs.get('raw'):
+        update_fields = kwargs.get('update_fields')
+        merge(_local.deferred['saved'], {sender: [{instance.pk}, set(update_fields) if update_fields else None]})
+
+
+def predelete_handler(sender, instance, **kwargs):
+    from computedfields import handlers
+    from computedfields.models import active_resolver
+    if not is_deferred():
+        handlers.predelete_handler(sender, instance, **kwargs)
+    else:
+        # The dependents have to be collected before the instance is deleted
+        merge(_local.deferred['pending'], active_resolver._querysets_for_update(sender, instance, pk_list=True))
+
+
+def postdelete_handler(sender, instance, **kwargs):
+    from computedfields import handlers
+    if not is_deferred():
+        handlers.postdelete_handler(sender, instance, **kwargs)
+
+
+def install_handlers():
+    """
+    Replaces the signal handlers of django-computedfields with the handlers of this module
+    """
+    for signal, name, dispatch_uid in HANDLERS:
+        # django-computedfields does not connect its handlers for some management commands (e.g. migrate)
+        if signal.disconnect(sender=None, dispatch_uid=dispatch_uid):
+            signal.connect(globals()[name], sender=None, weak=False, dispatch_uid=dispatch_uid)
@@ -0,0 +1,186 @@
+"""
+Bulk dumps of the data as newline-delimited JSON (NDJSON), one object per line.
+
+A dump contains all rows of one model, read in chunks ordered by primary key. Each row has the values of the
+concrete fields of the model (foreign keys as '<name>_id') and some values of related objects, e.g.
+'edition__year_start' for items, so that consumers do not need to join the dumps of small tables.
+
+With updated_since, a dump only contains the rows that were created or changed since then according to the
+history tables, followed by a line {"<primary key>": ..., "_deleted": true} per object that was deleted since
+then. The deleted objects of a dataset are found by the dataset field of their history rows, so dumps whose
+objects are linked to a dataset through other objects cannot combine updated_since with datasets.
+
+See the api/dump/<name>/ endpoint (mediate.api.DumpView) and the dump_ndjson command.
+"""
+import json
+import zlib
+from collections import OrderedDict
+from datetime import datetime, time
+
+from django.apps import apps
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from mediate.history import DELETED, get_history_model
+
+
+class Dump:
+    """
+    The rows of a model in a dump
+    """
+    def __init__(self, model_label, related_fields=None, dataset_field=None):
+        """
+        :param model_label: the label of the model, e.g. 'items.Item'
+        :param related_fields: the lookups of the values of related objects to add to each row
+        :param dataset_field: the lookup of the dataset of the objects
+        """
+        self.model_label = model_label
+        self.related_fields = related_fields or []
+        self.dataset_field = dataset_field
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_fields(self):
+        return [field.attname for field in self.model._meta.concrete_fields] + self.related_fields
+
+    def get_queryset(self, datasets=None, since=None):
+        """
+        :param datasets: the primary keys of the datasets to dump, or None for all
+        :param since: only dump the objects that were changed since this date
+        """
+        model = self.model
+        queryset = model._base_manager.all()
+        if datasets is not None:
+            # A subquery, as the objects may be linked to a dataset more than once
+            queryset = queryset.filter(pk__in=model._base_manager.filter(**{self.dataset_field + '__in': datasets})
+                                       .values('pk'))
+        if since is not None:
+            pk_name = model._meta.pk.attname
+            queryset = queryset.filter(pk__in=self.get_history(since).values(pk_name))
+        return queryset.order_by('pk').values(*self.get_fields())
+
+    def get_history(self, since):
+        history_model = get_history_model(self.model)
+        if history_model is None:
+            raise ValueError("The history of {} is not recorded".format(self.model_label))
+        return history_model.objects.filter(history_date__gte=since)
+
+    def get_deleted(self, since, datasets=None):
+        """
+        Gets the primary keys of the objects that were deleted since a date, as dicts
+        :param datasets: the primary keys of the datasets of the objects, or None for all
+        :raises ValueError: if the objects are scoped by datasets and the dataset field is not a field of the model
+        """
+        model = self.model
+        pk_name = model._meta.pk.attname
+        deleted = self.get_history(since).filter(history_type=DELETED)
+        if datasets is not None:
+            # The history rows of deleted objects cannot be joined to the objects that link them to a dataset
+            if '__' in self.dataset_field:
+                raise ValueError("The deleted {} cannot be selected by dataset, dump them without datasets"
+                                 .format(model._meta.verbose_name_plural))
+            deleted = deleted.filter(**{self.dataset_field + '__in': datasets})
+        return deleted.exclude(**{pk_name + '__in': model._base_manager.values('pk')})\
+            .order_by(pk_name).values(pk_name).distinct()
+
+    @staticmethod
+    def iterate(queryset, field, chunk_size):
+        """
+        Yields the rows of a values queryset ordered by a unique field in chunks, each selected by the last value of
+        the previous chunk, as MySQL does not have server-side cursors
+        """
+        last = None
+        while True:
+            chunk = list((queryset if last is None else queryset.filter(**{field + '__gt': last}))[:chunk_size])
+            if not chunk:
+                return
+            yield from chunk
+            last = chunk[-1][field]
+
+    def rows(self, datasets=None, since=None, chunk_size=2000):
+        """
+        Gets the rows of the dump as dicts
+        :raises ValueError: if the dump cannot be made, before any row is read
+        :return: a generator of dicts
+        """
+        pk_name = self.model._meta.pk.attname
+        queryset = self.get_queryset(datasets, since)
+        deleted = self.get_deleted(since, datasets) if since is not None else None
+
+        def generate():
+            yield from self.iterate(queryset, pk_name, chunk_size)
+            if deleted is not None:
+                for row in self.iterate(deleted, pk_name, chunk_size):
+                    yield {pk_name: row[pk_name], '_deleted': True}
+        return generate()
+
+    def lines(self, datasets=None, since=None, chunk_size=2000):
+        """
+        Gets the rows of the dump as lines of JSON
+        :raises ValueError: if the dump cannot be made, before any row is read
+        :return: a generator of strings
+        """
+        return (json.dumps(row, ensure_ascii=False, default=str) + "\n"
+                for row in self.rows(datasets, since, chunk_size))
+
+
+DUMPS = OrderedDict([
+    ('items', Dump('items.Item', ['lot__collection', 'lot__number_in_collection', 'edition__year_start',
+                                  'edition__year_end', 'edition__place__name', 'book_format__name'],
+                   'dataset_uuid')),
+    ('lots', Dump('catalogues.Lot', ['collection__short_title'], 'collection__catalogue__dataset')),
+    ('collections', Dump('catalogues.Collection', [], 'catalogue__dataset')),
+    ('catalogues', Dump('catalogues.Catalogue', ['dataset__name'], 'dataset')),
+    ('editions', Dump('items.Edition', ['place__name', 'place__cerl_id'], 'items__dataset_uuid')),
+    ('publishers', Dump('items.Publisher', ['publisher__short_name'], 'edition__items__dataset_uuid')),
+    ('persons', Dump('persons.Person', ['city_of_birth__name', 'city_of_death__name'],
+                     'personitemrelation__item__dataset_uuid')),
+    ('works', Dump('items.Work', [], 'items__item__dataset_uuid')),
+    ('workauthors', Dump('items.WorkAuthor', ['author__short_name'], 'work__items__item__dataset_uuid')),
+    ('personitemrelations', Dump('items.PersonItemRelation', ['person__short_name', 'role__name'],
+                                 'item__dataset_uuid')),
+    ('itemworkrelations', Dump('items.ItemWorkRelation', ['work__title'], 'item__dataset_uuid')),
+    ('itemitemtyperelations', Dump('items.ItemItemTypeRelation', ['type__name'], 'item__dataset_uuid')),
+    ('itemlanguagerelations', Dump('items.ItemLanguageRelation', ['language__name'], 'item__dataset_uuid')),
+    ('personcollectionrelations', Dump('catalogues.PersonCollectionRelation', ['person__short_name', 'role__name'],
+                                       'collection__catalogue__dataset')),
+])
+
+
+def parse_since(value):
+    """
+    Parses an ISO 8601 date or date and time; dates and times without a time zone are in the current time zone
+    :raises ValueError: if the value is not a valid date
+    """
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError("Not a valid date: {}".format(value))
+        since = datetime.combine(date, time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def gzip_stream(lines, buffer_size=64 * 1024):
+    """
+    Compresses lines of text to gzip on the fly
+    :param lines: an iterable of strings
+    :param buffer_size: the number of characters to compress at once
+    :return: a generator of bytes
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            data = compressor.compress("".join(buffer).encode())
+            buffer, size = [], 0
+            if data:
+                yield data
+    yield compressor.compress("".join(buffer).encode()) + compressor.flush()
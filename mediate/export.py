@@ -0,0 +1,112 @@
+import csv
+import tempfile
+
+from django.http import StreamingHttpResponse, FileResponse
+from django.utils.encoding import force_str
+from django_tables2.data import TableQuerysetData
+from django_tables2.rows import BoundRow
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+
+class Echo:
+    """
+    A file-like object that returns what is written to it, to stream the output of csv.writer
+    """
+    def write(self, value):
+        return value
+
+
+class StreamingTableExport:
+    """
+    Exports a django-tables2 table without loading all its records in memory.
+    The records are retrieved in chunks of primary keys, so that the related data the table prefetches
+    is also retrieved per chunk. CSV is streamed to the client; XLSX is written to a temporary file first.
+    """
+    CSV = 'csv'
+    XLSX = 'xlsx'
+
+    FORMATS = {
+        CSV: 'text/csv; charset=utf-8',
+        XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    }
+
+    CHUNK_SIZE = 500
+
+    def __init__(self, export_format, table, exclude_columns=None, chunk_size=None):
+        """
+        :param export_format: 'csv' or 'xlsx'
+        :param table: a configured (i.e. ordered) table
+        :param exclude_columns: the names of the columns not to export
+        :param chunk_size: the number of records to retrieve at once
+        """
+        if not self.is_valid_format(export_format):
+            raise TypeError('Export format "{}" is not supported.'.format(export_format))
+        self.format = export_format
+        self.table = table
+        self.exclude_columns = exclude_columns or ()
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    @classmethod
+    def is_valid_format(cls, export_format):
+        return export_format in cls.FORMATS
+
+    def get_columns(self):
+        return [column for column in self.table.columns.iterall()
+                if not (column.column.exclude_from_export or column.name in self.exclude_columns)]
+
+    def get_chunks(self):
+        """
+        Yields lists of records in the order of the table
+        """
+        if not isinstance(self.table.data, TableQuerysetData):
+            # Other table data (e.g. a ranking) retrieves its records per slice itself
+            for start in range(0, len(self.table.data), self.chunk_size):
+                yield self.table.data[start:start + self.chunk_size]
+            return
+
+        queryset = self.table.data.data
+        pks = queryset.prefetch_related(None).values_list('pk', flat=True)
+        chunk = []
+        for pk in pks.iterator(chunk_size=self.chunk_size):
+            chunk.append(pk)
+            if len(chunk) == self.chunk_size:
+                yield self.get_records(queryset, chunk)
+                chunk = []
+        if chunk:
+            yield self.get_records(queryset, chunk)
+
+    @staticmethod
+    def get_records(queryset, pks):
+        records = {record.pk: record for record in queryset.filter(pk__in=pks)}
+        return [records[pk] for pk in pks if pk in records]
+
+    def get_rows(self):
+        """
+        Yields the header and the values of the rows, like Table.as_values()
+        """
+        columns = self.get_columns()
+        yield [force_str(column.header, strings_only=True) for column in columns]
+        for records in self.get_chunks():
+            for record in records:
+                row = BoundRow(record, table=self.table)
+                yield [force_str(row.get_cell_value(column.name), strings_only=True) for column in columns]
+
+    def response(self, filename):
+        if self.format == self.CSV:
+            writer = csv.writer(Echo())
+            response = StreamingHttpResponse((writer.writerow(row) for row in self.get_rows()),
+                                             content_type=self.FORMATS[self.CSV])
+            response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+            return response
+
+        # A write-only workbook keeps the rows in temporary files instead of in memory
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        for row in self.get_rows():
+            worksheet.append([ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+                              for value in row])
+        file = tempfile.TemporaryFile()
+        workbook.save(file)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=self.FORMATS[self.XLSX])
@@ -0,0 +1,182 @@
+"""
+Bulk history.
+
+simple-history records a historical row per saved or deleted object, with an INSERT per row. Bulk queries
+(bulk_create, bulk_update, QuerySet.update) do not send signals, so they record no history at all. A HistoryWriter
+collects the historical rows of objects changed with bulk queries and inserts them in batches per historical model.
+
+Historical tables grow with every change. compact_history() removes the intermediate versions of objects that are
+older than a date: per object, the creation, the deletion and the last version before that date remain, so the
+state of every object at that date and any later date can still be restored.
+
+Example:
+
+    with HistoryWriter(change_reason="Batch edit") as history:
+        Item.objects.bulk_update(items, ['book_format'])
+        history.add(items)
+
+"""
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from simple_history.exceptions import NotHistoricalModelError
+from simple_history.utils import get_change_reason_from_object, get_history_model_for_model
+from search.index import reindex
+
+CREATED = '+'
+CHANGED = '~'
+DELETED = '-'
+
+
+def get_history_model(model):
+    """
+    Gets the historical model of a model, or None if its history is not recorded
+    """
+    try:
+        return get_history_model_for_model(model)
+    except NotHistoricalModelError:
+        return None
+
+
+def get_history_models():
+    """
+    Gets the historical models of all models with history, by the labels of the models
+    """
+    history_models = OrderedDict()
+    for model in apps.get_models():
+        history_model = get_history_model(model)
+        if history_model is not None and history_model is not model:
+            history_models[model._meta.label] = history_model
+    return history_models
+
+
+class HistoryWriter:
+    """
+    Collects historical rows for objects changed with bulk queries, and inserts them in batches
+    """
+    def __init__(self, change_reason="", user=None, batch_size=1000):
+        """
+        :param change_reason: the change reason of the historical rows (unless set on the objects)
+        :param user: the history user, by default the user of the current request
+        :param batch_size: the number of historical rows per INSERT statement
+        """
+        self.change_reason = change_reason
+        self.user = user
+        self.batch_size = batch_size
+        self.rows = OrderedDict()
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def get_row(self, history_model, obj, history_type, date):
+        row = history_model(
+            history_date=getattr(obj, '_history_date', date),
+            history_user=getattr(obj, '_history_user', self.user or history_model.get_default_history_user(obj)),
+            history_change_reason=get_change_reason_from_object(obj) or self.change_reason,
+            history_type=history_type,
+            **{field.attname: getattr(obj, field.attname) for field in history_model.tracked_fields}
+        )
+        if hasattr(history_model, 'history_relation'):
+            row.history_relation_id = obj.pk
+        return row
+
+    def add(self, objs, history_type=CHANGED):
+        """
+        Adds historical rows for objects, e.g. after bulk_update
+        :param objs: the objects, with the values of all their fields
+        :param history_type: CREATED, CHANGED or DELETED
+        """
+        if not getattr(settings, 'SIMPLE_HISTORY_ENABLED', True):
+            return
+        date = timezone.now()
+        for obj in objs:
+            history_model = get_history_model(type(obj))
+            if history_model is None:
+                continue
+            rows = self.rows.setdefault(history_model, [])
+            rows.append(self.get_row(history_model, obj, history_type, date))
+            if len(rows) >= self.batch_size:
+                self.flush_model(history_model)
+
+    def flush_model(self, history_model):
+        rows = self.rows.pop(history_model, [])
+        if rows:
+            history_model.objects.bulk_create(rows, batch_size=self.batch_size)
+            self.counts[history_model] = self.counts.get(history_model, 0) + len(rows)
+
+    def flush(self):
+        """
+        Inserts the collected historical rows
+        """
+        for history_model in list(self.rows):
+            self.flush_model(history_model)
+
+
+def update_with_history(queryset, change_reason="", batch_size=1000, **values):
+    """
+    Like QuerySet.update, but also records the history of the changed objects in batches and updates their
+    postings in the search index
+    :param queryset: the objects to change
+    :param change_reason: the change reason of the historical rows
+    :param batch_size: the number of objects per UPDATE statement
+    :param values: the new values (or expressions) per field
+    :return: the number of changed objects
+    """
+    model = queryset.model
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    with transaction.atomic(), HistoryWriter(change_reason=change_reason, batch_size=batch_size) as history:
+        for i in range(0, len(pks), batch_size):
+            objs = model._base_manager.filter(pk__in=pks[i:i + batch_size])
+            objs.update(**values)
+            if get_history_model(model) is not None:
+                history.add(objs)
+        reindex(model, pks, list(values), batch_size)
+    return len(pks)
+
+
+def get_superseded_versions(history_model, before):
+    """
+    Gets the historical rows that are superseded by a later version before a date, except for creations
+    and deletions
+    :param history_model: a historical model
+    :param before: the date
+    :return: a queryset of historical rows
+    """
+    pk_name = history_model.instance_type._meta.pk.attname
+    later_versions = history_model.objects.filter(**{pk_name: OuterRef(pk_name)}, history_date__lt=before)\
+        .filter(Q(history_date__gt=OuterRef('history_date')) |
+                Q(history_date=OuterRef('history_date'), history_id__gt=OuterRef('history_id')))
+    return history_model.objects.filter(history_type=CHANGED, history_date__lt=before)\
+        .filter(Exists(later_versions))
+
+
+def compact_history(history_model, before, batch_size=10000, dry_run=False):
+    """
+    Deletes the historical rows that are superseded by a later version before a date, in batches
+    :param history_model: a historical model
+    :param before: the date
+    :param batch_size: the number of rows per DELETE statement
+    :param dry_run: only count the rows
+    :return: the number of (deleted) rows
+    """
+    superseded = get_superseded_versions(history_model, before)
+    if dry_run:
+        return superseded.count()
+    deleted = 0
+    while True:
+        history_ids = list(superseded.order_by().values_list('history_id', flat=True)[:batch_size])
+        if not history_ids:
+            return deleted
+        with transaction.atomic():
+            # Without the delete signals, which are connected for all models and would be sent per row
+            deleted += history_model.objects.filter(history_id__in=history_ids)._raw_delete(history_model.objects.db)
@@ -0,0 +1,284 @@
+"""
+Bulk ingestion of imported data.
+
+Import commands create many objects that refer to each other. Saving them one at a time runs the save signals
+(counters, cache invalidation, dashboard totals, search index), the computed fields and the history per object.
+A BulkIngest instead:
+
+- keeps an identity map of lookup objects (places, formats, categories...), so that each is retrieved or created
+  only once
+- buffers new objects per model and writes them with bulk_create, in the order of their foreign keys
+- suspends the model signals, for objects that are still saved one by one
+- does the work of the signals once at the end, for all created and changed objects
+- reports the number of rows per second per model
+
+Example:
+
+    with transaction.atomic(), BulkIngest() as ingest:
+        place, created = ingest.get_or_create(Place, name='Leiden')
+        edition = ingest.add(Edition(place=place))
+    ingest.print_report()
+
+"""
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import signals
+
+MODEL_SIGNALS = [signals.pre_save, signals.post_save, signals.pre_delete, signals.post_delete, signals.m2m_changed]
+
+
+@contextmanager
+def suspended_signals(*signal_list):
+    """
+    Disconnects all receivers of the model signals while in the context. Only use this in processes that do
+    nothing else in the meantime (i.e. management commands), as it applies to all threads.
+    :param signal_list: the signals to suspend, by default the save, delete and m2m_changed signals
+    """
+    suspended = []
+    for signal in signal_list or MODEL_SIGNALS:
+        with signal.lock:
+            suspended.append((signal, signal.receivers))
+            signal.receivers = []
+            signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in suspended:
+            with signal.lock:
+                signal.receivers = receivers
+                signal.sender_receivers_cache.clear()
+
+
+def chunks(values, size):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class BulkIngest:
+    """
+    Buffers new objects and writes them in bulk, and does the work of the model signals once at the end
+    """
+    def __init__(self, batch_size=1000, change_reason="Import"):
+        """
+        :param batch_size: the number of buffered objects per model after which the buffers are written
+        :param change_reason: the change reason of the history records
+        """
+        self.batch_size = batch_size
+        self.change_reason = change_reason
+        self.buffers = OrderedDict()
+        self.created = defaultdict(list)
+        self.changed = defaultdict(set)
+        self.identity_map = {}
+        self.row_counts = defaultdict(int)
+        self.durations = defaultdict(float)
+        self.step_durations = OrderedDict()
+        self.finished = False
+        self._suspended_signals = None
+
+    def __enter__(self):
+        self._suspended_signals = suspended_signals()
+        self._suspended_signals.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.finish()
+        finally:
+            self.resume_signals()
+        return False
+
+    def resume_signals(self):
+        if self._suspended_signals is not None:
+            self._suspended_signals.__exit__(None, None, None)
+            self._suspended_signals = None
+
+    def add(self, obj):
+        """
+        Buffers a new object. It is written with the latest values of its fields.
+        :return: the object
+        """
+        self.buffers.setdefault(type(obj), []).append(obj)
+        if len(self.buffers[type(obj)]) >= self.batch_size:
+            self.flush()
+        return obj
+
+    def save(self, obj, update_fields=None):
+        """
+        Saves an existing object without signals, and does the work of the signals at the end.
+        Objects that are still buffered are only written when the buffers are flushed.
+        """
+        if obj._state.adding:
+            if obj not in self.buffers.get(type(obj), []):
+                self.add(obj)
+            return obj
+        obj.save(update_fields=update_fields)
+        self.changed[type(obj)].add(obj.pk)
+        return obj
+
+    def lookup(self, model, key, find, create=None):
+        """
+        Gets an object from the identity map, or finds it in the database, or creates it
+        :param model: the model of the object
+        :param key: a hashable key of the object within the model
+        :param find: a function that returns the existing object or None
+        :param create: a function that returns a new (unsaved) object, or None to not create objects
+        :return: a tuple of the object (or None) and whether it was created
+        """
+        if (model, key) in self.identity_map:
+            return self.identity_map[(model, key)], False
+        obj = find()
+        created = obj is None and create is not None
+        if created:
+            obj = self.add(create())
+        self.identity_map[(model, key)] = obj
+        return obj, created
+
+    @staticmethod
+    def get_key(lookup):
+        return tuple(sorted((name, value.pk if hasattr(value, '_meta') else value)
+                            for name, value in lookup.items()))
+
+    def get_or_create(self, model, defaults=None, **lookup):
+        """
+        Like QuerySet.get_or_create, but with the identity map and a buffered create
+        """
+        return self.lookup(model, self.get_key(lookup), lambda: model.objects.filter(**lookup).first(),
+                           lambda: model(**lookup, **(defaults or {})))
+
+    def get(self, model, **lookup):
+        """
+        Gets an object via the identity map, or None if it does not exist
+        """
+        return self.lookup(model, self.get_key(lookup), lambda: model.objects.filter(**lookup).first())[0]
+
+    def get_model_order(self):
+        """
+        Gets the buffered models, ordered so that the models they refer to come first
+        """
+        models = list(self.buffers)
+        ordered = []
+
+        def visit(model, path):
+            if model in ordered or model in path:
+                return
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.related_model in models and field.related_model is not model:
+                    visit(field.related_model, path | {model})
+            ordered.append(model)
+
+        for model in models:
+            visit(model, set())
+        return ordered
+
+    def flush(self):
+        """
+        Writes all buffered objects, in the order of their foreign keys
+        """
+        for model in self.get_model_order():
+            objs = self.buffers.pop(model)
+            if not objs:
+                continue
+            start = time.perf_counter()
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+            self.durations[model] += time.perf_counter() - start
+            self.row_counts[model] += len(objs)
+            self.created[model].extend(obj.pk for obj in objs)
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        yield
+        self.step_durations[name] = self.step_durations.get(name, 0) + time.perf_counter() - start
+
+    def get_pks(self, model):
+        """
+        Gets the primary keys of the created and changed objects of a model
+        """
+        created = self.created.get(model, [])
+        return created + list(self.changed.get(model, set()) - set(created))
+
+    def finish(self):
+        """
+        Writes the remaining objects and does the work of the signals for all created and changed objects:
+        lot order, counters, computed fields, history, search index, cache and dashboard totals
+        """
+        if self.finished:
+            return
+        self.flush()
+        self.finished = True
+        models = list(dict.fromkeys(list(self.created) + list(self.changed)))
+        if not models:
+            return
+
+        from catalogues.models import Catalogue, CatalogueCollectionRelation, Collection, Lot
+        from catalogues.ordering import rebalance_lots
+        from catalogues.tools import reconcile_counters, invalidate_session_scopes
+        from dashboard.models import Totals
+        from items.models import Item
+        from mediate.cache import invalidate_instances
+        from mediate.computed import recompute
+        from mediate.history import HistoryWriter, CREATED, CHANGED
+        from persons.models import AlternativePersonName, Person
+        from search.index import get_indexes, reindex
+
+        with transaction.atomic():
+            collection_ids = set(self.created.get(Collection, [])) | set(self.changed.get(Collection, set()))
+            for model in [Lot, Item]:
+                lookup = 'collection' if model is Lot else 'lot__collection'
+                for pks in chunks(self.get_pks(model), self.batch_size):
+                    collection_ids.update(model.objects.filter(pk__in=pks).values_list(lookup, flat=True)
+                                          .distinct())
+            collection_ids.discard(None)
+
+            with self.step("Lot order"):
+                for collection_id in collection_ids:
+                    rebalance_lots(collection_id, order_by=('index_in_collection', 'sort_key'))
+
+            with self.step("Computed fields"):
+                for model in models:
+                    recompute(model, self.get_pks(model), batch_size=self.batch_size)
+
+            with self.step("Counters"):
+                reconcile_counters(collection_ids)
+
+            with self.step("History, search index and cache"), \
+                    HistoryWriter(change_reason=self.change_reason, batch_size=self.batch_size) as history:
+                for model in models:
+                    created = set(self.created.get(model, []))
+                    for pks in chunks(self.get_pks(model), self.batch_size):
+                        objs = list(model.objects.filter(pk__in=pks))
+                        history.add([obj for obj in objs if obj.pk in created], CREATED)
+                        history.add([obj for obj in objs if obj.pk not in created], CHANGED)
+                        for index in get_indexes(model):
+                            index.index_objects(objs)
+                        invalidate_instances(objs)
+                        # The alternative names are indexed with the names of their persons
+                        if model is AlternativePersonName:
+                            reindex(Person, {obj.person_id for obj in objs})
+
+            if Catalogue in models or CatalogueCollectionRelation in models:
+                invalidate_session_scopes()
+            Totals.mark_stale()
+
+    def get_report(self):
+        """
+        Gets the number of rows written per model and the time spent on the work after writing them
+        :return: a list of lines
+        """
+        lines = []
+        for model, count in self.row_counts.items():
+            duration = self.durations[model]
+            lines.append("{}: {} rows in {:.2f} s ({:.0f} rows/sec)".format(
+                model._meta.verbose_name_plural.capitalize(), count, duration, count / duration if duration else 0))
+        for name, duration in self.step_durations.items():
+            lines.append("{}: {:.2f} s".format(name, duration))
+        return lines
+
+    def print_report(self):
+        for line in self.get_report():
+            print(line)
@@ -0,0 +1,53 @@
+"""
+Compacts the history tables: removes the intermediate versions of objects that are older than a number of days.
+Per object, the creation, the deletion and the last version before that day remain (see mediate.history).
+
+Example:
+
+    ./manage.py compact_history --days 365 --dry_run
+    ./manage.py compact_history --days 365 --model items.Item
+
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from jobs.tasks import report_progress
+from mediate.history import compact_history, get_history_models
+
+
+class Command(BaseCommand):
+    help = 'Remove the intermediate versions of objects from the history tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', type=int, default=365,
+                            help='Keep all versions of the last number of days.')
+        parser.add_argument('-m', '--model', type=str, action='append',
+                            help='The label of a model (e.g. items.Item) whose history to compact. '
+                                 'Can be used more than once. All models by default.')
+        parser.add_argument('-b', '--batch_size', type=int, default=10000,
+                            help='The number of rows to delete per query.')
+        parser.add_argument('-n', '--dry_run', action='store_true',
+                            help='Only count the versions that would be removed.')
+
+    def handle(self, *args, **kwargs):
+        history_models = get_history_models()
+        labels = kwargs['model'] or list(history_models)
+        for label in labels:
+            if label not in history_models:
+                raise CommandError("The history of {} is not recorded".format(label))
+        before = timezone.now() - timedelta(days=kwargs['days'])
+
+        total = 0
+        for index, label in enumerate(labels, start=1):
+            start = time.perf_counter()
+            count = compact_history(history_models[label], before, batch_size=kwargs['batch_size'],
+                                    dry_run=kwargs['dry_run'])
+            total += count
+            report_progress(current=index, total=len(labels), message=label)
+            self.stdout.write("{}: {} {} versions in {:.2f} s".format(
+                label, "would remove" if kwargs['dry_run'] else "removed", count, time.perf_counter() - start))
+        self.stdout.write("{} {} versions from before {:%Y-%m-%d}".format(
+            "Would remove" if kwargs['dry_run'] else "Removed", total, before))
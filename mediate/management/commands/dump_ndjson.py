@@ -0,0 +1,65 @@
+"""
+Dumps all rows of a model as newline-delimited JSON, optionally only those of a dataset or those changed since
+a date (see mediate.dump). Output files ending with .gz are compressed on the fly.
+
+Example:
+
+    ./manage.py dump_ndjson items --dataset "Private libraries" -o items.ndjson.gz
+    ./manage.py dump_ndjson persons --updated_since 2024-01-01 -o persons.ndjson
+
+"""
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogues.models import Dataset
+from mediate.dump import DUMPS, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Dump the rows of a model as newline-delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', type=str, choices=list(DUMPS),
+                            help='The name of the dump.')
+        parser.add_argument('-o', '--output', type=str,
+                            help='The output file, compressed with gzip if it ends with .gz. Standard output by '
+                                 'default.')
+        parser.add_argument('-d', '--dataset', type=str, action='append',
+                            help='The name of a dataset whose objects to dump. Can be used more than once.')
+        parser.add_argument('-s', '--updated_since', type=str,
+                            help='Only dump the objects created, changed or deleted since this date (ISO 8601).')
+        parser.add_argument('-c', '--chunk_size', type=int, default=2000,
+                            help='The number of rows to fetch at once.')
+
+    def handle(self, *args, **kwargs):
+        dump = DUMPS[kwargs['name']]
+        datasets = None
+        if kwargs['dataset']:
+            datasets = list(Dataset.objects.filter(name__in=kwargs['dataset']).values_list('pk', flat=True))
+            if len(datasets) < len(set(kwargs['dataset'])):
+                raise CommandError("Dataset(s) {} do not exist".format(", ".join(kwargs['dataset'])))
+        since = None
+        if kwargs['updated_since']:
+            try:
+                since = parse_since(kwargs['updated_since'])
+            except ValueError as e:
+                raise CommandError(e)
+
+        start = time.perf_counter()
+        try:
+            lines = dump.lines(datasets, since, chunk_size=kwargs['chunk_size'])
+            if not kwargs['output']:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+                return
+            count = 0
+            opener = gzip.open if kwargs['output'].endswith('.gz') else open
+            with opener(kwargs['output'], 'wt', encoding='utf-8') as file:
+                for count, line in enumerate(lines, start=1):
+                    file.write(line)
+        except ValueError as e:
+            raise CommandError(e)
+        print("Dumped {} rows of {} to {} in {:.2f} s".format(count, kwargs['name'], kwargs['output'],
+                                                              time.perf_counter() - start))
@@ -0,0 +1,54 @@
+"""
+Fills in missing data from the authority records: the coordinates of places from their CERL records and the years
+of birth and death of persons from their VIAF records (see apiconnectors.enrich). The records are fetched
+concurrently, and the objects are updated in batches. With a checkpoint file, an interrupted run continues where
+it stopped.
+
+Example:
+
+    ./manage.py enrich_authorities places persons --workers 8 --rate 10 --checkpoint enrich.json
+
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apiconnectors.enrich import ENRICHMENTS, Enricher
+from jobs.tasks import report_progress
+
+
+class Command(BaseCommand):
+    help = 'Fill in the coordinates of places and the years of persons from their CERL and VIAF records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', type=str, nargs='*',
+                            help='The objects to enrich: {}. All by default.'.format(", ".join(ENRICHMENTS)))
+        parser.add_argument('-w', '--workers', type=int, default=8,
+                            help='The number of records to fetch at the same time.')
+        parser.add_argument('-r', '--rate', type=float, default=10,
+                            help='The maximum number of requests per second, 0 for no limit.')
+        parser.add_argument('-R', '--retries', type=int, default=3,
+                            help='The number of times a failed request is retried.')
+        parser.add_argument('-b', '--batch_size', type=int, default=200,
+                            help='The number of objects to update at once.')
+        parser.add_argument('-c', '--checkpoint', type=str,
+                            help='A file to keep the progress in, to continue an interrupted run.')
+
+    def handle(self, *args, **kwargs):
+        names = kwargs['model'] or list(ENRICHMENTS)
+        for name in names:
+            if name not in ENRICHMENTS:
+                raise CommandError("Unknown objects {}. Choose from: {}".format(name, ", ".join(ENRICHMENTS)))
+        for name in names:
+            enricher = Enricher(ENRICHMENTS[name], workers=kwargs['workers'], rate=kwargs['rate'],
+                                retries=kwargs['retries'], batch_size=kwargs['batch_size'],
+                                checkpoint=kwargs['checkpoint'])
+            start = time.perf_counter()
+            progress = {'done': 0, 'updated': 0, 'failed': 0, 'rate': 0}
+            for progress in enricher.run():
+                report_progress(current=progress['done'], total=progress['total'], message=name)
+                print("{}: {} of {} done, {} updated, {} failed, {:.1f} per second".format(
+                    name, progress['done'], progress['total'], progress['updated'], progress['failed'],
+                    progress['rate']))
+            print("Enriched {} of {} {} ({} failed) in {:.2f} s".format(
+                progress['updated'], progress['done'], name, progress['failed'], time.perf_counter() - start))
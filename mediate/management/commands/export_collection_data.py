@@ -1,19 +1,94 @@
-from django.core.management.base import BaseCommand
+"""
+Exports the items, persons or lots of one or more collections.
+The data of each collection is retrieved with a fixed number of queries.
+
+Example:
+
+    ./manage.py export_collection_data items <collection UUID> <collection UUID> --format jsonl -o items.jsonl
+    ./manage.py export_collection_data lots --all-collections --format npz -o lots.npz
+
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
 import csv
+import json
 import sys
-from items.models import Item, MaterialDetails, Language, ItemType, PersonItemRelation
-from catalogues.models import Lot
-from persons.models import Person, Place
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from items.models import Item, PersonItemRelation, ItemWorkRelation, ItemLanguageRelation, \
+    ItemMaterialDetailsRelation, ItemItemTypeRelation, Publisher, PublicationPlace
+from catalogues.models import Lot, Collection
+from persons.models import Person
+from tagme.models import TaggedEntity
+
+
+class CsvWriter:
+    def __init__(self, file, header):
+        self.writer = csv.writer(file)
+        self.writer.writerow(header)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter:
+    def __init__(self, file, header):
+        self.file = file
+        self.header = header
+
+    def writerow(self, row):
+        self.file.write(json.dumps(dict(zip(self.header, row)), ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        pass
+
+
+class ColumnarWriter:
+    """
+    Collects the values per column and saves them as numpy string arrays, one per column, in a .npz file
+    """
+    def __init__(self, file, header):
+        self.file = file
+        self.header = header
+        self.columns = [[] for column in header]
+
+    def writerow(self, row):
+        for column, value in zip(self.columns, row):
+            column.append("" if value is None else str(value))
+
+    def close(self):
+        np.savez_compressed(self.file, **{name: np.array(values, dtype=str)
+                                          for name, values in zip(self.header, self.columns)})
 
 
 class Command(BaseCommand):
     help = 'Exports data for a Collection'
 
+    WRITERS = {
+        'csv': CsvWriter,
+        'jsonl': JsonLinesWriter,
+        'npz': ColumnarWriter,
+    }
+
+    ITEM_HEADER = ["Short title", "People VIAF", "Work VIAF", "Lot", "Index in lot", "Collection",
+                   "Number of volumes", "Book format", "Material details", "Edition", "Languages",
+                   "Parisian category", "Item type", "Tags"]
+    PERSON_HEADER = ["Short name", "Name", "Birth", "Death", "Sex", "Notes", "Bibliography"]
+    LOT_HEADER = ["Text", "Collection", "Number in collection", "Page in collection", "Index", "Category",
+                  "Parisian category"]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.dry_run = False
         self.collection_uuids = []
-        self.writer = csv.writer(sys.stdout)
+        self.writer = None
+        self.row_count = 0
 
     def add_arguments(self, parser):
         # Positional
@@ -21,102 +96,142 @@ class Command(BaseCommand):
         parser.add_argument('collection', type=str, nargs='*', help='Collection UUID')
 
         # Optional
-        # parser.add_argument('-d', '--dry_run', action='store_true', help='Do not make any change to the database.')
-        # parser.add_argument('-vv', '--verbose', action='store_true', help='Print the data.')
-
-    def get_edition_string(self, item):
-        year = item.edition.get_year_range_str()
-        year_str = year if year else ""
-        publishers_str = ", ".join(
-            Person.objects.filter(publisher__edition=item.edition_id).values_list('short_name', flat=True)
-        )
-        places_str = ", ".join(
-            Place.objects.filter(publicationplace__edition=item.edition_id).values_list('name', flat=True)
-        )
-        return f'{places_str}{": " if places_str else ""}{publishers_str}{", " if publishers_str and year_str else ""}{year_str}'
+        parser.add_argument('-a', '--all-collections', action='store_true', help='Export all collections.')
+        parser.add_argument('-f', '--format', choices=self.WRITERS.keys(), default='csv',
+                            help='The output format: csv (default), jsonl (JSON lines) '
+                                 'or npz (columnar numpy arrays, one per column).')
+        parser.add_argument('-o', '--output', type=str, help='The output file (default: standard output).')
 
     def handle(self, *args, **kwargs):
-        self.collection_uuids = kwargs.get('collection', [])
+        if kwargs['all_collections']:
+            self.collection_uuids = list(Collection.objects.values_list('uuid', flat=True))
+        else:
+            self.collection_uuids = kwargs.get('collection', [])
         model = kwargs.get('model', "").lower()
 
         if model == "items":
-            self.write_items()
+            header, write_collection = self.ITEM_HEADER, self.write_items
         elif model == "persons" or model == "people":
-            self.write_people()
+            header, write_collection = self.PERSON_HEADER, self.write_people
         elif model == "lots":
-            self.write_lots()
+            header, write_collection = self.LOT_HEADER, self.write_lots
         else:
             print("Please give a model to output, either items, persons or lots.")
+            return
 
-    def write_items(self):
-        self.writer.writerow(["Short title", "People VIAF", "Work VIAF", "Lot", "Index in lot", "Collection",
-                              "Number of volumes", "Book format", "Material details", "Edition", "Languages",
-                              "Parisian category", "Item type", "Tags"])
+        output_format = kwargs['format']
+        if output_format == 'npz' and not kwargs['output']:
+            raise CommandError("The npz format requires an output file.")
+        if not kwargs['output']:
+            file = sys.stdout
+        elif output_format == 'npz':
+            file = open(kwargs['output'], 'wb')
+        else:
+            file = open(kwargs['output'], 'w', newline='', encoding='utf-8')
+
+        start = time.perf_counter()
+        self.writer = self.WRITERS[output_format](file, header)
         for collection_uuid in self.collection_uuids:
-            # Items
-            for item in Item.objects.filter(lot__collection_id=collection_uuid):
-                self.writer.writerow([
-                    item.short_title,
-                    self.get_persons(item),
-                    "; ".join(relation.work.viaf_id for relation in item.works.all() if relation.work.viaf_id),
-                    item.lot.lot_as_listed_in_collection,
-                    item.index_in_lot,
-                    item.lot.collection.short_title,
-                    item.number_of_volumes,
-                    item.book_format.name if item.book_format else "",
-                    "; ".join(MaterialDetails.objects.filter(items__item=item).values_list('description', flat=True)),
-                    self.get_edition_string(item),
-                    "; ".join(Language.objects.filter(items__item=item).values_list('name', flat=True)),
-                    item.parisian_category.name if item.parisian_category else "",
-                    "; ".join(ItemType.objects.filter(itemitemtyperelation__item=item).values_list('name', flat=True)),
-                    ", ".join([str(taggedentity.tag) for taggedentity in item.tags.all()])
-                ])
-
-    def get_persons(self, item):
-        person_item_relations = item.personitemrelation_set.all()  #
+            write_collection(collection_uuid)
+        self.writer.close()
+        if file is not sys.stdout:
+            file.close()
+
+        duration = time.perf_counter() - start
+        self.stderr.write("Exported {} rows in {:.1f} seconds ({:.0f} rows/sec)".format(
+            self.row_count, duration, self.row_count / duration if duration else 0))
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.row_count += 1
+
+    @staticmethod
+    def get_edition_string(edition):
+        year_str = edition.get_year_range_str()
+        publishers_str = ", ".join(publisher.publisher.short_name for publisher in edition.publisher_set.all())
+        places_str = ", ".join(publication_place.place.name
+                               for publication_place in edition.publicationplace_set.all())
+        return f'{places_str}{": " if places_str else ""}{publishers_str}{", " if publishers_str and year_str else ""}{year_str}'
+
+    @staticmethod
+    def get_persons(item):
+        # Group the relations per role, in order of first occurrence
+        relations_per_role = OrderedDict()
+        for relation in item.personitemrelation_set.all():
+            relations_per_role.setdefault(relation.role, []).append(relation)
+
         relation_groups = []
-        for role in set([relation.role for relation in person_item_relations]):
-            role_relations = person_item_relations.filter(role=role)
+        for role, role_relations in relations_per_role.items():
             persons = []
             for relation in role_relations:
                 person = relation.person
-                name = person.short_name
-                viaf = person.viaf_id
-                person_entry = name
-                if viaf:
-                    person_entry += f" ({viaf})"
+                person_entry = person.short_name
+                if person.viaf_id:
+                    person_entry += f" ({person.viaf_id})"
                 persons.append(person_entry)
 
             relation_groups.append(role.name.capitalize() + ": " + "; ".join(persons))
         return " - ".join(relation_groups)
 
-    def write_people(self):
-        self.writer.writerow(["Short name", "Name", "Birth", "Death", "Sex", "Notes", "Bibliography"])
-        for collection_uuid in self.collection_uuids:
-            for person in Person.objects.filter(personitemrelation__item__catalogue__collection__uuid=collection_uuid)\
-                    .distinct():
-                self.writer.writerow([
-                    person.short_name,
-                    f'{person.first_names} {person.surname}',
-                    person.date_of_birth,
-                    person.date_of_death,
-                    person.sex,
-                    person.notes,
-                    person.bibliography
-                ])
-
-    def write_lots(self):
-        self.writer.writerow(["Text", "Collection", "Number in collection", "Page in collection", "Index", "Category",
-                              "Parisian category"])
-        for collection_uuid in self.collection_uuids:
-            for lot in Lot.objects.filter(collection_id=collection_uuid)\
-                    .select_related('category',  'category__parisian_category').order_by('index_in_collection'):
-                self.writer.writerow([
-                    lot.lot_as_listed_in_collection,
-                    lot.collection.short_title,
-                    lot.number_in_collection,
-                    lot.page_in_collection,
-                    lot.index_in_collection,
-                    lot.category.bookseller_category if lot.category else "",
-                    lot.category.parisian_category.name if lot.category and lot.category.parisian_category else ""
-                ])
\ No newline at end of file
+    def write_items(self, collection_uuid):
+        items = Item.objects.filter(lot__collection_id=collection_uuid)\
+            .select_related('lot', 'lot__collection', 'book_format', 'parisian_category', 'edition')\
+            .prefetch_related(
+                Prefetch('personitemrelation_set',
+                         queryset=PersonItemRelation.objects.select_related('person', 'role')),
+                Prefetch('works', queryset=ItemWorkRelation.objects.select_related('work')),
+                Prefetch('itemmaterialdetailsrelation_set',
+                         queryset=ItemMaterialDetailsRelation.objects.select_related('material_details')),
+                Prefetch('languages', queryset=ItemLanguageRelation.objects.select_related('language')),
+                Prefetch('itemitemtyperelation_set', queryset=ItemItemTypeRelation.objects.select_related('type')),
+                Prefetch('edition__publisher_set', queryset=Publisher.objects.select_related('publisher')),
+                Prefetch('edition__publicationplace_set',
+                         queryset=PublicationPlace.objects.select_related('place')),
+                Prefetch('tags', queryset=TaggedEntity.objects.select_related('tag')),
+            )
+        for item in items:
+            self.writerow([
+                item.short_title,
+                self.get_persons(item),
+                "; ".join(relation.work.viaf_id for relation in item.works.all() if relation.work.viaf_id),
+                item.lot.lot_as_listed_in_collection,
+                item.index_in_lot,
+                item.lot.collection.short_title,
+                item.number_of_volumes,
+                item.book_format.name if item.book_format else "",
+                "; ".join(relation.material_details.description
+                          for relation in item.itemmaterialdetailsrelation_set.all()),
+                self.get_edition_string(item.edition),
+                "; ".join(relation.language.name for relation in item.languages.all()),
+                item.parisian_category.name if item.parisian_category else "",
+                "; ".join(relation.type.name for relation in item.itemitemtyperelation_set.all()),
+                ", ".join([str(taggedentity.tag) for taggedentity in item.tags.all()])
+            ])
+
+    def write_people(self, collection_uuid):
+        for person in Person.objects.filter(personitemrelation__item__catalogue__collection__uuid=collection_uuid)\
+                .distinct():
+            self.writerow([
+                person.short_name,
+                f'{person.first_names} {person.surname}',
+                person.date_of_birth,
+                person.date_of_death,
+                person.sex,
+                person.notes,
+                person.bibliography
+            ])
+
+    def write_lots(self, collection_uuid):
+        # The index in the collection is the position of the lot
+        lots = Lot.objects.filter(collection_id=collection_uuid)\
+            .select_related('collection', 'category', 'category__parisian_category').order_by('sort_key')
+        for index_in_collection, lot in enumerate(lots, start=1):
+            self.writerow([
+                lot.lot_as_listed_in_collection,
+                lot.collection.short_title,
+                lot.number_in_collection,
+                lot.page_in_collection,
+                index_in_collection,
+                lot.category.bookseller_category if lot.category else "",
+                lot.category.parisian_category.name if lot.category and lot.category.parisian_category else ""
+            ])
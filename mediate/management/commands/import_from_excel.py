@@ -4,9 +4,10 @@ from openpyxl import load_workbook
 
 import os
 
-from catalogues.models import Collection, Catalogue, Lot, Category
+from catalogues.models import Collection, Catalogue, Lot, Category, CatalogueCollectionRelation
 from items.models import Item, Edition, BookFormat
 from persons.models import Place
+from mediate.ingest import BulkIngest
 
 
 class Command(BaseCommand):
@@ -39,54 +40,58 @@ class Command(BaseCommand):
                 lots_data.append(dict(zip(header, row_as_list)))
 
             # Handle each lot dict
-            index_in_collection = 1
-            for lot_dict in lots_data:
-
-                # Catalogue and Collection
-                collection_short_title = os.path.splitext(os.path.basename(transcription_file))[0]
-                catalogue, created = Catalogue.objects.get_or_create(name=collection_short_title)
-                collection, created = Collection.objects.get_or_create(
-                    catalogue=catalogue,
-                    short_title=collection_short_title,
-                    full_title=lot_dict['full_collection_title'],
-                    preface_and_paratexts=lot_dict['preface_and paratexts'],
-                    year_of_publication=lot_dict['collection_date_of_publication'],
-                )
-
-                # Category
-                category, created = Category.objects\
-                    .get_or_create(collection=collection, bookseller_category=lot_dict['bookseller_category_books'])
-
-                # Lot
-                lot = Lot.objects.create(
-                    collection=collection,
-                    number_in_collection=lot_dict['number_in_collection'],
-                    lot_as_listed_in_collection=lot_dict['item_as_listed_in_collection'],
-                    index_in_collection=index_in_collection,
-                    category=category
-                )
-                index_in_collection += 1
-
-                # Place
-                place = None
-                if lot_dict['place_of_publication']:
-                    try:
-                        place = Place.objects.get(name=lot_dict['place_of_publication'])
-                    except:
-                        pass
-
-                # Edition
-                edition = Edition.objects.create(place=place)
-
-                # Book format
-                book_format, created = BookFormat.objects.get_or_create(name=lot_dict['book_format'])
-
-                # Item
-                item = Item.objects.create(
-                    short_title=lot_dict['item_as_listed_in_collection'][:128],
-                    lot=lot,
-                    catalogue=catalogue,
-                    book_format=book_format,
-                    index_in_lot=1,
-                    edition=edition
-                )
+            with BulkIngest() as ingest:
+                index_in_collection = 1
+                for lot_dict in lots_data:
+
+                    # Catalogue and Collection
+                    collection_short_title = os.path.splitext(os.path.basename(transcription_file))[0]
+                    catalogue, created = ingest.get_or_create(Catalogue, name=collection_short_title)
+                    collection_fields = {
+                        'short_title': collection_short_title,
+                        'full_title': lot_dict['full_collection_title'],
+                        'preface_and_paratexts': lot_dict['preface_and paratexts'],
+                        'year_of_publication': lot_dict['collection_date_of_publication'],
+                    }
+                    collection, created = ingest.lookup(
+                        Collection, (catalogue.pk,) + ingest.get_key(collection_fields),
+                        lambda: Collection.objects.filter(catalogue=catalogue, **collection_fields).first(),
+                        lambda: Collection(**collection_fields))
+                    if created:
+                        ingest.add(CatalogueCollectionRelation(catalogue=catalogue, collection=collection))
+
+                    # Category
+                    category, created = ingest.get_or_create(
+                        Category, collection=collection, bookseller_category=lot_dict['bookseller_category_books'])
+
+                    # Lot
+                    lot = ingest.add(Lot(
+                        collection=collection,
+                        number_in_collection=lot_dict['number_in_collection'],
+                        lot_as_listed_in_collection=lot_dict['item_as_listed_in_collection'],
+                        index_in_collection=index_in_collection,
+                        category=category
+                    ))
+                    index_in_collection += 1
+
+                    # Place
+                    place = None
+                    if lot_dict['place_of_publication']:
+                        place = ingest.get(Place, name=lot_dict['place_of_publication'])
+
+                    # Edition
+                    edition = ingest.add(Edition(place=place))
+
+                    # Book format
+                    book_format, created = ingest.get_or_create(BookFormat, name=lot_dict['book_format'])
+
+                    # Item
+                    ingest.add(Item(
+                        short_title=lot_dict['item_as_listed_in_collection'][:128],
+                        lot=lot,
+                        catalogue=catalogue,
+                        book_format=book_format,
+                        index_in_lot=1,
+                        edition=edition
+                    ))
+            ingest.print_report()
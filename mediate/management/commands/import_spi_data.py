@@ -16,6 +16,7 @@ import re
 import catalogues
 import items
 import persons
+from mediate.ingest import BulkIngest
 
 
 class Command(BaseCommand):
@@ -43,6 +44,7 @@ class Command(BaseCommand):
         self.dataset_name = kwargs.get('dataset_name', "Dump")
 
         # Read collection IDs
+        collection_ids = None
         if collection_ids_filename:
             with open(collection_ids_filename, 'r') as cat_ids_file:
                 collection_ids = [id.strip() for id in cat_ids_file.readlines()]
@@ -58,13 +60,16 @@ class Command(BaseCommand):
         cursor = db_connection.cursor()
 
         # Collections
-        collection_id_mapping = self.create_collections(collection_ids, cursor)
+        with BulkIngest() as self.ingest:
+            self.catalogues_with_collections = set()
+            self.create_collections(collection_ids, cursor)
+        self.ingest.print_report()
 
         # Close database connection
         cursor.close
         db_connection.close()
 
-    def create_items(self, lot, lot_spi_id, cursor):
+    def create_items(self, lot, catalogue, lot_spi_id, cursor):
         cursor.execute("SELECT `item`.*, `lot`.entry_text FROM `item` JOIN `lot` ON `item`.lot_id = `lot`.id "
                            "WHERE `lot`.id = {}".format(lot_spi_id))
         resultSet = cursor.fetchall()
@@ -85,30 +90,26 @@ class Command(BaseCommand):
                 # Find a place marked with [non-CERL]
                 non_cerl_str = "[non-CERL]"
                 place_name = places_of_publication[0]
-                places = persons.models.Place.objects\
-                    .filter(name__iregex=re.escape(place_name) + r' +' + re.escape(non_cerl_str))
-                if places:
-                    place = places[0]
-                else:
-                    place = persons.models.Place.objects.create(name="{} {}".format(place_name, non_cerl_str))
+                place, created = self.ingest.lookup(
+                    persons.models.Place, (non_cerl_str, place_name.lower()),
+                    lambda: persons.models.Place.objects
+                    .filter(name__iregex=re.escape(place_name) + r' +' + re.escape(non_cerl_str)).first(),
+                    lambda: persons.models.Place(name="{} {}".format(place_name, non_cerl_str)))
             else:
                 place = None
             # print('place: ' + str(place))
             if row['publisher']:
-                person, created = persons.models.Person.objects.get_or_create(short_name=row['publisher'],
-                                         surname=row['publisher'],
-                                         first_names='',
-                                         sex='UNKNOWN')
+                person, created = self.ingest.get_or_create(persons.models.Person, short_name=row['publisher'],
+                                                            surname=row['publisher'],
+                                                            first_names='',
+                                                            sex='UNKNOWN')
             else:
                 person = None
             # print('person: ' + str(person) + " " + str(created))
-            edition = items.models.Edition(year_start=date, place=place)
-            edition.save()
+            edition = self.ingest.add(items.models.Edition(year_start=date, place=place))
             # print('edition: ' + str(edition))
             if person:
-                publisher = items.models.Publisher(edition=edition, publisher=person)
-                publisher.save()
-                # print('publisher: ' + str(publisher))
+                self.ingest.add(items.models.Publisher(edition=edition, publisher=person))
 
             item_entries = re.compile(r'\s?\/\s?').split(row['entry_text'])
             if len(item_entries) >= row['index_in_lot']:
@@ -119,11 +120,12 @@ class Command(BaseCommand):
             try:
                 book_format = None
                 if row['book_format']:
-                    book_format, created = items.models.BookFormat.objects.get_or_create(name=row['book_format'])
+                    book_format, created = self.ingest.get_or_create(items.models.BookFormat,
+                                                                     name=row['book_format'])
                 insert_fields = {
                     'short_title': short_title[:128],
                     'lot': lot,
-                    'catalogue': lot.collection.catalogue.first(),
+                    'catalogue': catalogue,
                     'number_of_volumes': row['number_of_volumes'],
                     'book_format': book_format,
                     'index_in_lot': row['index_in_lot'],
@@ -135,20 +137,17 @@ class Command(BaseCommand):
                 raise e
 
             try:
-                item = items.models.Item(**insert_fields)
-                item.save()
+                item = self.ingest.add(items.models.Item(**insert_fields))
             except Exception as e:
                 print(insert_fields)
                 raise e
 
             if row['binding_material_details']:
-                material_details, created = items.models.MaterialDetails.objects.get_or_create(
-                    description=row['binding_material_details'])
-                item_materialdetails_relations = items.models.ItemMaterialDetailsRelation(item=item,
-                                                                                          material_details=material_details)
-                item_materialdetails_relations.save()
+                material_details, created = self.ingest.get_or_create(
+                    items.models.MaterialDetails, description=row['binding_material_details'])
+                self.ingest.add(items.models.ItemMaterialDetailsRelation(item=item, material_details=material_details))
 
-    def create_lots(self, collection, catalogue_id_spi, cursor):
+    def create_lots(self, collection, catalogue, catalogue_id_spi, cursor):
         minimal_lot_id = cursor.execute("SELECT MIN(ID) FROM lot WHERE catalogue_id={}".format(catalogue_id_spi))\
             .fetchall()[0]['MIN(ID)']
 
@@ -182,11 +181,12 @@ class Command(BaseCommand):
                 child = bookseller_category
 
             # Link to Category
-            parent_category, created = catalogues.models.Category.objects.get_or_create(collection=collection,
-                                              bookseller_category=parent) if parent else (None, None)
+            parent_category, created = self.ingest.get_or_create(catalogues.models.Category, collection=collection,
+                                                                 bookseller_category=parent) \
+                if parent else (None, None)
 
-            category, created = catalogues.models.Category.objects.get_or_create(collection=collection,
-                                       bookseller_category=child, parent=parent_category)
+            category, created = self.ingest.get_or_create(catalogues.models.Category, collection=collection,
+                                                          bookseller_category=child, parent=parent_category)
 
             insert_fields = {
                 'collection': collection,
@@ -199,9 +199,8 @@ class Command(BaseCommand):
             }
 
             try:
-                lot = catalogues.models.Lot(**insert_fields)
-                lot.save()
-                self.create_items(lot, row['id'], cursor)
+                lot = self.ingest.add(catalogues.models.Lot(**insert_fields))
+                self.create_items(lot, catalogue, row['id'], cursor)
             except Exception as e:
                 print(insert_fields)
                 raise e
@@ -223,19 +222,21 @@ class Command(BaseCommand):
 
             try:
                 # Only use a catalogue that is new or that does not have any collections linked to it.
-                if not catalogues.models.Catalogue.objects.filter(name=row['short_title']).exists():
-                    dataset = catalogues.models.Dataset.objects.get(name=self.dataset_name)
-                    catalogue = catalogues.models.Catalogue.objects.create(name=row['short_title'], dataset=dataset)
-                    catalogue.save()
-                else:
-                    catalogue = catalogues.models.Catalogue.objects.get(name=row['short_title'])
-                    if catalogue.collection.count() != 0 and not self.multiple_collections_per_catalogue:
-                        raise Exception("Catalogue {} already exists and has collections linked to.".format(catalogue))
-
-                collection = catalogues.models.Collection(**insert_fields)
-                collection.save()
-                collection.catalogue.add(catalogue)
-                self.create_lots(collection, row['id'], cursor)
+                catalogue, created = self.ingest.lookup(
+                    catalogues.models.Catalogue, row['short_title'],
+                    lambda: catalogues.models.Catalogue.objects.filter(name=row['short_title']).first(),
+                    lambda: catalogues.models.Catalogue(
+                        name=row['short_title'],
+                        dataset=catalogues.models.Dataset.objects.get(name=self.dataset_name)))
+                if not created and not self.multiple_collections_per_catalogue and \
+                        (catalogue.pk in self.catalogues_with_collections or catalogue.collection.exists()):
+                    raise Exception("Catalogue {} already exists and has collections linked to.".format(catalogue))
+
+                collection = self.ingest.add(catalogues.models.Collection(**insert_fields))
+                self.ingest.add(catalogues.models.CatalogueCollectionRelation(catalogue=catalogue,
+                                                                              collection=collection))
+                self.catalogues_with_collections.add(catalogue.pk)
+                self.create_lots(collection, catalogue, row['id'], cursor)
             except Exception as e:
                 print(insert_fields)
                 raise e
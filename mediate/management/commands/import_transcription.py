@@ -8,9 +8,10 @@ from collections import OrderedDict
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.forms.models import model_to_dict
-from catalogues.models import Catalogue, Collection, Lot, Category, Dataset
+from catalogues.models import Catalogue, Collection, Lot, Category, Dataset, CatalogueCollectionRelation
 from items.models import Item, Edition, BookFormat, PublicationPlace
 from persons.models import Place
+from mediate.ingest import BulkIngest
 
 
 CITY_NAME_SHORTHANDS = {'Lond.': 'London', 'Dubl.': 'Dublin', 'Edinb.': 'Edinburgh'}
@@ -112,10 +113,10 @@ class Command(BaseCommand):
 
             try:
                 with open(file, 'r', encoding='utf-8') as transcription_file:
-                    with transaction.atomic():
+                    with transaction.atomic(), BulkIngest() as ingest:
                         catalogue = Catalogue(name=collection_short_title, dataset=dataset)
                         print_obj(catalogue, verbose)
-                        catalogue.save()
+                        ingest.add(catalogue)
 
                         transcription = transcription_file.read().replace(u'\ufeff', '')
                         transcription_with_field_markers = add_field_marker(transcription)
@@ -129,9 +130,9 @@ class Command(BaseCommand):
                         def get_collection(collection):
                             if not collection:
                                 print("Creating a new collection")
-                                collection =  Collection.objects.create(short_title=collection_short_title,
-                                                                        full_title=collection_short_title)
-                                collection.catalogue.add(catalogue)
+                                collection = ingest.add(Collection(short_title=collection_short_title,
+                                                                   full_title=collection_short_title))
+                                ingest.add(CatalogueCollectionRelation(catalogue=catalogue, collection=collection))
                             return collection
 
                         category = None
@@ -150,49 +151,46 @@ class Command(BaseCommand):
                                 title = fields["TITLE"]
                                 collection = Collection(short_title=collection_short_title, full_title=title)
                                 print_obj(collection, verbose)
-                                collection.save()
-                                collection.catalogue.add(catalogue)
+                                ingest.add(collection)
+                                ingest.add(CatalogueCollectionRelation(catalogue=catalogue, collection=collection))
                             if "CATEGORY" in fields:
                                 # print(fields)
                                 category_books = fields["CATEGORY"]
                                 collection = get_collection(collection)
                                 category = Category(collection=collection, bookseller_category=category_books)
                                 print_obj(category, verbose)
-                                category.save()
+                                ingest.add(category)
                             if "FULL_ITEM_DESC" in fields:
                                 full_item_desc_books = fields["FULL_ITEM_DESC"]
                                 page_in_collection = page if page else None
 
                                 # Lot
                                 collection = get_collection(collection)
-                                lot, created = Lot.objects.get_or_create(collection=collection,
-                                          number_in_collection=fields.get("ITEM_NUMBER", '-1'),
-                                          page_in_collection=page_in_collection,
-                                          sales_price=fields.get("SALES_PRICE", ""),
-                                          lot_as_listed_in_collection=full_item_desc_books,
-                                          index_in_collection=index_in_collection,
-                                          category=category)
+                                # The collection is new, so the lot is too
+                                lot = ingest.add(Lot(collection=collection,
+                                                     number_in_collection=fields.get("ITEM_NUMBER", '-1'),
+                                                     page_in_collection=page_in_collection,
+                                                     sales_price=fields.get("SALES_PRICE", ""),
+                                                     lot_as_listed_in_collection=full_item_desc_books,
+                                                     index_in_collection=index_in_collection,
+                                                     category=category))
                                 print_obj(lot, verbose)
-                                lot.save()
                                 index_in_collection += 1
 
                                 # Place
                                 if "CITY" in fields:
                                     non_cerl_str = "[non-CERL]"
                                     place_name = fields.get("CITY")
-                                    places = Place.objects.filter(name__iregex=re.escape(place_name) + r' +'
-                                                                               + re.escape(non_cerl_str))
-                                    if places:
-                                        place = places[0]
-                                    else:
-                                        place = Place.objects.create(name="{} {}".format(place_name, non_cerl_str))
+                                    place, created = ingest.lookup(
+                                        Place, (non_cerl_str, place_name.lower()),
+                                        lambda: Place.objects.filter(name__iregex=re.escape(place_name) + r' +'
+                                                                     + re.escape(non_cerl_str)).first(),
+                                        lambda: Place(name="{} {}".format(place_name, non_cerl_str)))
                                 elif matches := find_matches(full_item_desc_books, CITY_NAME_SHORTHANDS):
                                     full_place_name = CITY_NAME_SHORTHANDS[matches[0]]
-                                    try:
-                                        place = Place.objects.get(name=full_place_name)
+                                    place = ingest.get(Place, name=full_place_name)
+                                    if place:
                                         print_obj(place, verbose)
-                                    except Place.DoesNotExist:
-                                        place = None
                                 else:
                                     place = None
 
@@ -214,15 +212,15 @@ class Command(BaseCommand):
 
                                 edition = Edition(place=place, year_start=year, year_tag=year_tag)
                                 print_obj(edition, verbose)
-                                edition.save()
+                                ingest.add(edition)
 
                                 # PublicationPlace
                                 if place:
-                                    PublicationPlace.objects.create(place=place, edition=edition)
+                                    ingest.add(PublicationPlace(place=place, edition=edition))
 
                                 # Format
                                 if "FORMAT" in fields:
-                                    book_format, created = BookFormat.objects.get_or_create(name=fields.get("FORMAT"))
+                                    book_format, created = ingest.get_or_create(BookFormat, name=fields.get("FORMAT"))
                                     print_obj(book_format, verbose)
                                 else:
                                     book_format = None
@@ -236,7 +234,7 @@ class Command(BaseCommand):
                                             index_in_lot=1,
                                             edition=edition)
                                 print_obj(item, verbose)
-                                item.save()
+                                ingest.add(item)
 
                             if "PREFACE" in fields:
                                 collection = get_collection(collection)
@@ -246,11 +244,13 @@ class Command(BaseCommand):
                                     collection.preface_and_paratexts = collection.preface_and_paratexts + " [...] " + \
                                                                       fields.get("PREFACE")
                                 print_obj(collection, verbose)
-                                collection.save()
+                                ingest.save(collection)
 
                         # The following, including the try-except is meant to handle a dry run
                         if dry_run:
+                            ingest.finish()
                             raise DryRunException()
+                    ingest.print_report()
             except DryRunException:
                 print("Dry run finished without errors.")
 
@@ -5,27 +5,43 @@ Match Persons to Items
 
 
 import re
+import time
 from collections import defaultdict
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.db.models import Count, Q
+from simple_history.utils import bulk_create_with_history
 from catalogues.models import Collection
 from items.models import Item, PersonItemRelation
+from dashboard.models import Totals
+from mediate.cache import invalidate_instances
+from mediate.computed import recompute
+from jobs.tasks import report_progress
 
 
 class Command(BaseCommand):
     help = 'Matches Persons to Items'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dry_run = False
+        self.batch_size = 1000
+
     def add_arguments(self, parser):
         # Optional
         parser.add_argument('-c', '--collection_ids_filename', type=str,
                             help='Path to a list of collection IDs to process (one ID per line)')
+        parser.add_argument('-d', '--dry_run', action='store_true',
+                            help='Only report how many relations would be created.')
+        parser.add_argument('-b', '--batch_size', type=int, default=1000,
+                            help='The number of relations to create per query (default: 1000).')
 
     @transaction.atomic
     def handle(self, *args, **kwargs):
         # Get the command line arguments
-        if 'collection_ids_filename' in kwargs:
-            collection_ids_filename = kwargs['collection_ids_filename']
+        collection_ids_filename = kwargs.get('collection_ids_filename')
+        self.dry_run = kwargs.get('dry_run', False)
+        self.batch_size = kwargs.get('batch_size') or self.batch_size
 
         # Read collection IDs
         collection_ids = []
@@ -33,13 +49,13 @@ class Command(BaseCommand):
             with open(collection_ids_filename, 'r') as cat_ids_file:
                 collection_ids = [id.strip() for id in cat_ids_file.readlines()]
 
-        print("#collection_ids:", len(collection_ids))
-        print("#collections:", Collection.objects.filter(short_title__in=collection_ids).count())
+        self.stdout.write("#collection_ids: {}".format(len(collection_ids)))
+        self.stdout.write("#collections: {}".format(Collection.objects.filter(short_title__in=collection_ids).count()))
         for collection_id in collection_ids:
             try:
                 Collection.objects.get(short_title=collection_id)
             except:
-                print("collection <{}> not found".format(collection_id))
+                self.stdout.write("collection <{}> not found".format(collection_id))
 
         self.do_matching(collection_ids)
 
@@ -69,40 +85,76 @@ class Command(BaseCommand):
         """Matches normalized short_titles and copies the PersonItemRelations."""
 
         short_titles_with_relations = self.get_short_titles_with_relations()
-        print("#short_titles_with_relations", len(short_titles_with_relations))
+        self.stdout.write("#short_titles_with_relations {}".format(len(short_titles_with_relations)))
 
         filter = Q()
         if collection_ids:
             filter = Q(lot__collection__short_title__in=collection_ids)
         short_titles_target_items = self.get_short_titles_with_filter(filter)
-        print("#short_titles_target_items", len(short_titles_target_items))
+        self.stdout.write("#short_titles_target_items {}".format(len(short_titles_target_items)))
 
         # Find short_titles that are in both lists
         short_title_intersection = short_titles_with_relations.keys() & short_titles_target_items.keys()
-        print("#short_title_intersection", len(short_title_intersection))
+        self.stdout.write("#short_title_intersection {}".format(len(short_title_intersection)))
         total_items_with_copyable_relations = 0
         for short_title in short_title_intersection:
             total_items_with_copyable_relations += len(short_titles_with_relations[short_title])
-        print("total_items_with_copyable_relations:", total_items_with_copyable_relations)
-
-        # Copy PersonItemRelations to target items
-        grand_total = 0
-
-        for short_title in short_title_intersection:
-            personitemrelations_to_copy = PersonItemRelation.objects\
-                .filter(item_id__in=short_titles_with_relations[short_title])
+        self.stdout.write("total_items_with_copyable_relations: {}".format(total_items_with_copyable_relations))
+
+        # Pre-load the (person, role) pairs of the items with relations
+        source_item_ids = [item_id for short_title in short_title_intersection
+                           for item_id in short_titles_with_relations[short_title]]
+        relations_per_item = defaultdict(list)
+        for item_ids in self.divide_chunks(source_item_ids, self.batch_size):
+            for item_id, person_id, role_id in PersonItemRelation.objects.filter(item_id__in=item_ids)\
+                    .values_list('item_id', 'person_id', 'role_id'):
+                relations_per_item[item_id].append((person_id, role_id))
+
+        # Pre-load the existing (item, person, role) triples of the target items
+        target_item_ids = [item_id for short_title in short_title_intersection
+                           for item_id in short_titles_target_items[short_title]]
+        existing_triples = set()
+        for item_ids in self.divide_chunks(target_item_ids, self.batch_size):
+            existing_triples.update(PersonItemRelation.objects.filter(item_id__in=item_ids)
+                                    .values_list('item_id', 'person_id', 'role_id'))
+
+        # Compute the missing triples in memory
+        new_triples = []
+        for short_title in sorted(short_title_intersection):
+            person_role_pairs = {pair for item_id in short_titles_with_relations[short_title]
+                                 for pair in relations_per_item[item_id]}
             total_for_short_title = 0
-            for relation_to_copy in personitemrelations_to_copy:
-                for item_id in short_titles_target_items[short_title]:
-                    relation, created = PersonItemRelation.objects.get_or_create(item_id=item_id,
-                                                                        person=relation_to_copy.person,
-                                                                        role=relation_to_copy.role)
-                    if created:
+            for item_id in short_titles_target_items[short_title]:
+                for person_id, role_id in person_role_pairs:
+                    triple = (item_id, person_id, role_id)
+                    if triple not in existing_triples:
+                        existing_triples.add(triple)
+                        new_triples.append(triple)
                         total_for_short_title += 1
-            print("Total for {}: {}".format(short_title, total_for_short_title))
-            grand_total += total_for_short_title
-
-        print("Grand total:", grand_total)
+            self.stdout.write("Total for {}: {}".format(short_title, total_for_short_title))
+
+        self.stdout.write("Grand total: {}".format(len(new_triples)))
+        if self.dry_run:
+            self.stdout.write("Dry run: no relations created")
+            return
+
+        # Create the relations in batches
+        start = time.perf_counter()
+        created = 0
+        for triples in self.divide_chunks(new_triples, self.batch_size):
+            relations = [PersonItemRelation(item_id=item_id, person_id=person_id, role_id=role_id)
+                         for item_id, person_id, role_id in triples]
+            bulk_create_with_history(relations, PersonItemRelation, batch_size=self.batch_size,
+                                     ignore_conflicts=True)
+            # Recompute the fields depending on these relations (e.g. Person.weight)
+            recompute(PersonItemRelation, [relation.uuid for relation in relations])
+            invalidate_instances(relations)
+            created += len(relations)
+            report_progress(current=created, total=len(new_triples))
+            duration = time.perf_counter() - start
+            self.stdout.write("Created {}/{} relations ({:.0f} relations/sec)".format(
+                created, len(new_triples), created / duration if duration else 0))
+        Totals.mark_stale()
 
     def get_short_titles_with_filter(self, filter=None):
         """Get short_titles from items and filter them"""
@@ -0,0 +1,40 @@
+"""
+Deletes the stored responses of the external APIs (see apiconnectors.client) that expired more than a number of
+days ago. Expired responses are still used when a request fails or in offline mode, so recently expired ones are
+kept. Run it periodically, e.g. as a job, as responses are otherwise never removed.
+
+Example:
+
+    ./manage.py purge_api_responses --days 30
+
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apiconnectors.client import purge
+from apiconnectors.models import ApiResponse
+
+
+class Command(BaseCommand):
+    help = 'Delete the stored responses of the external APIs that expired a number of days ago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', type=int, default=30,
+                            help='Keep the responses that expired in the last number of days.')
+        parser.add_argument('-b', '--batch_size', type=int, default=10000,
+                            help='The number of responses to delete per query.')
+        parser.add_argument('-n', '--dry_run', action='store_true',
+                            help='Only count the responses that would be deleted.')
+
+    def handle(self, *args, **kwargs):
+        expired_before = timezone.now() - timedelta(days=kwargs['days'])
+        if kwargs['dry_run']:
+            print("{} responses would be deleted".format(
+                ApiResponse.objects.filter(expires__lt=expired_before).count()))
+            return
+        start = time.perf_counter()
+        deleted = purge(expired_before, batch_size=kwargs['batch_size'])
+        print("Deleted {} responses in {:.2f} s".format(deleted, time.perf_counter() - start))
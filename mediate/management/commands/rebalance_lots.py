@@ -0,0 +1,33 @@
+"""
+Rebalances the sort keys of the lots of collections and sets their index_in_collection to their position.
+Saving and deleting lots keeps the indices contiguous (see catalogues.ordering), so this is only needed after
+the indices were changed otherwise, e.g. by an update of the database. Without a collection, only the collections
+whose indices are out of line are rebalanced.
+
+Example:
+
+    ./manage.py rebalance_lots
+    ./manage.py rebalance_lots --collection 3e9c7e6a-0f3c-4b4e-9d5a-2b7c8f1e6d4a
+
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalogues.ordering import rebalance_lots, get_unbalanced_collections
+
+
+class Command(BaseCommand):
+    help = 'Rebalance the sort keys and indices of the lots of collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--collection', type=str,
+                            help='The UUID of the collection to rebalance.')
+
+    def handle(self, *args, **kwargs):
+        collection_ids = [kwargs['collection']] if kwargs['collection'] else get_unbalanced_collections()
+        number_of_lots = 0
+        for collection_id in collection_ids:
+            with transaction.atomic():
+                number_of_lots += rebalance_lots(collection_id)
+        print("Rebalanced {} lots in {} collections".format(number_of_lots, len(collection_ids)))
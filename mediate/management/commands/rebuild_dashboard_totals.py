@@ -0,0 +1,42 @@
+"""
+Rebuilds the precomputed totals of the dashboard from scratch:
+one row per dataset and, optionally, one row per collection.
+
+Example:
+
+    ./manage.py rebuild_dashboard_totals --collections
+
+"""
+
+from django.core.management.base import BaseCommand
+
+from catalogues.models import Dataset, Collection
+from dashboard.models import Totals
+from dashboard.tools import refresh_totals
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed dashboard totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--collections', action='store_true',
+                            help='Also compute the totals per collection.')
+        parser.add_argument('-s', '--stale_only', action='store_true',
+                            help='Only refresh the totals that are stale, instead of rebuilding all.')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['stale_only']:
+            for totals in Totals.objects.filter(stale=True).select_related('collection')\
+                    .prefetch_related('datasets'):
+                refresh_totals(list(totals.datasets.all()), totals.collection)
+                print("Refreshed totals {}".format(totals.key))
+            return
+
+        Totals.objects.all().delete()
+        for dataset in Dataset.objects.all():
+            refresh_totals([dataset])
+            print("Computed totals for dataset {}".format(dataset))
+            if kwargs['collections']:
+                for collection in Collection.objects.filter(catalogue__dataset=dataset).distinct():
+                    refresh_totals([dataset], collection)
+                    print("Computed totals for collection {}".format(collection))
@@ -0,0 +1,29 @@
+"""
+Rebuilds the search index of item short titles and lot descriptions, and the autocomplete index of the names
+and titles of persons, places, works and collections. Saves and the bulk edits of the application keep the index
+up to date; this is the fallback for changes that bypass them, e.g. raw SQL or QuerySet.update().
+
+Example:
+
+    ./manage.py rebuild_search_index --batch_size 2000
+
+"""
+
+from django.core.management.base import BaseCommand
+
+from search.index import INDEXES
+from search.models import SearchWord
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch_size', type=int, default=1000,
+                            help='The number of objects to index at once.')
+
+    def handle(self, *args, **kwargs):
+        SearchWord.objects.all().delete()
+        for index in INDEXES:
+            count = index.rebuild(kwargs['batch_size'])
+            self.stdout.write("Indexed {} {}".format(count, index.model._meta.verbose_name_plural))
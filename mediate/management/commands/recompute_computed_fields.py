@@ -0,0 +1,60 @@
+"""
+Recomputes the computed fields of all items and persons, or of the items of a dataset and the persons related
+to them, with set-based UPDATE statements (see mediate.computed). Use it after bulk changes that did not
+update the computed fields, or to repair them.
+
+Example:
+
+    ./manage.py recompute_computed_fields
+    ./manage.py recompute_computed_fields --dataset "Private libraries" --batch_size 5000
+
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from catalogues.models import Dataset
+from items.models import Item
+from jobs.tasks import report_progress
+from mediate.computed import recompute_items, recompute_persons
+from persons.models import Person
+
+
+class Command(BaseCommand):
+    help = 'Recompute the computed fields of items and persons in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--dataset', type=str,
+                            help='The name of the dataset whose items (and their persons) to recompute.')
+        parser.add_argument('-b', '--batch_size', type=int, default=2000,
+                            help='The number of objects to update per query.')
+
+    def handle(self, *args, **kwargs):
+        items = Item.objects.all()
+        persons = Person.objects.all()
+        if kwargs['dataset']:
+            dataset = Dataset.objects.filter(name=kwargs['dataset']).first()
+            if dataset is None:
+                raise CommandError("Dataset {} does not exist".format(kwargs['dataset']))
+            # Including the items that are still marked with the dataset
+            items = items.filter(Q(lot__collection__catalogue__dataset=dataset) | Q(dataset_uuid=dataset.pk))
+            persons = persons.filter(personitemrelation__item__in=items)
+
+        item_ids = list(items.order_by().values_list('pk', flat=True).distinct())
+        person_ids = list(persons.order_by().values_list('pk', flat=True).distinct())
+        total = len(item_ids) + len(person_ids)
+        batch_size = kwargs['batch_size']
+        done = 0
+        start = time.perf_counter()
+        for model, ids, recompute in [(Item, item_ids, recompute_items), (Person, person_ids, recompute_persons)]:
+            for i in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    recompute(model.objects.filter(pk__in=ids[i:i + batch_size]))
+                done += len(ids[i:i + batch_size])
+                report_progress(current=done, total=total)
+                duration = time.perf_counter() - start
+                print("Recomputed {}/{} objects ({:.0f} objects/sec)".format(
+                    done, total, done / duration if duration else 0))
+        print("Recomputed the computed fields of {} items and {} persons".format(len(item_ids), len(person_ids)))
@@ -0,0 +1,22 @@
+"""
+Recomputes the lot and item counters of all collections and catalogues,
+e.g. after a bulk import or bulk update that did not send signals.
+
+Example:
+
+    ./manage.py reconcile_counters
+
+"""
+
+from django.core.management.base import BaseCommand
+
+from catalogues.tools import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the lot and item counters of all collections and catalogues'
+
+    def handle(self, *args, **kwargs):
+        number_of_collections, number_of_catalogues = reconcile_counters()
+        print("Corrected the counters of {} collections and {} catalogues".format(number_of_collections,
+                                                                                  number_of_catalogues))
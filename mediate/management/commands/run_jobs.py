@@ -0,0 +1,64 @@
+"""
+Runs the jobs that are queued in the database, e.g. imports or exports started from the dashboard.
+Several workers can run in parallel, either as separate processes or with --workers.
+Running jobs without a heartbeat for --stale_after seconds (e.g. of a killed worker) are marked as failed.
+
+Example:
+
+    ./manage.py run_jobs --workers 2
+    ./manage.py run_jobs --once
+
+"""
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs.models import Job
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=1,
+                            help='The number of worker processes (default: 1).')
+        parser.add_argument('-s', '--sleep', type=float, default=5,
+                            help='The number of seconds to wait when there are no queued jobs (default: 5).')
+        parser.add_argument('-t', '--stale_after', type=int, default=600,
+                            help='The number of seconds after which a running job without heartbeat '
+                                 'is marked as failed (default: 600).')
+        parser.add_argument('-o', '--once', action='store_true',
+                            help='Stop when there are no more queued jobs.')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['workers'] <= 1:
+            self.work(kwargs)
+            return
+
+        # The worker processes open their own database connections
+        connections.close_all()
+        processes = [multiprocessing.Process(target=self.work, args=(kwargs,)) for _ in range(kwargs['workers'])]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def work(self, kwargs):
+        worker = Worker()
+        print("Worker {} started".format(worker.name))
+        while True:
+            close_old_connections()
+            stale = Job.fail_stale(kwargs['stale_after'])
+            if stale:
+                print("Marked {} stale jobs as failed".format(stale))
+            job = worker.run_next()
+            if job is None:
+                if kwargs['once']:
+                    break
+                time.sleep(kwargs['sleep'])
+                continue
+            print("Job {} ({}): {}".format(job.pk, job.description or job.task, job.get_state_display()))
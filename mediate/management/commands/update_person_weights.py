@@ -0,0 +1,31 @@
+"""
+Recomputes the stored weight of all persons in one vectorized pass,
+e.g. after a bulk import that did not update the computed fields.
+
+Example:
+
+    ./manage.py update_person_weights --batch_size 1000
+
+"""
+
+from django.core.management.base import BaseCommand
+
+from persons.models import Person
+from persons.ranking import compute_person_weights
+
+
+class Command(BaseCommand):
+    help = 'Recompute the weight of all persons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch_size', type=int, default=1000,
+                            help='The number of persons to update per query.')
+
+    def handle(self, *args, **kwargs):
+        weights = compute_person_weights(Person.objects.all())
+        persons = [person for person in Person.objects.only('uuid', 'weight')
+                   if person.weight != weights.get(person.pk)]
+        for person in persons:
+            person.weight = weights.get(person.pk)
+        Person.objects.bulk_update(persons, ['weight'], batch_size=kwargs['batch_size'])
+        print("Updated the weight of {} persons".format(len(persons)))
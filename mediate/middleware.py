@@ -1,5 +1,11 @@
 from django.conf import settings
 from django.shortcuts import render
+from django.middleware.cache import UpdateCacheMiddleware, FetchFromCacheMiddleware
+
+import contextvars
+
+from mediate.cache import get_tagged_key, dataset_tag, SHARED_TAG
+from mediate.computed import deferred_computed_fields
 
 
 class SetRemoteAddrMiddleware:
@@ -12,6 +18,21 @@ class SetRemoteAddrMiddleware:
         return self.get_response(request)
 
 
+class DeferredComputedFieldsMiddleware:
+    """
+    Recomputes the computed fields that depend on the objects changed by a request once, at the end of the request,
+    instead of after every save (see mediate.computed).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD", "OPTIONS"):
+            return self.get_response(request)
+        with deferred_computed_fields():
+            return self.get_response(request)
+
+
 class OldHostNameWarningMiddleware:
     """
     If an old host name is used, show a warning and an up-to-date URL.
@@ -28,4 +49,38 @@ class OldHostNameWarningMiddleware:
             'base_url': request.build_absolute_uri('/').replace(host_name, settings.HOST_NAME),
             'new_url': request.build_absolute_uri().replace(host_name, settings.HOST_NAME),
         }
-        return render(request, "old_host_name_warning.html", context)
\ No newline at end of file
+        return render(request, "old_host_name_warning.html", context)
+
+# The key prefix of the page cache for the current request
+page_cache_key_prefix = contextvars.ContextVar('page_cache_key_prefix', default=None)
+
+
+class TaggedCacheKeyPrefixMixin:
+    """
+    Makes the key prefix of the page cache depend on the versions of the cache tags of the request,
+    i.e. the shared tag and the tags of the datasets in the session.
+    Saving an object therefore only invalidates the cached pages of the affected dataset(s).
+    """
+    @property
+    def key_prefix(self):
+        return page_cache_key_prefix.get() or self.base_key_prefix
+
+    @key_prefix.setter
+    def key_prefix(self, value):
+        self.base_key_prefix = value
+
+
+class TaggedUpdateCacheMiddleware(TaggedCacheKeyPrefixMixin, UpdateCacheMiddleware):
+    pass
+
+
+class TaggedFetchFromCacheMiddleware(TaggedCacheKeyPrefixMixin, FetchFromCacheMiddleware):
+    def process_request(self, request):
+        page_cache_key_prefix.set(None)
+        if request.method in ("GET", "HEAD") and settings.CACHE_MIDDLEWARE_SECONDS:
+            from catalogues.tools import get_dataset_for_anonymoususer
+            dataset_uuids = [dataset['uuid'] for dataset in request.session.get('datasets', [])] \
+                or [dataset.uuid for dataset in get_dataset_for_anonymoususer()]
+            tags = [SHARED_TAG] + [dataset_tag(dataset_uuid) for dataset_uuid in dataset_uuids]
+            page_cache_key_prefix.set(get_tagged_key(self.base_key_prefix, tags))
+        return super().process_request(request)
@@ -0,0 +1,40 @@
+"""
+The pagination of the API, see mediate.api. It is kept apart from mediate.api, as DRF imports the default
+pagination class while the viewsets are imported.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ApiCursorPagination(CursorPagination):
+    ordering = 'pk'
+    page_size = getattr(settings, 'API_CURSOR_PAGE_SIZE', 1000)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 5000)
+
+
+class ApiPagination(PageNumberPagination):
+    """
+    Page number pagination, or keyset pagination if ?pagination=cursor or a cursor is given
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 5000)
+    cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor':
+            self.cursor_pagination = ApiCursorPagination()
+            page = self.cursor_pagination.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.cursor_pagination.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_pagination:
+            return self.cursor_pagination.to_html()
+        return super().to_html()
@@ -74,13 +74,16 @@ INSTALLED_APPS = [
     'persons',
     'catalogues',
     'dashboard',
+    'search',
+    'jobs',
+    'apiconnectors',
     'registration',
 ]
 
 MIDDLEWARE = [
     'mediate.middleware.OldHostNameWarningMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.middleware.cache.UpdateCacheMiddleware',
+    'mediate.middleware.TaggedUpdateCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,9 +91,10 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'maintenance_mode.middleware.MaintenanceModeMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
+    'mediate.middleware.TaggedFetchFromCacheMiddleware',
     'simple_history.middleware.HistoryRequestMiddleware',
     'mediate.middleware.SetRemoteAddrMiddleware',
+    'mediate.middleware.DeferredComputedFieldsMiddleware',
     'request.middleware.RequestMiddleware',
 ]
 
@@ -174,6 +178,7 @@ except ConnectionRefusedError:
 CACHE_MIDDLEWARE_ALIAS = 'default'
 CACHE_MIDDLEWARE_KEY_PREFIX = 'mediate'
 CACHE_MIDDLEWARE_SECONDS = config('CACHE_MIDDLEWARE_SECONDS', cast=int, default=0)  # 0 means no caching
+PERSON_RANKING_CACHE_SECONDS = config('PERSON_RANKING_CACHE_SECONDS', cast=int, default=60*60*24)  # 24 hours
 
 
 # Password validation
@@ -234,11 +239,28 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.DjangoModelPermissions',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'mediate.pagination.ApiPagination',
     'PAGE_SIZE': 10,
     'URL_FIELD_NAME': 'api-url',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
+# The largest page size of the API (?page_size=) and the page size of ?pagination=cursor, see mediate.api
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', cast=int, default=5000)
+API_CURSOR_PAGE_SIZE = config('API_CURSOR_PAGE_SIZE', cast=int, default=1000)
+# The number of terms whose results the autocomplete of the Select2 pickers keeps per process, and the maximum
+# number of results per term (see search.autocomplete)
+AUTOCOMPLETE_CACHE_SIZE = config('AUTOCOMPLETE_CACHE_SIZE', cast=int, default=2000)
+AUTOCOMPLETE_MAX_RESULTS = config('AUTOCOMPLETE_MAX_RESULTS', cast=int, default=200)
+# The number of rows the dumps of the API (api/dump/<name>/) fetch at once
+API_DUMP_CHUNK_SIZE = config('API_DUMP_CHUNK_SIZE', cast=int, default=2000)
+# The external authority APIs, CERL and VIAF (see apiconnectors.client)
+API_CONNECTOR_TIMEOUT = config('API_CONNECTOR_TIMEOUT', cast=float, default=10)  # seconds
+API_CONNECTOR_POOL_SIZE = config('API_CONNECTOR_POOL_SIZE', cast=int, default=10)
+API_CONNECTOR_CACHE_SECONDS = config('API_CONNECTOR_CACHE_SECONDS', cast=int, default=60*60*24*30)  # 30 days
+API_CONNECTOR_SUGGEST_CACHE_SECONDS = config('API_CONNECTOR_SUGGEST_CACHE_SECONDS', cast=int,
+                                             default=60*60*24)  # 24 hours
+API_CONNECTOR_OFFLINE = config('API_CONNECTOR_OFFLINE', False, cast=bool)
+API_CONNECTOR_STUB_URL = config('API_CONNECTOR_STUB_URL', default='')
 
 SITE_ID = 1
 
@@ -253,6 +275,27 @@ MODERATION_OFF = config('MODERATION_OFF', False, cast=bool)
 
 TAGME_OBJECT_ID_TYPE = "uuid"
 
+# Stale dashboard totals are refreshed by a job; if no worker claimed it after this time, they are refreshed on request
+TOTALS_REFRESH_TIMEOUT = config('TOTALS_REFRESH_TIMEOUT', cast=int, default=300)  # seconds
+
+# Management commands that can be queued as jobs from the dashboard and run by the run_jobs command
+JOB_COMMANDS = [
+    'compact_history',
+    'enrich_authorities',
+    'export_collection_data',
+    'import_from_excel',
+    'import_spi_data',
+    'import_transcription',
+    'match_persons_to_items',
+    'purge_api_responses',
+    'rebalance_lots',
+    'rebuild_dashboard_totals',
+    'rebuild_search_index',
+    'recompute_computed_fields',
+    'reconcile_counters',
+    'update_person_weights',
+]
+
 APPLICATION_INSTANCE_TYPE = config('APPLICATION_INSTANCE_TYPE', default="")
 
 DBBACKUP_STORAGE = 'django.core.files.storage.FileSystemStorage'
@@ -0,0 +1,299 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from guardian.shortcuts import assign_perm
+from cachalot.api import cachalot_disabled
+
+from catalogues.models import Dataset, Catalogue, Collection, Lot, Library
+from items.models import Item, Language, PersonItemRelation, PersonItemRelationRole
+from persons.models import Person
+from mediate.cache import get_tag_versions, get_pending_invalidation, dataset_tag, SHARED_TAG
+from mediate.computed import deferred_computed_fields
+from mediate.dump import DUMPS
+from mediate.history import update_with_history
+from mediate.middleware import TaggedFetchFromCacheMiddleware, page_cache_key_prefix
+from mediate.tools_testing import create_lot, create_items
+
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        # Invalidations are executed on commit, so run the pending invalidation of the fixtures first
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dataset = Dataset.objects.create(name='name_test')
+            self.other_dataset = Dataset.objects.create(name='name_test_other')
+            catalogue = Catalogue.objects.create(name='name_test', dataset=self.dataset)
+            collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+            collection.catalogue.add(catalogue)
+            self.lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1,
+                                          lot_as_listed_in_collection='lot 1')
+        self.tags = [dataset_tag(self.dataset.pk), dataset_tag(self.other_dataset.pk), SHARED_TAG]
+
+    def tearDown(self):
+        page_cache_key_prefix.set(None)
+
+    def get_changed_tags(self, versions):
+        return {tag for tag, version in get_tag_versions(self.tags).items() if version != versions[tag]}
+
+    def test_invalidate_on_commit(self):
+        versions = get_tag_versions(self.tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lot.lot_as_listed_in_collection = 'lot 1 changed'
+            self.lot.save()
+            self.assertEqual(self.get_changed_tags(versions), set())
+        self.assertEqual(self.get_changed_tags(versions), {dataset_tag(self.dataset.pk)})
+
+        # Objects without a dataset invalidate the shared tag
+        versions = get_tag_versions(self.tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            Library.objects.create(name='library')
+        self.assertEqual(self.get_changed_tags(versions), {SHARED_TAG})
+
+    def test_invalidate_on_rollback(self):
+        versions = get_tag_versions(self.tags)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.lot.lot_as_listed_in_collection = 'lot 1 changed'
+                    self.lot.save()
+                    Library.objects.create(name='library')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.get_changed_tags(versions), set())
+
+    @override_settings(CACHE_MIDDLEWARE_SECONDS=60)
+    def test_page_cache_key_prefix(self):
+        middleware = TaggedFetchFromCacheMiddleware(lambda request: HttpResponse())
+
+        def get_key_prefix(dataset):
+            request = RequestFactory().get('/')
+            request.session = {'datasets': [{'uuid': str(dataset.pk)}]}
+            middleware.process_request(request)
+            return middleware.key_prefix
+
+        key_prefix = get_key_prefix(self.dataset)
+        other_key_prefix = get_key_prefix(self.other_dataset)
+        self.assertNotEqual(key_prefix, other_key_prefix)
+        self.assertEqual(get_key_prefix(self.dataset), key_prefix)
+
+        # Changing the dataset only changes the key prefix of its sessions
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lot.save()
+        self.assertNotEqual(get_key_prefix(self.dataset), key_prefix)
+        self.assertEqual(get_key_prefix(self.other_dataset), other_key_prefix)
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.languages = [Language.objects.create(name='language {}'.format(index)) for index in range(3)]
+
+    def test_update_with_history(self):
+        with CaptureQueriesContext(connection) as context:
+            update_with_history(Language.objects.filter(name__in=['language 0', 'language 1']), name='changed',
+                                change_reason='Test')
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        history = Language.history.filter(history_type='~')
+        self.assertEqual(sorted(history.values_list('name', 'history_change_reason')), [('changed', 'Test')] * 2)
+
+    def test_compact_history(self):
+        language = self.languages[0]
+        for index in range(3):
+            language.name = 'version {}'.format(index)
+            language.save()
+        language.history.update(history_date=timezone.now() - timedelta(days=10))
+        language.name = 'recent'
+        language.save()
+        self.assertEqual(language.history.count(), 5)
+
+        output = io.StringIO()
+        call_command('compact_history', days=5, model=['items.Language'], dry_run=True, stdout=output)
+        self.assertEqual(language.history.count(), 5)
+        self.assertIn("items.Language: would remove 2 versions", output.getvalue())
+        call_command('compact_history', days=5, model=['items.Language'], stdout=io.StringIO())
+        # The creation, the last version before 5 days ago and the recent version remain
+        self.assertEqual(list(language.history.order_by('history_date', 'history_id').values_list('name', flat=True)),
+                         ['language 0', 'version 2', 'recent'])
+        self.assertEqual(Language.history.count(), 5)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test', password='secret')
+        self.client.force_login(self.user)
+        self.datasets = []
+        for name in ['name_test', 'other']:
+            dataset, lot = create_lot(name, name)
+            create_items(lot, ['{} {}'.format(name, index) for index in range(3)])
+            self.datasets.append(dataset)
+        assign_perm('catalogues.view_dataset', self.user, self.datasets[0])
+        person = Person.objects.create(short_name='short_name test')
+        role = PersonItemRelationRole.objects.create(name='author')
+        for item in Item.objects.all():
+            PersonItemRelation.objects.create(person=person, item=item, role=role)
+
+    def get(self, params, url='/api/item/', **headers):
+        return self.client.get(url, params, HTTP_HOST=settings.HOST_NAME, **headers)
+
+    def test_cursor_pagination_and_expansion(self):
+        params = {'pagination': 'cursor', 'page_size': 2, 'expand': 'lot,collection,edition,persons,works',
+                  'dataset': str(self.datasets[0].pk)}
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            response = self.get(params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIn('cursor=', data['next'])
+        item = data['results'][0]
+        self.assertEqual(item['collection']['short_title'], 'name_test')
+        self.assertEqual(item['persons'][0]['person']['short_name'], 'short_name test')
+        self.assertIn('year_start', item['edition'])
+
+        # The number of queries does not depend on the number of items
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context_next:
+            response = self.get({}, url=data['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(len(context_next.captured_queries), len(context.captured_queries))
+
+    def test_fields_and_datasets(self):
+        data = self.get({'fields': 'short_title', 'page_size': 100}).json()
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(data['results'][0], {'short_title': data['results'][0]['short_title']})
+        self.assertEqual(self.get({'dataset': str(self.datasets[1].pk)}).status_code, 403)
+        self.assertEqual(self.get({'dataset': 'invalid'}).status_code, 400)
+        self.assertEqual(self.get({'expand': 'invalid'}).status_code, 400)
+
+    def test_etag(self):
+        response = self.get({'page_size': 100})
+        etag = response['ETag']
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            response = self.get({'page_size': 100}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in context.captured_queries if 'items_item' in query['sql']])
+
+        item = Item.objects.first()
+        item.short_title = 'changed'
+        item.save()
+        # The cache tags are invalidated when the transaction is committed
+        get_pending_invalidation()()
+        response = self.get({'page_size': 100}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_person_etag(self):
+        etag = self.get({}, url='/api/person/')['ETag']
+        # The weights of persons are recomputed without saving the persons. The Person tag is invalidated
+        # immediately too, so the new ETag does not depend on the invalidation on commit.
+        with deferred_computed_fields():
+            PersonItemRelation.objects.first().delete()
+        response = self.get({}, url='/api/person/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class DumpTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test', password='secret')
+        self.client.force_login(self.user)
+        self.dataset, lot = create_lot()
+        self.items = create_items(lot, ['item {}'.format(index) for index in range(3)])
+
+    def test_dump_endpoint(self):
+        assign_perm('catalogues.view_dataset', self.user, self.dataset)
+        response = self.client.get('/api/dump/items/', {'dataset': str(self.dataset.pk)}, HTTP_HOST=settings.HOST_NAME,
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual(sorted(row['short_title'] for row in rows), ['item 0', 'item 1', 'item 2'])
+        self.assertEqual({row['lot__collection'] for row in rows}, {str(self.items[0].lot.collection_id)})
+        self.assertIn('edition__year_start', rows[0])
+
+        self.assertEqual(self.client.get('/api/dump/unknown/', HTTP_HOST=settings.HOST_NAME).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/dump/items/', HTTP_HOST=settings.HOST_NAME).status_code, 403)
+
+    def test_dumps(self):
+        for name, dump in DUMPS.items():
+            # In chunks smaller than the dump
+            rows = list(dump.rows(datasets=[self.dataset.pk], chunk_size=2))
+            self.assertEqual(len(rows), {'items': 3, 'lots': 1, 'collections': 1, 'catalogues': 1,
+                                         'editions': 3}.get(name, 0), name)
+
+    def test_dump_command_updated_since(self):
+        Item.history.update(history_date=timezone.now() - timedelta(days=10))
+        self.items[0].short_title = 'changed'
+        self.items[0].save()
+        deleted_pk = self.items[1].pk
+        self.items[1].delete()
+
+        output = io.StringIO()
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        call_command('dump_ndjson', 'items', updated_since=since, stdout=output)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(rows, [{**rows[0], 'short_title': 'changed'}, {'uuid': str(deleted_pk), '_deleted': True}])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'items.ndjson.gz')
+            call_command('dump_ndjson', 'items', dataset=['name_test'], output=path, stdout=io.StringIO())
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+    def test_dump_deleted_by_dataset(self):
+        other_dataset, other_lot = create_lot('other', 'other')
+        other_item, = create_items(other_lot, ['other'])
+        self.assertEqual(other_item.dataset_uuid, other_dataset.pk)
+        deleted_pk = self.items[0].pk
+        self.items[0].delete()
+        other_item.delete()
+
+        since = timezone.now() - timedelta(days=1)
+        rows = list(DUMPS['items'].rows(datasets=[self.dataset.pk], since=since))
+        self.assertEqual([row for row in rows if row.get('_deleted')], [{'uuid': deleted_pk, '_deleted': True}])
+        self.assertEqual(len([row for row in DUMPS['items'].rows(since=since) if row.get('_deleted')]), 2)
+
+        # The deleted lots cannot be linked to their datasets, which is reported before the dump starts
+        with self.assertRaises(ValueError):
+            DUMPS['lots'].rows(datasets=[self.dataset.pk], since=since)
+        assign_perm('catalogues.view_dataset', self.user, self.dataset)
+        response = self.client.get('/api/dump/lots/', {'dataset': str(self.dataset.pk),
+                                                       'updated_since': since.isoformat()},
+                                   HTTP_HOST=settings.HOST_NAME)
+        self.assertEqual(response.status_code, 400)
+
+
+class MatchPersonsToItemsTests(TestCase):
+    def setUp(self):
+        dataset, lot = create_lot()
+        person = Person.objects.create(short_name='short_name test', surname='surname test',
+                                       first_names='first_names test')
+        role = PersonItemRelationRole.objects.create(name='author')
+        source_item = create_items(lot, ['Title: test'] + ['title. test'] * 3)[0]
+        PersonItemRelation.objects.create(person=person, item=source_item, role=role)
+
+    def test_match_persons_to_items_dry_run(self):
+        output = io.StringIO()
+        call_command('match_persons_to_items', dry_run=True, stdout=output)
+        self.assertEqual(PersonItemRelation.objects.count(), 1)
+        self.assertIn("Grand total: 3", output.getvalue())
+
+    def test_match_persons_to_items(self):
+        call_command('match_persons_to_items', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(PersonItemRelation.objects.count(), 4)
+        self.assertEqual(PersonItemRelation.history.count(), 4)
+        # Running again does not create duplicates
+        call_command('match_persons_to_items', stdout=io.StringIO())
+        self.assertEqual(PersonItemRelation.objects.count(), 4)
@@ -32,7 +32,7 @@ def wildcards_to_mysqlregex(wildcard_search_string):
     :return: 
     """
     mysqlregex = re.escape(wildcard_search_string)
-    return mysqlregex.replace('?', '[[:alpha:]]').replace('*', '[[:alpha:]]+')
+    return mysqlregex.replace('\\?', '[[:alpha:]]').replace('\\*', '[[:alpha:]]+')
 
 
 def filter_multiple_words(lookup_expr, queryset, name, value, wildcards=False):
@@ -5,7 +5,8 @@ from django.urls import reverse_lazy
 
 from guardian.shortcuts import assign_perm
 
-from catalogues.models import Dataset
+from catalogues.models import Dataset, Catalogue, Collection, Lot
+from items.models import Item, Edition
 
 
 class GenericCRUDTestMixin:
@@ -120,3 +121,31 @@ class GenericCRUDTestMixin:
         response = client.post(reverse_lazy(self.get_url_name('delete'), args=[obj.uuid]), {},
                                HTTP_REFERER=reverse_lazy('dashboard'), follow=True)
         self.assertEqual(response.status_code, 200)
+
+
+def create_lot(dataset_name='name_test', short_title='short_title test'):
+    """
+    Creates a lot in a new collection of a new catalogue of a (new) dataset
+    :param dataset_name: the name of the dataset and the catalogue
+    :param short_title: the short title of the collection
+    :return: the dataset and the lot
+    """
+    dataset, created = Dataset.objects.get_or_create(name=dataset_name)
+    catalogue = Catalogue.objects.create(name=dataset_name, dataset=dataset)
+    collection = Collection.objects.create(short_title=short_title, year_of_publication=1666)
+    collection.catalogue.add(catalogue)
+    lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1,
+                             lot_as_listed_in_collection='lot 1')
+    return dataset, lot
+
+
+def create_items(lot, short_titles):
+    """
+    Creates items in a lot, each with its own edition
+    :param lot: the lot
+    :param short_titles: the short titles of the items
+    :return: a list of the items
+    """
+    return [Item.objects.create(short_title=short_title, lot=lot, index_in_lot=index + 1,
+                                edition=Edition.objects.create(year_start=1640 + index))
+            for index, short_title in enumerate(short_titles)]
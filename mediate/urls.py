@@ -24,11 +24,13 @@ from django.views.generic import RedirectView, TemplateView
 from rest_framework import routers
 
 from .views import protected_media
+from .api import DumpView
 
 import items.urls
 import catalogues.urls
 import persons.urls
 import transcriptions.urls
+import jobs.urls
 from dashboard.views import view_dashboard, view_totals, get_dashboard_stats
 
 from mediate. views import select_dataset
@@ -110,6 +112,8 @@ urlpatterns = [
          name="django_registration_register"),
     path('accounts/', include('django_registration.backends.activation.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
+    # Before the items URLs, whose pattern also matches api/dump/items/
+    path(r'api/dump/<str:name>/', DumpView.as_view(), name='api_dump'),
     re_path(r'items/', include(items.urls)),
     path(r'catalogues/', include(catalogues.urls)),
     path(r'persons/', include(persons.urls)),
@@ -117,6 +121,7 @@ urlpatterns = [
     path(r'dashboard/', login_required(view_dashboard), name='dashboard'),
     path(r'dashboard_stats/', login_required(get_dashboard_stats), name='get_dashboard_stats'),
     path(r'totals/', view_totals, name='totals'),
+    path(r'jobs/', include(jobs.urls)),
     path(r'dataset/', login_required(select_dataset), name='select_dataset'),
     path(r'moderation/', include('simplemoderation.urls')),
     re_path(r'^api/', include(router.urls)),
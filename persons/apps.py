@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PersonsConfig(AppConfig):
     name = 'persons'
+
+    def ready(self):
+        # Register the tasks, so that workers can run them
+        from . import tasks  # noqa: F401
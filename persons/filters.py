@@ -1,8 +1,7 @@
 import django_filters
 from .models import *
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q, IntegerField, Count, FloatField, F, OuterRef, Subquery, Value
-from django.db.models.functions import Coalesce
+from django.db.models import Q, Count, FloatField
 from django.db.models.functions import Cast
 from django_select2.forms import Select2MultipleWidget, ModelSelect2MultipleWidget
 from django_filters.widgets import RangeWidget
@@ -14,8 +13,10 @@ from mediate.filters import QBasedFilter, RangeFilterQ, RangeRangeFilterQ, Multi
     ModelMultipleChoiceFilterQ, ModelMultipleChoiceFilterQWithExtraLookups, QBasedFilterset
 from catalogues.models import PersonCollectionRelationRole, Collection
 from catalogues.views.views import get_collections_for_session
+from catalogues.tools import get_datasets_for_session
 from items.models import PersonItemRelationRole
 from tagme.models import Tag
+from .ranking import PersonRanking, PersonRankingTableData, get_cached_ranking
 
 
 # Person filter
@@ -266,27 +267,23 @@ class PersonRankingFilter(QBasedFilterset):
         self.request = request
         self.fields_with_errors = []
 
-    # Override method
-    @property
-    def qs(self):
-        if hasattr(self, '_qs') and self._qs is not None:
-            return self._qs
+    def get_collections(self):
+        """
+        Gets the collections to count the items and collections of the persons in
+        """
+        return get_collections_for_session(self.request)
 
-        qs = super().qs
-        self._qs = self.annotate_queryset(qs)
-        return self._qs
+    def compute_ranking(self):
+        return PersonRanking.from_queryset(self.qs, self.get_collections())
 
-    def annotate_queryset(self, qs):
-        return qs.distinct() \
-            .annotate(item_count=Count('personitemrelation__item',
-                                       filter=Q(personitemrelation__item__lot__collection__in=
-                                         get_collections_for_session(self.request)),
-                                       distinct=True)) \
-            .annotate(collection_count=Count('personitemrelation__item__lot__collection',
-                                       filter=Q(personitemrelation__item__lot__collection__in=
-                                         get_collections_for_session(self.request)),
-                                        distinct=True)) \
-            .order_by('-item_count')
+    def get_table_data(self):
+        """
+        Gets the ranking of the filtered persons as table data, from the cache if the same filter was used before
+        """
+        if not self.is_valid():
+            return self.queryset.none()
+        ranking = get_cached_ranking(self, get_datasets_for_session(self.request), self.compute_ranking)
+        return PersonRankingTableData(self.queryset, ranking, self.qs)
 
     def year_text_range_filter(self, queryset, name, value):
         """
@@ -316,18 +313,12 @@ class PersonRankingFilter(QBasedFilterset):
 
 
 class PersonWeightedRankingFilter(PersonRankingFilter):
-    def annotate_queryset(self, qs):
-        collections = self.filter_collections(get_collections_for_session(self.request))
-        sub_query = (collections.filter(year_of_publication__gt=OuterRef('earliest_edition_year'))
-                     .annotate(one=Value(1)).values('one')
-                     .annotate(collection_count=Count('one'))
-                     .values('collection_count')[:1])
-        qs = qs.annotate(collection_count=Count('personitemrelation__item__lot__collection',
-                                                filter=Q(personitemrelation__item__lot__collection__in=collections),
-                                                distinct=True))
-        qs = qs.annotate(potential_collection_count=Coalesce(Subquery(sub_query,output_field=IntegerField()), 0))
-        qs = qs.annotate(dynamic_weight=100.0 * F('collection_count') / F('potential_collection_count'))
-        return qs.distinct().order_by('-dynamic_weight')
+    def get_collections(self):
+        return self.filter_collections(get_collections_for_session(self.request))
+
+    def compute_ranking(self):
+        collections = self.get_collections()
+        return PersonRanking.from_queryset(self.qs, collections, potential_collections=collections)
 
     def filter_collections(self, collection_qs):
         cleaned_data = self.form.cleaned_data
@@ -1,6 +1,7 @@
 from django import forms
 from django.urls import reverse_lazy
 from django_select2.forms import Select2Widget, ModelSelect2Widget, ModelSelect2MultipleWidget
+from search.widgets import PersonSelect2Widget, PlaceSelect2Widget
 from django_date_extensions.fields import ApproximateDateFormField
 from django.forms import inlineformset_factory
 from apiconnectors.widgets import ApiSelectWidget
@@ -129,15 +130,13 @@ class PersonPersonRelationModelForm(forms.ModelForm):
             'end_year'
         )
         widgets = {
-            'first_person': ModelSelect2Widget(
+            'first_person': PersonSelect2Widget(
                 label="Person",
                 model=Person,
-                search_fields=['short_name__icontains']
             ),
-            'second_person': ModelSelect2Widget(
+            'second_person': PersonSelect2Widget(
                 label="Person",
                 model=Person,
-                search_fields=['short_name__icontains'],
                 attrs={'style': 'width: 200px;'}
             ),
             'type': ModelSelect2Widget(
@@ -218,13 +217,11 @@ class ResidenceModelForm(forms.ModelForm):
         model = Residence
         fields = "__all__"
         widgets = {
-            'person': ModelSelect2Widget(
+            'person': PersonSelect2Widget(
                 model=Person,
-                search_fields=['short_name__icontains', 'surname__icontains', 'first_names__icontains']
             ),
-            'place': ModelSelect2Widget(
+            'place': PlaceSelect2Widget(
                 model=Place,
-                search_fields=['name__icontains'],
                 attrs={'style': 'width: 300px'}
             )
         }
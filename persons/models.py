@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django_date_extensions.fields import ApproximateDateField
@@ -7,10 +7,8 @@ from django.urls import reverse_lazy
 from computedfields.models import ComputedFieldsModel, computed
 from simple_history.models import HistoricalRecords
 
-import requests
-
 import mediate.tools
-from apiconnectors.cerlapi import cerl_record_url_api
+from apiconnectors import cerlapi
 
 import uuid
 
@@ -55,26 +53,44 @@ class Place(models.Model):
     def get_absolute_url(self):
         return reverse_lazy('place_detail', args=[str(self.uuid)])
 
+    def needs_lat_long(self):
+        return bool(self.cerl_id) and (not self.latitude or not self.longitude)
+
     def get_lat_long(self, overwrite=False):
-        if self.cerl_id and (overwrite or (not self.latitude or not self.longitude)):
-            response = requests.get(cerl_record_url_api + self.cerl_id, headers={'accept': 'application/json'})
-            cerl_record_json = response.json()
-            try:
-                if overwrite or not self.latitude:
-                    self.latitude = cerl_record_json['data']['location']['point']['lat']
-            except KeyError:
-                pass
-            try:
-                if overwrite or not self.longitude:
-                    self.longitude = cerl_record_json['data']['location']['point']['long']
-            except KeyError:
-                pass
+        """
+        Fills in the latitude and longitude from the CERL record of the place
+        :param overwrite: replace the values that are already filled in
+        :return: True if a value changed
+        """
+        if self.cerl_id and (overwrite or self.needs_lat_long()):
+            return self.set_lat_long(cerlapi.get_record_json(self.cerl_id), overwrite)
+        return False
+
+    def set_lat_long(self, record, overwrite=False):
+        """
+        Fills in the latitude and longitude from a CERL record that was retrieved beforehand
+        :param record: the JSON of the CERL record, or None
+        :param overwrite: replace the values that are already filled in
+        :return: True if a value changed
+        """
+        changed = False
+        latitude, longitude = cerlapi.get_lat_long(record)
+        if latitude is not None and (overwrite or not self.latitude) and latitude != self.latitude:
+            self.latitude = latitude
+            changed = True
+        if longitude is not None and (overwrite or not self.longitude) and longitude != self.longitude:
+            self.longitude = longitude
+            changed = True
+        return changed
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        self.get_lat_long()
         super().save(force_insert=False, force_update=False, using=None,
              update_fields=None)
+        if self.needs_lat_long():
+            # The CERL record is looked up by a job, so that saving does not wait for it
+            from .tasks import enqueue_lat_long
+            transaction.on_commit(enqueue_lat_long)
 
 
 class Religion(models.Model):
@@ -298,15 +314,15 @@ class PersonPersonRelation(models.Model):
 from .history import *
 
 
-# Clear cache when a model object is saved
+# Invalidate the cache tags of a model object when it is saved or deleted
 from django.db.models.signals import post_save, post_delete
 from mediate.tools import receiver_with_multiple_senders
-from django.core.cache import cache
+from mediate.cache import invalidate_instance
 
 
 @receiver_with_multiple_senders([post_save, post_delete],[
     Country, Place, Religion, Person, AlternativePersonName, ReligiousAffiliation, Residence, Profession,
     PersonProfession, PersonPersonRelationType, PersonPersonRelation
 ])
-def clear_cache(sender, instance, **kwargs):
-    cache.clear()
\ No newline at end of file
+def invalidate_cache(sender, instance, using=None, **kwargs):
+    invalidate_instance(instance, using=using)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Person rankings computed with numpy.
+
+The person x collection incidence of the filtered persons is retrieved with a single query. The item and
+collection counts and the weights of all persons are then computed in one vectorized pass, using the sorted
+publication years of the collections for the potential collection counts. Rankings are cached per filter signature.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django_tables2.data import TableData
+from django_tables2.utils import OrderBy
+
+from mediate.cache import get_or_set_tagged, dataset_tag, model_tag, SHARED_TAG
+
+
+def count_distinct(groups, values, group_count):
+    """
+    Counts the distinct values per group
+    :param groups: an array with the group index of each value
+    :param values: an array of values
+    :param group_count: the number of groups
+    :return: an array with the number of distinct values per group
+    """
+    counts = np.zeros(group_count, dtype=np.int64)
+    if not len(values):
+        return counts
+    unique_values, value_codes = np.unique(values, return_inverse=True)
+    pairs = np.unique(groups.astype(np.int64) * len(unique_values) + value_codes)
+    np.add.at(counts, pairs // len(unique_values), 1)
+    return counts
+
+
+def count_later_collections(collection_years, earliest_years, inclusive=False):
+    """
+    Counts the collections published after (or in, if inclusive) the given years
+    :param collection_years: a sorted array of collection publication years
+    :param earliest_years: an array of years, NaN for unknown years
+    :return: an array of counts, 0 for unknown years
+    """
+    counts = np.zeros(len(earliest_years), dtype=np.int64)
+    known = ~np.isnan(earliest_years)
+    counts[known] = len(collection_years) - np.searchsorted(collection_years, earliest_years[known],
+                                                            side='left' if inclusive else 'right')
+    return counts
+
+
+def get_collection_years(collections):
+    # With the primary key, as with .distinct() collections published in the same year would be counted once
+    return np.sort(np.array([year for pk, year in collections.order_by().values_list('pk', 'year_of_publication')
+                             if year is not None], dtype=np.float64))
+
+
+def to_float_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class PersonRanking:
+    """
+    The persons of a ranking in rank order with their statistics as numpy arrays
+    """
+    STATISTICS = ['item_count', 'collection_count', 'potential_collection_count', 'dynamic_weight', 'weight']
+
+    def __init__(self, person_ids, item_count, collection_count, potential_collection_count, dynamic_weight, weight):
+        self.person_ids = person_ids
+        self.item_count = item_count
+        self.collection_count = collection_count
+        self.potential_collection_count = potential_collection_count
+        self.dynamic_weight = dynamic_weight
+        self.weight = weight
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    @classmethod
+    def from_queryset(cls, queryset, collections, potential_collections=None):
+        """
+        Computes the ranking of a filtered Person queryset.
+        Like annotations after the filter, the counts only include the person-item relations that match the filter.
+        :param queryset: a filtered Person queryset
+        :param collections: a Collection queryset with the collections to count the items and collections in
+        :param potential_collections: a Collection queryset; if given, the number of these collections published
+        after the earliest edition of each person and the dynamic weight are computed and the persons are ranked
+        by dynamic weight instead of by number of items
+        :return: a PersonRanking
+        """
+        rows = list(queryset.values_list('pk', 'personitemrelation__item',
+                                                    'personitemrelation__item__lot__collection',
+                                                    'earliest_edition_year', 'weight'))
+        person_column, item_column, collection_column, earliest_year_column, weight_column = \
+            zip(*rows) if rows else ((), (), (), (), ())
+
+        person_ids, first_rows, person_index = np.unique(np.array(person_column, dtype=object).astype(str),
+                                                         return_index=True, return_inverse=True)
+        person_count = len(person_ids)
+        # Keep the persons in the order of the queryset, so that persons with equal statistics are in that order
+        order = np.argsort(first_rows)
+        first_rows = first_rows[order]
+        person_index = np.argsort(order)[person_index]
+
+        collection_ids = np.array([str(pk) for pk in collections.values_list('pk', flat=True)], dtype=str)
+        collection_column = np.array([str(pk) for pk in collection_column], dtype=str)
+        counted = np.isin(collection_column, collection_ids)
+        item_count = count_distinct(person_index[counted], np.array(item_column, dtype=object)[counted].astype(str),
+                                    person_count)
+        collection_count = count_distinct(person_index[counted], collection_column[counted], person_count)
+
+        earliest_years = to_float_array(np.array(earliest_year_column, dtype=object)[first_rows])
+        weight = to_float_array(np.array(weight_column, dtype=object)[first_rows])
+        potential_collection_count = np.zeros(person_count, dtype=np.int64)
+        dynamic_weight = np.full(person_count, np.nan)
+        if potential_collections is not None:
+            potential_collection_count = count_later_collections(get_collection_years(potential_collections),
+                                                                 earliest_years)
+            np.divide(100.0 * collection_count, potential_collection_count, out=dynamic_weight,
+                      where=potential_collection_count > 0)
+
+        ranking = cls(np.array(person_column, dtype=object)[first_rows], item_count, collection_count,
+                      potential_collection_count, dynamic_weight, weight)
+        return ranking.ordered_by(['-dynamic_weight' if potential_collections is not None else '-item_count'])
+
+    def get_sort_key(self, statistic, descending=False):
+        """
+        Gets a sort key for a statistic, with missing values last
+        """
+        values = getattr(self, statistic).astype(np.float64)
+        values = -values if descending else values
+        return np.where(np.isnan(values), np.inf, values)
+
+    def ordered_by(self, aliases, get_field_positions=None):
+        """
+        Gets the ranking in the order of the given aliases, e.g. ['-collection_count', 'short_name']
+        :param aliases: names prefixed with '-' for descending order
+        :param get_field_positions: a function that gets the position of each person when ordered by an alias
+        that is not a statistic (i.e. a model field)
+        """
+        keys = []
+        for alias in aliases:
+            order_by = OrderBy(alias)
+            if order_by.bare in self.STATISTICS:
+                keys.append(self.get_sort_key(order_by.bare, order_by.is_descending))
+            elif get_field_positions:
+                keys.append(get_field_positions(alias))
+        if not keys or not len(self):
+            return self
+        # np.lexsort is stable and sorts by the last key first
+        order = np.lexsort(keys[::-1])
+        return PersonRanking(self.person_ids[order], self.item_count[order], self.collection_count[order],
+                             self.potential_collection_count[order], self.dynamic_weight[order], self.weight[order])
+
+    def get_persons(self, queryset, key):
+        """
+        Gets the persons for a slice of the ranking, with their statistics as attributes
+        :param queryset: the Person queryset to retrieve the persons with
+        :param key: a slice
+        :return: a list of persons in rank order
+        """
+        indices = range(*key.indices(len(self)))
+        persons = {person.pk: person for person in queryset.filter(pk__in=list(self.person_ids[key]))}
+        records = []
+        for index in indices:
+            person = persons.get(self.person_ids[index])
+            if person is None:
+                continue
+            person.item_count = int(self.item_count[index])
+            person.collection_count = int(self.collection_count[index])
+            person.potential_collection_count = int(self.potential_collection_count[index])
+            if not np.isnan(self.dynamic_weight[index]):
+                person.dynamic_weight = float(self.dynamic_weight[index])
+            records.append(person)
+        return records
+
+
+def get_cached_ranking(filterset, datasets, compute_ranking):
+    """
+    Gets the ranking for the filter signature (filter class, filter parameters and datasets) from the cache
+    or computes it. Entries are invalidated when persons or the data of the datasets change.
+    :param filterset: a bound filterset
+    :param datasets: the datasets of the session
+    :param compute_ranking: a function that computes the PersonRanking
+    """
+    from persons.models import Person  # Avoid a circular import
+    parameters = sorted((name, value) for name, values in filterset.data.lists() for value in values
+                        if name not in ('page', 'per_page', 'sort', '_export'))
+    signature = repr((type(filterset).__name__, parameters, sorted(str(dataset.pk) for dataset in datasets)))
+    key = 'person_ranking_{}'.format(hashlib.sha1(signature.encode()).hexdigest())
+    tags = [SHARED_TAG, model_tag(Person)] + [dataset_tag(dataset.pk) for dataset in datasets]
+    return get_or_set_tagged(key, compute_ranking, tags, timeout=settings.PERSON_RANKING_CACHE_SECONDS)
+
+
+def compute_person_weights(persons):
+    """
+    Computes Person.weight for many persons with two queries instead of three per person
+    :param persons: a Person queryset
+    :return: a dict with the weight (or None) per person primary key
+    """
+    from catalogues.models import Collection  # Avoid a circular import
+    collections = Collection.objects.filter(catalogue__dataset__name=settings.DATASET_NAME_FOR_ANONYMOUSUSER)\
+        .distinct()
+    rows = list(persons.order_by().annotate(
+        collection_count=Count('personitemrelation__item__lot__collection', distinct=True,
+                               filter=Q(personitemrelation__item__lot__collection__in=collections))
+    ).values_list('pk', 'earliest_edition_year', 'collection_count'))
+    if not rows:
+        return {}
+    person_ids, earliest_years, collection_counts = zip(*rows)
+    potential_collection_count = count_later_collections(get_collection_years(collections),
+                                                         to_float_array(earliest_years), inclusive=True)
+    weights = np.full(len(rows), np.nan)
+    np.divide(100.0 * np.array(collection_counts), potential_collection_count, out=weights,
+              where=potential_collection_count > 0)
+    return {person_id: None if np.isnan(weight) else float(weight) for person_id, weight in zip(person_ids, weights)}
+
+
+class PersonRankingTableData(TableData):
+    """
+    Table data for a PersonRanking: only the persons on the current page (or export chunk) are retrieved
+    """
+    CHUNK_SIZE = 500
+
+    def __init__(self, queryset, ranking, filtered_queryset):
+        """
+        :param queryset: the Person queryset to retrieve the persons with; tables may add prefetches to it
+        :param ranking: a PersonRanking
+        :param filtered_queryset: the filtered Person queryset of the ranking, to order by model fields
+        """
+        super().__init__(queryset)
+        self.ranking = ranking
+        self.filtered_queryset = filtered_queryset
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.ranking.get_persons(self.data, key)
+        return self.ranking.get_persons(self.data, slice(key, key + 1))[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), self.CHUNK_SIZE):
+            yield from self[start:start + self.CHUNK_SIZE]
+
+    @property
+    def verbose_name(self):
+        return self.data.model._meta.verbose_name
+
+    @property
+    def verbose_name_plural(self):
+        return self.data.model._meta.verbose_name_plural
+
+    def get_field_positions(self, alias):
+        positions = {}
+        for pk in self.filtered_queryset.order_by(alias).values_list('pk', flat=True):
+            positions.setdefault(pk, len(positions))
+        return np.array([positions.get(pk, len(positions)) for pk in self.ranking.person_ids])
+
+    def order_by(self, aliases):
+        accessors = []
+        for alias in aliases:
+            bound_column = self.table.columns[OrderBy(alias).bare]
+            if alias[0] != bound_column.order_by_alias[0]:
+                accessors += bound_column.order_by.opposite
+            else:
+                accessors += bound_column.order_by
+        self.ranking = self.ranking.ordered_by([accessor.replace('.', '__') for accessor in accessors],
+                                               self.get_field_positions)
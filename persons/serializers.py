@@ -1,62 +1,62 @@
 from .models import *
-from rest_framework import serializers
+from mediate.api import ApiSerializer
 
 
-class CountrySerializer(serializers.HyperlinkedModelSerializer):
+class CountrySerializer(ApiSerializer):
     class Meta:
         model = Country
         fields = "__all__"
 
 
-class PlaceSerializer(serializers.HyperlinkedModelSerializer):
+class PlaceSerializer(ApiSerializer):
     class Meta:
         model = Place
         fields = "__all__"
 
 
-class ReligionSerializer(serializers.HyperlinkedModelSerializer):
+class ReligionSerializer(ApiSerializer):
     class Meta:
         model = Religion
         fields = "__all__"
 
 
-class PersonSerializer(serializers.HyperlinkedModelSerializer):
+class PersonSerializer(ApiSerializer):
     class Meta:
         model = Person
         fields = "__all__"
 
 
-class ReligiousAffiliationSerializer(serializers.HyperlinkedModelSerializer):
+class ReligiousAffiliationSerializer(ApiSerializer):
     class Meta:
         model = ReligiousAffiliation
         fields = "__all__"
 
 
-class ResidenceSerializer(serializers.HyperlinkedModelSerializer):
+class ResidenceSerializer(ApiSerializer):
     class Meta:
         model = Residence
         fields = "__all__"
 
 
-class ProfessionSerializer(serializers.HyperlinkedModelSerializer):
+class ProfessionSerializer(ApiSerializer):
     class Meta:
         model = Profession
         fields = "__all__"
 
 
-class PersonProfessionSerializer(serializers.HyperlinkedModelSerializer):
+class PersonProfessionSerializer(ApiSerializer):
     class Meta:
         model = PersonProfession
         fields = "__all__"
 
 
-class PersonPersonRelationTypeSerializer(serializers.HyperlinkedModelSerializer):
+class PersonPersonRelationTypeSerializer(ApiSerializer):
     class Meta:
         model = PersonPersonRelationType
         fields = "__all__"
 
 
-class PersonPersonRelationSerializer(serializers.HyperlinkedModelSerializer):
+class PersonPersonRelationSerializer(ApiSerializer):
     class Meta:
         model = PersonPersonRelation
         fields = "__all__"
@@ -0,0 +1,31 @@
+"""
+Jobs of the persons app (see jobs.tasks)
+"""
+from jobs.tasks import register_task, report_progress
+
+LAT_LONG_TASK = 'place_lat_long'
+
+
+def enqueue_lat_long():
+    """
+    Queues a job that fills in the missing latitudes and longitudes of places, unless one is queued already
+    """
+    from jobs.models import Job
+    if not Job.objects.filter(task=LAT_LONG_TASK, state=Job.QUEUED).exists():
+        Job.enqueue(LAT_LONG_TASK, description="Look up the coordinates of places")
+
+
+@register_task(LAT_LONG_TASK)
+def update_lat_long(job):
+    """
+    Fills in the missing latitudes and longitudes of places with a CERL ID from their CERL records
+    (see apiconnectors.enrich)
+    """
+    from apiconnectors.enrich import Enricher, PLACE_ENRICHMENT
+    progress = {'done': 0, 'updated': 0}
+    for progress in Enricher(PLACE_ENRICHMENT, workers=4).run():
+        report_progress(current=progress['done'], total=progress['total'],
+                        message="Looking up the coordinates of places")
+    report_progress(message="Filled in the coordinates of {} of {} places"
+                    .format(progress['updated'], progress['done']))
+    return {'places': progress['updated']}
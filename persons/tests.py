@@ -1,7 +1,11 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from mediate.tools_testing import GenericCRUDTestMixin
 
+from apiconnectors.stub import StubServer
+from jobs.models import Job
+from jobs.worker import Worker
 from .models import *
+from .tasks import LAT_LONG_TASK
 
 
 class PlaceTests(GenericCRUDTestMixin, TestCase):
@@ -20,6 +24,26 @@ class PlaceTests(GenericCRUDTestMixin, TestCase):
         }
 
 
+class PlaceLatLongTests(TestCase):
+    def test_lat_long_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            place = Place.objects.create(name='Nijmegen', cerl_id='cnl00016323')
+            Place.objects.create(name='Utrecht', cerl_id='cnl00015951')
+            Place.objects.create(name='Unknown')
+        # Saving does not look up the coordinates, but queues one job to do so
+        self.assertIsNone(place.latitude)
+        self.assertEqual(Job.objects.filter(task=LAT_LONG_TASK, state=Job.QUEUED).count(), 1)
+
+        record = {'data': {'location': {'point': {'lat': 51.84, 'long': 5.86}}}}
+        with StubServer({'/data.cerl.org/thesaurus/cnl00016323': record}) as stub, \
+                override_settings(API_CONNECTOR_OFFLINE=True, API_CONNECTOR_STUB_URL=stub.url):
+            Worker(name='test worker').run_next()
+        place.refresh_from_db()
+        self.assertEqual((place.latitude, place.longitude), (51.84, 5.86))
+        self.assertEqual(Job.objects.get(task=LAT_LONG_TASK).result, {'places': 1})
+        self.assertEqual(place.history.count(), 2)
+
+
 class ReligionTests(GenericCRUDTestMixin, TestCase):
     model = Religion
 
@@ -283,3 +307,104 @@ class PersonPersonRelationTests(GenericCRUDTestMixin, TestCase):
     def test_Detail(self):
         """TODO: add detail template"""
         pass
+
+
+class PersonRankingTests(TestCase):
+    def setUp(self):
+        from django.conf import settings
+        from catalogues.models import Dataset, Catalogue, Collection, Lot
+        from items.models import Item, Edition, PersonItemRelation, PersonItemRelationRole
+
+        dataset = Dataset.objects.create(name=settings.DATASET_NAME_FOR_ANONYMOUSUSER)
+        catalogue = Catalogue.objects.create(name='name_test', dataset=dataset)
+        self.role = PersonItemRelationRole.objects.create(name='author')
+        edition = Edition.objects.create(year_start=1640)
+        later_edition = Edition.objects.create(year_start=1660)
+        self.persons = [Person.objects.create(short_name='person {}'.format(index), surname='surname',
+                                              first_names='first names') for index in range(3)]
+        for index, year in enumerate([1650, 1700, 1750]):
+            collection = Collection.objects.create(short_title='collection {}'.format(index),
+                                                   year_of_publication=year)
+            collection.catalogue.add(catalogue)
+            lot = Lot.objects.create(collection=collection, number_in_collection=1, index_in_collection=1,
+                                     lot_as_listed_in_collection='lot 1')
+            # Person 0 has items in all collections, person 1 in the first two and person 2 in the last one
+            for person_index in {0: [0, 1], 1: [0, 1], 2: [0, 2]}[index]:
+                item = Item.objects.create(short_title='item {} {}'.format(index, person_index), lot=lot,
+                                           catalogue=catalogue, index_in_lot=person_index + 1,
+                                           edition=later_edition if person_index == 2 else edition)
+                PersonItemRelation.objects.create(person=self.persons[person_index], item=item, role=self.role)
+
+    def get_table(self, filter_class, table_class, **parameters):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from django_tables2 import RequestConfig
+
+        request = RequestFactory().get('/', {'item_roles': self.role.pk, **parameters})
+        request.user = AnonymousUser()
+        request.session = {}
+        filter = filter_class(request.GET, queryset=Person.objects.all(), request=request)
+        table = table_class(filter.get_table_data())
+        RequestConfig(request).configure(table)
+        return table
+
+    def test_PersonRanking(self):
+        from .filters import PersonRankingFilter
+        from .tables import PersonRankingTable
+        from mediate.export import StreamingTableExport
+
+        table = self.get_table(PersonRankingFilter, PersonRankingTable)
+        self.assertEqual([(row.record, row.record.item_count, row.record.collection_count) for row in table.rows],
+                         [(self.persons[0], 3, 3), (self.persons[1], 2, 2), (self.persons[2], 1, 1)])
+
+        table = self.get_table(PersonRankingFilter, PersonRankingTable, sort='-short_name')
+        self.assertEqual([row.record for row in table.rows], self.persons[::-1])
+        rows = list(StreamingTableExport('csv', table).get_rows())
+        self.assertEqual([row[3] for row in rows[1:]], ['person 2', 'person 1', 'person 0'])
+
+        # The relations are only counted if they match the filter
+        table = self.get_table(PersonRankingFilter, PersonRankingTable, collection_year_min=1700,
+                                collection_year_max=1800)
+        self.assertEqual([(row.record, row.record.item_count) for row in table.rows],
+                         [(self.persons[0], 2), (self.persons[1], 1), (self.persons[2], 1)])
+
+    def test_PersonWeightedRanking(self):
+        from .filters import PersonWeightedRankingFilter
+        from .tables import PersonWeightedRankingTable
+
+        table = self.get_table(PersonWeightedRankingFilter, PersonWeightedRankingTable)
+        self.assertEqual([(row.record, row.record.collection_count, row.record.potential_collection_count,
+                           row.record.dynamic_weight) for row in table.rows],
+                         [(self.persons[0], 3, 3, 100.0), (self.persons[1], 2, 3, 200 / 3),
+                          (self.persons[2], 1, 2, 50.0)])
+
+    def test_compute_person_weights(self):
+        from .ranking import compute_person_weights
+
+        weights = compute_person_weights(Person.objects.all())
+        for person in Person.objects.all():
+            person.save()  # Recomputes the stored weight
+            self.assertAlmostEqual(weights[person.pk], person.weight)
+
+    def test_compute_person_weights_same_year(self):
+        from catalogues.models import Catalogue, Collection
+        from .ranking import compute_person_weights
+
+        # Collections published in the same year each count as a potential collection
+        catalogue = Catalogue.objects.get(name='name_test')
+        for index in range(3):
+            Collection.objects.create(short_title='collection 1700 {}'.format(index),
+                                      year_of_publication=1700).catalogue.add(catalogue)
+        weights = compute_person_weights(Person.objects.all())
+        for person in Person.objects.all():
+            person.save()  # Recomputes the stored weight
+            self.assertAlmostEqual(weights[person.pk], person.weight)
+        self.assertAlmostEqual(weights[self.persons[0].pk], 50.0)
+
+    def test_update_person_weights(self):
+        from django.core.management import call_command
+
+        Person.objects.update(weight=None)
+        call_command('update_person_weights')
+        self.assertEqual(list(Person.objects.order_by('short_name').values_list('weight', flat=True)),
+                         [100.0, 200 / 3, 50.0])
@@ -1,62 +1,66 @@
-from rest_framework import viewsets
+from catalogues.models import Catalogue, Collection, Lot
+from items.models import Edition, Item, PersonItemRelation
+from mediate.api import ApiViewSet
 from ..serializers import *
 
 
-class CountryViewSet(viewsets.ModelViewSet):
+class CountryViewSet(ApiViewSet):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
     http_method_names = ['get']
 
 
-class PlaceViewSet(viewsets.ModelViewSet):
+class PlaceViewSet(ApiViewSet):
     queryset = Place.objects.all()
     serializer_class = PlaceSerializer
     http_method_names = ['get']
 
 
-class ReligionViewSet(viewsets.ModelViewSet):
+class ReligionViewSet(ApiViewSet):
     queryset = Religion.objects.all()
     serializer_class = ReligionSerializer
     http_method_names = ['get']
 
 
-class PersonViewSet(viewsets.ModelViewSet):
+class PersonViewSet(ApiViewSet):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
     http_method_names = ['get']
+    # The computed fields of persons: the earliest edition year and the weight
+    etag_models = [PersonItemRelation, Item, Edition, Lot, Collection, Catalogue]
 
 
-class ReligiousAffiliationViewSet(viewsets.ModelViewSet):
+class ReligiousAffiliationViewSet(ApiViewSet):
     queryset = ReligiousAffiliation.objects.all()
     serializer_class = ReligiousAffiliationSerializer
     http_method_names = ['get']
 
 
-class ResidenceViewSet(viewsets.ModelViewSet):
+class ResidenceViewSet(ApiViewSet):
     queryset = Residence.objects.all()
     serializer_class = ResidenceSerializer
     http_method_names = ['get']
 
 
-class ProfessionViewSet(viewsets.ModelViewSet):
+class ProfessionViewSet(ApiViewSet):
     queryset = Profession.objects.all()
     serializer_class = ProfessionSerializer
     http_method_names = ['get']
 
 
-class PersonProfessionViewSet(viewsets.ModelViewSet):
+class PersonProfessionViewSet(ApiViewSet):
     queryset = PersonProfession.objects.all()
     serializer_class = PersonProfessionSerializer
     http_method_names = ['get']
 
 
-class PersonPersonRelationTypeViewSet(viewsets.ModelViewSet):
+class PersonPersonRelationTypeViewSet(ApiViewSet):
     queryset = PersonPersonRelationType.objects.all()
     serializer_class = PersonPersonRelationTypeSerializer
     http_method_names = ['get']
 
 
-class PersonPersonRelationViewSet(viewsets.ModelViewSet):
+class PersonPersonRelationViewSet(ApiViewSet):
     queryset = PersonPersonRelation.objects.all()
     serializer_class = PersonPersonRelationSerializer
     http_method_names = ['get']
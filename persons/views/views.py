@@ -11,7 +11,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.html import escape
 from django.urls import reverse
 import django_tables2
-from django_tables2.export.export import TableExport
+from mediate.export import StreamingTableExport
 
 from django.http import JsonResponse
 import re
@@ -124,19 +124,16 @@ class PersonRankingTableView(ListView):
     def create_filtered_table(self):
         filter = self.filter_class(self.request.GET, queryset=self.get_queryset(), request=self.request)
 
-        if not filter.form.is_valid():
-            filter._qs = filter.queryset.none()
-
-        table = self.table_class(filter.qs)
+        table = self.table_class(filter.get_table_data())
         django_tables2.RequestConfig(self.request, ).configure(table)
         return filter, table
 
     def get(self, request, *args, **kwargs):
         # Handle the _export query
         export_format = request.GET.get('_export', None)
-        if TableExport.is_valid_format(export_format):
+        if StreamingTableExport.is_valid_format(export_format):
             filter, table = self.create_filtered_table()
-            exporter = TableExport(export_format, table, exclude_columns=('uuid', 'roles', 'weight'))
+            exporter = StreamingTableExport(export_format, table, exclude_columns=('uuid', 'roles', 'weight'))
             return exporter.response('table.{}'.format(export_format))
         else:
             return super().get(request, *args, **kwargs)
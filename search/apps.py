@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    name = 'search'
+    # The postings have a row per word of each indexed object
+    default_auto_field = 'django.db.models.BigAutoField'
@@ -0,0 +1,169 @@
+"""
+Autocomplete for the Select2 pickers of persons, places, works, items and collections.
+
+The names and titles are indexed like item short titles (see search.index): every normalized word has
+postings per object. Each word of the vocabulary also has its trigrams (SearchWordGram). A run of a search
+term is looked up as a prefix of the words (for runs shorter than three characters) or by the trigrams of
+the run (otherwise), so that a keystroke does not scan the names and titles with a leading-wildcard LIKE.
+An object matches if it has a matching word for each run of the term. Objects whose text starts with
+the term come first.
+
+The first results for a term are kept in an in-process LRU cache, per queryset and scope. The keys include
+the cache tag versions of the indexed models (see mediate.cache), so changes invalidate the cached results in all
+processes. Terms with more results than are kept are ranked in SQL, so that all pages of the results can be
+loaded. Items and collections are scoped to the datasets of the session; persons, places and works do
+not belong to a dataset.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+
+from mediate.cache import get_tag_versions, model_tag
+from .index import ITEM_INDEX, COLLECTION_INDEX, PERSON_INDEX, PLACE_INDEX, WORK_INDEX, normalize_text, \
+    TERM_RUN_RE, WORD_RE
+
+
+def normalize_term(term):
+    return " ".join(normalize_text(term).split())
+
+
+def get_runs(term):
+    """
+    Gets the runs of word characters of a normalized term, without wildcards
+    """
+    return [run for run in TERM_RUN_RE.findall(term.replace('?', ' ').replace('*', ' ')) if WORD_RE.search(run)]
+
+
+class LRUCache:
+    """
+    A thread-safe in-process cache that keeps the most recently used entries
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class Autocomplete:
+    """
+    The autocomplete of a model, using a search index
+    """
+    def __init__(self, index, display_field, dataset_field=None, related_models=None):
+        """
+        :param index: the search index of the names or titles of the model
+        :param display_field: the field whose beginning ranks the results first if it matches the term
+        :param dataset_field: the lookup of the dataset of the objects, if they are scoped to the session
+        :param related_models: the labels of other models whose changes change the index, e.g. alternative names
+        """
+        self.index = index
+        self.display_field = display_field
+        self.dataset_field = dataset_field
+        self.related_models = related_models or []
+        self.cache = LRUCache(getattr(settings, 'AUTOCOMPLETE_CACHE_SIZE', 2000))
+
+    @property
+    def model(self):
+        return self.index.model
+
+    def get_datasets(self, request):
+        """
+        Gets the primary keys of the datasets of the session, or None if the objects are not scoped
+        """
+        if self.dataset_field is None or request is None:
+            return None
+        from catalogues.tools import get_datasets_for_session
+        return sorted(str(dataset.pk) for dataset in get_datasets_for_session(request))
+
+    def get_cache_key(self, queryset, term, datasets):
+        models = [self.model] + [apps.get_model(label) for label in self.related_models]
+        versions = get_tag_versions([model_tag(model) for model in models])
+        query = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return (self.index.model_label, query, term, tuple(datasets or ()), tuple(sorted(versions.items())))
+
+    def get_objects(self, queryset, runs, datasets=None):
+        """
+        Gets the objects of a queryset that match the runs of a term, in order of relevance
+        """
+        objects = queryset.filter(pk__in=self.index.get_autocomplete_candidates(runs))
+        if datasets is not None:
+            # A subquery, as the objects may be linked to a dataset more than once
+            objects = objects.filter(pk__in=self.model._base_manager
+                                     .filter(**{self.dataset_field + '__in': datasets}).values('pk'))
+        return objects.annotate(autocomplete_rank=Case(
+            When(**{self.display_field + '__istartswith': runs[0]}, then=Value(0)),
+            default=Value(1), output_field=IntegerField()
+        )).order_by('autocomplete_rank', self.display_field, 'pk')
+
+    def search(self, queryset, term, datasets=None, limit=None):
+        """
+        Gets the primary keys of the objects of a queryset that match a term, in order of relevance
+        :param queryset: a queryset of the model
+        :param term: the term, of which each run has to match a word of an object
+        :param datasets: the primary keys of the datasets to restrict the objects to
+        :param limit: the maximum number of results
+        :return: a list of primary keys, or None if the term has no runs to look up
+        """
+        term = normalize_term(term)
+        runs = get_runs(term)
+        if not runs:
+            return None
+        limit = limit or getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 200)
+        key = self.get_cache_key(queryset, term, datasets) + (limit,)
+        pks = self.cache.get(key)
+        if pks is None:
+            pks = list(self.get_objects(queryset, runs, datasets).values_list('pk', flat=True)[:limit])
+            self.cache.set(key, pks)
+        return pks
+
+    def get_candidates(self, term):
+        """
+        Gets the primary keys of all objects that match a term, e.g. to filter related objects
+        :return: a queryset of primary keys, or None if the term has no runs to look up
+        """
+        runs = get_runs(normalize_term(term))
+        return self.index.get_autocomplete_candidates(runs) if runs else None
+
+    def filter(self, queryset, term, request=None):
+        """
+        Filters a queryset for a term, scoped to the datasets of the session of a request
+        :return: the filtered queryset in order of relevance, or None if the term has no runs to look up
+        """
+        datasets = self.get_datasets(request)
+        pks = self.search(queryset, term, datasets)
+        if pks is None:
+            return None
+        if len(pks) >= getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 200):
+            # There may be more results than were kept, which the next pages of the results need
+            return self.get_objects(queryset, get_runs(normalize_term(term)), datasets)
+        order = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(pks)],
+                     default=Value(len(pks)), output_field=IntegerField())
+        return queryset.filter(pk__in=pks).order_by(order) if pks else queryset.none()
+
+
+PERSON_AUTOCOMPLETE = Autocomplete(PERSON_INDEX, 'short_name', related_models=['persons.AlternativePersonName'])
+PLACE_AUTOCOMPLETE = Autocomplete(PLACE_INDEX, 'name')
+WORK_AUTOCOMPLETE = Autocomplete(WORK_INDEX, 'title')
+ITEM_AUTOCOMPLETE = Autocomplete(ITEM_INDEX, 'short_title', dataset_field='dataset_uuid')
+COLLECTION_AUTOCOMPLETE = Autocomplete(COLLECTION_INDEX, 'short_title', dataset_field='catalogue__dataset')
@@ -0,0 +1,319 @@
+"""
+An inverted index of the words in item short titles and lot descriptions, and in the names and titles of
+persons, places, works and collections (for autocomplete, see search.autocomplete).
+
+Every text is split into runs of word characters without case and accents, which are stored once in a
+vocabulary (SearchWord) with postings per item or lot. A search term matches a text if it is contained in it,
+so each run of word characters (and ? and * wildcards) of the term is contained in a single word of the text.
+The index therefore narrows a search down to the objects that have such a word for every run, using the
+(small) vocabulary instead of the texts, and the original filter is only evaluated for these candidates.
+The words of the vocabulary that contain a run are found by the trigrams of the run (SearchWordGram).
+
+The postings are updated by the receivers in search.models when objects are saved, and by reindex() for changes
+that do not send signals, such as bulk updates. Changes that bypass both, e.g. raw SQL or QuerySet.update() outside
+of mediate.history.update_with_history, are indexed by the rebuild_search_index command.
+"""
+import re
+import unicodedata
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Q
+
+from mediate.tools import normalize_query, filter_multiple_words
+
+WORD_RE = re.compile(r'\w+')
+TERM_RUN_RE = re.compile(r'[\w?*]+')
+MAX_WORD_LENGTH = 255
+GRAM_LENGTH = 3
+
+
+def normalize_text(text):
+    """
+    Lowercases a text and removes its accents, as case and accent insensitive collations ignore them
+    """
+    return "".join(character for character in unicodedata.normalize('NFKD', (text or "").lower())
+                   if not unicodedata.combining(character))
+
+
+def get_words(text):
+    """
+    Gets the distinct normalized words of a text
+    """
+    return {word[:MAX_WORD_LENGTH] for word in WORD_RE.findall(normalize_text(text))}
+
+
+def get_grams(word):
+    """
+    Gets the distinct trigrams of a word
+    """
+    return {word[start:start + GRAM_LENGTH] for start in range(len(word) - GRAM_LENGTH + 1)}
+
+
+def get_gram_lookup(run):
+    """
+    Gets a lookup for the vocabulary words that have the first, middle and last trigrams of a run,
+    which narrow the vocabulary down to few words
+    """
+    SearchWordGram = apps.get_model('search', 'SearchWordGram')
+    grams = [run[start:start + GRAM_LENGTH] for start in range(len(run) - GRAM_LENGTH + 1)]
+    lookup = Q()
+    for gram in sorted({grams[0], grams[len(grams) // 2], grams[-1]}):
+        lookup &= Q(id__in=SearchWordGram.objects.filter(gram=gram).values('word_id'))
+    return lookup
+
+
+def get_word_lookup(run, prefix=False):
+    """
+    Gets a lookup for the vocabulary words that contain a run of a search term,
+    with ? matching a single letter and * one or more letters
+    :param prefix: whether runs shorter than a trigram only match the beginning of words
+    """
+    if '?' not in run and '*' not in run:
+        if len(run) < GRAM_LENGTH:
+            return Q(word__startswith=run) if prefix else Q(word__contains=run)
+        return get_gram_lookup(run) & Q(word__contains=run)
+    letter = '[^\\W\\d_]' if connection.vendor == 'sqlite' else '[[:alpha:]]'
+    regex = "".join(letter if character == '?' else letter + '+' if character == '*' else re.escape(character)
+                    for character in run)
+    return Q(word__regex=regex)
+
+
+class SearchIndex:
+    """
+    The index of a text field of a model, with a posting model that relates the objects to their words
+    """
+    def __init__(self, model, field_name, posting_model, object_field):
+        """
+        :param model: the label of the indexed model, e.g. 'items.Item'
+        :param field_name: the name of the indexed text field
+        :param posting_model: the name of the posting model in this app
+        :param object_field: the name of the foreign key of the posting model to the indexed model
+        """
+        self.model_label = model
+        self.field_name = field_name
+        self.posting_model_name = posting_model
+        self.object_field = object_field
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def posting_model(self):
+        return apps.get_model('search', self.posting_model_name)
+
+    @property
+    def object_id_field(self):
+        return self.object_field + '_id'
+
+    @property
+    def fields(self):
+        """
+        The names of the fields the indexed text is made of
+        """
+        return [self.field_name]
+
+    @staticmethod
+    def get_word_ids(words):
+        """
+        Gets the IDs of words, adding the words that are not in the vocabulary yet
+        :return: a dict with the ID per word
+        """
+        SearchWord = apps.get_model('search', 'SearchWord')
+        SearchWordGram = apps.get_model('search', 'SearchWordGram')
+        word_ids = dict(SearchWord.objects.filter(word__in=words).values_list('word', 'id'))
+        missing = [word for word in words if word not in word_ids]
+        if missing:
+            SearchWord.objects.bulk_create([SearchWord(word=word) for word in missing], ignore_conflicts=True)
+            missing_ids = dict(SearchWord.objects.filter(word__in=missing).values_list('word', 'id'))
+            SearchWordGram.objects.bulk_create([SearchWordGram(word_id=word_id, gram=gram)
+                                                for word, word_id in missing_ids.items() for gram in get_grams(word)],
+                                               ignore_conflicts=True)
+            word_ids.update(missing_ids)
+            # The collation of the database may consider distinct words equal (e.g. 'ß' and 'ss'), in which case
+            # only one of them is stored and returned: the others get the ID of the stored word
+            for word in set(missing) - set(missing_ids):
+                word_ids[word] = SearchWord.objects.filter(word=word).values_list('id', flat=True).first()
+        return word_ids
+
+    def index_values(self, values, batch_size=1000):
+        """
+        Updates the postings of objects
+        :param values: a list of tuples of an object ID and its text
+        """
+        words_per_object = {object_id: get_words(text) for object_id, text in values}
+        word_ids = self.get_word_ids(set().union(*words_per_object.values()))
+        postings = {(object_id, word_ids[word]) for object_id, words in words_per_object.items() for word in words}
+
+        existing = set(self.posting_model.objects.filter(**{self.object_id_field + '__in': list(words_per_object)})
+                       .values_list(self.object_id_field, 'word_id'))
+        obsolete = existing - postings
+        if obsolete:
+            obsolete_q = Q()
+            for object_id, word_id in obsolete:
+                obsolete_q |= Q(**{self.object_id_field: object_id, 'word_id': word_id})
+            self.posting_model.objects.filter(obsolete_q).delete()
+        self.posting_model.objects.bulk_create(
+            [self.posting_model(**{self.object_id_field: object_id, 'word_id': word_id})
+             for object_id, word_id in postings - existing],
+            batch_size=batch_size, ignore_conflicts=True)
+
+    def index_objects(self, objects):
+        self.index_values([(obj.pk, getattr(obj, self.field_name)) for obj in objects])
+
+    def get_values(self, pks=None, batch_size=1000):
+        """
+        Yields the object ID and the indexed text of all objects, or of the objects with the given IDs
+        """
+        queryset = self.model.objects.order_by()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        yield from queryset.values_list('pk', self.field_name).iterator(chunk_size=batch_size)
+
+    def rebuild(self, batch_size=1000):
+        """
+        Rebuilds the postings of all objects
+        :return: the number of indexed objects
+        """
+        self.posting_model.objects.all().delete()
+        count = 0
+        batch = []
+        for values in self.get_values(batch_size=batch_size):
+            batch.append(values)
+            if len(batch) == batch_size:
+                self.index_values(batch, batch_size)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.index_values(batch, batch_size)
+            count += len(batch)
+        return count
+
+    def get_candidates(self, term):
+        """
+        Gets the IDs of the objects that may contain a search term
+        :return: a queryset of object IDs, or None if the term cannot be looked up in the index
+        (e.g. because it only consists of wildcards or punctuation)
+        """
+        SearchWord = apps.get_model('search', 'SearchWord')
+        candidates = None
+        for run in TERM_RUN_RE.findall(normalize_text(term)):
+            if not WORD_RE.search(run):
+                continue
+            object_ids = self.posting_model.objects\
+                .filter(word__in=SearchWord.objects.filter(get_word_lookup(run)))\
+                .values(self.object_id_field)
+            candidates = object_ids if candidates is None \
+                else candidates.filter(**{self.object_id_field + '__in': object_ids})
+        return candidates
+
+    def get_autocomplete_candidates(self, runs):
+        """
+        Gets the IDs of the objects that have a word for each run of a search term. Runs shorter than a trigram
+        match the beginning of words, longer runs any part.
+        :param runs: the normalized runs of word characters of the term
+        :return: a queryset of object IDs
+        """
+        SearchWord = apps.get_model('search', 'SearchWord')
+        candidates = None
+        for run in runs:
+            object_ids = self.posting_model.objects\
+                .filter(word__in=SearchWord.objects.filter(get_word_lookup(run, prefix=True)))\
+                .values(self.object_id_field)
+            candidates = object_ids if candidates is None \
+                else candidates.filter(**{self.object_id_field + '__in': object_ids})
+        return candidates
+
+    def filter(self, queryset, name, value, lookup_expr='icontains', multiple_words=False, wildcards=False):
+        """
+        Filters a queryset for a search value, using the index to restrict the filter to the candidates
+        :param queryset: a queryset
+        :param name: the path to the indexed field from the model of the queryset,
+        e.g. 'short_title' or 'lot__lot_as_listed_in_collection'
+        :param value: the search value
+        :param lookup_expr: the lookup expression of the filter
+        :param multiple_words: whether to match any of the words (and quoted phrases) of the value
+        (as filter_multiple_words does) instead of the whole value
+        :param wildcards: whether ? and * are wildcards
+        """
+        object_path = name[:-len(self.field_name)] + 'pk' if name.endswith(self.field_name) else name
+        candidates_q = Q()
+        for term in normalize_query(value) if multiple_words else [value]:
+            candidates = self.get_candidates(term if wildcards else term.replace('?', ' ').replace('*', ' '))
+            if candidates is None:
+                candidates_q = None
+                break
+            candidates_q |= Q(**{object_path + '__in': candidates})
+        if candidates_q:
+            queryset = queryset.filter(candidates_q)
+
+        if multiple_words:
+            return filter_multiple_words(lookup_expr, queryset, name, value, wildcards=wildcards)
+        return queryset.filter(**{name + '__' + lookup_expr: value})
+
+
+class PersonSearchIndex(SearchIndex):
+    """
+    The index of the names and alternative names of persons
+    """
+    NAME_FIELDS = ['short_name', 'surname', 'first_names']
+
+    @property
+    def fields(self):
+        return self.NAME_FIELDS
+
+    def index_objects(self, objects):
+        self.index_values(list(self.get_values([obj.pk for obj in objects])))
+
+    def get_values(self, pks=None, batch_size=1000):
+        AlternativePersonName = apps.get_model('persons', 'AlternativePersonName')
+        queryset = self.model.objects.order_by('pk')
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        batch = []
+        for values in queryset.values_list('pk', *self.NAME_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(values)
+            if len(batch) == batch_size:
+                yield from self.get_texts(batch, AlternativePersonName)
+                batch = []
+        if batch:
+            yield from self.get_texts(batch, AlternativePersonName)
+
+    def get_texts(self, batch, alternative_name_model):
+        texts = {pk: [name for name in names if name] for pk, *names in batch}
+        for pk, *names in alternative_name_model.objects.filter(person_id__in=list(texts))\
+                .values_list('person_id', *self.NAME_FIELDS):
+            texts[pk].extend(name for name in names if name)
+        return [(pk, " ".join(names)) for pk, names in texts.items()]
+
+
+ITEM_INDEX = SearchIndex('items.Item', 'short_title', 'ItemSearchWord', 'item')
+LOT_INDEX = SearchIndex('catalogues.Lot', 'lot_as_listed_in_collection', 'LotSearchWord', 'lot')
+PERSON_INDEX = PersonSearchIndex('persons.Person', 'short_name', 'PersonSearchWord', 'person')
+PLACE_INDEX = SearchIndex('persons.Place', 'name', 'PlaceSearchWord', 'place')
+WORK_INDEX = SearchIndex('items.Work', 'title', 'WorkSearchWord', 'work')
+COLLECTION_INDEX = SearchIndex('catalogues.Collection', 'short_title', 'CollectionSearchWord', 'collection')
+INDEXES = [ITEM_INDEX, LOT_INDEX, PERSON_INDEX, PLACE_INDEX, WORK_INDEX, COLLECTION_INDEX]
+
+
+def get_indexes(model):
+    """
+    Gets the search indexes of a model
+    """
+    return [index for index in INDEXES if index.model_label == model._meta.label]
+
+
+def reindex(model, pks, fields=None, batch_size=1000):
+    """
+    Updates the postings of objects that were changed without sending signals, e.g. by bulk updates
+    :param model: the model of the objects
+    :param pks: the IDs of the objects
+    :param fields: the names of the changed fields, or None if any field may have changed
+    :param batch_size: the number of objects to index at once
+    """
+    pks = list(pks)
+    for index in get_indexes(model):
+        if fields is None or set(index.fields) & set(fields):
+            for i in range(0, len(pks), batch_size):
+                index.index_values(list(index.get_values(pks[i:i + batch_size], batch_size)), batch_size)
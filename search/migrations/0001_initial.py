@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('items', '0040_alter_edition_place'),
+        ('catalogues', '0041_auto_20260225_1354'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=255, unique=True, verbose_name='Word')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LotSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalogues.lot')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'lot')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+from search.index import get_words
+
+BATCH_SIZE = 1000
+
+
+def build_index(apps, schema_editor):
+    """
+    Indexes the existing item short titles and lot descriptions
+    """
+    SearchWord = apps.get_model('search', 'SearchWord')
+    word_ids = {}
+
+    def index(model, field_name, posting_model, object_field):
+        batch = []
+        for object_id, text in model.objects.order_by().values_list('pk', field_name).iterator(chunk_size=BATCH_SIZE):
+            for word in get_words(text):
+                if word not in word_ids:
+                    word_ids[word] = SearchWord.objects.create(word=word).id
+                batch.append(posting_model(**{object_field + '_id': object_id, 'word_id': word_ids[word]}))
+            if len(batch) >= BATCH_SIZE:
+                posting_model.objects.bulk_create(batch)
+                batch = []
+        posting_model.objects.bulk_create(batch)
+
+    index(apps.get_model('items', 'Item'), 'short_title', apps.get_model('search', 'ItemSearchWord'), 'item')
+    index(apps.get_model('catalogues', 'Lot'), 'lot_as_listed_in_collection',
+          apps.get_model('search', 'LotSearchWord'), 'lot')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
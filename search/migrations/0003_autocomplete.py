@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('persons', '0023_historicalperson_birth_name_person_birth_name'),
+        ('catalogues', '0043_lot_sort_key'),
+        ('items', '0040_alter_edition_place'),
+        ('search', '0002_build_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='works', to='search.searchword')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.work')),
+            ],
+            options={
+                'unique_together': {('word', 'work')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchWordGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(db_index=True, max_length=3, verbose_name='Trigram')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grams', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'gram')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PlaceSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='persons.place')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='places', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'place')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PersonSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='persons.person')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='persons', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'person')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CollectionSearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalogues.collection')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collections', to='search.searchword')),
+            ],
+            options={
+                'unique_together': {('word', 'collection')},
+            },
+        ),
+    ]
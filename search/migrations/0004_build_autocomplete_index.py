@@ -0,0 +1,68 @@
+from django.db import migrations
+
+from search.index import get_words, get_grams
+
+BATCH_SIZE = 1000
+
+
+def build_index(apps, schema_editor):
+    """
+    Adds the trigrams of the existing words, and indexes the names of persons, places, works and collections
+    """
+    SearchWord = apps.get_model('search', 'SearchWord')
+    SearchWordGram = apps.get_model('search', 'SearchWordGram')
+
+    batch = []
+    for word_id, word in SearchWord.objects.order_by().values_list('id', 'word').iterator(chunk_size=BATCH_SIZE):
+        batch.extend(SearchWordGram(word_id=word_id, gram=gram) for gram in get_grams(word))
+        if len(batch) >= BATCH_SIZE:
+            SearchWordGram.objects.bulk_create(batch)
+            batch = []
+    SearchWordGram.objects.bulk_create(batch)
+
+    word_ids = dict(SearchWord.objects.values_list('word', 'id'))
+
+    def get_word_id(word):
+        if word not in word_ids:
+            word_ids[word] = SearchWord.objects.create(word=word).id
+            SearchWordGram.objects.bulk_create([SearchWordGram(word_id=word_ids[word], gram=gram)
+                                                for gram in get_grams(word)])
+        return word_ids[word]
+
+    def index(texts, posting_model, object_field):
+        batch = []
+        for object_id, text in texts:
+            for word in get_words(text):
+                batch.append(posting_model(**{object_field + '_id': object_id, 'word_id': get_word_id(word)}))
+            if len(batch) >= BATCH_SIZE:
+                posting_model.objects.bulk_create(batch)
+                batch = []
+        posting_model.objects.bulk_create(batch)
+
+    names = {}
+    for model in [apps.get_model('persons', 'Person'), apps.get_model('persons', 'AlternativePersonName')]:
+        person_field = 'pk' if model._meta.model_name == 'person' else 'person_id'
+        for person_id, *values in model.objects.exclude(**{person_field: None})\
+                .values_list(person_field, 'short_name', 'surname', 'first_names').iterator(chunk_size=BATCH_SIZE):
+            names.setdefault(person_id, []).extend(value for value in values if value)
+    index(((person_id, " ".join(values)) for person_id, values in names.items()),
+          apps.get_model('search', 'PersonSearchWord'), 'person')
+
+    for model_label, field_name, posting_model, object_field in [
+        ('persons.Place', 'name', 'PlaceSearchWord', 'place'),
+        ('items.Work', 'title', 'WorkSearchWord', 'work'),
+        ('catalogues.Collection', 'short_title', 'CollectionSearchWord', 'collection'),
+    ]:
+        index(apps.get_model(model_label).objects.order_by().values_list('pk', field_name)
+              .iterator(chunk_size=BATCH_SIZE), apps.get_model('search', posting_model), object_field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_autocomplete'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,141 @@
+from django.db import models
+from django.db.models.deletion import CASCADE
+from django.utils.translation import gettext_lazy as _
+
+from items.models import Item, Work
+from catalogues.models import Lot, Collection
+from persons.models import Person, Place, AlternativePersonName
+
+
+class SearchWord(models.Model):
+    """
+    A word in the search index: a run of word characters, without case and accents, of an indexed text
+    """
+    word = models.CharField(_("Word"), max_length=255, unique=True)
+
+    def __str__(self):
+        return self.word
+
+
+class SearchWordGram(models.Model):
+    """
+    A trigram of a word in the search index, to find the words that contain a part of a word
+    """
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='grams')
+    gram = models.CharField(_("Trigram"), max_length=3, db_index=True)
+
+    class Meta:
+        unique_together = (('word', 'gram'),)
+
+
+class ItemSearchWord(models.Model):
+    """
+    A word in the short title of an item
+    """
+    item = models.ForeignKey(Item, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='items')
+
+    class Meta:
+        unique_together = (('word', 'item'),)
+
+
+class LotSearchWord(models.Model):
+    """
+    A word in the description of a lot, as listed in the collection
+    """
+    lot = models.ForeignKey(Lot, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='lots')
+
+    class Meta:
+        unique_together = (('word', 'lot'),)
+
+
+class PersonSearchWord(models.Model):
+    """
+    A word in the names or alternative names of a person
+    """
+    person = models.ForeignKey(Person, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='persons')
+
+    class Meta:
+        unique_together = (('word', 'person'),)
+
+
+class PlaceSearchWord(models.Model):
+    """
+    A word in the name of a place
+    """
+    place = models.ForeignKey(Place, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='places')
+
+    class Meta:
+        unique_together = (('word', 'place'),)
+
+
+class WorkSearchWord(models.Model):
+    """
+    A word in the title of a work
+    """
+    work = models.ForeignKey(Work, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='works')
+
+    class Meta:
+        unique_together = (('word', 'work'),)
+
+
+class CollectionSearchWord(models.Model):
+    """
+    A word in the short title of a collection
+    """
+    collection = models.ForeignKey(Collection, on_delete=CASCADE, related_name='+')
+    word = models.ForeignKey(SearchWord, on_delete=CASCADE, related_name='collections')
+
+    class Meta:
+        unique_together = (('word', 'collection'),)
+
+
+# Keep the index up to date when an indexed object is saved
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .index import ITEM_INDEX, LOT_INDEX, PERSON_INDEX, PLACE_INDEX, WORK_INDEX, COLLECTION_INDEX
+
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or ITEM_INDEX.field_name in update_fields:
+        ITEM_INDEX.index_objects([instance])
+
+
+@receiver(post_save, sender=Lot)
+def index_lot(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or LOT_INDEX.field_name in update_fields:
+        LOT_INDEX.index_objects([instance])
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_save, sender=Work)
+@receiver(post_save, sender=Collection)
+def index_name(sender, instance, update_fields=None, **kwargs):
+    index = {Place: PLACE_INDEX, Work: WORK_INDEX, Collection: COLLECTION_INDEX}[sender]
+    if update_fields is None or index.field_name in update_fields:
+        index.index_objects([instance])
+
+
+@receiver(post_save, sender=Person)
+def index_person(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(PERSON_INDEX.NAME_FIELDS) & set(update_fields):
+        PERSON_INDEX.index_objects([instance])
+
+
+@receiver(pre_save, sender=AlternativePersonName)
+def remember_person_of_alternative_name(sender, instance, **kwargs):
+    instance._old_person_id = sender.objects.filter(pk=instance.pk).values_list('person_id', flat=True).first() \
+        if not instance._state.adding else None
+
+
+@receiver(post_save, sender=AlternativePersonName)
+@receiver(post_delete, sender=AlternativePersonName)
+def index_person_of_alternative_name(sender, instance, **kwargs):
+    person_ids = {instance.person_id, getattr(instance, '_old_person_id', None)} - {None}
+    if person_ids:
+        PERSON_INDEX.index_values(list(PERSON_INDEX.get_values(person_ids)))
@@ -0,0 +1,112 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.http import QueryDict
+
+from catalogues.models import Dataset, Catalogue, Collection, Lot
+from items.models import Item, Edition
+from items.filters import ItemFilter
+from persons.models import Person, AlternativePersonName
+from cachalot.api import cachalot_disabled
+from mediate.history import update_with_history
+from .autocomplete import PERSON_AUTOCOMPLETE
+from .widgets import PersonSelect2Widget
+from .models import SearchWord, ItemSearchWord
+
+import io
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        dataset = Dataset.objects.create(name='name_test')
+        catalogue = Catalogue.objects.create(name='name_test', dataset=dataset)
+        collection = Collection.objects.create(short_title='short_title test', year_of_publication=1666)
+        collection.catalogue.add(catalogue)
+        self.lots = [Lot.objects.create(collection=collection, number_in_collection=index + 1,
+                                        index_in_collection=index + 1, lot_as_listed_in_collection=text)
+                     for index, text in enumerate(['Histoire de la Révolution, 3 vol.', 'Bibles et psaumes'])]
+        edition = Edition.objects.create(year_start=1600)
+        self.items = [Item.objects.create(short_title=short_title, lot=lot, catalogue=catalogue, edition=edition,
+                                          index_in_lot=1)
+                      for short_title, lot in [('Histoire de la Révolution', self.lots[0]),
+                                               ('Biblia sacra', self.lots[1]),
+                                               ('Les psaumes de David', self.lots[1])]]
+
+    def search(self, **parameters):
+        query = QueryDict(mutable=True)
+        query.update(parameters)
+        return set(ItemFilter(query, queryset=Item.objects.all()).qs)
+
+    def test_index_on_save(self):
+        self.assertEqual(set(ItemSearchWord.objects.filter(item=self.items[1])
+                             .values_list('word__word', flat=True)), {'biblia', 'sacra'})
+        self.items[1].short_title = 'Biblia latina'
+        self.items[1].save()
+        self.assertEqual(set(ItemSearchWord.objects.filter(item=self.items[1])
+                             .values_list('word__word', flat=True)), {'biblia', 'latina'})
+
+    def test_search(self):
+        # Any of the words, contained in the short title, regardless of case and accents
+        self.assertEqual(self.search(short_title='bibl david'), {self.items[1], self.items[2]})
+        self.assertEqual(self.search(short_title='évolution'), {self.items[0]})
+        self.assertEqual(self.search(short_title='"de la révolution"'), {self.items[0]})
+        self.assertEqual(self.search(short_title='"la histoire"'), set())
+        self.assertEqual(self.search(lot='psaumes'), {self.items[1], self.items[2]})
+        self.assertEqual(self.search(lot='3 vol'), {self.items[0]})
+
+    def test_reindex_bulk_update(self):
+        update_with_history(Item.objects.filter(pk=self.items[1].pk), short_title='Biblia latina')
+        self.assertEqual(self.search(short_title='latina'), {self.items[1]})
+        self.assertEqual(self.search(short_title='sacra'), set())
+
+    def test_rebuild_search_index(self):
+        SearchWord.objects.all().delete()
+        self.assertEqual(self.search(short_title='sacra'), set())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search(short_title='sacra'), {self.items[1]})
+
+        # Changes that do not send signals are indexed by the rebuild
+        Item.objects.filter(pk=self.items[1].pk).update(short_title='Biblia latina')
+        self.assertEqual(self.search(short_title='latina'), set())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search(short_title='latina'), {self.items[1]})
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.descartes = Person.objects.create(short_name='Descartes, René', surname='Descartes', first_names='René')
+        AlternativePersonName.objects.create(person=self.descartes, surname='Cartesius', first_names='Renatus')
+        self.pascal = Person.objects.create(short_name='Pascal, Blaise', surname='Pascal', first_names='Blaise')
+
+    def search(self, term):
+        return set(PERSON_AUTOCOMPLETE.filter(Person.objects.all(), term))
+
+    def test_autocomplete(self):
+        self.assertEqual(self.search('desc ren'), {self.descartes})
+        self.assertEqual(self.search('renatus'), {self.descartes})
+        # Short runs match the beginning of words, longer runs any part
+        self.assertEqual(self.search('ca'), {self.descartes})
+        self.assertEqual(self.search('scal'), {self.pascal})
+        self.assertEqual(self.search('rené pascal'), set())
+        self.assertIsNone(PERSON_AUTOCOMPLETE.filter(Person.objects.all(), ' '))
+
+        widget = PersonSelect2Widget(model=Person)
+        self.assertEqual(list(widget.filter_queryset(None, 'blai')), [self.pascal])
+
+        # Changing an alternative name updates the index
+        alternative_name = AlternativePersonName.objects.get()
+        alternative_name.person = self.pascal
+        alternative_name.save()
+        PERSON_AUTOCOMPLETE.cache.clear()
+        self.assertEqual(self.search('renatus'), {self.pascal})
+
+    def test_more_results_than_kept(self):
+        other = Person.objects.create(short_name='Descartes, Pierre', surname='Descartes', first_names='Pierre')
+        with override_settings(AUTOCOMPLETE_MAX_RESULTS=1):
+            self.assertEqual(list(PERSON_AUTOCOMPLETE.filter(Person.objects.all(), 'desc')), [other, self.descartes])
+            self.assertEqual(list(PERSON_AUTOCOMPLETE.filter(Person.objects.all(), 'desc')[1:]), [self.descartes])
+
+    def test_cache(self):
+        self.search('desc')
+        with cachalot_disabled(), self.assertNumQueries(1):
+            # Only the query for the objects themselves
+            self.assertEqual(self.search('desc'), {self.descartes})
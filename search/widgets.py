@@ -0,0 +1,58 @@
+"""
+Select2 widgets that look up the search term in the autocomplete index (see search.autocomplete)
+instead of filtering with icontains on the search fields.
+"""
+from django_select2.forms import ModelSelect2Widget, ModelSelect2MultipleWidget
+
+from .autocomplete import PERSON_AUTOCOMPLETE, PLACE_AUTOCOMPLETE, WORK_AUTOCOMPLETE, COLLECTION_AUTOCOMPLETE
+
+
+class AutocompleteMixin:
+    # The Autocomplete of the model of the widget
+    autocomplete = None
+
+    def filter_queryset(self, request, term, queryset=None, **dependent_fields):
+        if queryset is None:
+            queryset = self.get_queryset()
+        if dependent_fields:
+            queryset = queryset.filter(**dependent_fields)
+        filtered = self.autocomplete.filter(queryset, term, request=request)
+        if filtered is None:
+            # No words to look up, e.g. an empty term
+            return super().filter_queryset(request, term, queryset)
+        return filtered
+
+
+class PersonSelect2Widget(AutocompleteMixin, ModelSelect2Widget):
+    autocomplete = PERSON_AUTOCOMPLETE
+    search_fields = ['short_name__icontains', 'surname__icontains', 'first_names__icontains']
+
+
+class PersonSelect2MultipleWidget(AutocompleteMixin, ModelSelect2MultipleWidget):
+    autocomplete = PERSON_AUTOCOMPLETE
+    search_fields = ['short_name__icontains', 'surname__icontains', 'first_names__icontains']
+
+
+class PlaceSelect2Widget(AutocompleteMixin, ModelSelect2Widget):
+    autocomplete = PLACE_AUTOCOMPLETE
+    search_fields = ['name__icontains']
+
+
+class PlaceSelect2MultipleWidget(AutocompleteMixin, ModelSelect2MultipleWidget):
+    autocomplete = PLACE_AUTOCOMPLETE
+    search_fields = ['name__icontains']
+
+
+class WorkSelect2Widget(AutocompleteMixin, ModelSelect2Widget):
+    autocomplete = WORK_AUTOCOMPLETE
+    search_fields = ['title__icontains']
+
+
+class WorkSelect2MultipleWidget(AutocompleteMixin, ModelSelect2MultipleWidget):
+    autocomplete = WORK_AUTOCOMPLETE
+    search_fields = ['title__icontains']
+
+
+class CollectionSelect2Widget(AutocompleteMixin, ModelSelect2Widget):
+    autocomplete = COLLECTION_AUTOCOMPLETE
+    search_fields = ['short_title__icontains']
@@ -6,6 +6,36 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 
+class SerializedValue(str):
+    """
+    A serialized object as stored in the database, which is only deserialized when it is accessed
+    """
+
+
+class SerializedObjectDescriptor:
+    """
+    Deserializes the stored value of a SerializedObjectField on first access, so that retrieving many rows
+    (e.g. for a list of moderations) does not deserialize all objects
+    """
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        if self.field.attname not in instance.__dict__:
+            # A deferred field
+            instance.refresh_from_db(fields=[self.field.attname])
+        value = instance.__dict__.get(self.field.attname)
+        if isinstance(value, SerializedValue):
+            value = self.field._deserialize(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
 class SerializedObjectField(models.TextField):
     '''Model field that stores serialized value of model class instance
        and returns deserialized model instance
@@ -38,15 +68,18 @@ class SerializedObjectField(models.TextField):
     def db_type(self, connection=None):
         return 'text'
 
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        setattr(cls, self.attname, SerializedObjectDescriptor(self))
+
     def from_db_value(self, value, expression, connection):
         if value is None:
             return value
-        return self._deserialize(value)
+        # Deserialized by the descriptor on access
+        return SerializedValue(value)
 
     def to_python(self, value):
-        print("to_python")
         if isinstance(value, models.Model):
-            print("models.Model")
             return value
         if value is None:
             return value
@@ -85,6 +118,9 @@ class SerializedObjectField(models.TextField):
         return obj
 
     def _serialize_if_object(self, value):
+        if isinstance(value, SerializedValue):
+            # Not accessed since it was retrieved
+            return str(value)
         if isinstance(value, str):
             # Check whether value can be deserialized
             self._deserialize(value)
@@ -93,7 +129,7 @@ class SerializedObjectField(models.TextField):
             return self._serialize(value)
 
     def pre_save(self, model_instance, add):
-        value = getattr(model_instance, self.attname, None)
+        value = model_instance.__dict__.get(self.attname)
         return self._serialize_if_object(value)
 
     def get_prep_value(self, value):
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simplemoderation', '0003_alter_moderation_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moderation',
+            index=models.Index(fields=['content_type', 'object_pk', 'state'], name='moderation_object_state_idx'),
+        ),
+    ]
@@ -53,6 +53,25 @@ class Moderation(models.Model):
     moderator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="handled_moderations")
     reason = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # For the pending moderations of objects, see get_pending_object_pks
+            models.Index(fields=['content_type', 'object_pk', 'state'], name='moderation_object_state_idx'),
+        ]
+
+    @staticmethod
+    def get_pending_object_pks(model, pks):
+        """
+        Gets which of the objects of a model are under moderation, with one query
+        :param model: the model of the objects
+        :param pks: the primary keys of the objects
+        :return: a set of the primary keys of the objects that have a pending moderation
+        """
+        content_type = ContentType.objects.get_for_model(model)
+        return set(Moderation.objects.filter(content_type=content_type, object_pk__in=list(pks),
+                                             state=ModerationState.PENDING.value)
+                   .values_list('object_pk', flat=True))
+
     @staticmethod
     def create(editor, obj, action):
         content_type = ContentType.objects.get_for_model(obj)
@@ -7,12 +7,13 @@ from .models import *
 
 # Moderation table
 class ModerationTable(tables.Table):
+    entries = tables.CheckBoxColumn(accessor='pk', orderable=False)
     id = tables.Column(orderable=False, verbose_name=_("Moderate"))
 
     class Meta:
         model = Moderation
         attrs = {'class': 'table table-sortable'}
-        fields = ('editor', 'created_datetime', 'action', 'content_type', 'data', 'master', 'state', 'reason', 'id',)
+        fields = ('entries', 'editor', 'created_datetime', 'action', 'content_type', 'data', 'master', 'state', 'reason', 'id',)
 
     def render_action(self, record):
         return ModerationAction(record.action).name.capitalize()
@@ -1,3 +1,66 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from cachalot.api import cachalot_disabled
 
-# Create your tests here.
+from catalogues.models import Collection
+from .fields import SerializedValue
+from .models import Moderation, ModerationAction, ModerationState
+from .tools import handle_moderations, set_under_moderation
+
+
+class ModerationTests(TestCase):
+    def setUp(self):
+        self.editor = User.objects.create_user('editor', 'editor@example.com', 'editor')
+        self.moderator = User.objects.create_user('moderator', 'moderator@example.com', 'moderator')
+        self.collections = [Collection.objects.create(short_title='collection {}'.format(index))
+                            for index in range(3)]
+
+    def create_moderation(self, collection, short_title, master=None):
+        collection.short_title = short_title
+        moderation = Moderation.create(editor=self.editor, obj=collection, action=ModerationAction.UPDATE)
+        moderation.master = master
+        moderation.save()
+        return moderation
+
+    def test_under_moderation(self):
+        self.create_moderation(self.collections[1], 'changed')
+        self.assertEqual(Moderation.get_pending_object_pks(Collection, [c.pk for c in self.collections]),
+                         {self.collections[1].pk})
+
+        collections = list(Collection.objects.filter(pk__in=[c.pk for c in self.collections]))
+        with cachalot_disabled(), self.assertNumQueries(1):
+            set_under_moderation(collections)
+        with self.assertNumQueries(0):
+            self.assertEqual([c.short_title for c in collections if c.under_moderation()], ['collection 1'])
+
+    def test_lazy_data(self):
+        self.create_moderation(self.collections[0], 'changed')
+        moderation = Moderation.objects.get()
+        self.assertIsInstance(moderation.__dict__['data'], SerializedValue)
+        self.assertEqual(moderation.data.short_title, 'changed')
+        self.assertIsInstance(moderation.__dict__['data'], Collection)
+
+        # Saving without accessing the data keeps the stored value
+        moderation = Moderation.objects.get()
+        moderation.reason = 'reason'
+        moderation.save()
+        self.assertEqual(Moderation.objects.get().data.short_title, 'changed')
+
+    def test_handle_moderations(self):
+        first = self.create_moderation(self.collections[0], 'approved')
+        self.create_moderation(self.collections[1], 'also approved', master=first)
+        other = self.create_moderation(self.collections[2], 'rejected')
+        self.create_moderation(self.collections[2], 'skipped', master=other)
+
+        handled, skipped = handle_moderations(Moderation.objects.exclude(pk=other.pk), ModerationState.APPROVED,
+                                              self.moderator)
+        self.assertEqual((handled, skipped), (2, 1))
+        self.assertEqual(Collection.objects.get(pk=self.collections[0].pk).short_title, 'approved')
+        self.assertEqual(Collection.objects.get(pk=self.collections[1].pk).short_title, 'also approved')
+
+        handled, skipped = handle_moderations(Moderation.objects.filter(pk=other.pk), ModerationState.REJECTED,
+                                              self.moderator, reason='No')
+        self.assertEqual((handled, skipped), (1, 0))
+        other.refresh_from_db()
+        self.assertEqual((other.state, other.reason, other.moderator), ('R', 'No', self.moderator))
+        self.assertEqual(Collection.objects.get(pk=self.collections[2].pk).short_title, 'collection 2')
@@ -1,5 +1,7 @@
 from django.contrib import messages
+from django.db import transaction
 from django.http import HttpResponseRedirect
+from django.utils import timezone
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.utils.translation import gettext_lazy as _
 
@@ -25,11 +27,9 @@ def moderated(relevant_fields_list=[]):
                 Method to check whether the object of this class in under moderation
                 :return: boolean: whether the object of this class in under moderation
                 """
-                moderation = Moderation.objects.filter(object_pk=self.pk, state=ModerationState.PENDING.value)
-                if moderation:
-                    return True
-                else:
-                    return False
+                if not hasattr(self, '_under_moderation'):
+                    self._under_moderation = bool(Moderation.get_pending_object_pks(type(self), [self.pk]))
+                return self._under_moderation
             cls.under_moderation = under_moderation
 
             # Filter relevant fields with existing class fields
@@ -40,6 +40,77 @@ def moderated(relevant_fields_list=[]):
     return decorator
 
 
+def set_under_moderation(objects):
+    """
+    Determines for a list of objects of a moderated model whether they are under moderation, with one query,
+    so that their under_moderation methods do not query the database (e.g. on list pages)
+    :param objects: a list of objects of the same model
+    :return: the objects
+    """
+    if settings.MODERATION_OFF or not objects:
+        return objects
+    pending_pks = Moderation.get_pending_object_pks(type(objects[0]), [obj.pk for obj in objects])
+    for obj in objects:
+        obj._under_moderation = obj.pk in pending_pks
+    return objects
+
+
+def apply_moderation(moderation):
+    """
+    Saves or deletes the object of an approved moderation
+    :param moderation: the Moderation
+    """
+    if moderation.object_pk and moderation.action == ModerationAction.UPDATE.value:
+        obj = moderation.data
+        obj.pk = moderation.object_pk
+        # Update the existing object (a new object with a primary key default would be inserted)
+        obj._state.adding = False
+        obj.save()
+    elif not moderation.object_pk and moderation.action == ModerationAction.CREATE.value:
+        obj = moderation.data
+        obj.save()
+    elif moderation.object_pk and moderation.action == ModerationAction.DELETE.value:
+        obj = moderation.data
+        obj.delete()
+    else:
+        message = _("ERROR: Something went wrong when handling moderation {}").format(str(moderation.pk))
+        raise Exception(message)
+
+
+def handle_moderations(moderations, state, moderator, reason=''):
+    """
+    Approves or rejects pending moderations in one transaction. A moderation that depends on a pending moderation
+    is only handled if that moderation is handled as well.
+    :param moderations: a Moderation queryset
+    :param state: ModerationState.APPROVED or ModerationState.REJECTED
+    :param moderator: the user who handles the moderations
+    :param reason: the reason for all moderations, or an empty string to keep their reasons
+    :return: a tuple of the numbers of handled and skipped moderations
+    """
+    handled = []
+    skipped = 0
+    now = timezone.now()
+    with transaction.atomic():
+        handled_pks = set()
+        for moderation in moderations.select_for_update().filter(state=ModerationState.PENDING.value)\
+                .select_related('master').order_by('created_datetime', 'pk'):
+            if moderation.master and moderation.master.state == ModerationState.PENDING.value \
+                    and moderation.master_id not in handled_pks:
+                skipped += 1
+                continue
+            if state == ModerationState.APPROVED:
+                apply_moderation(moderation)
+            moderation.state = state.value
+            moderation.moderator = moderator
+            moderation.moderated_datetime = now
+            if reason:
+                moderation.reason = reason
+            handled.append(moderation)
+            handled_pks.add(moderation.pk)
+        Moderation.objects.bulk_update(handled, ['state', 'moderator', 'moderated_datetime', 'reason'])
+    return len(handled), skipped
+
+
 def moderate(action=None, check_under_moderation=True):
     def decorator(cls):
         """
@@ -11,4 +11,7 @@ urlpatterns = [
     path(r'moderations/edit/<int:pk>',
          permission_required('simplemoderation.change_moderation')(ModerationUpdateView.as_view()),
          name="change_moderation"),
+    path('moderations/handle',
+         permission_required('simplemoderation.change_moderation')(handle_moderations_view),
+         name="handle_moderations"),
     ]
\ No newline at end of file
@@ -9,6 +9,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.urls import reverse_lazy
 from django.shortcuts import redirect
+from django.views.decorators.http import require_POST
 import django_tables2
 
 from datetime import datetime
@@ -17,15 +18,17 @@ from collections import OrderedDict
 from .forms import *
 from .filters import *
 from .tables import *
+from .tools import apply_moderation, handle_moderations
 
 
 # Moderation views
 class ModerationTableView(ListView):
     model = Moderation
-    template_name = 'moderation_list.html'
+    template_name = 'simplemoderation/moderation_list.html'
 
     def get_queryset(self):
-        return Moderation.objects.all()
+        # The serialized objects are only deserialized for the rows on the page
+        return Moderation.objects.select_related('editor', 'content_type', 'master')
 
     def get_context_data(self, **kwargs):
         context = super(ModerationTableView, self).get_context_data(**kwargs)
@@ -79,21 +82,8 @@ class ModerationUpdateView(UpdateView):
         # If approved, save or delete the object
         try:
             with transaction.atomic():
-                if moderation.state is ModerationState.APPROVED.value:
-                    if moderation.object_pk and moderation.action == ModerationAction.UPDATE.value:
-                        obj = moderation.data
-                        obj.pk = moderation.object_pk
-                        obj.save()
-                    elif not moderation.object_pk and moderation.action == ModerationAction.CREATE.value:
-                        obj = moderation.data
-                        obj.save()
-                    elif moderation.object_pk and moderation.action == ModerationAction.DELETE.value:
-                        obj = moderation.data
-                        obj.delete()
-                    else:
-                        message = _("ERROR: Something went wrong when handling moderation {}")\
-                            .format(str(moderation.pk))
-                        raise Exception(message)
+                if moderation.state == ModerationState.APPROVED.value:
+                    apply_moderation(moderation)
 
                 moderation.moderator = self.request.user
                 moderation.moderated_datetime = timezone.now()
@@ -140,3 +130,31 @@ class ModerationUpdateView(UpdateView):
             else:
                 changes[field]['changed'] = True
         return (original_exists, new_exists, changes)
+
+
+@require_POST
+def handle_moderations_view(request):
+    """
+    Approves or rejects the selected pending moderations in one transaction
+    :param request:
+    :return:
+    """
+    pks = request.POST.getlist('entries')
+    try:
+        state = ModerationState(request.POST.get('state'))
+    except ValueError:
+        state = None
+    if not pks or state not in (ModerationState.APPROVED, ModerationState.REJECTED):
+        messages.add_message(request, messages.WARNING, _("No moderations and/or no action selected."))
+        return redirect('moderations')
+    try:
+        handled, skipped = handle_moderations(Moderation.objects.filter(pk__in=pks), state, request.user,
+                                              request.POST.get('reason', ''))
+    except Exception as e:
+        messages.add_message(request, messages.ERROR, str(e))
+        return redirect('moderations')
+    messages.add_message(request, messages.SUCCESS, _("{} moderations {}.").format(handled, state.name.lower()))
+    if skipped:
+        messages.add_message(request, messages.WARNING,
+                             _("{} moderations depend on a pending moderation and were skipped.").format(skipped))
+    return redirect('moderations')
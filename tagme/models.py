@@ -40,12 +40,12 @@ class TaggedEntity(models.Model):
 from .history import *
 
 
-# Clear cache when a model object is saved
+# Invalidate the cache tags of a model object when it is saved or deleted
 from django.db.models.signals import post_save, post_delete
 from mediate.tools import receiver_with_multiple_senders
-from django.core.cache import cache
+from mediate.cache import invalidate_instance
 
 
 @receiver_with_multiple_senders([post_save, post_delete],[Tag, TaggedEntity])
-def clear_cache(sender, instance, **kwargs):
-    cache.clear()
\ No newline at end of file
+def invalidate_cache(sender, instance, using=None, **kwargs):
+    invalidate_instance(instance, using=using)
\ No newline at end of file
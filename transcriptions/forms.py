@@ -1,5 +1,6 @@
 from django import forms
 from django_select2.forms import Select2Widget, ModelSelect2Widget, ModelSelect2MultipleWidget
+from search.widgets import PlaceSelect2Widget
 from .models import *
 from catalogues.models import Library, Catalogue
 
@@ -31,9 +32,8 @@ class ShelfMarkModelForm(forms.ModelForm):
         # fields = ['place', 'library']
         exclude = ['uuid']
         widgets = {
-            'place': ModelSelect2Widget(
+            'place': PlaceSelect2Widget(
                 model=Place,
-                search_fields=['name__icontains'],
                 attrs={'data-placeholder': "Select a place"},
             ),
             'library': ModelSelect2Widget(
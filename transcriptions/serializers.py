@@ -1,25 +1,25 @@
 from .models import *
-from rest_framework import serializers
+from mediate.api import ApiSerializer
 
 
-class SourceMaterialSerializer(serializers.HyperlinkedModelSerializer):
+class SourceMaterialSerializer(ApiSerializer):
     class Meta:
         model = SourceMaterial
         fields = "__all__"
 
 
-class TranscriptionSerializer(serializers.HyperlinkedModelSerializer):
+class TranscriptionSerializer(ApiSerializer):
     class Meta:
         model = Transcription
         fields = "__all__"
 
 
-class DocumentScanSerializer(serializers.HyperlinkedModelSerializer):
+class DocumentScanSerializer(ApiSerializer):
     class Meta:
         model = DocumentScan
         fields = "__all__"
 
-class ShelfmarkSerializer(serializers.HyperlinkedModelSerializer):
+class ShelfmarkSerializer(ApiSerializer):
     class Meta:
         model = ShelfMark
         fields = "__all__"
@@ -1,26 +1,26 @@
-from rest_framework import viewsets
+from mediate.api import ApiViewSet
 from ..serializers import *
 
 
-class SourceMaterialViewSet(viewsets.ModelViewSet):
+class SourceMaterialViewSet(ApiViewSet):
     queryset = SourceMaterial.objects.all()
     serializer_class = SourceMaterialSerializer
     http_method_names = ['get']
 
 
-class TranscriptionViewSet(viewsets.ModelViewSet):
+class TranscriptionViewSet(ApiViewSet):
     queryset = Transcription.objects.all()
     serializer_class = TranscriptionSerializer
     http_method_names = ['get']
 
 
-class DocumentScanViewSet(viewsets.ModelViewSet):
+class DocumentScanViewSet(ApiViewSet):
     queryset = DocumentScan.objects.all()
     serializer_class = DocumentScanSerializer
     http_method_names = ['get']
 
 
-class ShelfmarkViewSet(viewsets.ModelViewSet):
+class ShelfmarkViewSet(ApiViewSet):
     queryset = ShelfMark.objects.all()
     serializer_class = ShelfmarkSerializer
     http_method_names = ['get']